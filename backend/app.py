@@ -1,11 +1,40 @@
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, Response, send_file, stream_with_context
 from flask_cors import CORS
 import os
 import sys
 import subprocess
 import json
+import re
+import hmac
+import hashlib
+import time
+import socket
+from typing import Optional, Dict, Tuple
 from urllib.parse import unquote
 
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'transcript_extraction'))
+# The playlist module lives in test/; the playlist endpoints import it lazily from there
+PLAYLIST_MODULE_DIR = os.path.join(os.path.dirname(__file__), 'test')
+if PLAYLIST_MODULE_DIR not in sys.path:
+    sys.path.append(PLAYLIST_MODULE_DIR)
+import cache_manager
+import storage
+import search_index
+import llm_scheduler
+import stage_metrics
+import model_router
+import prefetch
+import prompt_cache
+import job_queue
+import profiling
+import serialization
+import topic_outline
+import access_log
+from decide_clip import save_segments
+from resilience import PIPELINE_DEADLINE_SECONDS
+from pipeline_runs import (EXIT_RATE_LIMITED, PIPELINE_MODE, PIPELINE_POLL_SECONDS, parse_retry_after,
+                           run_pipeline, run_queued_pipeline)
+
 app = Flask(__name__)
 CORS(app)  # Allow requests from frontend
 
@@ -21,10 +50,475 @@ def construct_youtube_url(video_id: str) -> str:
     """
     return f"https://www.youtube.com/watch?v={video_id}"
 
+def get_segments_path(video_id: str, prompt: str) -> str:
+    """
+    Get the logical path of the segments file for a video and prompt.
+    
+    Args:
+        video_id (str): The YouTube video ID
+        prompt (str): The search prompt
+        
+    Returns:
+        str: Path to the segments file (as written by decide_clip.save_segments)
+    """
+    segments_dir = os.path.join(os.path.dirname(__file__), 'transcript_extraction', 'temporary_files')
+    prompt_safe = ''.join(c for c in prompt[:20] if c.isalnum() or c in (' ', '-', '_')).replace(' ', '_')
+    return os.path.join(segments_dir, f"transcript_{video_id}_{prompt_safe}_segments.json")
+
+def get_transcript_path(video_id: str) -> str:
+    """
+    Get the logical path of a video's cleaned transcript.
+    
+    Args:
+        video_id (str): The YouTube video ID
+        
+    Returns:
+        str: Path to the transcript file (as written by transcript_fetch)
+    """
+    return os.path.join(os.path.dirname(__file__), 'transcript_extraction', 'temporary_files', f'transcript_{video_id}.txt')
+
+def read_cached_segments(segments_path: str) -> Optional[Dict]:
+    """
+    Read a cached segments file, if it holds a segments result.
+    
+    Args:
+        segments_path (str): Logical path of the segments file
+        
+    Returns:
+        Optional[Dict]: The stored result, or None if the file is missing or not a result object
+        (e.g. a bare segment list written by older playlist runs)
+    """
+    if not storage.artifact_exists(segments_path):
+        return None
+    data = storage.read_json_artifact(segments_path)
+    if not isinstance(data, dict):
+        print(f"[DEBUG] Ignoring cached segments in an old format: {segments_path}")
+        return None
+    return data
+
+# Transcripts missing from /api/info are fetched in the background unless disabled
+PREFETCH_ON_INFO = os.getenv('PREFETCH_ON_INFO', 'true').lower() in ('true', '1', 'yes', 'on')
+VIDEO_ID_PATTERN = re.compile(r'^[0-9A-Za-z_-]{11}$')
+
+# Shared secret for /api/admin/* endpoints; unset disables them
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
+
+# Non-standard status (nginx convention) logged when the client went away before the answer
+CLIENT_CLOSED_REQUEST = 499
+
+# Cache-Control sent by each cacheable endpoint; override with CACHE_CONTROL_<ENDPOINT> (e.g. CACHE_CONTROL_GET)
+CACHE_CONTROL_DEFAULTS = {
+    'get': 'public, max-age=300, stale-while-revalidate=86400',
+    'segments': 'public, max-age=300, stale-while-revalidate=86400',
+    'transcript': 'public, max-age=3600, stale-while-revalidate=86400',
+    'outline': 'public, max-age=300, stale-while-revalidate=86400',
+    'info': 'public, max-age=30, stale-while-revalidate=300',
+}
+CACHE_CONTROL = {endpoint: os.getenv(f'CACHE_CONTROL_{endpoint.upper()}', policy)
+                 for endpoint, policy in CACHE_CONTROL_DEFAULTS.items()}
+
+
+def make_etag(*parts) -> str:
+    """
+    Build a strong ETag from the values that determine a response body.
+    
+    Args:
+        *parts: Values identifying the representation (digests, normalized prompt, model, ...)
+    
+    Returns:
+        str: Quoted entity tag
+    """
+    digest = hashlib.sha256('\n'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+    return f'"{digest[:32]}"'
+
+def not_modified(etag: str) -> bool:
+    """
+    Check the request's If-None-Match header against an ETag.
+    
+    Args:
+        etag (str): Quoted entity tag of the current representation
+    
+    Returns:
+        bool: True if the client's copy is current and a 304 can be sent
+    """
+    return etag_matches(request.headers.get('If-None-Match', ''), etag)
+
+def etag_matches(header: str, etag: str) -> bool:
+    """
+    Compare an If-None-Match header with an ETag (weak comparison, as RFC 9110 requires).
+    
+    Args:
+        header (str): Value of the If-None-Match header
+        etag (str): Quoted entity tag of the current representation
+    
+    Returns:
+        bool: True if the header lists the ETag (or is '*')
+    """
+    if header.strip() == '*':
+        return True
+    candidates = (tag.strip() for tag in header.split(','))
+    return etag in (tag[2:] if tag.startswith('W/') else tag for tag in candidates)
+
+def cacheable(response: Response, endpoint: str, etag: Optional[str] = None) -> Response:
+    """
+    Attach validators and the endpoint's Cache-Control policy to a response.
+    
+    Args:
+        response (Response): Response to decorate (also used for 304 answers)
+        endpoint (str): Key of CACHE_CONTROL
+        etag (str, optional): Quoted entity tag of the representation
+    
+    Returns:
+        Response: The same response
+    """
+    if etag:
+        response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = CACHE_CONTROL[endpoint]
+    return response
+
+def not_modified_response(endpoint: str, etag: str, vary: Optional[str] = None) -> Response:
+    """
+    Build a 304 answer carrying the same validators and caching headers as the full response.
+    
+    Args:
+        endpoint (str): Key of CACHE_CONTROL
+        etag (str): Quoted entity tag of the representation
+        vary (str, optional): Vary header of the full response
+    
+    Returns:
+        Response: Empty 304 response
+    """
+    response = cacheable(Response(status=304), endpoint, etag)
+    if vary:
+        response.headers['Vary'] = vary
+    return response
+
+def payload_response(body: Dict, status: int = 200, headers: Optional[Dict[str, str]] = None):
+    """
+    Build a Flask response from a (body, status, headers) payload shared with asgi.py.
+    
+    Args:
+        body (Dict): JSON body
+        status (int): HTTP status
+        headers (Dict[str, str], optional): Extra response headers
+        
+    Returns:
+        Tuple[Response, int]: Flask response and status code
+    """
+    response = jsonify(body)
+    response.headers.update(headers or {})
+    return response, status
+
+def client_closed_payload() -> Tuple[Dict, int, Dict[str, str]]:
+    """
+    Payload logged for a request whose client disconnected (it is never read).
+    
+    Returns:
+        Tuple[Dict, int, Dict[str, str]]: Body, status and headers
+    """
+    return {"error": "Client closed request"}, CLIENT_CLOSED_REQUEST, {}
+
+def client_closed_response():
+    """
+    Build the response for a request whose client disconnected (it is never read).
+    
+    Returns:
+        Tuple[Response, int]: Flask response and status code
+    """
+    return payload_response(*client_closed_payload())
+
+def get_request_user() -> str:
+    """
+    Identify the user behind the current request, for fair LLM scheduling.
+    
+    Returns:
+        str: The X-User-Id header if present, otherwise the client address
+    """
+    return request.headers.get('X-User-Id') or request.remote_addr or 'anonymous'
+
+def profiling_requested() -> bool:
+    """
+    Check whether the current request asks for a profiled pipeline run
+    (X-Profile header or profile query flag; only honored with the admin token).
+    
+    Returns:
+        bool: True if profiling was requested by an admin
+    """
+    flag = request.headers.get('X-Profile') or request.args.get('profile') or ''
+    return flag.lower() in ('true', '1', 'yes', 'on') and admin_authorized()
+
+def admin_authorized() -> bool:
+    """
+    Check the X-Admin-Token header against ADMIN_TOKEN (admin endpoints are off without it).
+    
+    Returns:
+        bool: True if the request may use admin endpoints
+    """
+    return admin_token_valid(request.headers.get('X-Admin-Token', ''))
+
+def admin_token_valid(token: str) -> bool:
+    """
+    Compare an X-Admin-Token value with ADMIN_TOKEN in constant time.
+    
+    Args:
+        token (str): Token sent by the client
+        
+    Returns:
+        bool: True if ADMIN_TOKEN is set and the token matches it
+    """
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token, ADMIN_TOKEN)
+
+def rate_limited_payload(retry_after: int) -> Tuple[Dict, int, Dict[str, str]]:
+    """
+    Payload of a 429 telling the client when to retry.
+    
+    Args:
+        retry_after (int): Seconds until the client should retry
+        
+    Returns:
+        Tuple[Dict, int, Dict[str, str]]: Body, status and headers
+    """
+    return {
+        "error": "Too many requests",
+        "details": "LLM capacity is exhausted, please retry later",
+        "retry_after": retry_after
+    }, 429, {'Retry-After': str(retry_after)}
+
+def rate_limited_response(retry_after: int):
+    """
+    Build a 429 response telling the client when to retry.
+    
+    Args:
+        retry_after (int): Seconds until the client should retry
+        
+    Returns:
+        Tuple[Response, int]: Flask response and status code
+    """
+    return payload_response(*rate_limited_payload(retry_after))
+
+def pipeline_timeout_payload() -> Tuple[Dict, int, Dict[str, str]]:
+    """
+    Payload of a 504 for a pipeline run that exceeded PIPELINE_DEADLINE_SECONDS.
+    
+    Returns:
+        Tuple[Dict, int, Dict[str, str]]: Body, status and headers
+    """
+    return {
+        "error": "Processing timed out",
+        "details": f"Video processing did not finish within {int(PIPELINE_DEADLINE_SECONDS)}s, please retry later"
+    }, 504, {}
+
+def pipeline_failure_payload(result: Optional[subprocess.CompletedProcess]) -> Optional[Tuple[Dict, int, Dict[str, str]]]:
+    """
+    Map the outcome of a pipeline run to the error payload of /api/get.
+    
+    Args:
+        result (subprocess.CompletedProcess, optional): Finished run, or None if the client disconnected
+        
+    Returns:
+        Optional[Tuple[Dict, int, Dict[str, str]]]: Body, status and headers, or None if the run succeeded
+    """
+    if result is None:
+        return client_closed_payload()
+    if result.returncode == EXIT_RATE_LIMITED:
+        return rate_limited_payload(parse_retry_after(result.stdout))
+    if result.returncode != 0:
+        return {
+            "error": "Failed to process video",
+            "details": result.stderr,
+            "stdout": result.stdout
+        }, 500, {}
+    return None
+
+def search_run_failure(result: subprocess.CompletedProcess) -> Optional[Dict]:
+    """
+    Build the /api/search entry of an analyzed video whose decide_clip.py run failed.
+    
+    Args:
+        result (subprocess.CompletedProcess): The finished run
+        
+    Returns:
+        Optional[Dict]: The error entry, or None if the run succeeded
+    """
+    if result.returncode == EXIT_RATE_LIMITED:
+        return {"error": "Too many requests", "retry_after": parse_retry_after(result.stdout)}
+    if result.returncode != 0:
+        return {"error": "Failed to process video", "details": result.stderr}
+    return None
+
+# Whether the missing client socket was already logged (see client_disconnected)
+_disconnect_warning_logged = False
+
+def client_disconnected() -> bool:
+    """
+    Check whether the client of the current request has closed its connection.
+    
+    Only the development server and gunicorn expose the client socket. Under other WSGI
+    servers, including a2wsgi in asgi.py, disconnects cannot be detected and pipeline runs
+    are not cancelled; this is logged once. asgi.py serves the endpoints that wait on
+    pipeline runs natively, so they are cancelled there.
+    
+    Returns:
+        bool: True if the socket reports end-of-stream (False if it cannot be inspected)
+    """
+    global _disconnect_warning_logged
+    sock = request.environ.get('werkzeug.socket') or request.environ.get('gunicorn.socket')
+    if sock is None:
+        if not _disconnect_warning_logged:
+            _disconnect_warning_logged = True
+            print(f"[PIPELINE] Client socket not available under {request.environ.get('SERVER_SOFTWARE', 'this server')}; "
+                  f"runs waited on by Flask endpoints are not cancelled on disconnect")
+        return False
+    try:
+        return sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT) == b''
+    except (BlockingIOError, InterruptedError):
+        return False
+    except OSError:
+        return True
+
+def run_decide_clip(video_id: str, prompt: str, user: str = 'anonymous',
+                    profile_id: Optional[str] = None) -> Optional[subprocess.CompletedProcess]:
+    """
+    Run decide_clip.py to fetch, analyze and save segments for a video (through the job
+    queue when PIPELINE_MODE=queue). Concurrent requests for the same video and prompt share
+    one run (see pipeline_runs). While waiting, the client connection is watched; once every
+    waiting client has disconnected the run is cancelled.
+    
+    Args:
+        video_id (str): The YouTube video ID
+        prompt (str): The search prompt
+        user (str): User the request is made for (used for fair LLM scheduling)
+        profile_id (str, optional): Profile the run under this ID (ignored when joining a run
+            already in progress, or in queue mode where workers sample on their own)
+        
+    Returns:
+        Optional[subprocess.CompletedProcess]: The finished decide_clip.py process,
+        or None if the client disconnected before it finished
+        
+    Raises:
+        subprocess.TimeoutExpired: If the run exceeded PIPELINE_DEADLINE_SECONDS (the child is killed)
+    """
+    if PIPELINE_MODE == 'queue':
+        return run_queued_pipeline(video_id, prompt, user, disconnected=client_disconnected)
+    return run_pipeline(video_id, prompt, user, profile_id, disconnected=client_disconnected)
+
 @app.route("/api/hello")
 def hello():
     return jsonify({"message": "Hello from Flask!"})
 
+def find_cached_segments(video_id: str, prompt: str, youtube_url: str) -> Tuple[str, Optional[Dict], Optional[Dict]]:
+    """
+    Find a result for a video and prompt that needs no pipeline run: the cached result of the
+    prompt, of a differently phrased prompt, or a confident local answer from the topic outline.
+    
+    Args:
+        video_id (str): The YouTube video ID
+        prompt (str): The search prompt
+        youtube_url (str): The YouTube URL
+        
+    Returns:
+        Tuple[str, Optional[Dict], Optional[Dict]]: Segments path, segments data (None if the
+        pipeline has to run) and the prompt_match of the response
+    """
+    segments_path = get_segments_path(video_id, prompt)
+    segments_data = read_cached_segments(segments_path)
+    if segments_data is not None:
+        # Fast-model results are only reused while the routing policy that produced them holds
+        if model_router.route_satisfies(segments_data.get('routing'), 'segments'):
+            print(f"[DEBUG] Cache hit for segments file: {segments_path}")
+        else:
+            print(f"[DEBUG] Cached segments were routed under an old policy, recomputing")
+            segments_data = None
+    prompt_match = {"query": prompt, "score": 1.0, "exact": True} if segments_data is not None else None
+    if segments_data is None:
+        # A differently phrased prompt already answered for this video is reused
+        match = prompt_cache.find_match(video_id, prompt)
+        if match:
+            matched_data = read_cached_segments(match["segments_path"])
+            if matched_data is not None and model_router.route_satisfies(matched_data.get('routing'), 'segments'):
+                print(f"[DEBUG] Reusing segments of '{match['prompt']}' (similarity {match['score']})")
+                segments_path = match["segments_path"]
+                segments_data = matched_data
+                prompt_match = {"query": match["prompt"], "score": match["score"], "exact": False}
+    if segments_data is None:
+        # A confident local answer from the video's topic outline needs no pipeline run
+        outline_answer = topic_outline.answer_prompt(video_id, prompt, use_llm=False)
+        if outline_answer:
+            segments, route = outline_answer
+            segments_path = save_segments(segments, youtube_url, prompt, route=route)
+            segments_data = storage.read_json_artifact(segments_path)
+    return segments_path, segments_data, prompt_match
+
+def load_segments_result(video_id: str, prompt: str, segments_path: str, segments_data: Optional[Dict],
+                         prompt_match: Optional[Dict]) -> Optional[Tuple[Dict, str]]:
+    """
+    Load the stored result of a request and compute its ETag.
+    
+    Args:
+        video_id (str): The YouTube video ID
+        prompt (str): The search prompt
+        segments_path (str): Logical path of the segments file
+        segments_data (Dict, optional): The result, if already read
+        prompt_match (Dict, optional): prompt_match of the response
+        
+    Returns:
+        Optional[Tuple[Dict, str]]: Segments data and ETag, or None if the segments file is missing
+    """
+    print(f"[DEBUG] Looking for segments file at: {segments_path}")
+    stored_segments_path = storage.resolve_artifact_path(segments_path)
+    if not stored_segments_path:
+        print("[DEBUG] Segments file not found!")
+        return None
+    if segments_data is None:
+        segments_data = storage.read_json_artifact(segments_path)
+    cache_manager.touch_artifact(stored_segments_path)
+    print(f"[DEBUG] Successfully loaded segments data")
+
+    # Strong validator over everything the body is built from: transcript, prompt, model and stored result
+    etag = make_etag(
+        storage.artifact_digest(get_transcript_path(video_id)),
+        prompt_cache.canonicalize(prompt),
+        (segments_data.get('routing') or {}).get('model', 'legacy'),
+        storage.artifact_digest(segments_path),
+        json.dumps(prompt_match, sort_keys=True)
+    )
+    return segments_data, etag
+
+def segments_response_fields(video_id: str, youtube_url: str, segments_data: Dict, prompt_match: Optional[Dict]) -> Dict:
+    """
+    Build the fields of an /api/get body, with the transcript as a stream read from storage.
+    
+    Args:
+        video_id (str): The YouTube video ID
+        youtube_url (str): The YouTube URL
+        segments_data (Dict): The stored result
+        prompt_match (Dict, optional): prompt_match of the response
+        
+    Returns:
+        Dict: Fields in output order, for serialization.iter_json_object
+    """
+    # Stream the transcript from storage instead of building the whole body in memory
+    transcript = ""
+    transcript_path = get_transcript_path(video_id)
+    stored_transcript_path = storage.resolve_artifact_path(transcript_path)
+    if stored_transcript_path:
+        transcript = storage.open_text_stream(transcript_path)
+        cache_manager.touch_artifact(stored_transcript_path)
+        print(f"[DEBUG] Streaming full transcript")
+    else:
+        print(f"[DEBUG] Transcript file not found at: {transcript_path}")
+    
+    # Add transcript and other metadata to the response (stored keys override, as before)
+    fields = {
+        "video_id": video_id,
+        "youtube_url": youtube_url,
+        "transcript": None,
+        **segments_data,  # Include all the existing segments data
+        "prompt_match": prompt_match
+    }
+    fields["transcript"] = transcript
+    return fields
+
 @app.route("/api/get/<video_id>")
 def get_segments(video_id):
     """
@@ -47,60 +541,165 @@ def get_segments(video_id):
                 "usage": "Use /api/get/{video_id}?prompt=your search query"
             }), 400
         print(f"[DEBUG] Prompt: {prompt}")
+        # Popular pairs are precomputed off-peak (see precompute.py)
+        access_log.record_access(video_id, prompt)
         youtube_url = construct_youtube_url(video_id)
         print(f"[DEBUG] Constructed YouTube URL: {youtube_url}")
-        decide_clip_path = os.path.join(os.path.dirname(__file__), 'transcript_extraction', 'decide_clip.py')
-        print(f"[DEBUG] Path to decide_clip.py: {decide_clip_path}")
-        command = [sys.executable, decide_clip_path, youtube_url, prompt]
-        print(f"[DEBUG] Running command: {' '.join(command)}")
-        result = subprocess.run(
-            command,
-            capture_output=True,
-            text=True,
-            cwd=os.path.dirname(__file__)
-        )
-        print(f"[DEBUG] Subprocess return code: {result.returncode}")
-        print(f"[DEBUG] Subprocess stdout: {result.stdout}")
-        print(f"[DEBUG] Subprocess stderr: {result.stderr}")
-        if result.returncode != 0:
-            return jsonify({
-                "error": "Failed to process video",
-                "details": result.stderr,
-                "stdout": result.stdout
-            }), 500
-        segments_dir = os.path.join(os.path.dirname(__file__), 'transcript_extraction', 'temporary_files')
-        prompt_safe = ''.join(c for c in prompt[:20] if c.isalnum() or c in (' ', '-', '_')).replace(' ', '_')
-        segments_file = f"transcript_{video_id}_{prompt_safe}_segments.json"
-        segments_path = os.path.join(segments_dir, segments_file)
-        print(f"[DEBUG] Looking for segments file at: {segments_path}")
-        if not os.path.exists(segments_path):
-            print("[DEBUG] Segments file not found!")
+        profile_id = None
+        segments_path, segments_data, prompt_match = find_cached_segments(video_id, prompt, youtube_url)
+        if segments_data is None:
+            # Shed load early instead of queueing work the LLM cannot take on in time
+            expected_wait = llm_scheduler.estimate_wait(priority='interactive')
+            if expected_wait > llm_scheduler.MAX_WAIT_SECONDS[llm_scheduler.PRIORITY_INTERACTIVE]:
+                return rate_limited_response(int(expected_wait) + 1)
+            # Reuse a prefetch of this video that is already under way instead of fetching it again
+            prefetch_deadline = time.time() + PIPELINE_DEADLINE_SECONDS / 2
+            while prefetch.is_fetching(video_id) and time.time() < prefetch_deadline:
+                if prefetch.wait_for_fetch(video_id, timeout=PIPELINE_POLL_SECONDS):
+                    print(f"[DEBUG] Waited for background prefetch of {video_id}")
+                elif client_disconnected():
+                    return client_closed_response()
+            try:
+                profile_id = profiling.choose_profile_id(profiling_requested())
+                result = run_decide_clip(video_id, prompt, get_request_user(), profile_id)
+            except subprocess.TimeoutExpired:
+                return payload_response(*pipeline_timeout_payload())
+            failure = pipeline_failure_payload(result)
+            if failure:
+                return payload_response(*failure)
+        loaded = load_segments_result(video_id, prompt, segments_path, segments_data, prompt_match)
+        if loaded is None:
             return jsonify({
                 "error": "Segments file not found",
                 "expected_path": segments_path
             }), 404
-        with open(segments_path, 'r', encoding='utf-8') as f:
-            segments_data = json.load(f)
-        print(f"[DEBUG] Successfully loaded segments data")
-        
-        # Read the full transcript
-        transcript_path = os.path.join(segments_dir, f'transcript_{video_id}.txt')
-        full_transcript = ""
-        if os.path.exists(transcript_path):
-            with open(transcript_path, 'r', encoding='utf-8') as f:
-                full_transcript = f.read()
-            print(f"[DEBUG] Successfully loaded full transcript")
-        else:
-            print(f"[DEBUG] Transcript file not found at: {transcript_path}")
+        segments_data, etag = loaded
+        if not_modified(etag):
+            print(f"[DEBUG] Client copy is current, answering 304")
+            return not_modified_response('get', etag)
+
+        fields = segments_response_fields(video_id, youtube_url, segments_data, prompt_match)
+        response = cacheable(Response(serialization.iter_json_object(fields.items()), mimetype='application/json'), 'get', etag)
+        if profile_id and profiling.profile_data_path(profile_id, 'decide_clip'):
+            response.headers['X-Profile-Id'] = profile_id
+        return response
+    except Exception as e:
+        print(f"[DEBUG] Exception occurred: {str(e)}")
+        return jsonify({
+            "error": "Internal server error",
+            "details": str(e)
+        }), 500
+
+def video_info(video_id: str) -> Dict:
+    """
+    Describe a video and whether its transcript is cached, starting a background fetch if it is not.
+    
+    Args:
+        video_id (str): YouTube video ID
         
-        # Add transcript and other metadata to the response
-        response_data = {
+    Returns:
+        Dict: Body of /api/info
+    """
+    youtube_url = construct_youtube_url(video_id)
+    stored_transcript_path = storage.resolve_artifact_path(get_transcript_path(video_id))
+    if stored_transcript_path:
+        return {
             "video_id": video_id,
             "youtube_url": youtube_url,
-            "transcript": full_transcript,
-            **segments_data  # Include all the existing segments data
+            "transcript_available": True,
+            "transcript_path": stored_transcript_path
         }
+    # Warm the cache now so that a search started shortly after finds the transcript ready
+    prefetch_started = PREFETCH_ON_INFO and bool(VIDEO_ID_PATTERN.match(video_id)) and prefetch.prefetch_video(video_id)
+    return {
+        "video_id": video_id,
+        "youtube_url": youtube_url,
+        "transcript_available": False,
+        "prefetch_started": prefetch_started,
+        "message": "Transcript not found. Use /api/get/{video_id}?prompt=your query to fetch and analyze."
+    }
+
+@app.route("/api/info/<video_id>")
+def get_video_info(video_id):
+    """
+    Get basic information about a YouTube video.
+    
+    Args:
+        video_id (str): YouTube video ID
+        
+    Returns:
+        JSON response with video information
+    """
+    try:
+        response = jsonify(video_info(video_id))
+        # The body is small, so its own hash is the validator
+        response = cacheable(response, 'info', make_etag(response.get_data(as_text=True)))
+        if not_modified(response.headers['ETag']):
+            return not_modified_response('info', response.headers['ETag'])
+        return response
+    except Exception as e:
+        print(f"[DEBUG] Exception occurred: {str(e)}")
+        return jsonify({
+            "error": "Internal server error",
+            "details": str(e)
+        }), 500
+
+@app.route("/api/search")
+def search_library():
+    """
+    Search every cached transcript for windows matching a query.
+    
+    Args:
+        q (str): Search query (query parameter)
+        limit (int): Maximum number of windows to return (query parameter, default 10)
+        analyze (int): Run full segment extraction on the top N matching videos (query parameter, default 0)
         
+    Returns:
+        JSON response with the best-matching (video, start, end) windows
+    """
+    try:
+        query = request.args.get('q')
+        if not query:
+            return jsonify({
+                "error": "Missing 'q' query parameter",
+                "usage": "Use /api/search?q=your search query"
+            }), 400
+        limit = min(int(request.args.get('limit', 10)), 100)
+        analyze_top = min(int(request.args.get('analyze', 0)), 5)
+
+        results = search_index.search(query, limit=limit)
+        for result in results:
+            result["youtube_url"] = construct_youtube_url(result["video_id"])
+
+        # Optionally run full LLM segment extraction on the best-matching videos
+        analyzed = {}
+        for result in results:
+            video_id = result["video_id"]
+            if len(analyzed) >= analyze_top:
+                break
+            if video_id in analyzed:
+                continue
+            segments_path = get_segments_path(video_id, query)
+            if read_cached_segments(segments_path) is None:
+                run_result = run_decide_clip(video_id, query, get_request_user())
+                if run_result is None:
+                    return client_closed_response()
+                failure = search_run_failure(run_result)
+                if failure:
+                    analyzed[video_id] = failure
+                    continue
+            segments_data = read_cached_segments(segments_path)
+            if segments_data is not None:
+                analyzed[video_id] = segments_data
+                cache_manager.touch_artifact(storage.resolve_artifact_path(segments_path))
+
+        response_data = {
+            "query": query,
+            "results": results,
+            "total_results": len(results)
+        }
+        if analyze_top:
+            response_data["analyzed"] = analyzed
         return jsonify(response_data)
     except Exception as e:
         print(f"[DEBUG] Exception occurred: {str(e)}")
@@ -109,39 +708,421 @@ def get_segments(video_id):
             "details": str(e)
         }), 500
 
-@app.route("/api/info/<video_id>")
-def get_video_info(video_id):
+@app.route("/api/playlist")
+def analyze_playlist():
     """
-    Get basic information about a YouTube video.
+    Analyze a YouTube playlist for a prompt.
+    
+    Args:
+        url (str): YouTube playlist URL (query parameter)
+        prompt (str): Search prompt (query parameter)
+        mode (str): 'scan' for metadata relevance only, 'segments' to also extract clips (query parameter, default 'segments')
+        max_videos (int): Videos enumerated in scan mode, 0 for all (query parameter, default PLAYLIST_MAX_VIDEOS)
+        stream (bool): In scan mode, stream one NDJSON line per video as it is scanned (query parameter)
+        top_n (int): Number of most relevant videos to extract clips from (query parameter)
+        
+    Returns:
+        JSON response with the relevance-ranked videos or clips across the playlist
+    """
+    try:
+        playlist_url = request.args.get('url')
+        prompt = request.args.get('prompt')
+        if not playlist_url or not prompt:
+            return jsonify({
+                "error": "Missing 'url' or 'prompt' query parameter",
+                "usage": "Use /api/playlist?url=playlist_url&prompt=your search query"
+            }), 400
+        mode = request.args.get('mode', 'segments')
+
+        # Imported lazily: the playlist module pulls in yt_dlp and the Anthropic client
+        import analyze_playlist as playlist_module
+
+        if mode == 'scan':
+            max_videos = int(request.args.get('max_videos', playlist_module.PLAYLIST_MAX_VIDEOS))
+            if request.args.get('stream', '').lower() in ('true', '1', 'yes', 'on'):
+                # One JSON line per video as soon as its scan completes, while later pages are still enumerated
+                def generate():
+                    try:
+                        for video_id, result in playlist_module.iter_playlist_scan(playlist_url, prompt, max_videos=max_videos):
+                            yield serialization.dumps({"video_id": video_id, **result}) + b"\n"
+                    except Exception as e:
+                        print(f"[DEBUG] Playlist stream failed: {str(e)}")
+                        yield serialization.dumps({"error": "Playlist scan failed", "details": str(e)}) + b"\n"
+                return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+            results = playlist_module.analyze_playlist_with_prompt(playlist_url, prompt, max_videos=max_videos)
+            return jsonify({"playlist_url": playlist_url, "query": prompt, "videos": results})
+
+        top_n = int(request.args.get('top_n', playlist_module.PLAYLIST_TOP_N))
+        return jsonify(playlist_module.extract_playlist_segments(playlist_url, prompt, top_n=top_n))
+    except llm_scheduler.LLMRateLimited as e:
+        return rate_limited_response(e.retry_after)
+    except Exception as e:
+        print(f"[DEBUG] Exception occurred: {str(e)}")
+        return jsonify({
+            "error": "Internal server error",
+            "details": str(e)
+        }), 500
+
+def send_stored_artifact(path: str, mimetype: str, endpoint: str) -> Response:
+    """
+    Send a stored artifact, passing compressed bytes through when the client accepts the encoding.
+    Answers 304 without reading the file when the client's copy is current.
+    
+    Args:
+        path (str): Logical (uncompressed) artifact path
+        mimetype (str): Content type of the uncompressed artifact
+        endpoint (str): Key of CACHE_CONTROL for the caching policy
+        
+    Returns:
+        Response: Flask response with Content-Encoding set when the stored bytes are sent as-is
+    """
+    accept_encoding = request.headers.get('Accept-Encoding', '')
+    stored_path = storage.resolve_artifact_path(path)
+    # Each encoding is a distinct representation, so it gets its own strong ETag
+    etag = make_etag(storage.artifact_digest(path), storage.negotiate_encoding(stored_path, accept_encoding) or 'identity')
+    cache_manager.touch_artifact(stored_path)
+    if not_modified(etag):
+        return not_modified_response(endpoint, etag, vary='Accept-Encoding')
+    body, content_encoding = storage.read_encoded_artifact(path, accept_encoding)
+    response = cacheable(Response(body, mimetype=mimetype), endpoint, etag)
+    if content_encoding:
+        response.headers['Content-Encoding'] = content_encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+@app.route("/api/transcript/<video_id>")
+def get_transcript(video_id):
+    """
+    Get the cleaned transcript of a video, without fetching it.
     
     Args:
         video_id (str): YouTube video ID
         
     Returns:
-        JSON response with video information
+        Transcript text, or a JSON error if it has not been fetched yet
     """
     try:
-        youtube_url = construct_youtube_url(video_id)
-        transcript_path = os.path.join(
-            os.path.dirname(__file__), 
-            'transcript_extraction', 
-            'temporary_files', 
-            f'transcript_{video_id}.txt'
-        )
-        if os.path.exists(transcript_path):
+        transcript_path = get_transcript_path(video_id)
+        if not storage.artifact_exists(transcript_path):
+            return jsonify({
+                "error": "Transcript not found",
+                "video_id": video_id
+            }), 404
+        return send_stored_artifact(transcript_path, 'text/plain', 'transcript')
+    except Exception as e:
+        print(f"[DEBUG] Exception occurred: {str(e)}")
+        return jsonify({
+            "error": "Internal server error",
+            "details": str(e)
+        }), 500
+
+@app.route("/api/segments/<video_id>")
+def get_cached_segments(video_id):
+    """
+    Get previously computed segments for a video and prompt, without running the analysis.
+    
+    Args:
+        video_id (str): YouTube video ID
+        prompt (str): Search prompt the segments were computed for (query parameter)
+        
+    Returns:
+        Stored segments JSON, or a JSON error if no result is cached
+    """
+    try:
+        prompt = request.args.get('prompt')
+        if not prompt:
+            return jsonify({
+                "error": "Missing 'prompt' query parameter",
+                "usage": "Use /api/segments/{video_id}?prompt=your search query"
+            }), 400
+        segments_path = get_segments_path(video_id, prompt)
+        if not storage.artifact_exists(segments_path):
             return jsonify({
+                "error": "Segments not found",
                 "video_id": video_id,
-                "youtube_url": youtube_url,
-                "transcript_available": True,
-                "transcript_path": transcript_path
-            })
-        else:
+                "query": prompt
+            }), 404
+        return send_stored_artifact(segments_path, 'application/json', 'segments')
+    except Exception as e:
+        print(f"[DEBUG] Exception occurred: {str(e)}")
+        return jsonify({
+            "error": "Internal server error",
+            "details": str(e)
+        }), 500
+
+@app.route("/api/outline/<video_id>")
+def get_outline(video_id):
+    """
+    Get the topic outline of a video (sections with titles, summaries, keywords and cue boundaries).
+    
+    Args:
+        video_id (str): YouTube video ID
+        
+    Returns:
+        Stored outline JSON, or a JSON error if the video has no current outline
+    """
+    try:
+        if topic_outline.load_outline(video_id) is None:
             return jsonify({
+                "error": "Outline not found",
                 "video_id": video_id,
-                "youtube_url": youtube_url,
-                "transcript_available": False,
-                "message": "Transcript not found. Use /api/get/{video_id}?prompt=your query to fetch and analyze."
-            })
+                "usage": f"POST /api/outline/{video_id} to build it"
+            }), 404
+        return send_stored_artifact(topic_outline.outline_path(video_id), 'application/json', 'outline')
+    except Exception as e:
+        print(f"[DEBUG] Exception occurred: {str(e)}")
+        return jsonify({
+            "error": "Internal server error",
+            "details": str(e)
+        }), 500
+
+@app.route("/api/outline/<video_id>", methods=["POST"])
+def build_outline(video_id):
+    """
+    Build (or rebuild) the topic outline of a video whose transcript is cached.
+    
+    Args:
+        video_id (str): YouTube video ID
+        force (bool): Rebuild an outline that is still current (query parameter)
+        
+    Returns:
+        JSON response with the outline
+    """
+    try:
+        if not VIDEO_ID_PATTERN.match(video_id):
+            return jsonify({"error": "Invalid video ID", "video_id": video_id}), 400
+        if not storage.artifact_exists(topic_outline.transcript_path(video_id)):
+            return jsonify({
+                "error": "Transcript not cached",
+                "video_id": video_id,
+                "usage": "Fetch the transcript first, e.g. with POST /api/prefetch"
+            }), 404
+        outline = None
+        if request.args.get('force', '').lower() not in ('true', '1', 'yes', 'on'):
+            outline = topic_outline.load_outline(video_id)
+        if outline is None:
+            outline = topic_outline.build_outline(video_id, priority='batch')
+        return jsonify(outline)
+    except llm_scheduler.LLMRateLimited as e:
+        return rate_limited_response(e.retry_after)
+    except Exception as e:
+        print(f"[DEBUG] Exception occurred: {str(e)}")
+        return jsonify({
+            "error": "Internal server error",
+            "details": str(e)
+        }), 500
+
+@app.route("/api/cache/stats")
+def get_cache_stats():
+    """
+    Get disk usage statistics for the transcript/segment cache.
+    
+    Returns:
+        JSON response with cache usage, budget and last compaction result
+    """
+    try:
+        return jsonify(cache_manager.get_cache_stats())
+    except Exception as e:
+        print(f"[DEBUG] Exception occurred: {str(e)}")
+        return jsonify({
+            "error": "Internal server error",
+            "details": str(e)
+        }), 500
+
+@app.route("/api/llm/stats")
+def get_llm_stats():
+    """
+    Get the state of the global LLM scheduler.
+    
+    Returns:
+        JSON response with token bucket levels, limits and queue depth per priority
+    """
+    try:
+        return jsonify(llm_scheduler.get_scheduler_stats())
+    except Exception as e:
+        print(f"[DEBUG] Exception occurred: {str(e)}")
+        return jsonify({
+            "error": "Internal server error",
+            "details": str(e)
+        }), 500
+
+@app.route("/api/prefetch", methods=["POST"])
+def start_prefetch():
+    """
+    Fetch and clean transcripts in the background so later searches find them cached.
+    
+    Args:
+        video_ids (List[str]): Video IDs to prefetch (JSON body), or
+        playlist_url (str): Playlist whose videos are prefetched (JSON body)
+        build_index (bool): Also index already-cached transcripts for /api/search (JSON body, default true)
+        
+    Returns:
+        JSON response with the job and its status URL (202)
+    """
+    try:
+        body = request.get_json(silent=True) or {}
+        video_ids = body.get('video_ids')
+        playlist_url = body.get('playlist_url')
+        build_index = bool(body.get('build_index', True))
+        if not video_ids and not playlist_url:
+            return jsonify({
+                "error": "Missing 'video_ids' or 'playlist_url'",
+                "usage": "POST /api/prefetch with {\"video_ids\": [...]} or {\"playlist_url\": \"...\"}"
+            }), 400
+
+        if video_ids:
+            if not isinstance(video_ids, list) or not all(isinstance(v, str) and VIDEO_ID_PATTERN.match(v) for v in video_ids):
+                return jsonify({"error": "'video_ids' must be a list of 11-character YouTube video IDs"}), 400
+            job = prefetch.start_prefetch(video_ids=video_ids, build_index=build_index)
+        else:
+            def resolve_playlist():
+                # Imported lazily: the playlist module pulls in yt_dlp and the Anthropic client
+                import analyze_playlist as playlist_module
+                return (video_id for video_id, _ in playlist_module.iter_playlist_entries(playlist_url))
+            job = prefetch.start_prefetch(resolve_video_ids=resolve_playlist, build_index=build_index)
+
+        return jsonify({**job, "status_url": f"/api/prefetch/{job['job_id']}"}), 202
+    except Exception as e:
+        print(f"[DEBUG] Exception occurred: {str(e)}")
+        return jsonify({
+            "error": "Internal server error",
+            "details": str(e)
+        }), 500
+
+@app.route("/api/prefetch")
+@app.route("/api/prefetch/<job_id>")
+def get_prefetch(job_id=None):
+    """
+    Report the progress of prefetch jobs.
+    
+    Args:
+        job_id (str, optional): Job to report; without it all recent jobs are listed
+        
+    Returns:
+        JSON response with per-video status, counts and progress
+    """
+    if job_id is None:
+        return jsonify({"jobs": prefetch.list_jobs()})
+    job = prefetch.get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Prefetch job not found", "job_id": job_id}), 404
+    return jsonify(job)
+
+@app.route("/api/prefetch/<job_id>", methods=["DELETE"])
+def cancel_prefetch(job_id):
+    """
+    Cancel a prefetch job. Queued videos no other job or request needs are dropped;
+    fetches already running finish so their transcripts stay cached.
+    
+    Args:
+        job_id (str): Job to cancel
+        
+    Returns:
+        JSON response with the job after cancellation
+    """
+    job = prefetch.cancel_job(job_id)
+    if job is None:
+        return jsonify({"error": "Prefetch job not found", "job_id": job_id}), 404
+    return jsonify(job)
+
+@app.route("/api/queue/stats")
+def get_queue_stats():
+    """
+    Get the depth of the pipeline job queue, for scaling worker processes.
+    
+    Returns:
+        JSON response with job counts per status, depth, oldest queued job age and busy workers
+    """
+    try:
+        return jsonify({"mode": PIPELINE_MODE, **job_queue.get_queue_stats()})
+    except Exception as e:
+        print(f"[DEBUG] Exception occurred: {str(e)}")
+        return jsonify({
+            "error": "Internal server error",
+            "details": str(e)
+        }), 500
+
+@app.route("/api/access/stats")
+def get_access_stats():
+    """
+    Get how concentrated recent /api/get traffic is, and its most requested video/prompt pairs.
+    
+    Args:
+        window_days (float): Days of traffic to count (query parameter, default 7)
+        limit (int): Number of top pairs to list (query parameter, default 20)
+        
+    Returns:
+        JSON response with request totals, the top pairs' share of traffic and the top pairs
+    """
+    try:
+        window_days = float(request.args.get('window_days', 7))
+        limit = int(request.args.get('limit', 20))
+        return jsonify({
+            **access_log.get_access_stats(window_days),
+            "top_queries": access_log.top_queries(limit, window_days)
+        })
+    except Exception as e:
+        print(f"[DEBUG] Exception occurred: {str(e)}")
+        return jsonify({
+            "error": "Internal server error",
+            "details": str(e)
+        }), 500
+
+@app.route("/api/admin/profiles")
+@app.route("/api/admin/profiles/<request_id>")
+def get_profiles(request_id=None):
+    """
+    List profiled pipeline runs, or get the per-stage hot functions and allocation sites of one.
+    
+    Args:
+        request_id (str, optional): Profile ID (X-Profile-Id response header of the profiled request)
+        
+    Returns:
+        JSON response with the profiles
+    """
+    if not admin_authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    if request_id is None:
+        return jsonify({"profiles": profiling.list_profiles()})
+    profile = profiling.load_profile(request_id)
+    if profile is None:
+        return jsonify({"error": "Profile not found", "request_id": request_id}), 404
+    return jsonify(profile)
+
+@app.route("/api/admin/profiles/<request_id>/<process>.prof")
+def download_profile(request_id, process):
+    """
+    Download the raw cProfile data of one process of a profiled run (open with pstats or snakeviz).
+    
+    Args:
+        request_id (str): Profile ID
+        process (str): decide_clip or transcript_fetch
+        
+    Returns:
+        The .prof file
+    """
+    if not admin_authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    path = profiling.profile_data_path(request_id, process)
+    if path is None:
+        return jsonify({"error": "Profile not found", "request_id": request_id, "process": process}), 404
+    return send_file(path, mimetype='application/octet-stream', as_attachment=True,
+                     download_name=f"{request_id}_{process}.prof")
+
+@app.route("/api/metrics")
+def get_metrics():
+    """
+    Get per-stage outcome counts and latency percentiles (fetch, LLM, whole pipeline).
+    
+    Args:
+        window (int): Look-back window in seconds (query parameter, default 3600)
+        
+    Returns:
+        JSON response with outcomes, retries and p50/p95/p99 latency per stage
+    """
+    try:
+        window = request.args.get('window', default=3600, type=int)
+        return jsonify(stage_metrics.get_stage_summary(window))
     except Exception as e:
         print(f"[DEBUG] Exception occurred: {str(e)}")
         return jsonify({
@@ -150,4 +1131,6 @@ def get_video_info(video_id):
         }), 500
 
 if __name__ == "__main__":
+    # Keep the temporary_files volume within its disk budget (asgi.py starts it in its lifespan)
+    cache_manager.start_background_compaction()
     app.run(debug=True, port=3001)
\ No newline at end of file
@@ -0,0 +1,306 @@
+"""
+ASGI entry point with an asyncio path for the I/O-bound endpoints.
+/api/get, /api/info, /api/search and /api/playlist are Starlette coroutines. decide_clip.py runs
+as an asyncio subprocess shared through pipeline_runs (or is awaited on the job queue), a
+background prefetch of the video is awaited through its future, and playlist triage and segment
+extraction call Claude with the async client. The remaining blocking calls (artifact reads, the SQLite state stores,
+yt-dlp) go to the event loop's default executor, bounded by ASGI_IO_THREADS. A request waiting
+for its pipeline holds no thread. Every other path is served by the Flask app in app.py on a
+bounded WSGI thread pool.
+
+Usage: uvicorn asgi:application --host 0.0.0.0 --port 3001   (or: python asgi.py)
+"""
+import os
+import time
+import asyncio
+import functools
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, Any, Callable, Awaitable
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route, Mount
+
+import app as flask_app
+import cache_manager
+import llm_scheduler
+import prefetch
+import profiling
+import search_index
+import serialization
+import storage
+import access_log
+import pipeline_runs
+from resilience import PIPELINE_DEADLINE_SECONDS
+
+# Threads of the event loop's default executor: artifact reads/writes, SQLite state stores and yt-dlp
+ASGI_IO_THREADS = int(os.getenv('ASGI_IO_THREADS', '8'))
+# Threads running the Flask app for every other endpoint
+ASGI_WSGI_THREADS = int(os.getenv('ASGI_WSGI_THREADS', '8'))
+
+
+def json_response(body: Any, status: int = 200, headers: Optional[Dict[str, str]] = None) -> Response:
+    """Encode a body (or an app.*_payload) as a JSON response."""
+    return Response(serialization.dumps(body), status, headers, media_type='application/json')
+
+
+def request_user(request: Request) -> str:
+    """User behind the request, for fair LLM scheduling (X-User-Id or the client address, see app.get_request_user)."""
+    return request.headers.get('x-user-id') or (request.client.host if request.client else None) or 'anonymous'
+
+
+def profiling_requested(request: Request) -> bool:
+    """Whether an admin (X-Admin-Token) asks for a profiled pipeline run (see app.profiling_requested)."""
+    flag = request.headers.get('x-profile') or request.query_params.get('profile') or ''
+    return (flag.lower() in ('true', '1', 'yes', 'on')
+            and flask_app.admin_token_valid(request.headers.get('x-admin-token', '')))
+
+
+def not_modified(request: Request, etag: str) -> bool:
+    """Whether the client's copy (If-None-Match) is current."""
+    return flask_app.etag_matches(request.headers.get('if-none-match', ''), etag)
+
+
+def endpoint(handler: Callable[[Request], Awaitable[Response]]) -> Callable[[Request], Awaitable[Response]]:
+    """Answer exceptions like the Flask endpoints: 429 when the LLM scheduler turned a call away, 500 otherwise."""
+    @functools.wraps(handler)
+    async def wrapper(request: Request) -> Response:
+        try:
+            return await handler(request)
+        except llm_scheduler.LLMRateLimited as e:
+            return json_response(*flask_app.rate_limited_payload(e.retry_after))
+        except Exception as e:
+            print(f"[DEBUG] Exception occurred: {str(e)}")
+            return json_response({"error": "Internal server error", "details": str(e)}, 500)
+    return wrapper
+
+
+async def run_decide_clip(request: Request, video_id: str, prompt: str,
+                          profile_id: Optional[str] = None) -> Optional[subprocess.CompletedProcess]:
+    """
+    Await decide_clip.py for a video and prompt (see app.run_decide_clip). The run is an asyncio
+    subprocess, or a job on the queue when PIPELINE_MODE=queue; waiting holds no thread.
+
+    Args:
+        request (Request): The waiting request
+        video_id (str): The YouTube video ID
+        prompt (str): The search prompt
+        profile_id (str, optional): Profile the run under this ID
+
+    Returns:
+        Optional[subprocess.CompletedProcess]: The finished run, or None if the client disconnected
+
+    Raises:
+        subprocess.TimeoutExpired: If the run exceeded PIPELINE_DEADLINE_SECONDS
+    """
+    if pipeline_runs.PIPELINE_MODE == 'queue':
+        return await pipeline_runs.run_queued_pipeline_async(video_id, prompt, request_user(request),
+                                                             disconnected=request.is_disconnected)
+    return await pipeline_runs.run_pipeline_async(video_id, prompt, request_user(request), profile_id,
+                                                  disconnected=request.is_disconnected)
+
+
+async def wait_for_prefetch(request: Request, video_id: str) -> bool:
+    """
+    Await a background prefetch of the video, if one is running, instead of fetching it again.
+
+    Returns:
+        bool: False if the client disconnected while waiting
+    """
+    with prefetch.waiting_for_fetch(video_id) as future:
+        if future is None:
+            return True
+        fetch = asyncio.wrap_future(future)
+        # A failed prefetch is fetched again by the pipeline run itself
+        fetch.add_done_callback(lambda f: f.cancelled() or f.exception())
+        deadline = time.time() + PIPELINE_DEADLINE_SECONDS / 2
+        while time.time() < deadline:
+            done, _ = await asyncio.wait({fetch}, timeout=pipeline_runs.PIPELINE_POLL_SECONDS)
+            if done:
+                print(f"[DEBUG] Waited for background prefetch of {video_id}")
+                break
+            if await request.is_disconnected():
+                return False
+    return True
+
+
+@endpoint
+async def get_segments(request: Request) -> Response:
+    """Async /api/get: same lookups, pipeline and streamed body as app.get_segments."""
+    video_id = request.path_params['video_id']
+    print(f"[DEBUG] Received request for video_id: {video_id}")
+    prompt = request.query_params.get('prompt')
+    if not prompt:
+        return json_response({
+            "error": "Missing 'prompt' query parameter",
+            "usage": "Use /api/get/{video_id}?prompt=your search query"
+        }, 400)
+    # Popular pairs are precomputed off-peak (see precompute.py)
+    await asyncio.to_thread(access_log.record_access, video_id, prompt)
+    youtube_url = flask_app.construct_youtube_url(video_id)
+    profile_id = None
+    segments_path, segments_data, prompt_match = await asyncio.to_thread(
+        flask_app.find_cached_segments, video_id, prompt, youtube_url)
+    if segments_data is None:
+        # Shed load early instead of queueing work the LLM cannot take on in time
+        expected_wait = await asyncio.to_thread(llm_scheduler.estimate_wait, priority='interactive')
+        if expected_wait > llm_scheduler.MAX_WAIT_SECONDS[llm_scheduler.PRIORITY_INTERACTIVE]:
+            return json_response(*flask_app.rate_limited_payload(int(expected_wait) + 1))
+        if not await wait_for_prefetch(request, video_id):
+            return json_response(*flask_app.client_closed_payload())
+        try:
+            profile_id = profiling.choose_profile_id(profiling_requested(request))
+            result = await run_decide_clip(request, video_id, prompt, profile_id)
+        except subprocess.TimeoutExpired:
+            return json_response(*flask_app.pipeline_timeout_payload())
+        failure = flask_app.pipeline_failure_payload(result)
+        if failure:
+            return json_response(*failure)
+
+    loaded = await asyncio.to_thread(flask_app.load_segments_result, video_id, prompt, segments_path,
+                                     segments_data, prompt_match)
+    if loaded is None:
+        return json_response({"error": "Segments file not found", "expected_path": segments_path}, 404)
+    segments_data, etag = loaded
+    if not_modified(request, etag):
+        return flask_app.cacheable(Response(status_code=304), 'get', etag)
+
+    fields = await asyncio.to_thread(flask_app.segments_response_fields, video_id, youtube_url,
+                                     segments_data, prompt_match)
+    # A plain iterator body is read on Starlette's thread pool, so the transcript stream never blocks the loop
+    response = StreamingResponse(serialization.iter_json_object(fields.items()), media_type='application/json')
+    flask_app.cacheable(response, 'get', etag)
+    if profile_id and await asyncio.to_thread(profiling.profile_data_path, profile_id, 'decide_clip'):
+        response.headers['X-Profile-Id'] = profile_id
+    return response
+
+
+@endpoint
+async def get_video_info(request: Request) -> Response:
+    """Async /api/info (see app.get_video_info)."""
+    body = serialization.dumps(await asyncio.to_thread(flask_app.video_info, request.path_params['video_id']))
+    # The body is small, so its own hash is the validator
+    etag = flask_app.make_etag(body.decode('utf-8'))
+    if not_modified(request, etag):
+        return flask_app.cacheable(Response(status_code=304), 'info', etag)
+    return flask_app.cacheable(Response(body, media_type='application/json'), 'info', etag)
+
+
+@endpoint
+async def search_library(request: Request) -> Response:
+    """Async /api/search: runs for the analyzed videos are awaited and cancelled on disconnect (see app.search_library)."""
+    query = request.query_params.get('q')
+    if not query:
+        return json_response({
+            "error": "Missing 'q' query parameter",
+            "usage": "Use /api/search?q=your search query"
+        }, 400)
+    limit = min(int(request.query_params.get('limit', 10)), 100)
+    analyze_top = min(int(request.query_params.get('analyze', 0)), 5)
+
+    results = await asyncio.to_thread(search_index.search, query, limit=limit)
+    for result in results:
+        result["youtube_url"] = flask_app.construct_youtube_url(result["video_id"])
+
+    analyzed = {}
+    for result in results:
+        video_id = result["video_id"]
+        if len(analyzed) >= analyze_top:
+            break
+        if video_id in analyzed:
+            continue
+        segments_path = flask_app.get_segments_path(video_id, query)
+        if await asyncio.to_thread(flask_app.read_cached_segments, segments_path) is None:
+            run_result = await run_decide_clip(request, video_id, query)
+            if run_result is None:
+                return json_response(*flask_app.client_closed_payload())
+            failure = flask_app.search_run_failure(run_result)
+            if failure:
+                analyzed[video_id] = failure
+                continue
+        segments_data = await asyncio.to_thread(flask_app.read_cached_segments, segments_path)
+        if segments_data is not None:
+            analyzed[video_id] = segments_data
+            await asyncio.to_thread(lambda: cache_manager.touch_artifact(storage.resolve_artifact_path(segments_path)))
+
+    response_data = {
+        "query": query,
+        "results": results,
+        "total_results": len(results)
+    }
+    if analyze_top:
+        response_data["analyzed"] = analyzed
+    return json_response(response_data)
+
+
+@endpoint
+async def analyze_playlist(request: Request) -> Response:
+    """Async /api/playlist: scans and segment extraction await the async Claude client (see app.analyze_playlist)."""
+    playlist_url = request.query_params.get('url')
+    prompt = request.query_params.get('prompt')
+    if not playlist_url or not prompt:
+        return json_response({
+            "error": "Missing 'url' or 'prompt' query parameter",
+            "usage": "Use /api/playlist?url=playlist_url&prompt=your search query"
+        }, 400)
+    mode = request.query_params.get('mode', 'segments')
+
+    # Imported lazily: the playlist module pulls in yt_dlp and the Anthropic client (app.py puts
+    # its directory on sys.path)
+    import analyze_playlist as playlist_module
+
+    if mode == 'scan':
+        max_videos = int(request.query_params.get('max_videos', playlist_module.PLAYLIST_MAX_VIDEOS))
+        if request.query_params.get('stream', '').lower() in ('true', '1', 'yes', 'on'):
+            # One JSON line per video as soon as its scan completes, while later pages are still enumerated
+            async def generate():
+                try:
+                    async for video_id, result in playlist_module.iter_playlist_scan_async(
+                            playlist_url, prompt, max_videos=max_videos):
+                        yield serialization.dumps({"video_id": video_id, **result}) + b"\n"
+                except Exception as e:
+                    print(f"[DEBUG] Playlist stream failed: {str(e)}")
+                    yield serialization.dumps({"error": "Playlist scan failed", "details": str(e)}) + b"\n"
+            return StreamingResponse(generate(), media_type='application/x-ndjson')
+        results = await playlist_module.analyze_playlist_with_prompt_async(playlist_url, prompt, max_videos=max_videos)
+        return json_response({"playlist_url": playlist_url, "query": prompt, "videos": results})
+
+    top_n = int(request.query_params.get('top_n', playlist_module.PLAYLIST_TOP_N))
+    return json_response(await playlist_module.extract_playlist_segments_async(playlist_url, prompt, top_n=top_n))
+
+
+@asynccontextmanager
+async def lifespan(_: Starlette):
+    """Bound the default executor that every asyncio.to_thread call in this process runs on, and start cache compaction."""
+    executor = ThreadPoolExecutor(max_workers=ASGI_IO_THREADS, thread_name_prefix='asgi-io')
+    asyncio.get_running_loop().set_default_executor(executor)
+    # Keep the temporary_files volume within its disk budget (app.py only starts it when run directly)
+    cache_manager.start_background_compaction()
+    yield
+    executor.shutdown(wait=False)
+
+
+application = Starlette(
+    routes=[
+        Route('/api/get/{video_id}', get_segments),
+        Route('/api/info/{video_id}', get_video_info),
+        Route('/api/search', search_library),
+        Route('/api/playlist', analyze_playlist),
+        Mount('/', app=WSGIMiddleware(flask_app.app, workers=ASGI_WSGI_THREADS)),
+    ],
+    # Same policy as flask_cors on the Flask app; also answers the preflights of the native routes
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    lifespan=lifespan
+)
+
+
+if __name__ == "__main__":
+    # Imported here: uvicorn is only needed to run the ASGI server directly
+    import uvicorn
+    uvicorn.run(application, host=os.getenv('ASGI_HOST', '127.0.0.1'), port=int(os.getenv('PORT', '3001')))
@@ -1,74 +1,155 @@
 """
 Script to analyze video transcripts from YouTube playlists using Claude 4 Sonnet and identify segments based on a specific prompt.
 Automatically fetches transcripts from all videos in a YouTube playlist and analyzes them.
+The scan and extraction run on an event loop with the async Claude client (asgi.py awaits them
+directly); yt-dlp and transcript fetches, which only have blocking APIs, run on the loop's default
+executor. The plain functions (used by app.py and the command line) drive the same coroutines.
 """
 import os
 import json
 import sys
+import re
+import time
+import asyncio
+import hashlib
 import subprocess
-from typing import List, Dict
-import anthropic
-from dotenv import load_dotenv
-import yt_dlp
+import threading
+from typing import List, Dict, Optional, Iterator, AsyncIterator, Tuple
 
-# Debug: Print current file location
-print(f"Current file: {__file__}")
-print(f"Current directory: {os.path.dirname(__file__)}")
-print(f"Parent directory: {os.path.dirname(os.path.dirname(__file__))}")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'transcript_extraction'))
+from storage import resolve_artifact_path, read_text_artifact, write_json_artifact, replace_file
+from transcript_fetch import fetch_transcript
+from llm_client import create_message_async, estimate_input_tokens
+from model_router import routed_call_async, route_satisfies, segments_need_escalation, relevance_needs_escalation
+from llm_scheduler import LLMRateLimited
+from segment_postprocess import CueIndex, clean_model_segments
+from decide_clip import save_segments
 
-# Load environment variables from .env file
-load_dotenv()
+# Playlist scan and segment extraction defaults
+PLAYLIST_SCAN_WORKERS = int(os.getenv('PLAYLIST_SCAN_WORKERS', '8'))
+PLAYLIST_TOP_N = int(os.getenv('PLAYLIST_TOP_N', '5'))
+PLAYLIST_FETCH_WORKERS = int(os.getenv('PLAYLIST_FETCH_WORKERS', '4'))
+PLAYLIST_LLM_WORKERS = int(os.getenv('PLAYLIST_LLM_WORKERS', '2'))
+PLAYLIST_TOKEN_BUDGET = int(os.getenv('PLAYLIST_TOKEN_BUDGET', '400000'))
+PLAYLIST_COST_BUDGET_USD = float(os.getenv('PLAYLIST_COST_BUDGET_USD', '0') or 0)
 
-# Debug: Print environment variables
-print(f"ANTHROPIC_API_KEY exists: {bool(os.getenv('ANTHROPIC_API_KEY'))}")
+# Prices used for cost accounting (USD per million tokens)
+LLM_INPUT_COST_PER_MTOK = float(os.getenv('LLM_INPUT_COST_PER_MTOK', '3.0'))
+LLM_OUTPUT_COST_PER_MTOK = float(os.getenv('LLM_OUTPUT_COST_PER_MTOK', '15.0'))
+SEGMENT_MAX_OUTPUT_TOKENS = 2048
+
+# Playlist work yields to interactive /api/get traffic in the global LLM scheduler
+PLAYLIST_LLM_PRIORITY = os.getenv('PLAYLIST_LLM_PRIORITY', 'batch')
+
+# Videos enumerated per playlist or channel (0 removes the cap); pages are fetched lazily
+PLAYLIST_MAX_VIDEOS = int(os.getenv('PLAYLIST_MAX_VIDEOS', '100'))
+# Nesting followed below a channel URL (channel -> tab -> videos)
+PLAYLIST_MAX_DEPTH = 3
+VIDEO_ID_PATTERN = re.compile(r'^[0-9A-Za-z_-]{11}$')
 
 def load_credentials():
-    """Load credentials from environment variables."""
+    """Load credentials from environment variables (and the .env file, read on first use)."""
+    # Imported here so that importing this module stays cheap and free of side effects
+    from dotenv import load_dotenv
+    load_dotenv()
     api_key = os.getenv('ANTHROPIC_API_KEY')
     if not api_key:
         raise Exception("Anthropic API key not found in environment variables")
     return {'ANTHROPIC_API_KEY': api_key}
 
-def extract_playlist_videos(playlist_url: str) -> Dict[str, str]:
+def _walk_playlist(ydl, info: Dict, depth: int = 0) -> Iterator[Dict]:
+    """Yield the flat video entries of an unprocessed playlist result, descending into channel tabs."""
+    # A watch URL with list= resolves to a reference to the playlist itself
+    while info.get('_type') in ('url', 'url_transparent') and depth < PLAYLIST_MAX_DEPTH:
+        info = ydl.extract_info(info['url'], download=False, process=False)
+        depth += 1
+    for entry in info.get('entries') or []:
+        if not entry:
+            continue
+        if entry.get('entries') is not None:
+            yield from _walk_playlist(ydl, entry, depth + 1)
+        elif VIDEO_ID_PATTERN.match(entry.get('id') or ''):
+            yield entry
+        elif entry.get('url') and depth < PLAYLIST_MAX_DEPTH:
+            # Channel pages list their tabs (videos, live, ...) as nested playlists
+            yield from _walk_playlist(ydl, ydl.extract_info(entry['url'], download=False, process=False), depth + 1)
+
+def iter_playlist_entries(playlist_url: str, max_videos: int = PLAYLIST_MAX_VIDEOS) -> Iterator[Tuple[str, Dict]]:
     """
-    Extract video URLs from a YouTube playlist.
+    Lazily enumerate the videos of a YouTube playlist or channel.
+    Pages are requested from YouTube only as the iteration reaches them, so callers can start
+    working on the first page while later pages are still unknown.
     
     Args:
-        playlist_url (str): The YouTube playlist URL
+        playlist_url (str): The YouTube playlist or channel URL
+        max_videos (int): Stop after this many videos (0 for the whole playlist)
         
-    Returns:
-        Dict[str, str]: Dictionary with video IDs as keys and full URLs as values
+    Yields:
+        Tuple[str, Dict]: Video ID and a url/title/duration dictionary
     """
     print(f"Fetching videos from playlist: {playlist_url}")
     
     ydl_opts = {
         'quiet': True,
         'extract_flat': True,
-        'playlist_items': '1-100',  # Limit to first 100 videos
     }
     
     try:
+        import yt_dlp
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            playlist_info = ydl.extract_info(playlist_url, download=False)
-            
-            if not playlist_info or 'entries' not in playlist_info:
+            # process=False keeps 'entries' as yt-dlp's lazy page iterator instead of a full list
+            playlist_info = ydl.extract_info(playlist_url, download=False, process=False)
+            if not playlist_info:
                 raise Exception("Could not extract playlist information")
             
-            videos = {}
-            for entry in playlist_info['entries']:
-                if entry and 'id' in entry and 'url' in entry:
-                    video_id = entry['id']
-                    video_url = entry['url']
-                    videos[video_id] = video_url
-                    print(f"Found video: {video_id} - {entry.get('title', 'Unknown title')}")
+            seen = set()
+            for entry in _walk_playlist(ydl, playlist_info):
+                video_id = entry['id']
+                if video_id in seen:
+                    continue
+                seen.add(video_id)
+                print(f"Found video: {video_id} - {entry.get('title', 'Unknown title')}")
+                yield video_id, {
+                    'url': entry.get('url') or f"https://www.youtube.com/watch?v={video_id}",
+                    'title': entry.get('title'),
+                    'duration': entry.get('duration')
+                }
+                if max_videos and len(seen) >= max_videos:
+                    print(f"Stopping at PLAYLIST_MAX_VIDEOS={max_videos}")
+                    break
             
-            print(f"Total videos found in playlist: {len(videos)}")
-            return videos
+            print(f"Total videos found in playlist: {len(seen)}")
             
     except Exception as e:
         print(f"Error extracting playlist videos: {str(e)}")
         raise Exception(f"Failed to extract videos from playlist: {str(e)}")
 
+def extract_playlist_entries(playlist_url: str, max_videos: int = PLAYLIST_MAX_VIDEOS) -> Dict[str, Dict]:
+    """
+    Extract video entries (URL and flat metadata) from a YouTube playlist.
+    
+    Args:
+        playlist_url (str): The YouTube playlist URL
+        max_videos (int): Stop after this many videos (0 for the whole playlist)
+        
+    Returns:
+        Dict[str, Dict]: Dictionary with video IDs as keys and url/title/duration dictionaries as values
+    """
+    return dict(iter_playlist_entries(playlist_url, max_videos))
+
+def extract_playlist_videos(playlist_url: str, max_videos: int = PLAYLIST_MAX_VIDEOS) -> Dict[str, str]:
+    """
+    Extract video URLs from a YouTube playlist.
+    
+    Args:
+        playlist_url (str): The YouTube playlist URL
+        max_videos (int): Stop after this many videos (0 for the whole playlist)
+        
+    Returns:
+        Dict[str, str]: Dictionary with video IDs as keys and full URLs as values
+    """
+    return {video_id: entry['url'] for video_id, entry in iter_playlist_entries(playlist_url, max_videos)}
+
 def extract_video_id(url: str) -> str:
     """
     Extract the video ID from a YouTube URL.
@@ -119,7 +200,7 @@ def fetch_transcript_from_youtube(youtube_url: str) -> str:
     # Construct the expected transcript file path
     transcript_path = os.path.join(current_dir, '..', 'transcript_extraction', 'temporary_files', f'transcript_{video_id}.txt')
     
-    if not os.path.exists(transcript_path):
+    if not resolve_artifact_path(transcript_path):
         raise FileNotFoundError(f"Transcript file not found at: {transcript_path}")
     
     print(f"Transcript successfully fetched and saved to: {transcript_path}")
@@ -135,19 +216,22 @@ def read_transcript(transcript_path: str) -> str:
     Returns:
         str: Content of the transcript file
     """
-    if not os.path.exists(transcript_path):
+    if not resolve_artifact_path(transcript_path):
         raise FileNotFoundError(f"Transcript file not found: {transcript_path}")
     
-    with open(transcript_path, 'r', encoding='utf-8') as f:
-        return f.read()
+    return read_text_artifact(transcript_path)
 
-def analyze_transcript_with_prompt(transcript_content: str, user_prompt: str) -> List[Dict]:
+async def analyze_transcript_with_prompt(transcript_content: str, user_prompt: str, usage: Optional[Dict] = None,
+                                         route: Optional[Dict] = None) -> List[Dict]:
     """
-    Analyze transcript using Claude 4 Sonnet to identify segments relevant to the user's prompt.
+    Analyze transcript using Claude to identify segments relevant to the user's prompt.
+    The model is picked by model_router (fast model for short transcripts, escalated if its answer is weak).
     
     Args:
         transcript_content (str): Content of the transcript
         user_prompt (str): User's prompt describing what they're looking for
+        usage (Dict, optional): If given, filled with the input_tokens/output_tokens of all calls and the model used
+        route (Dict, optional): If given, filled with the model route that produced the segments
         
     Returns:
         List[Dict]: List of identified segments with start and end timestamps
@@ -193,77 +277,370 @@ Example response:
   }}
 ]"""
 
+    messages = [
+        {"role": "user", "content": f"Transcript text: {transcript_content}\n\nPrompt: {prompt}"}
+    ]
+    # Segments are snapped to the cues of the transcript the model reads
+    cue_index = CueIndex.from_transcript(transcript_content)
+
+    async def call(model: str, stage: str) -> List[Dict]:
+        # Get response from Claude (admitted by the global LLM scheduler)
+        response = await create_message_async(
+            api_key=credentials.get('ANTHROPIC_API_KEY'),
+            model=model,
+            max_tokens=SEGMENT_MAX_OUTPUT_TOKENS,
+            messages=messages,
+            priority=PLAYLIST_LLM_PRIORITY,
+            stage=stage
+        )
+        if usage is not None:
+            # An escalated analysis pays for both calls
+            usage['input_tokens'] = usage.get('input_tokens', 0) + response.usage.input_tokens
+            usage['output_tokens'] = usage.get('output_tokens', 0) + response.usage.output_tokens
+
+        # Parse the JSON array (salvaging a truncated one) and repair the timestamps locally
+        return clean_model_segments(response.content[0].text, cue_index)
+
     try:
         credentials = load_credentials()
-        # Initialize Anthropic client
-        client = anthropic.Anthropic(api_key=credentials.get('ANTHROPIC_API_KEY'))
         
         print(f"Analyzing transcript for query: '{user_prompt}'...")
-        # Get response from Claude
-        response = client.messages.create(
-            model="claude-3-5-sonnet-20241022",
-            max_tokens=2048,
-            messages=[
-                {"role": "user", "content": f"Transcript text: {transcript_content}\n\nPrompt: {prompt}"}
-            ]
-        )
-
-        # Parse JSON response
-        try:
-            content = response.content[0].text.replace('```json', '').replace('```', '').strip()
-            
-            # Clean up the response string
-            if not content.startswith('['):
-                content = '[' + content
-            if not content.endswith(']'):
-                content = content + ']'
-                
-            return json.loads(content)
-            
-        except json.JSONDecodeError as e:
-            print(f"Error parsing response: {str(e)}")
-            return []
+        segments, segments_route = await routed_call_async('playlist_segments', estimate_input_tokens(messages), call,
+                                                           segments_need_escalation)
+        if usage is not None:
+            usage['model'] = segments_route['model']
+            usage['escalated'] = segments_route['escalated']
+        if route is not None:
+            route.update(segments_route)
+        return segments
             
+    except LLMRateLimited:
+        raise
     except Exception as e:
         print(f"Error: {str(e)}")
         raise Exception(f"Error analyzing transcript: {str(e)}")
 
-def save_segments(segments: List[Dict], video_url: str, user_prompt: str) -> str:
+def get_playlist_id(playlist_url: str) -> str:
     """
-    Save segments to a JSON file.
+    Get a stable identifier for a playlist URL (the list= parameter when present).
     
     Args:
-        segments (List[Dict]): List of segments to save
-        video_url (str): The video URL
-        user_prompt (str): The user's prompt
+        playlist_url (str): The YouTube playlist URL
         
     Returns:
-        str: Path to the saved segments file
+        str: Playlist identifier safe for use in file names
     """
-    video_id = extract_video_id(video_url)
-    prompt_slug = user_prompt.replace(' ', '_').lower()
+    match = re.search(r'[?&]list=([0-9A-Za-z_-]+)', playlist_url)
+    if match:
+        return match.group(1)
+    return hashlib.sha1(playlist_url.encode('utf-8')).hexdigest()[:16]
+
+def video_fingerprint(entry: Dict) -> str:
+    """
+    Fingerprint a playlist entry so that changed videos (e.g. re-uploaded or retitled) get rescanned.
     
-    # Create filename
-    filename = f"transcript_{video_id}_{prompt_slug}_segments.json"
+    Args:
+        entry (Dict): Flat playlist entry with url, title and duration
+        
+    Returns:
+        str: Short hash of the entry metadata
+    """
+    key = json.dumps([entry.get('url'), entry.get('title'), entry.get('duration')])
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+def get_checkpoint_path(playlist_url: str, user_prompt: str) -> str:
+    """
+    Get the checkpoint file for a (playlist, prompt) pair.
     
-    # Save to temporary_files directory
+    Args:
+        playlist_url (str): The YouTube playlist URL
+        user_prompt (str): User's prompt
+        
+    Returns:
+        str: Path to the append-only JSONL checkpoint
+    """
+    normalized_prompt = ' '.join(user_prompt.lower().split())
+    prompt_slug = ''.join(c for c in normalized_prompt[:20] if c.isalnum() or c == ' ').replace(' ', '_')
+    prompt_hash = hashlib.sha1(normalized_prompt.encode('utf-8')).hexdigest()[:8]
     current_dir = os.path.dirname(__file__)
-    segments_path = os.path.join(current_dir, '..', 'transcript_extraction', 'temporary_files', filename)
+    return os.path.join(current_dir, '..', 'transcript_extraction', 'temporary_files', 'playlist_runs',
+                        f"{get_playlist_id(playlist_url)}_{prompt_slug}_{prompt_hash}.jsonl")
+
+def load_checkpoint(checkpoint_path: str) -> Dict[str, Dict]:
+    """
+    Load completed video results from a checkpoint. Later lines win; a line cut short by a
+    crash is ignored.
     
-    with open(segments_path, 'w', encoding='utf-8') as f:
-        json.dump(segments, f, indent=2)
+    Args:
+        checkpoint_path (str): Path to the JSONL checkpoint
+        
+    Returns:
+        Dict[str, Dict]: Dictionary with video IDs as keys and checkpoint records as values
+    """
+    records = {}
+    if not os.path.exists(checkpoint_path):
+        return records
+    with open(checkpoint_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            records[record['video_id']] = record
+    return records
+
+def append_checkpoint(checkpoint_path: str, record: Dict) -> None:
+    """
+    Durably append one video result to a checkpoint.
     
-    return segments_path
+    Args:
+        checkpoint_path (str): Path to the JSONL checkpoint
+        record (Dict): Checkpoint record (video_id, fingerprint, ok, result)
+    """
+    with open(checkpoint_path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
 
-def analyze_playlist_with_prompt(playlist_url: str, user_prompt: str) -> Dict[str, Dict]:
+def compact_checkpoint(checkpoint_path: str, records: Dict[str, Dict]) -> None:
+    """
+    Rewrite a checkpoint so it holds exactly one line per current playlist video.
+    
+    Args:
+        checkpoint_path (str): Path to the JSONL checkpoint
+        records (Dict[str, Dict]): Records to keep
+    """
+    content = ''.join(json.dumps(record) + '\n' for record in records.values())
+    replace_file(checkpoint_path, content.encode('utf-8'))
+
+async def scan_playlist_video(video_id: str, video_url: str, user_prompt: str) -> Dict:
+    """
+    Scan one playlist video for metadata relevance and pick the best chapter timestamp.
+    
+    Args:
+        video_id (str): The YouTube video ID
+        video_url (str): The YouTube video URL
+        user_prompt (str): User's prompt describing what they're looking for
+        
+    Returns:
+        Dict: Playlist result entry for the video. A failed scan has an 'error' field and is
+        retried on the next run of the playlist.
+        
+    Raises:
+        LLMRateLimited: If the LLM scheduler turned the relevance call away
+    """
+    try:
+        print(f"\n--- Scanning video {video_id} ---")
+        scan_result = await preliminary_scan(video_url, user_prompt)
+        if scan_result.get('error'):
+            raise Exception(scan_result['error'])
+        
+        # Find the most relevant chapter timestamp if chapters exist
+        timestamp = None
+        if scan_result.get('chapters') and scan_result.get('relevance_analysis', {}).get('relevant_elements'):
+            relevant_elements = scan_result.get('relevance_analysis', {}).get('relevant_elements', [])
+            if 'chapters' in relevant_elements:
+                # Find the chapter with the highest relevance to the prompt
+                chapters = scan_result.get('chapters', [])
+                best_chapter = None
+                best_score = 0
+                
+                for chapter in chapters:
+                    chapter_title = chapter.get('title', '').lower()
+                    prompt_words = user_prompt.lower().split()
+                    # Simple relevance scoring based on word overlap
+                    score = sum(1 for word in prompt_words if word in chapter_title)
+                    if score > best_score:
+                        best_score = score
+                        best_chapter = chapter
+                
+                if best_chapter:
+                    timestamp = best_chapter.get('start_time', 0)
+        
+        result = {
+            'video_url': video_url,
+            'title': scan_result.get('title', ''),
+            'relevant': scan_result.get('is_likely_relevant', False),
+            'relevance_score': scan_result.get('relevance_score', 0),
+            'explanation': scan_result.get('relevance_analysis', {}).get('explanation', ''),
+            'relevant_elements': scan_result.get('relevance_analysis', {}).get('relevant_elements', []),
+            'confidence': scan_result.get('relevance_analysis', {}).get('confidence', ''),
+            'timestamp': timestamp,
+            # Checked when the checkpointed verdict is reused (see iter_playlist_scan)
+            'routing': scan_result.get('relevance_analysis', {}).get('routing')
+        }
+        if scan_result.get('relevance_analysis', {}).get('error'):
+            # The verdict is only a placeholder for a failed analysis
+            result['error'] = scan_result['relevance_analysis']['error']
+        print(f"[{video_id}] Relevant: {result['relevant']} | Score: {result['relevance_score']}")
+        if timestamp:
+            print(f"[{video_id}] Relevant chapter timestamp: {timestamp} seconds")
+        return result
+    except LLMRateLimited:
+        raise
+    except Exception as e:
+        print(f"Error scanning video {video_id}: {str(e)}")
+        return {
+            'video_url': video_url,
+            'title': '',
+            'relevant': False,
+            'relevance_score': 0,
+            'explanation': f'Error: {str(e)}',
+            'relevant_elements': [],
+            'confidence': 'low',
+            'timestamp': None,
+            'error': str(e)
+        }
+
+async def iter_playlist_scan_async(playlist_url: str, user_prompt: str, scan_workers: int = PLAYLIST_SCAN_WORKERS,
+                                   force: bool = False, max_videos: int = PLAYLIST_MAX_VIDEOS) -> AsyncIterator[Tuple[str, Dict]]:
+    """
+    Scan a playlist's videos for metadata relevance as the playlist is enumerated.
+    Scans start as soon as the first page of the playlist arrives; at most scan_workers scans
+    run at once and at most twice that many are queued, so memory stays flat however long the
+    playlist is.
+    
+    Each result is appended to a per-(playlist, prompt) checkpoint as soon as it completes, so an
+    interrupted run resumes where it stopped, and later runs only scan videos that are new or
+    whose metadata changed. Failed scans (results with an 'error' field) are retried on the next
+    run. A scan the LLM scheduler turns away ends the run with LLMRateLimited; the scans finished
+    before it stay checkpointed.
+    
+    Args:
+        playlist_url (str): The YouTube playlist URL
+        user_prompt (str): User's prompt describing what they're looking for
+        scan_workers (int): Maximum number of videos scanned concurrently
+        force (bool): Ignore the checkpoint and rescan every video
+        max_videos (int): Stop enumerating after this many videos (0 for the whole playlist)
+        
+    Yields:
+        Tuple[str, Dict]: Video ID and scan result, in completion order
+    """
+    checkpoint_path = get_checkpoint_path(playlist_url, user_prompt)
+    os.makedirs(os.path.dirname(checkpoint_path), exist_ok=True)
+    checkpoint = {} if force else await asyncio.to_thread(load_checkpoint, checkpoint_path)
+    
+    current_records = {}
+    pending = {}
+    reused = scanned = 0
+    slots = asyncio.Semaphore(scan_workers)
+    
+    async def _scan(video_id: str, video_url: str) -> Dict:
+        async with slots:
+            return await scan_playlist_video(video_id, video_url, user_prompt)
+    
+    async def _finish(task) -> Tuple[str, Dict]:
+        video_id, fingerprint = pending.pop(task)
+        result = task.result()
+        record = {
+            'video_id': video_id,
+            'fingerprint': fingerprint,
+            'ok': 'error' not in result,
+            'scanned_at': time.time(),
+            'result': result
+        }
+        await asyncio.to_thread(append_checkpoint, checkpoint_path, record)
+        current_records[video_id] = record
+        return video_id, result
+    
+    # yt-dlp fetches playlist pages inside next(), so the iterator is advanced on the executor
+    entries = iter_playlist_entries(playlist_url, max_videos)
+    end = object()
+    try:
+        while True:
+            item = await asyncio.to_thread(next, entries, end)
+            if item is end:
+                break
+            video_id, entry = item
+            fingerprint = video_fingerprint(entry)
+            record = checkpoint.pop(video_id, None)
+            # Fast-model verdicts are reused only under the policy that produced them; records
+            # written before the route was stored are rescanned once
+            if (record and record.get('ok') and record.get('fingerprint') == fingerprint
+                    and 'routing' in record['result'] and route_satisfies(record['result']['routing'], 'relevance')):
+                current_records[video_id] = record
+                reused += 1
+                yield video_id, record['result']
+                continue
+            pending[asyncio.ensure_future(_scan(video_id, entry['url']))] = (video_id, fingerprint)
+            scanned += 1
+            # Hand back finished scans while enumerating, and stop reading pages while the queue is full
+            while pending:
+                done, _ = await asyncio.wait(pending, timeout=0 if len(pending) < scan_workers * 2 else None,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                for task in done:
+                    yield await _finish(task)
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield await _finish(task)
+    finally:
+        # The consumer stopped early (e.g. a streaming client went away): drop the queued scans
+        for task in pending:
+            task.cancel()
+    print(f"Reused {reused} checkpointed results, scanned {scanned} new or changed videos")
+    
+    # Drop superseded lines and videos no longer in the playlist
+    await asyncio.to_thread(compact_checkpoint, checkpoint_path, current_records)
+
+def iterate_sync(iterator: AsyncIterator) -> Iterator:
+    """
+    Drive an async iterator from synchronous code (Flask request threads, the command line)
+    on a private event loop.
+    
+    Args:
+        iterator (AsyncIterator): Async iterator to consume
+        
+    Yields:
+        The iterator's items
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(iterator.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        try:
+            loop.run_until_complete(iterator.aclose())
+            loop.run_until_complete(loop.shutdown_default_executor())
+        finally:
+            loop.close()
+
+def iter_playlist_scan(playlist_url: str, user_prompt: str, scan_workers: int = PLAYLIST_SCAN_WORKERS,
+                       force: bool = False, max_videos: int = PLAYLIST_MAX_VIDEOS) -> Iterator[Tuple[str, Dict]]:
+    """
+    Synchronous iter_playlist_scan_async, for callers without an event loop.
+    
+    Args:
+        playlist_url (str): The YouTube playlist URL
+        user_prompt (str): User's prompt describing what they're looking for
+        scan_workers (int): Maximum number of videos scanned concurrently
+        force (bool): Ignore the checkpoint and rescan every video
+        max_videos (int): Stop enumerating after this many videos (0 for the whole playlist)
+        
+    Yields:
+        Tuple[str, Dict]: Video ID and scan result, in completion order
+    """
+    return iterate_sync(iter_playlist_scan_async(playlist_url, user_prompt, scan_workers, force, max_videos))
+
+async def analyze_playlist_with_prompt_async(playlist_url: str, user_prompt: str, scan_workers: int = PLAYLIST_SCAN_WORKERS,
+                                             force: bool = False, max_videos: int = PLAYLIST_MAX_VIDEOS) -> Dict[str, Dict]:
     """
     Analyze all videos in a YouTube playlist for metadata relevance to the user's prompt.
-    For each video, use preliminary_scan to determine if the prompt is likely relevant.
+    For each video, use preliminary_scan to determine if the prompt is likely relevant
+    (see iter_playlist_scan_async for concurrency and checkpointing).
     Save the results as a JSON file in transcript_extraction/temporary_files/playlist_analysis.json.
     
     Args:
         playlist_url (str): The YouTube playlist URL
         user_prompt (str): User's prompt describing what they're looking for
+        scan_workers (int): Maximum number of videos scanned concurrently
+        force (bool): Ignore the checkpoint and rescan every video
+        max_videos (int): Stop enumerating after this many videos (0 for the whole playlist)
         
     Returns:
         Dict[str, Dict]: Dictionary with video IDs as keys and scan results as values
@@ -271,68 +648,12 @@ def analyze_playlist_with_prompt(playlist_url: str, user_prompt: str) -> Dict[st
     print(f"Analyzing playlist: {playlist_url}")
     print(f"Search query: {user_prompt}")
     
-    # Extract all video URLs from the playlist
-    videos = extract_playlist_videos(playlist_url)
-    
-    if not videos:
+    playlist_results = {video_id: result async for video_id, result
+                        in iter_playlist_scan_async(playlist_url, user_prompt, scan_workers, force, max_videos)}
+    if not playlist_results:
         print("No videos found in playlist")
         return {}
     
-    playlist_results = {}
-    
-    for video_id, video_url in videos.items():
-        try:
-            print(f"\n--- Scanning video {video_id} ---")
-            scan_result = preliminary_scan(video_url, user_prompt)
-            
-            # Find the most relevant chapter timestamp if chapters exist
-            timestamp = None
-            if scan_result.get('chapters') and scan_result.get('relevance_analysis', {}).get('relevant_elements'):
-                relevant_elements = scan_result.get('relevance_analysis', {}).get('relevant_elements', [])
-                if 'chapters' in relevant_elements:
-                    # Find the chapter with the highest relevance to the prompt
-                    chapters = scan_result.get('chapters', [])
-                    best_chapter = None
-                    best_score = 0
-                    
-                    for chapter in chapters:
-                        chapter_title = chapter.get('title', '').lower()
-                        prompt_words = user_prompt.lower().split()
-                        # Simple relevance scoring based on word overlap
-                        score = sum(1 for word in prompt_words if word in chapter_title)
-                        if score > best_score:
-                            best_score = score
-                            best_chapter = chapter
-                    
-                    if best_chapter:
-                        timestamp = best_chapter.get('start_time', 0)
-            
-            playlist_results[video_id] = {
-                'video_url': video_url,
-                'title': scan_result.get('title', ''),
-                'relevant': scan_result.get('is_likely_relevant', False),
-                'relevance_score': scan_result.get('relevance_score', 0),
-                'explanation': scan_result.get('relevance_analysis', {}).get('explanation', ''),
-                'relevant_elements': scan_result.get('relevance_analysis', {}).get('relevant_elements', []),
-                'confidence': scan_result.get('relevance_analysis', {}).get('confidence', ''),
-                'timestamp': timestamp
-            }
-            print(f"Relevant: {playlist_results[video_id]['relevant']} | Score: {playlist_results[video_id]['relevance_score']}")
-            if timestamp:
-                print(f"Relevant chapter timestamp: {timestamp} seconds")
-        except Exception as e:
-            print(f"Error scanning video {video_id}: {str(e)}")
-            playlist_results[video_id] = {
-                'video_url': video_url,
-                'title': '',
-                'relevant': False,
-                'relevance_score': 0,
-                'explanation': f'Error: {str(e)}',
-                'relevant_elements': [],
-                'confidence': 'low',
-                'timestamp': None
-            }
-    
     # Sort results by relevance score in descending order
     sorted_results = dict(sorted(playlist_results.items(), 
                                 key=lambda x: x[1]['relevance_score'], 
@@ -341,12 +662,87 @@ def analyze_playlist_with_prompt(playlist_url: str, user_prompt: str) -> Dict[st
     # Save results to JSON file
     current_dir = os.path.dirname(__file__)
     output_path = os.path.join(current_dir, '..', 'transcript_extraction', 'temporary_files', 'playlist_analysis.json')
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(sorted_results, f, indent=2)
+    output_path = await asyncio.to_thread(write_json_artifact, output_path, sorted_results)
     print(f"\nPlaylist analysis saved to: {output_path}")
     return sorted_results
 
-def preliminary_scan(video_url: str, user_prompt: str) -> Dict:
+def analyze_playlist_with_prompt(playlist_url: str, user_prompt: str, scan_workers: int = PLAYLIST_SCAN_WORKERS,
+                                 force: bool = False, max_videos: int = PLAYLIST_MAX_VIDEOS) -> Dict[str, Dict]:
+    """
+    Synchronous analyze_playlist_with_prompt_async, for callers without an event loop.
+    
+    Args:
+        playlist_url (str): The YouTube playlist URL
+        user_prompt (str): User's prompt describing what they're looking for
+        scan_workers (int): Maximum number of videos scanned concurrently
+        force (bool): Ignore the checkpoint and rescan every video
+        max_videos (int): Stop enumerating after this many videos (0 for the whole playlist)
+        
+    Returns:
+        Dict[str, Dict]: Dictionary with video IDs as keys and scan results as values
+    """
+    return asyncio.run(analyze_playlist_with_prompt_async(playlist_url, user_prompt, scan_workers, force, max_videos))
+
+def fetch_video_metadata(video_url: str) -> Dict:
+    """
+    Fetch the title, chapters and description of a YouTube video with yt-dlp (blocking).
+    
+    Args:
+        video_url (str): The YouTube video URL
+        
+    Returns:
+        Dict: video_id, title, description, chapters and the content_for_analysis text
+    """
+    ydl_opts = {
+        'quiet': True,
+        'extract_flat': False,  # Need full info for chapters and description
+    }
+    
+    import yt_dlp
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        video_info = ydl.extract_info(video_url, download=False)
+    
+    if not video_info:
+        raise Exception("Could not extract video information")
+    
+    # Extract basic metadata
+    video_id = video_info.get('id', '')
+    title = video_info.get('title', '')
+    description = video_info.get('description', '')
+    
+    # Extract chapters if available
+    chapters = []
+    if 'chapters' in video_info and video_info['chapters']:
+        for chapter in video_info['chapters']:
+            chapters.append({
+                'title': chapter.get('title', ''),
+                'start_time': chapter.get('start_time', 0),
+                'end_time': chapter.get('end_time', 0)
+            })
+    
+    # Prepare content for analysis
+    content_for_analysis = f"Video Title: {title}\n\n"
+    
+    if chapters:
+        content_for_analysis += "Video Chapters:\n"
+        for i, chapter in enumerate(chapters, 1):
+            content_for_analysis += f"{i}. {chapter['title']}\n"
+        content_for_analysis += "\n"
+    
+    if description:
+        # Truncate description if too long (keep first 1000 characters)
+        truncated_description = description[:1000] + "..." if len(description) > 1000 else description
+        content_for_analysis += f"Video Description:\n{truncated_description}\n\n"
+    
+    return {
+        'video_id': video_id,
+        'title': title,
+        'description': description,
+        'chapters': chapters,
+        'content_for_analysis': content_for_analysis
+    }
+
+async def preliminary_scan(video_url: str, user_prompt: str) -> Dict:
     """
     Perform a preliminary scan of a YouTube video to determine if the prompt is likely to be found.
     Extracts video title, chapters, and description, then analyzes relevance.
@@ -360,74 +756,42 @@ def preliminary_scan(video_url: str, user_prompt: str) -> Dict:
     """
     print(f"Performing preliminary scan for: {video_url}")
     
-    ydl_opts = {
-        'quiet': True,
-        'extract_flat': False,  # Need full info for chapters and description
-    }
-    
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            video_info = ydl.extract_info(video_url, download=False)
-            
-            if not video_info:
-                raise Exception("Could not extract video information")
-            
-            # Extract basic metadata
-            video_id = video_info.get('id', '')
-            title = video_info.get('title', '')
-            description = video_info.get('description', '')
-            
-            # Extract chapters if available
-            chapters = []
-            if 'chapters' in video_info and video_info['chapters']:
-                for chapter in video_info['chapters']:
-                    chapters.append({
-                        'title': chapter.get('title', ''),
-                        'start_time': chapter.get('start_time', 0),
-                        'end_time': chapter.get('end_time', 0)
-                    })
-            
-            # Prepare content for analysis
-            content_for_analysis = f"Video Title: {title}\n\n"
-            
-            if chapters:
-                content_for_analysis += "Video Chapters:\n"
-                for i, chapter in enumerate(chapters, 1):
-                    content_for_analysis += f"{i}. {chapter['title']}\n"
-                content_for_analysis += "\n"
-            
-            if description:
-                # Truncate description if too long (keep first 1000 characters)
-                truncated_description = description[:1000] + "..." if len(description) > 1000 else description
-                content_for_analysis += f"Video Description:\n{truncated_description}\n\n"
-            
-            # Analyze relevance using Claude
-            relevance_analysis = analyze_content_relevance(content_for_analysis, user_prompt)
-            
-            # Calculate overall relevance score
-            relevance_score = relevance_analysis.get('relevance_score', 0)
-            is_likely_relevant = relevance_score >= 3  # Threshold for likely relevance
-            
-            result = {
-                'video_id': video_id,
-                'video_url': video_url,
-                'title': title,
-                'chapters': chapters,
-                'description': description,
-                'relevance_analysis': relevance_analysis,
-                'relevance_score': relevance_score,
-                'is_likely_relevant': is_likely_relevant,
-                'content_summary': content_for_analysis
-            }
-            
-            print(f"Preliminary scan complete for {video_id}")
-            print(f"Title: {title}")
-            print(f"Chapters found: {len(chapters)}")
-            print(f"Relevance score: {relevance_score}/5")
-            print(f"Likely relevant: {is_likely_relevant}")
-            
-            return result
+        metadata = await asyncio.to_thread(fetch_video_metadata, video_url)
+        video_id = metadata['video_id']
+        title = metadata['title']
+        chapters = metadata['chapters']
+        content_for_analysis = metadata['content_for_analysis']
+        
+        # Analyze relevance using Claude
+        relevance_analysis = await analyze_content_relevance(content_for_analysis, user_prompt)
+        
+        # Calculate overall relevance score
+        relevance_score = relevance_analysis.get('relevance_score', 0)
+        is_likely_relevant = relevance_score >= 3  # Threshold for likely relevance
+        
+        result = {
+            'video_id': video_id,
+            'video_url': video_url,
+            'title': title,
+            'chapters': chapters,
+            'description': metadata['description'],
+            'relevance_analysis': relevance_analysis,
+            'relevance_score': relevance_score,
+            'is_likely_relevant': is_likely_relevant,
+            'content_summary': content_for_analysis
+        }
+        
+        print(f"Preliminary scan complete for {video_id}")
+        print(f"Title: {title}")
+        print(f"Chapters found: {len(chapters)}")
+        print(f"Relevance score: {relevance_score}/5")
+        print(f"Likely relevant: {is_likely_relevant}")
+        
+        return result
             
+    except LLMRateLimited:
+        raise
     except Exception as e:
         print(f"Error in preliminary scan: {str(e)}")
         return {
@@ -437,7 +801,7 @@ def preliminary_scan(video_url: str, user_prompt: str) -> Dict:
             'is_likely_relevant': False
         }
 
-def analyze_content_relevance(content: str, user_prompt: str) -> Dict:
+async def analyze_content_relevance(content: str, user_prompt: str) -> Dict:
     """
     Analyze the relevance of video metadata content to the user's prompt using Claude.
     
@@ -482,16 +846,18 @@ Example response:
   "confidence": "high"
 }}"""
 
-    try:
-        credentials = load_credentials()
-        client = anthropic.Anthropic(api_key=credentials.get('ANTHROPIC_API_KEY'))
-        
-        response = client.messages.create(
-            model="claude-3-5-sonnet-20241022",
+    messages = [
+        {"role": "user", "content": prompt}
+    ]
+
+    async def call(model: str, stage: str) -> Dict:
+        response = await create_message_async(
+            api_key=credentials.get('ANTHROPIC_API_KEY'),
+            model=model,
             max_tokens=1024,
-            messages=[
-                {"role": "user", "content": prompt}
-            ]
+            messages=messages,
+            priority=PLAYLIST_LLM_PRIORITY,
+            stage=stage
         )
 
         # Parse JSON response
@@ -505,30 +871,266 @@ Example response:
                 'relevance_score': 0,
                 'explanation': 'Error parsing analysis response',
                 'relevant_elements': [],
-                'confidence': 'low'
+                'confidence': 'low',
+                'error': f"Could not parse the analysis response: {str(e)}"
             }
+
+    try:
+        credentials = load_credentials()
+        
+        # Metadata triage is small, so it normally runs on the fast model
+        analysis, route = await routed_call_async('relevance', estimate_input_tokens(messages), call, relevance_needs_escalation)
+        analysis['routing'] = route
+        return analysis
             
+    except LLMRateLimited:
+        raise
     except Exception as e:
         print(f"Error in content relevance analysis: {str(e)}")
         return {
             'relevance_score': 0,
             'explanation': f'Error during analysis: {str(e)}',
             'relevant_elements': [],
-            'confidence': 'low'
+            'confidence': 'low',
+            'error': str(e)
         }
 
+class TokenBudget:
+    """
+    Thread-safe token/cost budget shared by all LLM calls of one playlist run.
+    Calls reserve their estimated cost up front and settle with the actual usage afterwards.
+    """
+
+    def __init__(self, max_tokens: int = 0, max_cost_usd: float = 0.0):
+        self.max_tokens = max_tokens
+        self.max_cost_usd = max_cost_usd
+        self.reserved_tokens = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def cost(input_tokens: int, output_tokens: int) -> float:
+        """Cost in USD of the given token counts."""
+        return (input_tokens * LLM_INPUT_COST_PER_MTOK + output_tokens * LLM_OUTPUT_COST_PER_MTOK) / 1_000_000
+
+    def spent_tokens(self) -> int:
+        """Tokens consumed so far."""
+        return self.input_tokens + self.output_tokens
+
+    def try_reserve(self, input_tokens: int, output_tokens: int) -> bool:
+        """
+        Reserve budget for a call, if it still fits.
+        
+        Args:
+            input_tokens (int): Estimated input tokens
+            output_tokens (int): Maximum output tokens
+            
+        Returns:
+            bool: True if the reservation was made
+        """
+        with self._lock:
+            tokens = input_tokens + output_tokens
+            if self.max_tokens and self.spent_tokens() + self.reserved_tokens + tokens > self.max_tokens:
+                return False
+            if self.max_cost_usd:
+                projected = self.cost(self.input_tokens, self.output_tokens) + self.cost(self.reserved_tokens, 0) + self.cost(input_tokens, output_tokens)
+                if projected > self.max_cost_usd:
+                    return False
+            self.reserved_tokens += tokens
+            return True
+
+    def settle(self, reserved_input: int, reserved_output: int, usage: Dict) -> None:
+        """
+        Replace a reservation with the actual usage of the call.
+        
+        Args:
+            reserved_input (int): Input tokens that were reserved
+            reserved_output (int): Output tokens that were reserved
+            usage (Dict): Actual input_tokens/output_tokens (empty if the call failed)
+        """
+        with self._lock:
+            self.reserved_tokens -= reserved_input + reserved_output
+            self.input_tokens += usage.get('input_tokens', 0)
+            self.output_tokens += usage.get('output_tokens', 0)
+
+    def summary(self) -> Dict:
+        """Usage summary for reporting."""
+        with self._lock:
+            return {
+                'input_tokens': self.input_tokens,
+                'output_tokens': self.output_tokens,
+                'estimated_cost_usd': round(self.cost(self.input_tokens, self.output_tokens), 4),
+                'token_budget': self.max_tokens,
+                'cost_budget_usd': self.max_cost_usd
+            }
+
+def estimate_tokens(text: str) -> int:
+    """
+    Roughly estimate the number of tokens in a text (about 4 characters per token).
+    
+    Args:
+        text (str): Input text
+        
+    Returns:
+        int: Estimated token count
+    """
+    return len(text) // 4 + 1
+
+def load_or_fetch_transcript(video_url: str) -> str:
+    """
+    Return the cleaned transcript of a video, fetching it in-process if it is not cached.
+    
+    Args:
+        video_url (str): The YouTube video URL
+        
+    Returns:
+        str: Cleaned transcript content
+    """
+    video_id = extract_video_id(video_url)
+    transcript_path = os.path.join(os.path.dirname(__file__), '..', 'transcript_extraction', 'temporary_files', f'transcript_{video_id}.txt')
+    if resolve_artifact_path(transcript_path):
+        return read_text_artifact(transcript_path)
+    return fetch_transcript(video_url)
+
+async def extract_playlist_segments_async(playlist_url: str, user_prompt: str,
+                                          top_n: int = PLAYLIST_TOP_N,
+                                          fetch_workers: int = PLAYLIST_FETCH_WORKERS,
+                                          llm_workers: int = PLAYLIST_LLM_WORKERS,
+                                          token_budget: int = PLAYLIST_TOKEN_BUDGET,
+                                          cost_budget_usd: float = PLAYLIST_COST_BUDGET_USD,
+                                          min_relevance: int = 3) -> Dict:
+    """
+    Find clips across a playlist in one call. The playlist is triaged by metadata relevance,
+    then the top-N relevant videos have their transcripts fetched and analyzed concurrently.
+    Transcript fetches and LLM calls are capped independently, and every LLM call must fit in
+    a shared token/cost budget.
+    
+    Args:
+        playlist_url (str): The YouTube playlist URL
+        user_prompt (str): User's prompt describing what they're looking for
+        top_n (int): Number of most relevant videos to extract segments from
+        fetch_workers (int): Maximum concurrent transcript fetches
+        llm_workers (int): Maximum concurrent LLM calls
+        token_budget (int): Maximum total tokens for segment extraction (0 for unlimited)
+        cost_budget_usd (float): Maximum estimated cost in USD (0 for unlimited)
+        min_relevance (int): Minimum metadata relevance score for a video to be considered
+        
+    Returns:
+        Dict: Merged, relevance-ranked clips plus per-video status and token usage
+    """
+    triage = await analyze_playlist_with_prompt_async(playlist_url, user_prompt)
+    candidates = [(video_id, result) for video_id, result in triage.items()
+                  if result['relevance_score'] >= min_relevance][:top_n]
+    print(f"\nExtracting segments from {len(candidates)} videos "
+          f"(fetch workers: {fetch_workers}, LLM workers: {llm_workers})")
+
+    budget = TokenBudget(token_budget, cost_budget_usd)
+    video_status = {video_id: {'status': 'pending'} for video_id, _ in candidates}
+    clips = []
+    fetch_slots = asyncio.Semaphore(fetch_workers)
+    llm_slots = asyncio.Semaphore(llm_workers)
+
+    async def _analyze(video_id: str, result: Dict, transcript_content: str) -> None:
+        reserved_input = estimate_tokens(transcript_content) + 600
+        if not budget.try_reserve(reserved_input, SEGMENT_MAX_OUTPUT_TOKENS):
+            video_status[video_id] = {'status': 'skipped', 'reason': 'token budget exhausted'}
+            print(f"Skipping {video_id}: token budget exhausted")
+            return
+        usage = {}
+        route = {}
+        try:
+            segments = await analyze_transcript_with_prompt(transcript_content, user_prompt, usage=usage, route=route)
+        finally:
+            budget.settle(reserved_input, SEGMENT_MAX_OUTPUT_TOKENS, usage)
+        # Stored like a /api/get result, so later requests for the video and prompt reuse it
+        await asyncio.to_thread(save_segments, segments, result['video_url'], user_prompt, route=route)
+        for segment in segments:
+            clips.append({
+                **segment,
+                'video_id': video_id,
+                'video_url': result['video_url'],
+                'video_title': result['title'],
+                'video_relevance_score': result['relevance_score']
+            })
+        video_status[video_id] = {'status': 'analyzed', 'segments': len(segments), **usage}
+
+    async def _extract(video_id: str, result: Dict) -> None:
+        # Each transcript goes to the LLM as soon as its own fetch completes
+        try:
+            async with fetch_slots:
+                transcript_content = await asyncio.to_thread(load_or_fetch_transcript, result['video_url'])
+        except Exception as e:
+            print(f"Error fetching transcript for {video_id}: {str(e)}")
+            video_status[video_id] = {'status': 'error', 'stage': 'fetch', 'error': str(e)}
+            return
+        try:
+            async with llm_slots:
+                await _analyze(video_id, result, transcript_content)
+        except Exception as e:
+            print(f"Error analyzing transcript for {video_id}: {str(e)}")
+            video_status[video_id] = {'status': 'error', 'stage': 'analyze', 'error': str(e)}
+
+    await asyncio.gather(*(_extract(video_id, result) for video_id, result in candidates))
+
+    # Rank clips across the playlist: segment relevance first, then the video's relevance
+    clips.sort(key=lambda c: (c.get('relevance_score', 0), c['video_relevance_score']), reverse=True)
+
+    output = {
+        'playlist_url': playlist_url,
+        'query': user_prompt,
+        'clips': clips,
+        'total_clips': len(clips),
+        'videos': video_status,
+        'usage': budget.summary()
+    }
+    current_dir = os.path.dirname(__file__)
+    output_path = os.path.join(current_dir, '..', 'transcript_extraction', 'temporary_files', 'playlist_segments.json')
+    output_path = await asyncio.to_thread(write_json_artifact, output_path, output)
+    print(f"\nPlaylist segments saved to: {output_path}")
+    return output
+
+def extract_playlist_segments(playlist_url: str, user_prompt: str, top_n: int = PLAYLIST_TOP_N, **kwargs) -> Dict:
+    """
+    Synchronous extract_playlist_segments_async, for callers without an event loop.
+    
+    Args:
+        playlist_url (str): The YouTube playlist URL
+        user_prompt (str): User's prompt describing what they're looking for
+        top_n (int): Number of most relevant videos to extract segments from
+        **kwargs: Worker counts, budgets and min_relevance (see extract_playlist_segments_async)
+        
+    Returns:
+        Dict: Merged, relevance-ranked clips plus per-video status and token usage
+    """
+    return asyncio.run(extract_playlist_segments_async(playlist_url, user_prompt, top_n=top_n, **kwargs))
+
 if __name__ == "__main__":
     if len(sys.argv) < 3:
-        print("Usage: python analyze_playlist.py <youtube_playlist_url> <prompt>")
+        print("Usage: python analyze_playlist.py <youtube_playlist_url> <prompt> [--segments [top_n] | --force]")
         print("Example: python analyze_playlist.py 'https://www.youtube.com/playlist?list=PLbUZQMMLnhfUXYPfDOZQ4dyydZO1zHNZh' 'Find segments about mathematical intuition'")
         sys.exit(1)
     
     playlist_url = sys.argv[1]
     user_prompt = sys.argv[2]
     
+    if len(sys.argv) > 3 and sys.argv[3] == '--segments':
+        try:
+            top_n = int(sys.argv[4]) if len(sys.argv) > 4 else PLAYLIST_TOP_N
+            output = extract_playlist_segments(playlist_url, user_prompt, top_n=top_n)
+            print(f"\n=== PLAYLIST CLIPS ({output['total_clips']}) ===")
+            for i, clip in enumerate(output['clips'], 1):
+                print(f"{i}. {clip['title']} - {clip['video_title']} ({clip['start']} - {clip['end']}) [Relevance: {clip['relevance_score']}/5]")
+                print(f"   {clip['video_url']}")
+            print(f"\nUsage: {output['usage']}")
+        except Exception as e:
+            print(f"Error: {str(e)}")
+            sys.exit(1)
+        sys.exit(0)
+    
     try:
-        # Analyze playlist with user's prompt
-        playlist_results = analyze_playlist_with_prompt(playlist_url, user_prompt)
+        # Analyze playlist with user's prompt (--force ignores the checkpoint)
+        playlist_results = analyze_playlist_with_prompt(playlist_url, user_prompt, force='--force' in sys.argv[3:])
         
         # Print summary
         total_videos = len(playlist_results)
@@ -550,3 +1152,4 @@ if __name__ == "__main__":
 
 # EXAMPLE USE ----------------------------------------------------------------
 # python analyze_playlist.py "https://www.youtube.com/playlist?list=PLbUZQMMLnhfUXYPfDOZQ4dyydZO1zHNZh" "area under curve rotating about y-axis"
+# python analyze_playlist.py "https://www.youtube.com/playlist?list=PLbUZQMMLnhfUXYPfDOZQ4dyydZO1zHNZh" "area under curve rotating about y-axis" --segments 5
@@ -0,0 +1,131 @@
+"""
+Benchmark of the segments response path: the previous serialization (indent=2 artifacts, the
+whole response built as one dict and encoded by jsonify) against the serialization module
+(compact artifacts, transcript streamed in chunks). Runs on the checked-in segment fixtures,
+with each transcript repeated to simulate a long lecture.
+
+Usage: python backend/test/bench_serialization.py [--repeat N] [--iterations N]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'transcript_extraction'))
+
+import storage
+import serialization
+from cache_manager import SEGMENTS_PATTERN
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'transcript_extraction', 'temporary_files')
+# Segment fixtures of videos without a checked-in transcript are paired with this one
+FALLBACK_TRANSCRIPT = 'transcript_heBErnN3ZPk.txt'
+
+
+def load_fixtures(work_dir: str, repeat: int):
+    """
+    Store every segment fixture in both encodings next to its (repeated) transcript.
+
+    Returns:
+        list: (name, old segments path, new segments path, transcript path) per fixture
+    """
+    fixtures = []
+    for name in sorted(os.listdir(FIXTURES_DIR)):
+        match = SEGMENTS_PATTERN.match(name)
+        if not match:
+            continue
+        with open(os.path.join(FIXTURES_DIR, name), encoding='utf-8') as f:
+            segments = json.load(f)
+        transcript_name = f'transcript_{match.group(1)}.txt'
+        if not os.path.exists(os.path.join(FIXTURES_DIR, transcript_name)):
+            transcript_name = FALLBACK_TRANSCRIPT
+        transcript_path = os.path.join(work_dir, f'{repeat}x_{transcript_name}')
+        if not storage.artifact_exists(transcript_path):
+            with open(os.path.join(FIXTURES_DIR, transcript_name), encoding='utf-8') as f:
+                storage.write_text_artifact(transcript_path, f.read() * repeat)
+
+        old_path = os.path.join(work_dir, f'old_{name}')
+        new_path = os.path.join(work_dir, f'new_{name}')
+        storage.write_bytes_artifact(old_path, json.dumps(segments, indent=2).encode('utf-8'))
+        storage.write_json_artifact(new_path, segments)
+        fixtures.append((name, old_path, new_path, transcript_path))
+    return fixtures
+
+
+def old_response(segments_path: str, transcript_path: str) -> int:
+    """The previous path: parse, read the whole transcript, encode one body like jsonify."""
+    segments_data = json.loads(storage.read_bytes_artifact(segments_path))
+    response_data = {
+        "video_id": "heBErnN3ZPk",
+        "youtube_url": "https://www.youtube.com/watch?v=heBErnN3ZPk",
+        "transcript": storage.read_text_artifact(transcript_path),
+        **segments_data,
+        "prompt_match": {"type": "exact"}
+    }
+    body = json.dumps(response_data, separators=(',', ':'), sort_keys=True).encode('utf-8')
+    return len(body)
+
+
+def new_response(segments_path: str, transcript_path: str) -> int:
+    """The streamed path used by /api/get; chunks are counted and dropped, as a server would send them."""
+    segments_data = storage.read_json_artifact(segments_path)
+    fields = {
+        "video_id": "heBErnN3ZPk",
+        "youtube_url": "https://www.youtube.com/watch?v=heBErnN3ZPk",
+        "transcript": None,
+        **segments_data,
+        "prompt_match": {"type": "exact"}
+    }
+    fields["transcript"] = storage.open_text_stream(transcript_path)
+    return sum(len(chunk) for chunk in serialization.iter_json_object(fields.items()))
+
+
+def measure(fn, fixtures, path_index: int, iterations: int):
+    """CPU seconds per request and the largest peak of traced memory over one request per fixture."""
+    started = time.process_time()
+    for _ in range(iterations):
+        for fixture in fixtures:
+            fn(fixture[path_index], fixture[3])
+    cpu = (time.process_time() - started) / (iterations * len(fixtures))
+
+    peak = 0
+    for fixture in fixtures:
+        tracemalloc.start()
+        fn(fixture[path_index], fixture[3])
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return cpu, peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark segment response serialization")
+    parser.add_argument('--repeat', type=int, nargs='+', default=[1, 20],
+                        help="Transcript repetitions to simulate longer lectures")
+    parser.add_argument('--iterations', type=int, default=20, help="Requests per fixture for the CPU timing")
+    args = parser.parse_args()
+
+    backend = 'orjson' if serialization.load_orjson() else 'json'
+    print(f"JSON backend: {backend}, storage codec: {storage.get_write_codec() or 'none'}")
+    with tempfile.TemporaryDirectory() as work_dir:
+        for repeat in args.repeat:
+            fixtures = load_fixtures(work_dir, repeat)
+            old_bytes = sum(os.path.getsize(storage.resolve_artifact_path(f[1])) for f in fixtures)
+            new_bytes = sum(os.path.getsize(storage.resolve_artifact_path(f[2])) for f in fixtures)
+            transcript_chars = max(len(storage.read_text_artifact(f[3])) for f in fixtures)
+            assert all(json.loads(b''.join(serialization.iter_json_object(
+                [('transcript', storage.open_text_stream(f[3]))])))['transcript'] == storage.read_text_artifact(f[3])
+                for f in fixtures)
+
+            old_cpu, old_peak = measure(old_response, fixtures, 1, args.iterations)
+            new_cpu, new_peak = measure(new_response, fixtures, 2, args.iterations)
+            print(f"\n{len(fixtures)} fixtures, transcripts x{repeat} (up to {transcript_chars} chars)")
+            print(f"  stored segments: {old_bytes} -> {new_bytes} bytes")
+            print(f"  CPU per request: {old_cpu * 1000:.2f} ms -> {new_cpu * 1000:.2f} ms")
+            print(f"  peak memory:     {old_peak / 1024:.0f} KiB -> {new_peak / 1024:.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Tests for the playlist scan checkpoint: failed scans are recorded as not ok (and rescanned on the
+next run) by their error field, and a scan turned away by the LLM scheduler stops the run.
+yt-dlp and Claude are replaced by fakes.
+
+Usage: python -m pytest backend/test/test_analyze_playlist.py
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import analyze_playlist
+from llm_scheduler import LLMRateLimited
+
+PLAYLIST = 'https://www.youtube.com/playlist?list=PLtest'
+ENTRIES = {video_id: {'url': f'https://www.youtube.com/watch?v={video_id}', 'title': video_id, 'duration': 60}
+           for video_id in ('aaaaaaaaaaa', 'bbbbbbbbbbb', 'ccccccccccc')}
+
+
+def fake_scan(outcomes):
+    """preliminary_scan returning (or raising) the outcome given for each video."""
+    async def preliminary_scan(video_url, user_prompt):
+        outcome = outcomes[video_url.rsplit('v=', 1)[-1]]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+    return preliminary_scan
+
+
+def verdict(score, explanation, error=None):
+    analysis = {'relevance_score': score, 'explanation': explanation, 'relevant_elements': [], 'confidence': 'high'}
+    if error:
+        analysis['error'] = error
+    return {'title': 't', 'relevance_score': score, 'is_likely_relevant': score >= 3, 'relevance_analysis': analysis}
+
+
+@pytest.fixture
+def playlist(tmp_path, monkeypatch):
+    checkpoint_path = str(tmp_path / 'run.jsonl')
+    monkeypatch.setattr(analyze_playlist, 'get_checkpoint_path', lambda playlist_url, user_prompt: checkpoint_path)
+    monkeypatch.setattr(analyze_playlist, 'iter_playlist_entries',
+                        lambda playlist_url, max_videos=0: iter(ENTRIES.items()))
+    return checkpoint_path
+
+
+def test_failed_scans_are_not_ok(playlist, monkeypatch):
+    monkeypatch.setattr(analyze_playlist, 'preliminary_scan', fake_scan({
+        # An explanation that happens to start with "Error" is still a verdict
+        'aaaaaaaaaaa': verdict(4, 'Error correcting codes are covered in chapter 2'),
+        'bbbbbbbbbbb': {'error': 'Video unavailable', 'relevance_score': 0, 'is_likely_relevant': False},
+        'ccccccccccc': verdict(0, 'Error during analysis: boom', error='boom'),
+    }))
+
+    results = dict(analyze_playlist.iter_playlist_scan(PLAYLIST, 'codes', scan_workers=1))
+
+    assert 'error' not in results['aaaaaaaaaaa']
+    assert results['bbbbbbbbbbb']['error'] == 'Video unavailable'
+    assert results['ccccccccccc']['error'] == 'boom'
+    records = analyze_playlist.load_checkpoint(playlist)
+    assert {video_id: record['ok'] for video_id, record in records.items()} == {
+        'aaaaaaaaaaa': True, 'bbbbbbbbbbb': False, 'ccccccccccc': False}
+
+
+def test_rate_limited_scan_stops_the_run(playlist, monkeypatch):
+    limited = LLMRateLimited(30)
+    monkeypatch.setattr(analyze_playlist, 'preliminary_scan', fake_scan({
+        'aaaaaaaaaaa': verdict(4, 'Covered'),
+        'bbbbbbbbbbb': limited,
+        'ccccccccccc': verdict(1, 'Not covered'),
+    }))
+
+    with pytest.raises(LLMRateLimited) as raised:
+        list(analyze_playlist.iter_playlist_scan(PLAYLIST, 'codes', scan_workers=1))
+
+    assert raised.value is limited
+    # The rate-limited video is not checkpointed, so the next run scans it
+    assert 'bbbbbbbbbbb' not in analyze_playlist.load_checkpoint(playlist)
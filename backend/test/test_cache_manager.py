@@ -0,0 +1,120 @@
+"""
+Tests for the cache budget: LRU eviction order, transcript pinning, the grace period for fresh
+artifacts and stray file cleanup.
+
+Usage: python -m pytest backend/test/test_cache_manager.py
+"""
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'transcript_extraction'))
+
+import cache_manager
+
+VIDEO_A = 'aaaaaaaaaaa'
+VIDEO_B = 'bbbbbbbbbbb'
+
+
+@pytest.fixture(autouse=True)
+def search_index_removals(monkeypatch):
+    """Record the videos dropped from the search index instead of touching the real one."""
+    removed = []
+    monkeypatch.setattr(cache_manager, '_remove_from_search_index', removed.append)
+    return removed
+
+
+def write_artifact(cache_dir, name: str, size: int = 100, age: float = 3600, accessed: float = None) -> str:
+    """Create a cache file written age seconds ago and last read accessed seconds ago."""
+    path = os.path.join(cache_dir, name)
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+    now = time.time()
+    os.utime(path, (now - (age if accessed is None else accessed), now - age))
+    return path
+
+
+def test_classifies_artifacts():
+    assert cache_manager.classify_artifact(f'transcript_{VIDEO_A}.txt.gz') == {"kind": "transcript", "video_id": VIDEO_A}
+    assert cache_manager.classify_artifact(f'transcript_{VIDEO_A}_q_segments.json.zst')["kind"] == "segments"
+    assert cache_manager.classify_artifact(f'outline_{VIDEO_A}.json')["kind"] == "outline"
+    assert cache_manager.classify_artifact('metrics.sqlite3') is None
+
+
+def test_evicts_least_recently_used_first(tmp_path, search_index_removals):
+    cache_dir = str(tmp_path)
+    write_artifact(cache_dir, f'transcript_{VIDEO_A}.txt.gz', accessed=300)
+    write_artifact(cache_dir, f'transcript_{VIDEO_B}.txt.gz', accessed=100)
+    write_artifact(cache_dir, f'chapters_{VIDEO_B}.json.gz', accessed=200)
+
+    summary = cache_manager.enforce_cache_budget(cache_dir, max_bytes=10**6, max_entries=1, min_age=60)
+
+    assert summary["evicted_files"] == [f'transcript_{VIDEO_A}.txt.gz', f'chapters_{VIDEO_B}.json.gz']
+    assert os.listdir(cache_dir) == [f'transcript_{VIDEO_B}.txt.gz']
+    assert search_index_removals == [VIDEO_A]
+    assert not summary["over_budget"]
+
+
+def test_byte_budget_stops_once_under(tmp_path):
+    cache_dir = str(tmp_path)
+    write_artifact(cache_dir, f'outline_{VIDEO_A}.json', size=400, accessed=300)
+    write_artifact(cache_dir, f'outline_{VIDEO_B}.json', size=400, accessed=100)
+
+    summary = cache_manager.enforce_cache_budget(cache_dir, max_bytes=500, max_entries=100, min_age=60)
+
+    assert summary["evicted_files"] == [f'outline_{VIDEO_A}.json']
+    assert summary["total_bytes"] == 400
+
+
+def test_transcript_is_pinned_while_segments_remain(tmp_path):
+    cache_dir = str(tmp_path)
+    # The transcript is the oldest, but a segment result still needs it
+    write_artifact(cache_dir, f'transcript_{VIDEO_A}.txt.gz', accessed=900)
+    write_artifact(cache_dir, f'transcript_{VIDEO_A}_one_segments.json.gz', accessed=100)
+    write_artifact(cache_dir, f'outline_{VIDEO_B}.json', accessed=500)
+
+    summary = cache_manager.enforce_cache_budget(cache_dir, max_bytes=10**6, max_entries=2, min_age=60)
+
+    assert summary["evicted_files"] == [f'outline_{VIDEO_B}.json']
+    assert os.path.exists(os.path.join(cache_dir, f'transcript_{VIDEO_A}.txt.gz'))
+    assert cache_manager.get_cache_stats(cache_dir)["pinned_transcripts"] == 1
+
+
+def test_transcript_is_unpinned_after_its_last_segments(tmp_path, search_index_removals):
+    cache_dir = str(tmp_path)
+    write_artifact(cache_dir, f'transcript_{VIDEO_A}.txt.gz', accessed=900)
+    write_artifact(cache_dir, f'transcript_{VIDEO_A}_one_segments.json.gz', accessed=800)
+    write_artifact(cache_dir, f'transcript_{VIDEO_A}_two_segments.json.gz', accessed=700)
+    write_artifact(cache_dir, f'transcript_{VIDEO_B}.txt.gz', accessed=100)
+
+    summary = cache_manager.enforce_cache_budget(cache_dir, max_bytes=10**6, max_entries=1, min_age=60)
+
+    # The parked transcript goes back in LRU order once both segment results are gone
+    assert summary["evicted_files"] == [f'transcript_{VIDEO_A}_one_segments.json.gz',
+                                        f'transcript_{VIDEO_A}_two_segments.json.gz',
+                                        f'transcript_{VIDEO_A}.txt.gz']
+    assert search_index_removals == [VIDEO_A]
+
+
+def test_fresh_artifacts_are_never_evicted(tmp_path):
+    cache_dir = str(tmp_path)
+    write_artifact(cache_dir, f'outline_{VIDEO_A}.json', age=10, accessed=900)
+    write_artifact(cache_dir, f'outline_{VIDEO_B}.json', age=3600, accessed=100)
+
+    summary = cache_manager.enforce_cache_budget(cache_dir, max_bytes=10**6, max_entries=0, min_age=60)
+
+    assert summary["evicted_files"] == [f'outline_{VIDEO_B}.json']
+    assert summary["over_budget"]
+
+
+def test_removes_old_stray_files_only(tmp_path):
+    cache_dir = str(tmp_path)
+    write_artifact(cache_dir, f'transcript_{VIDEO_A}.txt.gz.1234.tmp', age=3600)
+    write_artifact(cache_dir, f'transcript_{VIDEO_A}.en.srt', age=3600)
+    write_artifact(cache_dir, f'transcript_{VIDEO_B}.txt.gz.5678.tmp', age=5)
+    write_artifact(cache_dir, f'transcript_{VIDEO_A}.txt.gz', age=3600)
+
+    assert cache_manager.remove_stray_files(cache_dir, min_age=60) == 2
+    assert sorted(os.listdir(cache_dir)) == [f'transcript_{VIDEO_A}.txt.gz', f'transcript_{VIDEO_B}.txt.gz.5678.tmp']
@@ -0,0 +1,110 @@
+"""
+Import-time regression test for the backend modules.
+Each module is imported in a fresh interpreter under -X importtime. Importing must print nothing,
+must not load heavy dependencies (they are imported on first use), and must stay within a budget.
+
+Usage: python -m pytest backend/test/test_import_time.py
+"""
+import os
+import sys
+import subprocess
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (directory relative to backend/, module name)
+MODULES = [
+    ('transcript_extraction', 'decide_clip'),
+    ('transcript_extraction', 'transcript_fetch'),
+    ('transcript_extraction', 'chapter_slicing'),
+    ('transcript_extraction', 'search_index'),
+    ('transcript_extraction', 'llm_client'),
+    ('transcript_extraction', 'job_queue'),
+    ('transcript_extraction', 'worker'),
+    ('transcript_extraction', 'profiling'),
+    ('transcript_extraction', 'revalidation'),
+    ('transcript_extraction', 'segment_postprocess'),
+    ('transcript_extraction', 'serialization'),
+    ('transcript_extraction', 'topic_outline'),
+    ('transcript_extraction', 'access_log'),
+    ('transcript_extraction', 'precompute'),
+    ('transcript_extraction', 'cache_manager'),
+    ('transcript_extraction', 'storage'),
+    ('transcript_extraction', 'llm_scheduler'),
+    ('transcript_extraction', 'resilience'),
+    ('transcript_extraction', 'model_router'),
+    ('transcript_extraction', 'prefetch'),
+    ('transcript_extraction', 'prompt_cache'),
+    ('transcript_extraction', 'stage_metrics'),
+    ('transcript_extraction', 'pipeline_runs'),
+    ('test', 'analyze_playlist'),
+    ('', 'app'),
+]
+
+# Loaded lazily by the code paths that need them, never at import time
+HEAVY_MODULES = ('anthropic', 'yt_dlp', 'dotenv', 'zstandard', 'orjson', 'flask',
+                 'cProfile', 'tracemalloc', 'xml.etree.ElementTree')
+
+# Frameworks a module is built on: it may load them at import time, and their own import time is
+# not counted against its budget
+FRAMEWORK_MODULES = {'app': ('flask', 'flask_cors')}
+
+# Cumulative import time allowed per module; generous, since most of it is the standard library
+IMPORT_TIME_BUDGET_MS = float(os.getenv('IMPORT_TIME_BUDGET_MS', '150'))
+ATTEMPTS = 3
+
+
+def import_module(directory: str, module: str):
+    """
+    Import a module in a fresh interpreter with -X importtime.
+
+    Args:
+        directory (str): Directory holding the module, relative to backend/
+        module (str): Module name
+
+    Returns:
+        Tuple[str, float, set]: Captured stdout, cumulative import time of the module in ms
+        (without its frameworks), and every module name imported along the way
+    """
+    for framework in FRAMEWORK_MODULES.get(module, ()):
+        pytest.importorskip(framework)
+    path = os.path.join(BACKEND_DIR, directory)
+    code = f"import sys; sys.path[:0] = [{path!r}, {os.path.join(BACKEND_DIR, 'transcript_extraction')!r}]; import {module}"
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+
+    cumulative_us = {}
+    imported = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        imported.add(name.strip())
+        if cumulative.strip().isdigit():
+            cumulative_us[name.strip()] = int(cumulative)
+    assert module in cumulative_us, f"{module} missing from -X importtime output"
+    own_us = cumulative_us[module] - sum(cumulative_us.get(name, 0) for name in FRAMEWORK_MODULES.get(module, ()))
+    return result.stdout, own_us / 1000.0, imported
+
+
+@pytest.mark.parametrize('directory,module', MODULES)
+def test_import_is_silent(directory, module):
+    stdout, _, _ = import_module(directory, module)
+    assert stdout == '', f"importing {module} printed output"
+
+
+@pytest.mark.parametrize('directory,module', MODULES)
+def test_import_skips_heavy_dependencies(directory, module):
+    _, _, imported = import_module(directory, module)
+    loaded = sorted(name for name in HEAVY_MODULES
+                    if name in imported and name not in FRAMEWORK_MODULES.get(module, ()))
+    assert not loaded, f"importing {module} loaded {loaded}"
+
+
+@pytest.mark.parametrize('directory,module', MODULES)
+def test_import_time_budget(directory, module):
+    # Best of a few runs, so a busy machine does not make the test flaky
+    best_ms = min(import_module(directory, module)[1] for _ in range(ATTEMPTS))
+    assert best_ms <= IMPORT_TIME_BUDGET_MS, f"importing {module} took {best_ms:.1f}ms"
@@ -0,0 +1,161 @@
+"""
+Tests for the durable job queue: de-duplication, lease expiry and redelivery, re-queueing after
+failures and abandoning unwanted jobs. The queue's clock is replaced, so leases expire instantly.
+
+Usage: python -m pytest backend/test/test_job_queue.py
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'transcript_extraction'))
+
+import job_queue
+
+VIDEO = 'aaaaaaaaaaa'
+MODEL = 'auto'
+
+
+class FakeClock:
+    """Stands in for the time module inside job_queue."""
+
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(job_queue, 'time', fake)
+    return fake
+
+
+@pytest.fixture
+def state_dir(tmp_path):
+    return str(tmp_path)
+
+
+def test_enqueue_joins_a_live_job(state_dir, clock):
+    first = job_queue.enqueue(VIDEO, 'prompt', MODEL, priority='batch', wanted_seconds=None, state_dir=state_dir)
+    clock.advance(1)
+    second = job_queue.enqueue(VIDEO, 'prompt', MODEL, priority='interactive', wanted_seconds=30, state_dir=state_dir)
+
+    assert second["job_key"] == first["job_key"]
+    assert second["created"] == first["created"]
+    # The joined job takes the more urgent priority and stays wanted indefinitely
+    assert second["priority"] == job_queue.resolve_priority('interactive')
+    assert second["wanted_until"] is None
+    assert job_queue.get_queue_stats(state_dir)["depth"] == 1
+
+    # Another prompt or routing policy is a different job
+    assert job_queue.enqueue(VIDEO, 'other', MODEL, state_dir=state_dir)["job_key"] != first["job_key"]
+    assert job_queue.enqueue(VIDEO, 'prompt', 'large', state_dir=state_dir)["job_key"] != first["job_key"]
+
+
+def test_finished_job_is_queued_again(state_dir, clock):
+    job = job_queue.enqueue(VIDEO, 'prompt', MODEL, state_dir=state_dir)
+    job_queue.claim('w1', state_dir=state_dir)
+    job_queue.complete(job["job_key"], state_dir)
+    assert job_queue.get_job(job["job_key"], state_dir)["status"] == 'done'
+
+    again = job_queue.enqueue(VIDEO, 'prompt', MODEL, state_dir=state_dir)
+    assert (again["status"], again["attempts"]) == ('queued', 0)
+
+
+def test_claims_by_priority_then_age(state_dir, clock):
+    batch = job_queue.enqueue(VIDEO, 'batch', MODEL, priority='batch', wanted_seconds=None, state_dir=state_dir)
+    clock.advance(1)
+    first = job_queue.enqueue(VIDEO, 'first', MODEL, state_dir=state_dir)
+    clock.advance(1)
+    second = job_queue.enqueue(VIDEO, 'second', MODEL, state_dir=state_dir)
+
+    claimed = [job_queue.claim('w1', state_dir=state_dir)["job_key"] for _ in range(3)]
+
+    assert claimed == [first["job_key"], second["job_key"], batch["job_key"]]
+    assert job_queue.claim('w1', state_dir=state_dir) is None
+
+
+def test_expired_lease_is_redelivered(state_dir, clock):
+    job = job_queue.enqueue(VIDEO, 'prompt', MODEL, state_dir=state_dir)
+    assert job_queue.claim('w1', visibility_timeout=60, state_dir=state_dir)["lease_owner"] == 'w1'
+
+    # Extending the lease keeps the job with its worker
+    clock.advance(50)
+    assert job_queue.extend_lease(job["job_key"], 'w1', visibility_timeout=60, state_dir=state_dir)
+    clock.advance(50)
+    assert job_queue.claim('w2', visibility_timeout=60, state_dir=state_dir) is None
+
+    # The worker stops renewing: the lease expires and another worker takes over
+    clock.advance(11)
+    redelivered = job_queue.claim('w2', visibility_timeout=60, state_dir=state_dir)
+    assert (redelivered["job_key"], redelivered["lease_owner"], redelivered["attempts"]) == (job["job_key"], 'w2', 2)
+    assert not job_queue.extend_lease(job["job_key"], 'w1', state_dir=state_dir)
+    # The old worker's failure report no longer changes the job
+    assert job_queue.fail(job["job_key"], 'w1', "late", state_dir=state_dir)["lease_owner"] == 'w2'
+
+
+def test_lease_expiring_on_every_attempt_fails_the_job(state_dir, clock):
+    job = job_queue.enqueue(VIDEO, 'prompt', MODEL, state_dir=state_dir)
+    for worker in ('w1', 'w2'):
+        assert job_queue.claim(worker, visibility_timeout=10, max_attempts=2, state_dir=state_dir)
+        clock.advance(11)
+
+    assert job_queue.claim('w3', visibility_timeout=10, max_attempts=2, state_dir=state_dir) is None
+    assert job_queue.get_job(job["job_key"], state_dir)["status"] == 'failed'
+
+
+def test_failed_attempt_is_requeued_after_backoff(state_dir, clock):
+    job = job_queue.enqueue(VIDEO, 'prompt', MODEL, state_dir=state_dir)
+    job_queue.claim('w1', state_dir=state_dir)
+
+    requeued = job_queue.fail(job["job_key"], 'w1', "rate limited", retry_after=20, state_dir=state_dir)
+
+    assert (requeued["status"], requeued["lease_owner"], requeued["error"]) == ('queued', None, "rate limited")
+    assert requeued["available_at"] == clock.time() + 20
+    job_queue.touch(job["job_key"], wanted_seconds=60, state_dir=state_dir)
+    assert job_queue.claim('w1', state_dir=state_dir) is None
+    clock.advance(20)
+    assert job_queue.claim('w1', state_dir=state_dir)["attempts"] == 2
+
+
+def test_non_retryable_or_last_attempt_fails(state_dir, clock):
+    job = job_queue.enqueue(VIDEO, 'prompt', MODEL, state_dir=state_dir)
+    job_queue.claim('w1', state_dir=state_dir)
+    assert job_queue.fail(job["job_key"], 'w1', "bad video", retryable=False, state_dir=state_dir)["status"] == 'failed'
+
+    job = job_queue.enqueue(VIDEO, 'other', MODEL, state_dir=state_dir)
+    job_queue.claim('w1', state_dir=state_dir)
+    assert job_queue.fail(job["job_key"], 'w1', "boom", max_attempts=1, state_dir=state_dir)["status"] == 'failed'
+
+
+def test_unwanted_interactive_job_is_abandoned(state_dir, clock):
+    wanted = job_queue.enqueue(VIDEO, 'polled', MODEL, wanted_seconds=30, state_dir=state_dir)
+    unwanted = job_queue.enqueue(VIDEO, 'forgotten', MODEL, wanted_seconds=30, state_dir=state_dir)
+    background = job_queue.enqueue(VIDEO, 'batch', MODEL, priority='batch', wanted_seconds=None, state_dir=state_dir)
+
+    clock.advance(20)
+    job_queue.touch(wanted["job_key"], wanted_seconds=30, state_dir=state_dir)
+    clock.advance(20)
+
+    assert job_queue.claim('w1', state_dir=state_dir)["job_key"] == wanted["job_key"]
+    assert job_queue.get_job(unwanted["job_key"], state_dir)["status"] == 'abandoned'
+    assert job_queue.claim('w1', state_dir=state_dir)["job_key"] == background["job_key"]
+
+
+def test_prunes_finished_jobs_after_retention(state_dir, clock):
+    done = job_queue.enqueue(VIDEO, 'done', MODEL, state_dir=state_dir)
+    job_queue.claim('w1', state_dir=state_dir)
+    job_queue.complete(done["job_key"], state_dir)
+    queued = job_queue.enqueue(VIDEO, 'queued', MODEL, wanted_seconds=None, state_dir=state_dir)
+
+    clock.advance(100)
+    assert job_queue.prune_jobs(retention_seconds=50, state_dir=state_dir) == 1
+    assert job_queue.get_job(done["job_key"], state_dir) is None
+    assert job_queue.get_job(queued["job_key"], state_dir)["status"] == 'queued'
@@ -0,0 +1,149 @@
+"""
+Tests for the LLM scheduler: token buckets, waiter service order and rejections with a
+retry-after hint. The scheduler's clock is replaced, so waiting takes no real time.
+
+Usage: python -m pytest backend/test/test_llm_scheduler.py
+"""
+import os
+import sys
+import asyncio
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'transcript_extraction'))
+
+import llm_scheduler
+from llm_scheduler import LLMRateLimited
+
+
+class FakeClock:
+    """Stands in for the time module inside llm_scheduler; sleeping advances the clock."""
+
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+        self.slept = 0.0
+
+    def time(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+        self.slept += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(llm_scheduler, 'time', fake)
+    # 2 requests and 1000 input tokens per minute
+    monkeypatch.setattr(llm_scheduler, 'LLM_REQUESTS_PER_MINUTE', 2.0)
+    monkeypatch.setattr(llm_scheduler, 'LLM_INPUT_TOKENS_PER_MINUTE', 1000.0)
+    return fake
+
+
+def test_request_bucket_refills_over_time(tmp_path, clock):
+    state_dir = str(tmp_path)
+    llm_scheduler.acquire(10, user='a', state_dir=state_dir)
+    llm_scheduler.acquire(10, user='a', state_dir=state_dir)
+    assert clock.slept == 0
+
+    # The bucket is empty; one request refills in 30s at 2/min
+    llm_scheduler.acquire(10, user='a', max_wait=60, state_dir=state_dir)
+    assert clock.slept == pytest.approx(30, abs=0.1)
+
+
+def test_token_bucket_waits_for_input_tokens(tmp_path, clock):
+    state_dir = str(tmp_path)
+    llm_scheduler.acquire(800, user='a', state_dir=state_dir)
+    assert llm_scheduler.get_scheduler_stats(state_dir)["input_tokens_available"] == 200
+
+    # 600 more tokens take 36s at 1000/min (the request bucket has a slot left)
+    llm_scheduler.acquire(800, user='a', max_wait=60, state_dir=state_dir)
+    assert clock.slept == pytest.approx(36, abs=0.1)
+
+
+def test_record_usage_corrects_the_estimate(tmp_path, clock):
+    state_dir = str(tmp_path)
+    llm_scheduler.acquire(100, user='a', state_dir=state_dir)
+    llm_scheduler.record_usage(100, 400, state_dir)
+    assert llm_scheduler.get_scheduler_stats(state_dir)["input_tokens_available"] == 600
+
+
+def test_waiters_are_served_by_priority_then_user_then_arrival(tmp_path, clock, monkeypatch):
+    state_dir = str(tmp_path)
+    monkeypatch.setattr(llm_scheduler, 'LLM_REQUESTS_PER_MINUTE', 60.0)
+    llm_scheduler.acquire(10, user='a', state_dir=state_dir)
+    clock.sleep(1)
+    llm_scheduler.acquire(10, user='b', state_dir=state_dir)
+
+    conn = llm_scheduler._connect(state_dir)
+    try:
+        tickets = {}
+        for name, priority, user in [('batch_c', llm_scheduler.PRIORITY_BATCH, 'c'),
+                                     ('a_first', llm_scheduler.PRIORITY_INTERACTIVE, 'a'),
+                                     ('b', llm_scheduler.PRIORITY_INTERACTIVE, 'b'),
+                                     ('d', llm_scheduler.PRIORITY_INTERACTIVE, 'd'),
+                                     ('a_second', llm_scheduler.PRIORITY_INTERACTIVE, 'a')]:
+            clock.sleep(1)
+            tickets[name] = llm_scheduler._enqueue(conn, 10, priority, user, max_wait=3600)
+        order = [row["ticket"] for row in llm_scheduler._queue_order(conn)]
+
+        # d was never served, a longer ago than b; a's own waiters keep their arrival order
+        assert order == [tickets[name] for name in ('d', 'a_first', 'a_second', 'b', 'batch_c')]
+
+        # Only the head of the queue is admitted, even with capacity to spare
+        started = clock.time()
+        assert llm_scheduler._try_admit(conn, tickets['b'], 10, llm_scheduler.PRIORITY_INTERACTIVE,
+                                        'b', started, 3600) > 0
+        assert llm_scheduler._try_admit(conn, tickets['d'], 10, llm_scheduler.PRIORITY_INTERACTIVE,
+                                        'd', started, 3600) is None
+        assert llm_scheduler._queue_order(conn)[0]["ticket"] == tickets['a_first']
+    finally:
+        conn.close()
+
+
+def test_rejects_up_front_with_retry_after(tmp_path, clock):
+    state_dir = str(tmp_path)
+    llm_scheduler.acquire(10, user='a', state_dir=state_dir)
+    llm_scheduler.acquire(10, user='a', state_dir=state_dir)
+
+    with pytest.raises(LLMRateLimited) as raised:
+        llm_scheduler.acquire(10, user='b', max_wait=5, state_dir=state_dir)
+    # The next request slot is 30s away; the hint is rounded up
+    assert raised.value.retry_after == 31
+    assert clock.slept == 0
+    assert llm_scheduler.get_scheduler_stats(state_dir)["waiting"] == {}
+
+
+def test_rejects_a_waiter_after_max_wait(tmp_path, clock, monkeypatch):
+    state_dir = str(tmp_path)
+    # The blocking waiter below never polls, so keep it from going stale
+    monkeypatch.setattr(llm_scheduler, 'STALE_WAITER_SECONDS', 3600)
+    llm_scheduler.acquire(10, user='a', state_dir=state_dir)
+    llm_scheduler.acquire(10, user='a', state_dir=state_dir)
+
+    # Admitted to the queue (estimated 60s), but a waiter ahead keeps taking the head of the queue
+    conn = llm_scheduler._connect(state_dir)
+    try:
+        blocker = llm_scheduler._enqueue(conn, 10, llm_scheduler.PRIORITY_INTERACTIVE, 'x', max_wait=3600)
+        with pytest.raises(LLMRateLimited) as raised:
+            llm_scheduler.acquire(10, user='b', max_wait=70, state_dir=state_dir)
+        assert clock.slept == pytest.approx(70, abs=0.1)
+        assert raised.value.retry_after >= 1
+        llm_scheduler._leave(conn, blocker)
+    finally:
+        conn.close()
+    assert llm_scheduler.get_scheduler_stats(state_dir)["waiting"] == {}
+
+
+def test_retry_after_is_rounded_up():
+    assert LLMRateLimited(12.2).retry_after == 13
+    assert LLMRateLimited(0).retry_after == 1
+
+
+def test_acquire_async_admits_when_capacity_is_free(tmp_path, clock):
+    state_dir = str(tmp_path)
+    asyncio.run(llm_scheduler.acquire_async(100, user='a', state_dir=state_dir))
+    stats = llm_scheduler.get_scheduler_stats(state_dir)
+    assert stats["requests_available"] == 1
+    assert stats["waiting"] == {}
@@ -0,0 +1,50 @@
+"""
+Tests for pipeline profiling: stages are only recorded for profiled runs, and stages nested in
+another stage (transcript_fetch's inside decide_clip's fetch) are recorded with their parent.
+
+Usage: python -m pytest backend/test/test_profiling.py
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'transcript_extraction'))
+
+import profiling
+
+
+@pytest.fixture
+def stages(monkeypatch):
+    monkeypatch.setattr(profiling, '_stages', [])
+    monkeypatch.setattr(profiling, '_combined_stats', None)
+    return profiling._stages
+
+
+def test_unprofiled_run_records_nothing(stages, monkeypatch):
+    monkeypatch.delenv(profiling.PROFILE_ENV, raising=False)
+    with profiling.stage('fetch'):
+        pass
+    assert stages == []
+
+
+def test_nested_stages_are_recorded_with_their_parent(stages, monkeypatch):
+    monkeypatch.setenv(profiling.PROFILE_ENV, 'test')
+    with profiling.stage('fetch'):
+        with profiling.stage('download'):
+            pass
+        with profiling.stage('clean'):
+            pass
+
+    assert [(s['stage'], s.get('parent')) for s in stages] == [('download', 'fetch'), ('clean', 'fetch'),
+                                                              ('fetch', None)]
+    # Only the outer stage holds the profile
+    assert 'top_functions' in stages[-1]
+    assert 'top_functions' not in stages[0]
+    assert stages[0]['duration_ms'] <= stages[-1]['duration_ms']
+
+
+def test_profiling_is_only_chosen_when_requested(monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILE_SAMPLE_RATE', 0)
+    assert profiling.choose_profile_id(False) is None
+    assert len(profiling.choose_profile_id(True)) == 16
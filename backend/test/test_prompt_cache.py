@@ -0,0 +1,66 @@
+"""
+Tests for prompt canonicalization and matching: rephrasings and typos reuse cached segments,
+while a short prefix of a different word ("car"/"carbon") does not.
+
+Usage: python -m pytest backend/test/test_prompt_cache.py
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'transcript_extraction'))
+
+import prompt_cache
+import storage
+
+VIDEO = 'aaaaaaaaaaa'
+
+
+def similarity(a: str, b: str) -> float:
+    return prompt_cache.prompt_similarity(prompt_cache.canonicalize(a), prompt_cache.canonicalize(b))
+
+
+def test_canonical_form_ignores_case_order_and_stopwords():
+    assert prompt_cache.canonicalize("How to multiply MATRICES") == prompt_cache.canonicalize("matrices multiply")
+
+
+@pytest.mark.parametrize('cached, prompt', [
+    ("matrix multiplication", "how to multiply matrices"),
+    ("matrix multiplication", "Matrix Multiplicatio"),
+    ("the chain rule", "chain rules"),
+    ("sine wave", "sin wave"),
+])
+def test_rephrased_prompts_match(cached, prompt):
+    assert similarity(cached, prompt) >= prompt_cache.PROMPT_MATCH_THRESHOLD
+
+
+@pytest.mark.parametrize('cached, prompt', [
+    ("carbon", "car"),
+    ("article", "art"),
+    ("pendulum", "pen"),
+    ("sine", "sin"),
+    ("conclusion", "con"),
+    ("general ai", "gen ai"),
+])
+def test_prefix_of_another_word_does_not_match(cached, prompt):
+    assert similarity(cached, prompt) < prompt_cache.PROMPT_MATCH_THRESHOLD
+
+
+def test_prefix_alone_stays_below_threshold():
+    assert prompt_cache.term_similarity("derivativ", "derivative") < prompt_cache.PROMPT_MATCH_THRESHOLD
+    # A short prefix of a long term only gets its trigram overlap
+    assert prompt_cache.term_similarity("car", "carbon") < prompt_cache.PREFIX_SIMILARITY
+
+
+def test_find_match_returns_the_cached_prompt(tmp_path):
+    state_dir = str(tmp_path)
+    segments_path = str(tmp_path / f'transcript_{VIDEO}_matrix_multiplication_segments.json')
+    storage.write_json_artifact(segments_path, {"segments": []})
+    prompt_cache.register_prompt(VIDEO, "matrix multiplication", segments_path, state_dir)
+    prompt_cache.register_prompt(VIDEO, "carbon", segments_path, state_dir)
+
+    match = prompt_cache.find_match(VIDEO, "how to multiply matrices", state_dir=state_dir)
+    assert (match["prompt"], match["segments_path"]) == ("matrix multiplication", segments_path)
+    assert prompt_cache.find_match(VIDEO, "car", state_dir=state_dir) is None
+    assert prompt_cache.find_match('bbbbbbbbbbb', "matrix multiplication", state_dir=state_dir) is None
@@ -0,0 +1,85 @@
+"""
+Tests for the transcript search index: BM25 ranking across videos, window merging, refreshing
+and removing a video.
+
+Usage: python -m pytest backend/test/test_search_index.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'transcript_extraction'))
+
+import search_index
+
+VIDEO_A = 'aaaaaaaaaaa'
+VIDEO_B = 'bbbbbbbbbbb'
+
+# Matrices come up twice in a row in A, once in passing in B
+TRANSCRIPT_A = """00:00:00,000 --> 00:00:05,000
+today we multiply matrices row by column
+
+00:00:05,000 --> 00:00:10,000
+matrix multiplication is not commutative
+
+00:02:00,000 --> 00:02:05,000
+next week we look at eigenvalues
+"""
+
+TRANSCRIPT_B = """00:00:00,000 --> 00:00:05,000
+the cell copies its dna before dividing
+
+00:00:05,000 --> 00:00:10,000
+biologists sometimes store data in a matrix of counts and other tables and spreadsheets
+"""
+
+
+def build_index(state_dir):
+    assert search_index.index_transcript(VIDEO_A, TRANSCRIPT_A, state_dir)
+    assert search_index.index_transcript(VIDEO_B, TRANSCRIPT_B, state_dir)
+
+
+def test_ranks_dense_short_cues_first(tmp_path):
+    state_dir = str(tmp_path)
+    build_index(state_dir)
+
+    results = search_index.search("matrix multiplication", state_dir=state_dir)
+
+    assert [r["video_id"] for r in results] == [VIDEO_A, VIDEO_B]
+    best = results[0]
+    # Adjacent hits of the same video are merged into one window
+    assert (best["start"], best["end"]) == ("00:00:00,000", "00:00:10,000")
+    assert best["matched_terms"] == sorted(search_index.tokenize("matrix multiplication"))
+    assert "commutative" in best["text"]
+    assert best["score"] > results[1]["score"]
+
+
+def test_unknown_terms_and_stopwords_find_nothing(tmp_path):
+    state_dir = str(tmp_path)
+    build_index(state_dir)
+    assert search_index.search("photosynthesis", state_dir=state_dir) == []
+    assert search_index.search("the and of", state_dir=state_dir) == []
+
+
+def test_unchanged_transcript_is_not_reindexed(tmp_path):
+    state_dir = str(tmp_path)
+    build_index(state_dir)
+    assert not search_index.index_transcript(VIDEO_A, TRANSCRIPT_A, state_dir)
+
+    # A changed transcript replaces the old postings of that video
+    assert search_index.index_transcript(VIDEO_A, TRANSCRIPT_A.replace("eigenvalues", "determinants"), state_dir)
+    assert search_index.search("eigenvalues", state_dir=state_dir) == []
+    assert [r["video_id"] for r in search_index.search("determinants", state_dir=state_dir)] == [VIDEO_A]
+
+
+def test_remove_video(tmp_path):
+    state_dir = str(tmp_path)
+    build_index(state_dir)
+    before = search_index.get_index_stats(state_dir)
+
+    search_index.remove_video(VIDEO_A, state_dir)
+
+    assert [r["video_id"] for r in search_index.search("matrix", state_dir=state_dir)] == [VIDEO_B]
+    stats = search_index.get_index_stats(state_dir)
+    assert stats["videos"] == 1
+    assert stats["cues"] == before["cues"] - 3
+    assert stats["postings"] < before["postings"]
@@ -0,0 +1,109 @@
+"""
+Tests for the local repair of model segments: lenient parsing, snapping to cue boundaries,
+clamping to the transcript, merging and salvaging malformed output.
+
+Usage: python -m pytest backend/test/test_segment_postprocess.py
+"""
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'transcript_extraction'))
+
+from segment_postprocess import (CueIndex, clean_model_segments, parse_segments_response,
+                                 parse_timestamp, postprocess_segments)
+
+# Cues of 10s each, from 0:00 to 1:00
+TRANSCRIPT = "\n".join(
+    f"00:00:{start:02d},000 --> 00:00:{start + 10:02d},000\ncue {start}\n"
+    for start in range(0, 50, 10)
+) + "00:00:50,000 --> 00:01:00,000\ncue 50\n"
+
+
+def cue_index() -> CueIndex:
+    return CueIndex.from_transcript(TRANSCRIPT)
+
+
+def segment(start: str, end: str, score: int = 3, title: str = 't') -> dict:
+    return {"start": start, "end": end, "title": title, "summary": "s", "relevance_score": score}
+
+
+def test_cue_index_snaps_to_nearest_boundary():
+    index = cue_index()
+    assert len(index) == 6
+    assert index.duration_ms == 60000
+    assert index.snap_start(14000) == 10000
+    assert index.snap_start(16000) == 20000
+    assert index.snap_end(-5000) == 10000
+    assert index.snap_end(99000) == 60000
+    assert index.end_after(20000) == 30000
+    assert index.end_after(60000) is None
+    assert index.end_before(25000) == 20000
+    assert index.end_before(5000) is None
+
+
+def test_parses_timestamp_variants():
+    assert parse_timestamp("00:01:02,500") == 62500
+    assert parse_timestamp("1:02") == 62000
+    assert parse_timestamp("00:01:02.5") == 62500
+    assert parse_timestamp(12.25) == 12250
+    assert parse_timestamp("soon") is None
+    assert parse_timestamp(True) is None
+    assert parse_timestamp(-1) is None
+
+
+def test_snaps_segments_to_cues():
+    segments, stats = postprocess_segments([segment("00:00:12,000", "00:00:28,000")], cue_index())
+    assert [(s["start"], s["end"]) for s in segments] == [("00:00:10,000", "00:00:30,000")]
+    assert stats["snapped"] == 1
+
+
+def test_segment_inside_one_cue_keeps_that_cue():
+    segments, _ = postprocess_segments([segment("00:00:21,000", "00:00:23,000")], cue_index())
+    assert [(s["start"], s["end"]) for s in segments] == [("00:00:20,000", "00:00:30,000")]
+
+
+def test_clamps_to_transcript_and_drops_what_is_past_it():
+    items = [segment("00:00:48,000", "00:05:00,000"), segment("00:02:00,000", "00:03:00,000")]
+    segments, stats = postprocess_segments(items, cue_index())
+    assert [(s["start"], s["end"]) for s in segments] == [("00:00:50,000", "00:01:00,000")]
+    assert stats["clamped"] == 1
+    assert stats["dropped"] == 1
+
+
+def test_swaps_reversed_ends_and_clamps_scores():
+    segments, _ = postprocess_segments([segment("00:00:30,000", "00:00:10,000", score=9)], cue_index())
+    assert segments == [{"start": "00:00:10,000", "end": "00:00:30,000", "title": "t", "summary": "s",
+                         "relevance_score": 5}]
+
+
+def test_merges_overlapping_segments_keeping_the_best_text():
+    items = [segment("00:00:00,000", "00:00:20,000", score=2, title="low"),
+             segment("00:00:20,000", "00:00:40,000", score=4, title="high"),
+             segment("00:00:50,000", "00:01:00,000", score=1, title="apart")]
+    segments, stats = postprocess_segments(items, cue_index())
+    assert [(s["start"], s["end"], s["title"]) for s in segments] == [
+        ("00:00:00,000", "00:00:40,000", "high"), ("00:00:50,000", "00:01:00,000", "apart")]
+    assert stats["merged"] == 1
+
+
+def test_salvages_truncated_array():
+    text = "```json\n[" + json.dumps(segment("00:00:00,000", "00:00:10,000")) + ', {"start": "00:00:2'
+    items, truncated = parse_segments_response(text)
+    assert truncated
+    assert len(items) == 1
+
+
+def test_accepts_lone_object_and_trailing_text():
+    assert parse_segments_response(json.dumps(segment("0:10", "0:20")))[0][0]["start"] == "0:10"
+    items, truncated = parse_segments_response("[" + json.dumps(segment("0:10", "0:20")) + "] Hope this helps!")
+    assert (len(items), truncated) == (1, False)
+    assert parse_segments_response("no segments found") == ([], True)
+
+
+def test_clean_model_segments_drops_malformed_items():
+    text = json.dumps([segment("00:00:10,000", "00:00:20,000"), {"start": "later"}, "not a segment",
+                       {"start": "0:30", "end": "0:40", "relevance_score": "high"}])
+    segments = clean_model_segments(text, cue_index())
+    assert [(s["start"], s["end"], s["relevance_score"]) for s in segments] == [
+        ("00:00:10,000", "00:00:20,000", 3), ("00:00:30,000", "00:00:40,000", 1)]
@@ -0,0 +1,49 @@
+"""
+Tests for the stage metrics: nearest-rank percentiles, which outcomes count towards latency
+percentiles, and the hedge delay taken from the API latency of a stage.
+
+Usage: python -m pytest backend/test/test_stage_metrics.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'transcript_extraction'))
+
+import stage_metrics
+import resilience
+
+
+def test_percentile_is_nearest_rank():
+    values = list(range(1, 21))
+    assert stage_metrics._percentile(values, 0.95) == 19
+    assert stage_metrics._percentile(values, 0.50) == 10
+    assert stage_metrics._percentile(values, 0.99) == 20
+    assert stage_metrics._percentile(values, 0.0) == 1
+    assert stage_metrics._percentile([7], 0.95) == 7
+    assert stage_metrics._percentile([], 0.95) is None
+
+
+def test_latency_percentile_counts_successes_only(tmp_path):
+    state_dir = str(tmp_path)
+    for duration_ms in range(1, 21):
+        stage_metrics.record_stage('llm_segments', 'success', duration_ms * 100, state_dir=state_dir)
+    # Failures and other stages do not move the percentile
+    stage_metrics.record_stage('llm_segments', 'timeout', 60000, state_dir=state_dir)
+    stage_metrics.record_stage('llm_segments_api', 'success', 90000, state_dir=state_dir)
+
+    assert stage_metrics.get_latency_percentile('llm_segments', 0.95, state_dir=state_dir) == 1900
+    assert stage_metrics.get_latency_percentile('llm_segments', 0.95, min_samples=21, state_dir=state_dir) is None
+
+
+def test_hedge_delay_uses_api_latency(monkeypatch):
+    asked = []
+
+    def percentile(stage, pct):
+        asked.append(stage)
+        return 8000
+
+    monkeypatch.setattr(resilience, 'LLM_HEDGE_ENABLED', True)
+    monkeypatch.setattr(resilience, 'get_latency_percentile', percentile)
+
+    assert resilience.get_hedge_delay('llm_segments') == 8.0
+    assert asked == ['llm_segments_api']
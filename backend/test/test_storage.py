@@ -0,0 +1,152 @@
+"""
+Tests for the artifact storage helpers: compressed round trips, logical path resolution and
+Accept-Encoding negotiation.
+
+Usage: python -m pytest backend/test/test_storage.py
+"""
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'transcript_extraction'))
+
+import storage
+import cache_manager
+
+
+@pytest.fixture
+def codec(request, monkeypatch):
+    """Write artifacts with the codec named by the test parameter."""
+    if request.param == 'zstd' and storage.load_zstandard() is None:
+        pytest.skip("zstandard is not installed")
+    monkeypatch.setattr(storage, 'STORAGE_COMPRESSION', request.param)
+    return request.param
+
+
+@pytest.mark.parametrize('codec', ['gzip', 'zstd', 'none'], indirect=True)
+def test_round_trips(tmp_path, codec):
+    path = str(tmp_path / 'transcript_abc.txt')
+    stored_path = storage.write_text_artifact(path, "héllo\nworld")
+    assert stored_path == path + storage.CODEC_SUFFIXES.get(codec, '')
+    assert storage.codec_for_path(stored_path) == (None if codec == 'none' else codec)
+    assert storage.read_text_artifact(path) == "héllo\nworld"
+    assert ''.join(storage.open_text_stream(path, chunk_chars=3)) == "héllo\nworld"
+
+    json_path = str(tmp_path / 'transcript_abc_q_segments.json')
+    storage.write_json_artifact(json_path, {"segments": [{"start": 1.5, "text": "ü"}]})
+    assert storage.read_json_artifact(json_path) == {"segments": [{"start": 1.5, "text": "ü"}]}
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+
+
+def test_concurrent_writes_of_one_artifact_do_not_collide(tmp_path, monkeypatch):
+    path = str(tmp_path / 'transcript_abc.txt')
+    monkeypatch.setattr(storage, 'STORAGE_COMPRESSION', 'gzip')
+    errors = []
+
+    def write(n):
+        try:
+            for _ in range(20):
+                storage.write_text_artifact(path, f"writer {n}")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert storage.read_text_artifact(path).startswith("writer ")
+    assert os.listdir(tmp_path) == ['transcript_abc.txt.gz']
+
+
+def test_failed_write_removes_its_temporary_file(tmp_path, monkeypatch):
+    path = str(tmp_path / 'transcript_abc.txt')
+    storage.write_text_artifact(path, "old")
+    temporary_names = []
+
+    def failing_replace(src, dst):
+        temporary_names.append(os.path.basename(src))
+        raise OSError("disk full")
+
+    monkeypatch.setattr(storage.os, 'replace', failing_replace)
+    with pytest.raises(OSError):
+        storage.write_text_artifact(path, "new")
+    monkeypatch.undo()
+
+    # The temporary name is one the cache's stray file cleanup recognises
+    assert cache_manager.STRAY_FILE_PATTERN.match(temporary_names[0])
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+    assert storage.read_text_artifact(path) == "old"
+
+
+def test_resolves_logical_path_to_any_encoding(tmp_path, monkeypatch):
+    path = str(tmp_path / 'transcript_abc.txt')
+    assert storage.resolve_artifact_path(path) is None
+    assert not storage.artifact_exists(path)
+    with pytest.raises(FileNotFoundError):
+        storage.read_bytes_artifact(path)
+
+    # Plain files from older versions are still found and read
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("plain")
+    assert storage.resolve_artifact_path(path) == path
+    assert storage.read_text_artifact(path) == "plain"
+
+    # Rewriting compressed replaces the plain copy
+    monkeypatch.setattr(storage, 'STORAGE_COMPRESSION', 'gzip')
+    storage.write_text_artifact(path, "compressed")
+    assert storage.resolve_artifact_path(path) == path + '.gz'
+    assert not os.path.exists(path)
+    assert storage.read_text_artifact(path) == "compressed"
+
+    storage.remove_artifact(path)
+    assert not storage.artifact_exists(path)
+
+
+def test_digest_is_independent_of_encoding(tmp_path, monkeypatch):
+    path = str(tmp_path / 'transcript_abc.txt')
+    monkeypatch.setattr(storage, 'STORAGE_COMPRESSION', 'gzip')
+    storage.write_text_artifact(path, "same content")
+    compressed = storage.artifact_digest(path)
+    monkeypatch.setattr(storage, 'STORAGE_COMPRESSION', 'none')
+    storage.write_text_artifact(path, "same content")
+    assert storage.artifact_digest(path) == compressed
+
+
+@pytest.mark.parametrize('accept_encoding,expected', [
+    ('gzip', 'gzip'),
+    ('deflate, GZIP', 'gzip'),
+    ('gzip;q=0.5, br', 'gzip'),
+    ('gzip;q=0', None),
+    ('gzip; q=0.0, br', None),
+    ('gzip;q=bogus', None),
+    ('br, deflate', None),
+    ('*', 'gzip'),
+    ('*;q=0', None),
+    ('gzip;q=0, *', None),
+    ('br, *;q=0.1', 'gzip'),
+    ('', None),
+])
+def test_negotiates_gzip_with_q_values(accept_encoding, expected):
+    assert storage.negotiate_encoding('transcript_abc.txt.gz', accept_encoding) == expected
+
+
+def test_plain_artifact_is_never_encoded():
+    assert storage.negotiate_encoding('transcript_abc.txt', 'gzip, zstd') is None
+
+
+def test_serves_stored_bytes_or_decompresses(tmp_path, monkeypatch):
+    path = str(tmp_path / 'transcript_abc_q_segments.json')
+    monkeypatch.setattr(storage, 'STORAGE_COMPRESSION', 'gzip')
+    stored_path = storage.write_json_artifact(path, {"a": 1}, pretty=False)
+    with open(stored_path, 'rb') as f:
+        stored = f.read()
+
+    assert storage.read_encoded_artifact(path, 'gzip, deflate') == (stored, 'gzip')
+    body, content_encoding = storage.read_encoded_artifact(path, 'gzip;q=0')
+    assert content_encoding is None
+    assert storage.decompress_bytes(stored, 'gzip') == body
@@ -0,0 +1,98 @@
+"""
+Tests for the native caption parsers: json3/srv3 words, closing the gaps between words, and
+grouping words into cues at sentence ends, pauses (CUE_PAUSE_MS) and the length limit (CUE_MAX_MS).
+
+Usage: python -m pytest backend/test/test_transcript_fetch.py
+"""
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'transcript_extraction'))
+
+import transcript_fetch
+from transcript_fetch import parse_json3_words, parse_srv3_words, build_cues_from_words
+
+
+def word(start_ms: int, end_ms: int, text: str) -> dict:
+    return {'start_ms': start_ms, 'end_ms': end_ms, 'text': text}
+
+
+def test_parses_json3_words():
+    json3 = json.dumps({"events": [
+        {"tStartMs": 0, "dDurationMs": 4000, "segs": [{"utf8": "hello"}, {"utf8": " world", "tOffsetMs": 500}]},
+        # Line-break events and events without timing carry no words
+        {"tStartMs": 2000, "segs": [{"utf8": "\n"}]},
+        {"segs": [{"utf8": "untimed"}]},
+        {"tStartMs": 1000, "dDurationMs": 3000, "segs": [{"utf8": "again"}]},
+    ]})
+
+    words = parse_json3_words(json3)
+
+    # Sorted by start; each word ends no later than the next one starts
+    assert words == [word(0, 500, 'hello'), word(500, 1000, 'world'), word(1000, 4000, 'again')]
+
+
+def test_parses_srv3_words_and_untimed_paragraphs():
+    srv3 = """<timedtext format="3"><body>
+      <p t="1000" d="3000"><s>first</s><s t="600"> second</s></p>
+      <p t="5000" d="2000">a manual line</p>
+      <p t="7000" d="500"> </p>
+    </body></timedtext>"""
+
+    words = parse_srv3_words(srv3)
+
+    assert words == [word(1000, 1600, 'first'), word(1600, 4000, 'second'), word(5000, 7000, 'a manual line')]
+
+
+def test_closes_overlapping_words():
+    words = parse_json3_words(json.dumps({"events": [
+        {"tStartMs": 0, "dDurationMs": 5000, "segs": [{"utf8": "a"}]},
+        {"tStartMs": 0, "dDurationMs": 5000, "segs": [{"utf8": "b", "tOffsetMs": 0}]},
+        {"tStartMs": 3000, "dDurationMs": 1000, "segs": [{"utf8": "c"}]},
+    ]}))
+
+    # Words starting together get zero length instead of ending before they start
+    assert [(w['start_ms'], w['end_ms']) for w in words] == [(0, 0), (0, 3000), (3000, 4000)]
+
+
+def test_cue_ends_at_sentence_punctuation():
+    cues = build_cues_from_words([word(0, 500, 'Hi'), word(500, 900, 'there.'), word(900, 1500, 'Next')])
+
+    assert [c['text'] for c in cues] == ['Hi there.', 'Next']
+    assert (cues[0]['start'], cues[0]['end']) == ('00:00:00,000', '00:00:00,900')
+    assert [c['index'] for c in cues] == [1, 2]
+
+
+def test_cue_ends_at_pause():
+    words = [word(0, 400, 'one'), word(400, 1000, 'two'),
+             word(1000 + transcript_fetch.CUE_PAUSE_MS, 3000, 'three')]
+
+    assert [c['text'] for c in build_cues_from_words(words)] == ['one two', 'three']
+    # A shorter silence keeps the words together
+    assert [c['text'] for c in build_cues_from_words(words, pause_ms=transcript_fetch.CUE_PAUSE_MS + 1)] == ['one two three']
+
+
+def test_long_speech_is_split_at_max_length():
+    words = [word(i * 1000, (i + 1) * 1000, f'w{i}') for i in range(20)]
+
+    cues = build_cues_from_words(words, max_cue_ms=8000)
+
+    assert [c['text'].split()[0] for c in cues] == ['w0', 'w8', 'w16']
+    assert all(transcript_fetch.time_to_millis(c['end']) - transcript_fetch.time_to_millis(c['start']) <= 8000
+               for c in cues)
+    # Cues do not overlap
+    ends = [transcript_fetch.time_to_millis(c['end']) for c in cues]
+    starts = [transcript_fetch.time_to_millis(c['start']) for c in cues]
+    assert all(end <= next_start for end, next_start in zip(ends, starts[1:]))
+
+
+def test_native_captions_round_trip_through_cleaned_format():
+    json3 = json.dumps({"events": [
+        {"tStartMs": 0, "dDurationMs": 2000, "segs": [{"utf8": "Hello"}, {"utf8": " everyone.", "tOffsetMs": 800}]},
+        {"tStartMs": 5000, "dDurationMs": 1000, "segs": [{"utf8": "Welcome"}]},
+    ]})
+
+    cues = transcript_fetch.parse_cleaned_transcript(transcript_fetch.clean_native_captions(json3, '.json3'))
+
+    assert [(c['start_ms'], c['end_ms'], c['text']) for c in cues] == [(0, 2000, 'Hello everyone.'), (5000, 6000, 'Welcome')]
@@ -0,0 +1,149 @@
+"""
+Access counts of (video, prompt) pairs requested through /api/get.
+Prompts are counted under their canonical form (see prompt_cache.canonicalize), so rephrasings of
+one question add up, in daily buckets so that popularity can be read over a recent window. The
+off-peak precomputation (precompute.py) refreshes the results of the most requested pairs.
+"""
+import os
+import time
+import random
+from typing import Optional, List, Dict
+
+from state_store import get_connection
+from prompt_cache import canonicalize
+
+ACCESS_DB_NAME = 'access_log.sqlite3'
+
+# Set to false to stop counting requests
+ACCESS_LOG_ENABLED = os.getenv('ACCESS_LOG_ENABLED', 'true').lower() in ('true', '1', 'yes', 'on')
+# Daily buckets older than this are pruned
+ACCESS_LOG_RETENTION_DAYS = int(os.getenv('ACCESS_LOG_RETENTION_DAYS', '30'))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS query_hits (
+    video_id TEXT NOT NULL,
+    canonical TEXT NOT NULL,
+    day INTEGER NOT NULL,
+    hits INTEGER NOT NULL,
+    prompt TEXT NOT NULL,
+    last_seen REAL NOT NULL,
+    PRIMARY KEY (video_id, canonical, day)
+);
+CREATE INDEX IF NOT EXISTS query_hits_by_day ON query_hits (day);
+"""
+
+_schema_ready = set()
+
+
+def _connect(state_dir: Optional[str] = None):
+    """Open the access log database, creating the schema on first use."""
+    conn = get_connection(ACCESS_DB_NAME, state_dir)
+    key = state_dir or ''
+    if key not in _schema_ready:
+        conn.executescript(SCHEMA)
+        _schema_ready.add(key)
+    return conn
+
+
+def query_key(prompt: str) -> str:
+    """
+    Normalized form prompts are counted under: the canonical terms, or the lowercased prompt
+    when it has no terms left (e.g. only stopwords).
+
+    Args:
+        prompt (str): User's prompt
+
+    Returns:
+        str: Counting key
+    """
+    return canonicalize(prompt) or " ".join(prompt.lower().split())
+
+
+def record_access(video_id: str, prompt: str, state_dir: Optional[str] = None) -> None:
+    """
+    Count one request for a video and prompt. Logging failures never affect the caller.
+
+    Args:
+        video_id (str): YouTube video ID
+        prompt (str): The requested prompt (the latest phrasing is kept for precomputation)
+        state_dir (str, optional): Directory holding the access log database
+    """
+    if not ACCESS_LOG_ENABLED:
+        return
+    try:
+        conn = _connect(state_dir)
+        try:
+            with conn:
+                now = time.time()
+                day = int(now // 86400)
+                conn.execute("INSERT INTO query_hits VALUES (?, ?, ?, 1, ?, ?) "
+                             "ON CONFLICT (video_id, canonical, day) DO UPDATE "
+                             "SET hits = hits + 1, prompt = excluded.prompt, last_seen = excluded.last_seen",
+                             (video_id, query_key(prompt), day, prompt, now))
+                # Prune old buckets now and then instead of on every write
+                if random.random() < 0.01:
+                    conn.execute("DELETE FROM query_hits WHERE day < ?", (day - ACCESS_LOG_RETENTION_DAYS,))
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"[ACCESS LOG] Failed to record {video_id}: {str(e)}")
+
+
+def top_queries(limit: int, window_days: float = 7, min_hits: int = 1,
+                state_dir: Optional[str] = None) -> List[Dict]:
+    """
+    Get the most requested (video, prompt) pairs of a recent window.
+
+    Args:
+        limit (int): Number of pairs to return
+        window_days (float): Only count requests from this many days back (whole daily buckets)
+        min_hits (int): Leave out pairs requested fewer times
+        state_dir (str, optional): Directory holding the access log database
+
+    Returns:
+        List[Dict]: video_id, canonical, prompt (latest phrasing), hits and last_seen, most requested first
+    """
+    first_day = int((time.time() - window_days * 86400) // 86400)
+    conn = _connect(state_dir)
+    try:
+        # The bare prompt column is taken from the row holding MAX(last_seen)
+        rows = conn.execute(
+            """SELECT video_id, canonical, prompt, SUM(hits) AS hits, MAX(last_seen) AS last_seen
+               FROM query_hits WHERE day >= ?
+               GROUP BY video_id, canonical HAVING SUM(hits) >= ?
+               ORDER BY hits DESC, last_seen DESC LIMIT ?""",
+            (first_day, min_hits, limit)
+        ).fetchall()
+    finally:
+        conn.close()
+    return [dict(row) for row in rows]
+
+
+def get_access_stats(window_days: float = 7, state_dir: Optional[str] = None) -> Dict:
+    """
+    Summarize how concentrated recent traffic is.
+
+    Args:
+        window_days (float): Only count requests from this many days back
+        state_dir (str, optional): Directory holding the access log database
+
+    Returns:
+        Dict: Total requests, distinct pairs and the share of requests going to the top 10/50 pairs
+    """
+    first_day = int((time.time() - window_days * 86400) // 86400)
+    conn = _connect(state_dir)
+    try:
+        counts = [row[0] for row in conn.execute(
+            "SELECT SUM(hits) FROM query_hits WHERE day >= ? GROUP BY video_id, canonical ORDER BY 1 DESC",
+            (first_day,)
+        ).fetchall()]
+    finally:
+        conn.close()
+    total = sum(counts)
+    return {
+        "window_days": window_days,
+        "requests": total,
+        "distinct_queries": len(counts),
+        "top_10_share": round(sum(counts[:10]) / total, 3) if total else None,
+        "top_50_share": round(sum(counts[:50]) / total, 3) if total else None
+    }
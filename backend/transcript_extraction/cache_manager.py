@@ -0,0 +1,350 @@
+"""
+Cache manager for the temporary_files working store.
+Keeps the transcript/segment cache within a byte budget and an entry count by evicting
+least-recently-used artifacts, while pinning transcripts that still have segment results.
+"""
+import os
+import re
+import time
+import heapq
+import threading
+from typing import Optional, List, Dict
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(__file__), 'temporary_files')
+
+# Budget configuration (overridable through the environment)
+CACHE_MAX_BYTES = int(os.getenv('CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', '5000'))
+CACHE_MIN_AGE_SECONDS = int(os.getenv('CACHE_MIN_AGE_SECONDS', '60'))
+CACHE_COMPACTION_INTERVAL = int(os.getenv('CACHE_COMPACTION_INTERVAL', '300'))
+
+# Artifact naming patterns inside the cache directory (optionally compressed, see storage.py)
+SEGMENTS_PATTERN = re.compile(r'^transcript_([0-9A-Za-z_-]{11})_.+_segments\.json(\.gz|\.zst)?$')
+TRANSCRIPT_PATTERN = re.compile(r'^transcript_([0-9A-Za-z_-]{11})\.txt(\.gz|\.zst)?$')
+RAW_TRANSCRIPT_PATTERN = re.compile(r'^raw_transcript_([0-9A-Za-z_-]{11})\.txt(\.gz|\.zst)?$')
+CHAPTERS_PATTERN = re.compile(r'^chapters_([0-9A-Za-z_-]{11})\.json(\.gz|\.zst)?$')
+OUTLINE_PATTERN = re.compile(r'^outline_([0-9A-Za-z_-]{11})\.json(\.gz|\.zst)?$')
+STRAY_FILE_PATTERN = re.compile(r'^(transcript.*\.(srt|json3|srv3)|.*\.tmp)$')
+
+_compaction_lock = threading.Lock()
+_compaction_thread = None
+_last_compaction = {}
+
+
+def classify_artifact(filename: str) -> Optional[Dict]:
+    """
+    Classify a file in the cache directory.
+
+    Args:
+        filename (str): Name of the file (no directory)
+
+    Returns:
+        Optional[Dict]: Dictionary with kind and video_id, or None if the file is not a managed artifact
+    """
+    match = SEGMENTS_PATTERN.match(filename)
+    if match:
+        return {"kind": "segments", "video_id": match.group(1)}
+    match = TRANSCRIPT_PATTERN.match(filename)
+    if match:
+        return {"kind": "transcript", "video_id": match.group(1)}
+    match = RAW_TRANSCRIPT_PATTERN.match(filename)
+    if match:
+        return {"kind": "raw_transcript", "video_id": match.group(1)}
+    match = CHAPTERS_PATTERN.match(filename)
+    if match:
+        return {"kind": "chapters", "video_id": match.group(1)}
+    match = OUTLINE_PATTERN.match(filename)
+    if match:
+        return {"kind": "outline", "video_id": match.group(1)}
+    return None
+
+
+def touch_artifact(path: str) -> None:
+    """
+    Mark an artifact as recently used by bumping its access time (modification time is kept).
+
+    Args:
+        path (str): Path to the artifact
+    """
+    try:
+        st = os.stat(path)
+        os.utime(path, (time.time(), st.st_mtime))
+    except OSError:
+        pass
+
+
+def list_artifacts(cache_dir: Optional[str] = None) -> List[Dict]:
+    """
+    List all managed artifacts in the cache directory.
+
+    Args:
+        cache_dir (str, optional): Cache directory. Defaults to temporary_files.
+
+    Returns:
+        List[Dict]: Artifacts with name, path, kind, video_id, size, atime and mtime
+    """
+    if cache_dir is None:
+        cache_dir = DEFAULT_CACHE_DIR
+    if not os.path.isdir(cache_dir):
+        return []
+
+    artifacts = []
+    with os.scandir(cache_dir) as entries:
+        for entry in entries:
+            if not entry.is_file():
+                continue
+            info = classify_artifact(entry.name)
+            if info is None:
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            artifacts.append({
+                "name": entry.name,
+                "path": entry.path,
+                "kind": info["kind"],
+                "video_id": info["video_id"],
+                "size": st.st_size,
+                "atime": max(st.st_atime, st.st_mtime),
+                "mtime": st.st_mtime
+            })
+    return artifacts
+
+
+def get_cache_stats(cache_dir: Optional[str] = None) -> Dict:
+    """
+    Compute usage statistics for the cache directory.
+
+    Args:
+        cache_dir (str, optional): Cache directory. Defaults to temporary_files.
+
+    Returns:
+        Dict: Byte and entry usage, per-kind breakdown, pin count, budget and last compaction result
+    """
+    artifacts = list_artifacts(cache_dir)
+    by_kind = {}
+    for artifact in artifacts:
+        kind_stats = by_kind.setdefault(artifact["kind"], {"entries": 0, "bytes": 0})
+        kind_stats["entries"] += 1
+        kind_stats["bytes"] += artifact["size"]
+
+    videos_with_segments = {a["video_id"] for a in artifacts if a["kind"] == "segments"}
+    pinned = sum(1 for a in artifacts if a["kind"] == "transcript" and a["video_id"] in videos_with_segments)
+    total_bytes = sum(a["size"] for a in artifacts)
+
+    return {
+        "total_bytes": total_bytes,
+        "total_entries": len(artifacts),
+        "max_bytes": CACHE_MAX_BYTES,
+        "max_entries": CACHE_MAX_ENTRIES,
+        "bytes_utilization": round(total_bytes / CACHE_MAX_BYTES, 4) if CACHE_MAX_BYTES else None,
+        "pinned_transcripts": pinned,
+        "by_kind": by_kind,
+        "last_compaction": dict(_last_compaction)
+    }
+
+
+def remove_stray_files(cache_dir: Optional[str] = None, min_age: int = CACHE_MIN_AGE_SECONDS) -> int:
+    """
+    Remove leftover subtitle downloads and partial writes from interrupted fetches.
+
+    Args:
+        cache_dir (str, optional): Cache directory. Defaults to temporary_files.
+        min_age (int): Only remove files older than this many seconds
+
+    Returns:
+        int: Number of files removed
+    """
+    if cache_dir is None:
+        cache_dir = DEFAULT_CACHE_DIR
+    if not os.path.isdir(cache_dir):
+        return 0
+
+    removed = 0
+    now = time.time()
+    with os.scandir(cache_dir) as entries:
+        for entry in entries:
+            if not entry.is_file() or not STRAY_FILE_PATTERN.match(entry.name):
+                continue
+            try:
+                if now - entry.stat().st_mtime >= min_age:
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError:
+                continue
+    return removed
+
+
+def remove_segments(video_id: str, cache_dir: Optional[str] = None) -> int:
+    """
+    Remove every cached segment result of a video (e.g. after its transcript changed).
+
+    Args:
+        video_id (str): YouTube video ID
+        cache_dir (str, optional): Cache directory. Defaults to temporary_files.
+
+    Returns:
+        int: Number of segment results removed
+    """
+    removed = 0
+    for artifact in list_artifacts(cache_dir):
+        if artifact["kind"] != "segments" or artifact["video_id"] != video_id:
+            continue
+        try:
+            os.remove(artifact["path"])
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def _remove_from_search_index(video_id: str) -> None:
+    """Drop an evicted transcript from the search index so search only returns cached videos."""
+    try:
+        from search_index import remove_video
+        remove_video(video_id)
+    except Exception as e:
+        print(f"[CACHE] Failed to remove {video_id} from search index: {str(e)}")
+
+
+def enforce_cache_budget(cache_dir: Optional[str] = None,
+                         max_bytes: Optional[int] = None,
+                         max_entries: Optional[int] = None,
+                         min_age: int = CACHE_MIN_AGE_SECONDS) -> Dict:
+    """
+    Evict least-recently-used artifacts until the cache fits its byte and entry budget.
+    Transcripts are pinned while any segment result for the same video remains; once the
+    last segment result of a video is evicted its transcript becomes evictable again.
+    Artifacts written less than min_age seconds ago are never evicted.
+
+    Args:
+        cache_dir (str, optional): Cache directory. Defaults to temporary_files.
+        max_bytes (int, optional): Byte budget. Defaults to CACHE_MAX_BYTES.
+        max_entries (int, optional): Entry budget. Defaults to CACHE_MAX_ENTRIES.
+        min_age (int): Grace period in seconds for freshly written artifacts
+
+    Returns:
+        Dict: Summary of the eviction pass
+    """
+    if max_bytes is None:
+        max_bytes = CACHE_MAX_BYTES
+    if max_entries is None:
+        max_entries = CACHE_MAX_ENTRIES
+
+    artifacts = list_artifacts(cache_dir)
+    total_bytes = sum(a["size"] for a in artifacts)
+    total_entries = len(artifacts)
+
+    segment_counts = {}
+    for artifact in artifacts:
+        if artifact["kind"] == "segments":
+            segment_counts[artifact["video_id"]] = segment_counts.get(artifact["video_id"], 0) + 1
+
+    # Min-heap ordered by last access; pinned transcripts are parked until unpinned
+    heap = [(a["atime"], i) for i, a in enumerate(artifacts)]
+    heapq.heapify(heap)
+    parked = {}
+    now = time.time()
+    evicted = []
+
+    while heap and (total_bytes > max_bytes or total_entries > max_entries):
+        _, i = heapq.heappop(heap)
+        artifact = artifacts[i]
+        if now - artifact["mtime"] < min_age:
+            continue
+        if artifact["kind"] == "transcript" and segment_counts.get(artifact["video_id"], 0) > 0:
+            parked.setdefault(artifact["video_id"], []).append(i)
+            continue
+        try:
+            os.remove(artifact["path"])
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"[CACHE] Failed to evict {artifact['name']}: {str(e)}")
+            continue
+
+        total_bytes -= artifact["size"]
+        total_entries -= 1
+        evicted.append(artifact["name"])
+
+        if artifact["kind"] == "transcript":
+            _remove_from_search_index(artifact["video_id"])
+
+        if artifact["kind"] == "segments":
+            video_id = artifact["video_id"]
+            segment_counts[video_id] -= 1
+            if segment_counts[video_id] == 0:
+                for j in parked.pop(video_id, []):
+                    heapq.heappush(heap, (artifacts[j]["atime"], j))
+
+    summary = {
+        "evicted": len(evicted),
+        "evicted_files": evicted,
+        "total_bytes": total_bytes,
+        "total_entries": total_entries,
+        "over_budget": total_bytes > max_bytes or total_entries > max_entries
+    }
+    if evicted:
+        print(f"[CACHE] Evicted {len(evicted)} artifacts, cache now {total_bytes} bytes / {total_entries} entries")
+    if summary["over_budget"]:
+        print("[CACHE] Cache still over budget after eviction (remaining entries are pinned or too new)")
+    return summary
+
+
+def compact_cache(cache_dir: Optional[str] = None) -> Dict:
+    """
+    Run one compaction pass: clean up stray files, then enforce the budget.
+
+    Args:
+        cache_dir (str, optional): Cache directory. Defaults to temporary_files.
+
+    Returns:
+        Dict: Summary of the compaction pass
+    """
+    with _compaction_lock:
+        started = time.time()
+        stray_removed = remove_stray_files(cache_dir)
+        summary = enforce_cache_budget(cache_dir)
+        summary.pop("evicted_files", None)
+        summary["stray_removed"] = stray_removed
+        summary["finished_at"] = time.time()
+        summary["duration_ms"] = int((summary["finished_at"] - started) * 1000)
+        _last_compaction.clear()
+        _last_compaction.update(summary)
+        return summary
+
+
+def start_background_compaction(cache_dir: Optional[str] = None,
+                                interval: int = CACHE_COMPACTION_INTERVAL) -> threading.Thread:
+    """
+    Start a daemon thread that periodically compacts the cache. Safe to call more than once.
+
+    Args:
+        cache_dir (str, optional): Cache directory. Defaults to temporary_files.
+        interval (int): Seconds between compaction passes
+
+    Returns:
+        threading.Thread: The compaction thread
+    """
+    global _compaction_thread
+    if _compaction_thread is not None and _compaction_thread.is_alive():
+        return _compaction_thread
+
+    def _run():
+        while True:
+            try:
+                compact_cache(cache_dir)
+            except Exception as e:
+                print(f"[CACHE] Compaction failed: {str(e)}")
+            time.sleep(interval)
+
+    _compaction_thread = threading.Thread(target=_run, name="cache-compaction", daemon=True)
+    _compaction_thread.start()
+    return _compaction_thread
+
+
+if __name__ == "__main__":
+    import json
+    print(json.dumps(compact_cache(), indent=2))
+    print(json.dumps(get_cache_stats(), indent=2))
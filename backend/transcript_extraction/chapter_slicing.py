@@ -0,0 +1,166 @@
+"""
+Chapter-scoped transcript slicing.
+Ranks a video's YouTube chapters against the prompt locally and keeps only the transcript cues
+inside the best chapters (plus a margin), so Claude reads a fraction of a well-chaptered lecture.
+Chapters are cached next to the transcript as chapters_{video_id}.json.
+"""
+import os
+import math
+from typing import Optional, List, Dict, Tuple
+
+from storage import resolve_artifact_path, read_json_artifact, write_json_artifact
+from text_utils import tokenize
+from transcript_fetch import parse_cleaned_transcript, format_srt, extract_video_id
+
+CHAPTER_SLICING = os.getenv('CHAPTER_SLICING', 'true').lower() in ('true', '1', 'yes', 'on')
+CHAPTER_TOP_K = int(os.getenv('CHAPTER_TOP_K', '2'))
+CHAPTER_MARGIN_SECONDS = float(os.getenv('CHAPTER_MARGIN_SECONDS', '30'))
+# Slicing is skipped when the selected chapters would keep more than this share of the cues
+CHAPTER_MAX_KEEP_RATIO = float(os.getenv('CHAPTER_MAX_KEEP_RATIO', '0.8'))
+
+TEMP_DIR = os.path.join(os.path.dirname(__file__), 'temporary_files')
+
+
+def chapters_path(video_id: str) -> str:
+    """Logical path of a video's cached chapter list."""
+    return os.path.join(TEMP_DIR, f'chapters_{video_id}.json')
+
+
+def normalize_chapters(raw_chapters: Optional[List[Dict]]) -> List[Dict]:
+    """
+    Reduce yt-dlp chapter entries to title, start_time and end_time (seconds).
+
+    Args:
+        raw_chapters (List[Dict], optional): The 'chapters' field of yt-dlp video info
+
+    Returns:
+        List[Dict]: Chapters with title, start_time and end_time
+    """
+    return [{
+        'title': chapter.get('title', ''),
+        'start_time': chapter.get('start_time', 0),
+        'end_time': chapter.get('end_time', 0)
+    } for chapter in (raw_chapters or [])]
+
+
+def save_chapters(video_id: str, chapters: List[Dict]) -> None:
+    """
+    Cache a video's chapters (an empty list records that the video has none).
+
+    Args:
+        video_id (str): YouTube video ID
+        chapters (List[Dict]): Normalized chapters
+    """
+    write_json_artifact(chapters_path(video_id), chapters)
+
+
+def load_chapters(video_url: str) -> List[Dict]:
+    """
+    Get a video's chapters from the cache, fetching them with yt_dlp if they are not cached.
+
+    Args:
+        video_url (str): The YouTube video URL
+
+    Returns:
+        List[Dict]: Chapters with title, start_time and end_time (empty if unavailable)
+    """
+    video_id = extract_video_id(video_url)
+    if resolve_artifact_path(chapters_path(video_id)):
+        return read_json_artifact(chapters_path(video_id))
+
+    try:
+        import yt_dlp
+        from resilience import call_with_retries, is_retryable_fetch_error
+
+        def extract(timeout: float) -> Dict:
+            with yt_dlp.YoutubeDL({'quiet': True, 'no_warnings': True, 'skip_download': True,
+                                   'socket_timeout': timeout}) as ydl:
+                return ydl.extract_info(video_url, download=False)
+
+        info = call_with_retries('youtube_chapters', extract, is_retryable_fetch_error, breaker='youtube')
+        chapters = normalize_chapters(info.get('chapters'))
+        save_chapters(video_id, chapters)
+        return chapters
+    except Exception as e:
+        print(f"Warning: could not fetch chapters for {video_id}: {str(e)}")
+        return []
+
+
+def rank_chapters(chapters: List[Dict], user_prompt: str) -> List[Tuple[float, Dict]]:
+    """
+    Score chapter titles against the prompt; terms that appear in fewer chapters weigh more.
+
+    Args:
+        chapters (List[Dict]): Chapters with title
+        user_prompt (str): User's prompt
+
+    Returns:
+        List[Tuple[float, Dict]]: (score, chapter) pairs with a positive score, best first
+    """
+    terms = set(tokenize(user_prompt))
+    if not terms or not chapters:
+        return []
+    chapter_terms = [set(tokenize(chapter['title'])) for chapter in chapters]
+    ranked = []
+    for chapter, title_terms in zip(chapters, chapter_terms):
+        score = 0.0
+        for term in terms & title_terms:
+            df = sum(1 for other in chapter_terms if term in other)
+            score += math.log(1 + len(chapters) / df)
+        if score > 0:
+            ranked.append((score, chapter))
+    ranked.sort(key=lambda pair: (-pair[0], pair[1]['start_time']))
+    return ranked
+
+
+def slice_transcript(transcript_content: str, chapters: List[Dict], user_prompt: str,
+                     top_k: int = CHAPTER_TOP_K, margin_seconds: float = CHAPTER_MARGIN_SECONDS) -> Tuple[str, Optional[Dict]]:
+    """
+    Keep only the cues inside the chapters that best match the prompt, plus a margin.
+    Timestamps are unchanged, so segments found in the slice refer to the full video.
+
+    Args:
+        transcript_content (str): Cleaned transcript content
+        chapters (List[Dict]): Chapters with title, start_time and end_time
+        user_prompt (str): User's prompt
+        top_k (int): Number of best chapters to keep
+        margin_seconds (float): Extra context kept around each chapter
+
+    Returns:
+        Tuple[str, Optional[Dict]]: The transcript to analyze and a description of the slice,
+        or the full transcript and None if no chapter matches or slicing would not save much
+    """
+    ranked = rank_chapters(chapters, user_prompt)[:top_k]
+    if not ranked:
+        return transcript_content, None
+
+    windows = [((chapter['start_time'] - margin_seconds) * 1000, (chapter['end_time'] + margin_seconds) * 1000)
+               for _, chapter in ranked]
+    cues = parse_cleaned_transcript(transcript_content)
+    kept = [cue for cue in cues
+            if any(cue['start_ms'] < window_end and cue['end_ms'] > window_start for window_start, window_end in windows)]
+    if not kept or len(kept) > CHAPTER_MAX_KEEP_RATIO * len(cues):
+        return transcript_content, None
+
+    return format_srt(kept), {
+        'chapters': [chapter['title'] for _, chapter in ranked],
+        'cues_kept': len(kept),
+        'cues_total': len(cues)
+    }
+
+
+def slice_for_prompt(video_url: str, transcript_content: str, user_prompt: str) -> Tuple[str, Optional[Dict]]:
+    """
+    Slice a transcript to the chapters relevant to the prompt, if slicing is enabled.
+
+    Args:
+        video_url (str): The YouTube video URL
+        transcript_content (str): Cleaned transcript content
+        user_prompt (str): User's prompt
+
+    Returns:
+        Tuple[str, Optional[Dict]]: The transcript to analyze and a description of the slice (None if not sliced)
+    """
+    if not CHAPTER_SLICING:
+        return transcript_content, None
+    return slice_transcript(transcript_content, load_chapters(video_url), user_prompt)
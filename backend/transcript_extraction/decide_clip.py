@@ -3,26 +3,29 @@ Script to analyze video transcripts using Claude 4 Sonnet and identify segments
 Automatically fetches transcript from YouTube URL and analyzes it.
 """
 import os
-import json
 import sys
-import subprocess
-from typing import List, Dict
-import anthropic
-from dotenv import load_dotenv
+from typing import List, Dict, Optional
+from cache_manager import touch_artifact
+from storage import resolve_artifact_path, read_text_artifact, write_json_artifact
+from llm_client import create_message, estimate_input_tokens
+from model_router import routed_call, segments_need_escalation
+from chapter_slicing import slice_for_prompt
+from topic_outline import ensure_outline, answer_prompt
+from segment_postprocess import CueIndex, clean_model_segments
+from llm_scheduler import LLMRateLimited
+from resilience import PipelineCancelled, install_cancel_handler, defer_cancellation
+import profiling
 
-# Debug: Print current file location
-print(f"Current file: {__file__}")
-print(f"Current directory: {os.path.dirname(__file__)}")
-print(f"Parent directory: {os.path.dirname(os.path.dirname(__file__))}")
-
-# Load environment variables from .env file
-load_dotenv()
-
-# Debug: Print environment variables
-print(f"ANTHROPIC_API_KEY exists: {bool(os.getenv('ANTHROPIC_API_KEY'))}")
+# Exit code used to tell app.py that the LLM scheduler rejected the request (EX_TEMPFAIL)
+EXIT_RATE_LIMITED = 75
+# Exit code used when app.py cancelled the run because its client disconnected (128 + SIGTERM)
+EXIT_CANCELLED = 143
 
 def load_credentials():
-    """Load credentials from environment variables."""
+    """Load credentials from environment variables (and the .env file, read on first use)."""
+    # Imported here so that importing this module stays cheap and free of side effects
+    from dotenv import load_dotenv
+    load_dotenv()
     api_key = os.getenv('ANTHROPIC_API_KEY')
     if not api_key:
         raise Exception("Anthropic API key not found in environment variables")
@@ -47,7 +50,8 @@ def extract_video_id(url: str) -> str:
 
 def fetch_transcript_from_youtube(youtube_url: str) -> str:
     """
-    Fetch transcript from YouTube URL using transcript_fetch.py.
+    Fetch transcript from YouTube URL with transcript_fetch.fetch_transcript.
+    A transcript already in the cache is reused instead of being downloaded again.
     
     Args:
         youtube_url (str): The YouTube URL
@@ -55,38 +59,30 @@ def fetch_transcript_from_youtube(youtube_url: str) -> str:
     Returns:
         str: Path to the generated transcript file
     """
+    cached_path = os.path.join(os.path.dirname(__file__), 'temporary_files', f'transcript_{extract_video_id(youtube_url)}.txt')
+    stored_path = resolve_artifact_path(cached_path)
+    if stored_path:
+        touch_artifact(stored_path)
+        print(f"Using cached transcript: {cached_path}")
+        return cached_path
+
+    # Fetched in-process like prefetch._fetch: no second interpreter, and the fetch shares this run's profile
+    from transcript_fetch import fetch_transcript
     try:
-        # Get the path to transcript_fetch.py
-        transcript_fetch_path = os.path.join(os.path.dirname(__file__), 'transcript_fetch.py')
-        
         print(f"Fetching transcript from: {youtube_url}")
-        
-        # Run transcript_fetch.py with the YouTube URL
-        result = subprocess.run(
-            [sys.executable, transcript_fetch_path, youtube_url],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        
-        # Extract video ID to construct the transcript file path
-        video_id = extract_video_id(youtube_url)
-        transcript_path = os.path.join(os.path.dirname(__file__), 'temporary_files', f'transcript_{video_id}.txt')
-        
-        if os.path.exists(transcript_path):
-            print(f"Transcript successfully fetched and saved to: {transcript_path}")
-            return transcript_path
+        fetch_transcript(youtube_url)
+        if resolve_artifact_path(cached_path):
+            print(f"Transcript successfully fetched and saved to: {cached_path}")
+            return cached_path
         else:
-            raise FileNotFoundError(f"Transcript file not found at expected location: {transcript_path}")
-            
-    except subprocess.CalledProcessError as e:
-        raise Exception(f"Error fetching transcript: {e.stderr}")
+            raise FileNotFoundError(f"Transcript file not found at expected location: {cached_path}")
     except Exception as e:
         raise Exception(f"Error processing YouTube URL: {str(e)}")
 
 def read_transcript(transcript_path: str) -> str:
     """
     Read transcript from the specified file path.
+    Compressed copies (.gz/.zst) of the path are read transparently.
     
     Args:
         transcript_path (str): Path to the transcript file
@@ -94,19 +90,20 @@ def read_transcript(transcript_path: str) -> str:
     Returns:
         str: Content of the transcript file
     """
-    if not os.path.exists(transcript_path):
+    if not resolve_artifact_path(transcript_path):
         raise FileNotFoundError(f"Transcript file not found: {transcript_path}")
     
-    with open(transcript_path, 'r', encoding='utf-8') as f:
-        return f.read()
+    return read_text_artifact(transcript_path)
 
-def analyze_transcript_with_prompt(transcript_content: str, user_prompt: str) -> List[Dict]:
+def analyze_transcript_with_prompt(transcript_content: str, user_prompt: str, route: Optional[Dict] = None) -> List[Dict]:
     """
-    Analyze transcript using Claude 4 Sonnet to identify segments relevant to the user's prompt.
+    Analyze transcript using Claude to identify segments relevant to the user's prompt.
+    The model is picked by model_router (fast model for short transcripts, escalated if its answer is weak).
     
     Args:
         transcript_content (str): Content of the transcript
         user_prompt (str): User's prompt describing what they're looking for
+        route (Dict, optional): If given, filled with the model route that produced the segments
         
     Returns:
         List[Dict]: List of identified segments with start and end timestamps
@@ -152,42 +149,58 @@ Example response:
   }}
 ]"""
 
+    messages = [
+        {"role": "user", "content": f"Transcript text: {transcript_content}\n\nPrompt: {prompt}"}
+    ]
+    # Segments are snapped to the cues of the transcript the model reads
+    cue_index = CueIndex.from_transcript(transcript_content)
+
+    def call(model: str, stage: str) -> List[Dict]:
+        # Get response from Claude (admitted by the global LLM scheduler)
+        response = create_message(
+            api_key=credentials.get('ANTHROPIC_API_KEY'),
+            model=model,
+            max_tokens=2048,
+            messages=messages,
+            stage=stage
+        )
+
+        # Parse the JSON array (salvaging a truncated one) and repair the timestamps locally
+        return clean_model_segments(response.content[0].text, cue_index)
+
     try:
         credentials = load_credentials()
-        # Initialize Anthropic client
-        client = anthropic.Anthropic(api_key=credentials.get('ANTHROPIC_API_KEY'))
         
         print(f"Analyzing transcript for query: '{user_prompt}'...")
-        # Get response from Claude
-        response = client.messages.create(
-            model="claude-3-5-sonnet-20241022",
-            max_tokens=2048,
-            messages=[
-                {"role": "user", "content": f"Transcript text: {transcript_content}\n\nPrompt: {prompt}"}
-            ]
-        )
-
-        # Parse JSON response
-        try:
-            content = response.content[0].text.replace('```json', '').replace('```', '').strip()
-            
-            # Clean up the response string
-            if not content.startswith('['):
-                content = '[' + content
-            if not content.endswith(']'):
-                content = content + ']'
-                
-            return json.loads(content)
-            
-        except json.JSONDecodeError as e:
-            print(f"Error parsing response: {str(e)}")
-            return []
+        segments, segments_route = routed_call('segments', estimate_input_tokens(messages), call, segments_need_escalation)
+        if route is not None:
+            route.update(segments_route)
+        return segments
             
+    except LLMRateLimited:
+        raise
     except Exception as e:
         print(f"Error: {str(e)}")
         raise Exception(f"Error analyzing transcript: {str(e)}")
 
-def save_segments(segments: List[Dict], youtube_url: str, user_prompt: str) -> str:
+def get_segments_path(video_id: str, user_prompt: str) -> str:
+    """
+    Get the logical path of the segments file for a video and prompt.
+    
+    Args:
+        video_id (str): The YouTube video ID
+        user_prompt (str): The user's query
+        
+    Returns:
+        str: Path to the segments file
+    """
+    # Create a safe filename from the prompt (first 20 chars, alphanumeric only)
+    prompt_safe = ''.join(c for c in user_prompt[:20] if c.isalnum() or c in (' ', '-', '_')).replace(' ', '_')
+    segments_file = f"transcript_{video_id}_{prompt_safe}_segments.json"
+    return os.path.join(os.path.dirname(__file__), 'temporary_files', segments_file)
+
+def save_segments(segments: List[Dict], youtube_url: str, user_prompt: str, route: Optional[Dict] = None,
+                  chapter_slice: Optional[Dict] = None) -> str:
     """
     Save identified segments to a JSON file.
     
@@ -195,16 +208,15 @@ def save_segments(segments: List[Dict], youtube_url: str, user_prompt: str) -> s
         segments (List[Dict]): List of identified segments
         youtube_url (str): The original YouTube URL
         user_prompt (str): The user's original query
+        route (Dict, optional): Model route that produced the segments (checked on cache hits)
+        chapter_slice (Dict, optional): Chapters the analysis was limited to, if any
         
     Returns:
         str: Path to the saved segments file
     """
     # Create segments filename based on video ID and prompt
     video_id = extract_video_id(youtube_url)
-    # Create a safe filename from the prompt (first 20 chars, alphanumeric only)
-    prompt_safe = ''.join(c for c in user_prompt[:20] if c.isalnum() or c in (' ', '-', '_')).replace(' ', '_')
-    segments_file = f"transcript_{video_id}_{prompt_safe}_segments.json"
-    segments_path = os.path.join(os.path.dirname(__file__), 'temporary_files', segments_file)
+    segments_path = get_segments_path(video_id, user_prompt)
     
     # Save segments to file with metadata
     output_data = {
@@ -212,11 +224,19 @@ def save_segments(segments: List[Dict], youtube_url: str, user_prompt: str) -> s
         "video_id": video_id,
         "query": user_prompt,
         "segments": segments,
-        "total_segments": len(segments)
+        "total_segments": len(segments),
+        "routing": route,
+        "chapter_slice": chapter_slice
     }
     
-    with open(segments_path, 'w', encoding='utf-8') as f:
-        json.dump(output_data, f, indent=2)
+    write_json_artifact(segments_path, output_data)
+    
+    # Let later phrasings of the same question reuse this result
+    try:
+        from prompt_cache import register_prompt
+        register_prompt(video_id, user_prompt, segments_path)
+    except Exception as e:
+        print(f"Warning: failed to register prompt: {str(e)}")
     
     return segments_path
 
@@ -228,21 +248,44 @@ if __name__ == "__main__":
     
     youtube_url = sys.argv[1]
     user_prompt = sys.argv[2]
+    install_cancel_handler()
     
     try:
-        # Fetch transcript from YouTube URL
-        transcript_path = fetch_transcript_from_youtube(youtube_url)
+        # Fetch transcript from YouTube URL; a cancellation waits for the fetch so the transcript is cached
+        with defer_cancellation(), profiling.stage('fetch'):
+            transcript_path = fetch_transcript_from_youtube(youtube_url)
         
         # Read transcript
-        transcript_content = read_transcript(transcript_path)
+        with profiling.stage('read'):
+            transcript_content = read_transcript(transcript_path)
+        
+        # Answer from the video's topic outline when it is confident (built first in OUTLINE_MODE=fetch)
+        video_id = extract_video_id(youtube_url)
+        with profiling.stage('outline'):
+            outline = ensure_outline(video_id, transcript_content)
+            outline_answer = answer_prompt(video_id, user_prompt, outline=outline) if outline else None
         
-        # Analyze transcript with user's prompt
-        segments = analyze_transcript_with_prompt(transcript_content, user_prompt)
+        if outline_answer:
+            segments, route = outline_answer
+            chapter_slice = None
+        else:
+            # Limit the analysis to the chapters matching the prompt (full transcript if none match)
+            with profiling.stage('slice'):
+                analysis_content, chapter_slice = slice_for_prompt(youtube_url, transcript_content, user_prompt)
+            if chapter_slice:
+                print(f"Analyzing chapters {chapter_slice['chapters']} "
+                      f"({chapter_slice['cues_kept']}/{chapter_slice['cues_total']} cues)")
+            
+            # Analyze transcript with user's prompt
+            route = {}
+            with profiling.stage('analyze'):
+                segments = analyze_transcript_with_prompt(analysis_content, user_prompt, route=route)
         
         # Save segments
-        segments_path = save_segments(segments, youtube_url, user_prompt)
+        with profiling.stage('save'):
+            segments_path = save_segments(segments, youtube_url, user_prompt, route=route, chapter_slice=chapter_slice)
         
-        print(f"Found {len(segments)} relevant segments")
+        print(f"Found {len(segments)} relevant segments using {route.get('model')}")
         print(f"Segments saved to: {segments_path}")
         
         # Print summary of found segments
@@ -253,6 +296,15 @@ if __name__ == "__main__":
                 print(f"   Summary: {segment['summary']}")
                 print()
         
+    except LLMRateLimited as e:
+        print(f"Error: {str(e)}")
+        print(f"RETRY_AFTER={e.retry_after}")
+        sys.exit(EXIT_RATE_LIMITED)
+    except PipelineCancelled as e:
+        print(f"Cancelled: {str(e)}")
+        sys.exit(EXIT_CANCELLED)
     except Exception as e:
         print(f"Error: {str(e)}")
-        sys.exit(1) 
\ No newline at end of file
+        sys.exit(1)
+    finally:
+        profiling.save('decide_clip', {'video_url': youtube_url, 'prompt': user_prompt})
@@ -0,0 +1,345 @@
+"""
+Durable queue of pipeline jobs (fetch, clean, analyze and save segments for a video and prompt).
+The queue is a SQLite database next to the cached artifacts, so API processes and any number of
+worker processes sharing the temporary_files volume see the same jobs.
+
+Delivery is at-least-once: a claimed job is leased for a visibility timeout which the worker keeps
+extending while it runs. If the worker dies, the lease expires and another worker picks the job up.
+Jobs are keyed by (video, prompt, routing policy), so enqueuing the same work twice is a no-op.
+"""
+import os
+import time
+import hashlib
+from typing import Optional, Dict
+
+from state_store import get_connection
+from llm_scheduler import resolve_priority
+from resilience import backoff_delay
+
+QUEUE_DB_NAME = 'job_queue.sqlite3'
+
+# A claimed job is redelivered if its worker has not extended the lease within this many seconds
+JOB_VISIBILITY_TIMEOUT_SECONDS = float(os.getenv('JOB_VISIBILITY_TIMEOUT_SECONDS', '120'))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+# Interactive jobs nobody has polled for this long are abandoned before a worker starts them
+JOB_WANTED_SECONDS = float(os.getenv('JOB_WANTED_SECONDS', '30'))
+# Finished jobs are forgotten after this many seconds
+JOB_RETENTION_SECONDS = float(os.getenv('JOB_RETENTION_SECONDS', '86400'))
+
+TERMINAL_STATUSES = ('done', 'failed', 'abandoned')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_key TEXT PRIMARY KEY,
+    video_id TEXT NOT NULL,
+    prompt TEXT NOT NULL,
+    model TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    user TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    wanted_until REAL,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, priority, created);
+"""
+
+_schema_ready = set()
+
+
+def _connect(state_dir: Optional[str] = None):
+    """Open the queue database, creating the schema on first use."""
+    conn = get_connection(QUEUE_DB_NAME, state_dir)
+    conn.isolation_level = None  # explicit BEGIN IMMEDIATE transactions below
+    key = state_dir or ''
+    if key not in _schema_ready:
+        conn.executescript(SCHEMA)
+        _schema_ready.add(key)
+    return conn
+
+
+def _to_dict(row) -> Optional[Dict]:
+    """Convert a jobs row to a plain dictionary."""
+    return dict(row) if row is not None else None
+
+
+def default_model() -> str:
+    """Routing policy of the segments stage, which decides which model answers a job."""
+    from model_router import get_routing_policy
+    return get_routing_policy('segments')
+
+
+def make_job_key(video_id: str, prompt: str, model: str) -> str:
+    """
+    Build the idempotency key of a job.
+
+    Args:
+        video_id (str): YouTube video ID
+        prompt (str): Search prompt
+        model (str): Routing policy or model the job is answered with
+
+    Returns:
+        str: Key of the form {video_id}:{hash of prompt and model}
+    """
+    digest = hashlib.sha1(f"{prompt}\n{model}".encode('utf-8')).hexdigest()[:16]
+    return f"{video_id}:{digest}"
+
+
+def enqueue(video_id: str, prompt: str, model: Optional[str] = None, priority='interactive',
+            user: str = 'anonymous', wanted_seconds: Optional[float] = JOB_WANTED_SECONDS,
+            state_dir: Optional[str] = None) -> Dict:
+    """
+    Add a job unless the same job is already queued or running. A finished job is queued
+    again (its result was needed, so it must have been evicted or the job failed).
+
+    Args:
+        video_id (str): YouTube video ID
+        prompt (str): Search prompt
+        model (str, optional): Routing policy or model. Defaults to the segments routing policy.
+        priority (str | int): 'interactive' (default) or 'batch'
+        user (str): User the job is run for (used for fair LLM scheduling)
+        wanted_seconds (float, optional): Abandon the job if nobody calls touch() for this long
+            before it starts; None keeps it queued regardless (background work)
+        state_dir (str, optional): Directory holding the queue database
+
+    Returns:
+        Dict: The job
+    """
+    model = model or default_model()
+    key = make_job_key(video_id, prompt, model)
+    priority = resolve_priority(priority)
+    now = time.time()
+    wanted_until = now + wanted_seconds if wanted_seconds is not None else None
+    conn = _connect(state_dir)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT * FROM jobs WHERE job_key = ?", (key,)).fetchone()
+        if row is None or row["status"] in TERMINAL_STATUSES:
+            conn.execute("INSERT OR REPLACE INTO jobs (job_key, video_id, prompt, model, priority, user, status, attempts, "
+                         "available_at, wanted_until, created, updated) VALUES (?, ?, ?, ?, ?, ?, 'queued', 0, ?, ?, ?, ?)",
+                         (key, video_id, prompt, model, priority, user, now, wanted_until, now, now))
+        else:
+            # Joining a live job: it keeps the most urgent priority and the longest interest
+            if row["wanted_until"] is None or wanted_until is None:
+                wanted_until = None
+            else:
+                wanted_until = max(row["wanted_until"], wanted_until)
+            conn.execute("UPDATE jobs SET priority = MIN(priority, ?), wanted_until = ?, updated = ? WHERE job_key = ?",
+                         (priority, wanted_until, now, key))
+        job = _to_dict(conn.execute("SELECT * FROM jobs WHERE job_key = ?", (key,)).fetchone())
+        conn.execute("COMMIT")
+        return job
+    finally:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        conn.close()
+
+
+def touch(job_key: str, wanted_seconds: float = JOB_WANTED_SECONDS, state_dir: Optional[str] = None) -> None:
+    """
+    Record that a client still waits for an interactive job.
+
+    Args:
+        job_key (str): Job key
+        wanted_seconds (float): Seconds the job stays wanted from now
+        state_dir (str, optional): Directory holding the queue database
+    """
+    conn = _connect(state_dir)
+    try:
+        conn.execute("UPDATE jobs SET wanted_until = MAX(wanted_until, ?) WHERE job_key = ? AND wanted_until IS NOT NULL",
+                     (time.time() + wanted_seconds, job_key))
+    finally:
+        conn.close()
+
+
+def claim(worker_id: str, visibility_timeout: float = JOB_VISIBILITY_TIMEOUT_SECONDS,
+          max_attempts: int = JOB_MAX_ATTEMPTS, state_dir: Optional[str] = None) -> Optional[Dict]:
+    """
+    Lease the next job: the most urgent queued job, or a running job whose lease expired.
+
+    Args:
+        worker_id (str): Identifies the claiming worker
+        visibility_timeout (float): Seconds until the job is redelivered unless extended
+        max_attempts (int): Jobs whose lease expired this many times are failed instead
+        state_dir (str, optional): Directory holding the queue database
+
+    Returns:
+        Optional[Dict]: The leased job, or None if there is nothing to do
+    """
+    conn = _connect(state_dir)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        now = time.time()
+        conn.execute("UPDATE jobs SET status = 'abandoned', updated = ? "
+                     "WHERE status = 'queued' AND wanted_until IS NOT NULL AND wanted_until < ?", (now, now))
+        conn.execute("UPDATE jobs SET status = 'failed', error = 'Lease expired on every attempt', lease_owner = NULL, "
+                     "updated = ? WHERE status = 'running' AND lease_expires < ? AND attempts >= ?",
+                     (now, now, max_attempts))
+        row = conn.execute(
+            "SELECT job_key FROM jobs WHERE (status = 'queued' AND available_at <= ?) "
+            "OR (status = 'running' AND lease_expires < ?) ORDER BY priority, created LIMIT 1",
+            (now, now)
+        ).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        conn.execute("UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_owner = ?, lease_expires = ?, "
+                     "updated = ? WHERE job_key = ?", (worker_id, now + visibility_timeout, now, row["job_key"]))
+        job = _to_dict(conn.execute("SELECT * FROM jobs WHERE job_key = ?", (row["job_key"],)).fetchone())
+        conn.execute("COMMIT")
+        return job
+    finally:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        conn.close()
+
+
+def extend_lease(job_key: str, worker_id: str, visibility_timeout: float = JOB_VISIBILITY_TIMEOUT_SECONDS,
+                 state_dir: Optional[str] = None) -> bool:
+    """
+    Keep a running job leased to its worker.
+
+    Args:
+        job_key (str): Job key
+        worker_id (str): Worker holding the lease
+        visibility_timeout (float): Seconds from now until the job is redelivered
+        state_dir (str, optional): Directory holding the queue database
+
+    Returns:
+        bool: False if the lease was lost (the job expired and was claimed by another worker)
+    """
+    conn = _connect(state_dir)
+    try:
+        cursor = conn.execute("UPDATE jobs SET lease_expires = ? WHERE job_key = ? AND lease_owner = ? AND status = 'running'",
+                              (time.time() + visibility_timeout, job_key, worker_id))
+        return cursor.rowcount == 1
+    finally:
+        conn.close()
+
+
+def complete(job_key: str, state_dir: Optional[str] = None) -> None:
+    """
+    Mark a job done. Any worker that finished it may do so: the result is the same.
+
+    Args:
+        job_key (str): Job key
+        state_dir (str, optional): Directory holding the queue database
+    """
+    conn = _connect(state_dir)
+    try:
+        conn.execute("UPDATE jobs SET status = 'done', error = NULL, lease_owner = NULL, lease_expires = NULL, "
+                     "updated = ? WHERE job_key = ? AND status != 'done'", (time.time(), job_key))
+    finally:
+        conn.close()
+
+
+def fail(job_key: str, worker_id: str, error: str, retryable: bool = True, retry_after: Optional[float] = None,
+         max_attempts: int = JOB_MAX_ATTEMPTS, state_dir: Optional[str] = None) -> Dict:
+    """
+    Release a job after a failed attempt: it is queued again after a backoff while attempts
+    remain and the error is retryable, and failed otherwise.
+
+    Args:
+        job_key (str): Job key
+        worker_id (str): Worker holding the lease (a worker that lost its lease changes nothing)
+        error (str): Error description
+        retryable (bool): Whether another attempt may succeed
+        retry_after (float, optional): Seconds to wait before the retry instead of the backoff
+        max_attempts (int): Total attempts allowed
+        state_dir (str, optional): Directory holding the queue database
+
+    Returns:
+        Dict: The job after the update
+    """
+    conn = _connect(state_dir)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        now = time.time()
+        row = conn.execute("SELECT * FROM jobs WHERE job_key = ?", (job_key,)).fetchone()
+        if row is not None and row["status"] == 'running' and row["lease_owner"] == worker_id:
+            if retryable and row["attempts"] < max_attempts:
+                delay = retry_after if retry_after is not None else backoff_delay(row["attempts"], 5.0, 60.0)
+                conn.execute("UPDATE jobs SET status = 'queued', available_at = ?, lease_owner = NULL, lease_expires = NULL, "
+                             "error = ?, updated = ? WHERE job_key = ?", (now + delay, error, now, job_key))
+            else:
+                conn.execute("UPDATE jobs SET status = 'failed', lease_owner = NULL, lease_expires = NULL, error = ?, "
+                             "updated = ? WHERE job_key = ?", (error, now, job_key))
+        job = _to_dict(conn.execute("SELECT * FROM jobs WHERE job_key = ?", (job_key,)).fetchone())
+        conn.execute("COMMIT")
+        return job
+    finally:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        conn.close()
+
+
+def get_job(job_key: str, state_dir: Optional[str] = None) -> Optional[Dict]:
+    """
+    Get a job by key.
+
+    Args:
+        job_key (str): Job key
+        state_dir (str, optional): Directory holding the queue database
+
+    Returns:
+        Optional[Dict]: The job, or None if unknown
+    """
+    conn = _connect(state_dir)
+    try:
+        return _to_dict(conn.execute("SELECT * FROM jobs WHERE job_key = ?", (job_key,)).fetchone())
+    finally:
+        conn.close()
+
+
+def prune_jobs(retention_seconds: float = JOB_RETENTION_SECONDS, state_dir: Optional[str] = None) -> int:
+    """
+    Forget finished jobs older than the retention period.
+
+    Args:
+        retention_seconds (float): Age after which finished jobs are deleted
+        state_dir (str, optional): Directory holding the queue database
+
+    Returns:
+        int: Number of jobs deleted
+    """
+    conn = _connect(state_dir)
+    try:
+        cursor = conn.execute(f"DELETE FROM jobs WHERE status IN {TERMINAL_STATUSES} AND updated < ?",
+                              (time.time() - retention_seconds,))
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+
+def get_queue_stats(state_dir: Optional[str] = None) -> Dict:
+    """
+    Summarize the queue for monitoring and for scaling workers with queue depth.
+
+    Args:
+        state_dir (str, optional): Directory holding the queue database
+
+    Returns:
+        Dict: Job counts per status, queue depth, age of the oldest queued job and active workers
+    """
+    conn = _connect(state_dir)
+    try:
+        now = time.time()
+        counts = {row["status"]: row["n"] for row in
+                  conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")}
+        oldest = conn.execute("SELECT MIN(created) AS created FROM jobs WHERE status = 'queued'").fetchone()["created"]
+        workers = conn.execute("SELECT COUNT(DISTINCT lease_owner) AS n FROM jobs "
+                               "WHERE status = 'running' AND lease_expires >= ?", (now,)).fetchone()["n"]
+        return {
+            "counts": counts,
+            "depth": counts.get('queued', 0),
+            "running": counts.get('running', 0),
+            "oldest_queued_seconds": round(now - oldest, 1) if oldest else None,
+            "busy_workers": workers
+        }
+    finally:
+        conn.close()
@@ -0,0 +1,142 @@
+"""
+Single entry point for Claude API calls.
+Every call is admitted by the shared llm_scheduler before it is sent, and the scheduler's
+token bucket is corrected with the real input size afterwards. Transient API errors are
+retried with jittered backoff under a stage deadline, and slow calls can be hedged (see resilience).
+create_message_async is the same path on the async client, for callers on an event loop.
+"""
+import time
+import asyncio
+from typing import List, Dict, Optional
+
+import llm_scheduler
+from stage_metrics import record_stage
+from resilience import (call_with_retries, call_with_retries_async, call_hedged, call_hedged_async,
+                        get_hedge_delay, is_retryable_llm_error)
+
+# A hedged copy only goes out if the scheduler can admit it almost immediately
+HEDGE_MAX_WAIT_SECONDS = 1.0
+
+
+def estimate_input_tokens(messages: List[Dict]) -> int:
+    """
+    Roughly estimate the input tokens of a message list (about 4 characters per token).
+
+    Args:
+        messages (List[Dict]): Anthropic messages
+
+    Returns:
+        int: Estimated token count
+    """
+    return sum(len(str(message.get('content', ''))) for message in messages) // 4 + 1
+
+
+def create_message(api_key: str, model: str, max_tokens: int, messages: List[Dict],
+                   priority=None, user: Optional[str] = None, stage: str = 'llm'):
+    """
+    Send a Messages API request through the global scheduler.
+
+    Args:
+        api_key (str): Anthropic API key
+        model (str): Model name
+        max_tokens (int): Maximum output tokens
+        messages (List[Dict]): Anthropic messages
+        priority (str | int, optional): 'interactive' or 'batch' (defaults to LLM_PRIORITY env)
+        user (str, optional): User the call is made for, used for fairness (defaults to LLM_USER env)
+        stage (str): Stage name used for retry policy and metrics (e.g. llm_segments)
+
+    Returns:
+        anthropic.types.Message: The API response
+
+    Raises:
+        llm_scheduler.LLMRateLimited: If no slot is available within the priority's maximum wait
+        resilience.StageTimeout: If the stage deadline expired
+    """
+    import anthropic
+
+    estimated_tokens = estimate_input_tokens(messages)
+    hedge_delay = get_hedge_delay(stage)
+
+    def send(timeout: float, max_wait: Optional[float] = None):
+        llm_scheduler.acquire(estimated_tokens, priority=priority, user=user, max_wait=max_wait)
+        # Retries are handled here, not by the SDK, so they share the stage deadline
+        client = anthropic.Anthropic(api_key=api_key, timeout=timeout, max_retries=0)
+        sent = time.time()
+        response = client.messages.create(
+            model=model,
+            max_tokens=max_tokens,
+            messages=messages
+        )
+        # API latency alone, without the scheduler wait: the hedge delay is based on it
+        record_stage(f"{stage}_api", 'success', (time.time() - sent) * 1000)
+        llm_scheduler.record_usage(estimated_tokens, response.usage.input_tokens)
+        return response
+
+    def attempt(timeout: float):
+        if hedge_delay is None or hedge_delay >= timeout:
+            return send(timeout)
+
+        def allow_hedge() -> bool:
+            return llm_scheduler.estimate_wait(estimated_tokens, priority) <= HEDGE_MAX_WAIT_SECONDS
+
+        return call_hedged(stage, lambda: send(timeout), hedge_delay, allow_hedge,
+                           hedge_fn=lambda: send(timeout, HEDGE_MAX_WAIT_SECONDS))
+
+    return call_with_retries(stage, attempt, is_retryable_llm_error)
+
+
+async def create_message_async(api_key: str, model: str, max_tokens: int, messages: List[Dict],
+                               priority=None, user: Optional[str] = None, stage: str = 'llm'):
+    """
+    create_message on anthropic.AsyncAnthropic: waiting for the scheduler, the API and retry
+    backoff all happen on the event loop, and a losing hedged copy is cancelled.
+
+    Args:
+        api_key (str): Anthropic API key
+        model (str): Model name
+        max_tokens (int): Maximum output tokens
+        messages (List[Dict]): Anthropic messages
+        priority (str | int, optional): 'interactive' or 'batch' (defaults to LLM_PRIORITY env)
+        user (str, optional): User the call is made for, used for fairness (defaults to LLM_USER env)
+        stage (str): Stage name used for retry policy and metrics (e.g. llm_segments)
+
+    Returns:
+        anthropic.types.Message: The API response
+
+    Raises:
+        llm_scheduler.LLMRateLimited: If no slot is available within the priority's maximum wait
+        resilience.StageTimeout: If the stage deadline expired
+    """
+    import anthropic
+
+    estimated_tokens = estimate_input_tokens(messages)
+    hedge_delay = await asyncio.to_thread(get_hedge_delay, stage)
+
+    async def send(timeout: float, max_wait: Optional[float] = None):
+        await llm_scheduler.acquire_async(estimated_tokens, priority=priority, user=user, max_wait=max_wait)
+        client = anthropic.AsyncAnthropic(api_key=api_key, timeout=timeout, max_retries=0)
+        sent = time.time()
+        try:
+            response = await client.messages.create(
+                model=model,
+                max_tokens=max_tokens,
+                messages=messages
+            )
+        finally:
+            await client.close()
+        await asyncio.to_thread(record_stage, f"{stage}_api", 'success', (time.time() - sent) * 1000)
+        await asyncio.to_thread(llm_scheduler.record_usage, estimated_tokens, response.usage.input_tokens)
+        return response
+
+    async def attempt(timeout: float):
+        if hedge_delay is None or hedge_delay >= timeout:
+            return await send(timeout)
+
+        async def allow_hedge() -> bool:
+            wait = await asyncio.to_thread(llm_scheduler.estimate_wait, estimated_tokens, priority)
+            return wait <= HEDGE_MAX_WAIT_SECONDS
+
+        return await call_hedged_async(stage, lambda: send(timeout), hedge_delay, allow_hedge,
+                                       hedge_fn=lambda: send(timeout, HEDGE_MAX_WAIT_SECONDS))
+
+    return await call_with_retries_async(stage, attempt, is_retryable_llm_error)
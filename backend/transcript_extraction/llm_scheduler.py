@@ -0,0 +1,367 @@
+"""
+Global scheduler for Claude API calls.
+Every process sharing the temporary_files volume coordinates through one SQLite database:
+token buckets cap requests/min and input tokens/min, waiters are served by priority
+(interactive before batch) and round-robin across users within a priority, and callers
+that would wait too long are rejected with a retry-after hint instead of piling up.
+"""
+import os
+import time
+import asyncio
+from typing import Optional, Dict, Tuple, Callable
+
+from state_store import get_connection
+
+SCHEDULER_DB_NAME = 'llm_scheduler.sqlite3'
+
+LLM_REQUESTS_PER_MINUTE = float(os.getenv('LLM_REQUESTS_PER_MINUTE', '50'))
+LLM_INPUT_TOKENS_PER_MINUTE = float(os.getenv('LLM_INPUT_TOKENS_PER_MINUTE', '40000'))
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+PRIORITY_NAMES = {'interactive': PRIORITY_INTERACTIVE, 'batch': PRIORITY_BATCH}
+
+# How long a caller may wait for a slot before being told to retry later
+MAX_WAIT_SECONDS = {
+    PRIORITY_INTERACTIVE: float(os.getenv('LLM_INTERACTIVE_MAX_WAIT_SECONDS', '30')),
+    PRIORITY_BATCH: float(os.getenv('LLM_BATCH_MAX_WAIT_SECONDS', '600')),
+}
+
+# Waiters whose process stopped polling for this long are dropped from the queue
+STALE_WAITER_SECONDS = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    name TEXT PRIMARY KEY,
+    level REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS waiters (
+    ticket INTEGER PRIMARY KEY AUTOINCREMENT,
+    priority INTEGER NOT NULL,
+    user TEXT NOT NULL,
+    input_tokens INTEGER NOT NULL,
+    enqueued REAL NOT NULL,
+    heartbeat REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS users (
+    user TEXT PRIMARY KEY,
+    last_served REAL NOT NULL
+);
+"""
+
+_schema_ready = set()
+
+
+class LLMRateLimited(Exception):
+    """Raised when an LLM call cannot be scheduled within the caller's maximum wait."""
+
+    def __init__(self, retry_after: float, message: str = "LLM capacity exhausted"):
+        super().__init__(f"{message}, retry after {int(retry_after) + 1}s")
+        self.retry_after = int(retry_after) + 1
+
+
+def _connect(state_dir: Optional[str] = None):
+    """Open the scheduler database, creating the schema on first use."""
+    conn = get_connection(SCHEDULER_DB_NAME, state_dir)
+    conn.isolation_level = None  # explicit BEGIN IMMEDIATE transactions below
+    key = state_dir or ''
+    if key not in _schema_ready:
+        conn.executescript(SCHEMA)
+        _schema_ready.add(key)
+    return conn
+
+
+def resolve_priority(priority=None) -> int:
+    """
+    Resolve a priority given as a name, a number or None (LLM_PRIORITY env, default interactive).
+
+    Args:
+        priority (str | int, optional): 'interactive', 'batch' or a number (lower is served first)
+
+    Returns:
+        int: Numeric priority
+    """
+    if priority is None:
+        priority = os.getenv('LLM_PRIORITY', 'interactive')
+    if isinstance(priority, str):
+        if priority.isdigit():
+            return int(priority)
+        return PRIORITY_NAMES.get(priority, PRIORITY_INTERACTIVE)
+    return int(priority)
+
+
+def _bucket_capacities() -> Dict[str, float]:
+    """Bucket capacity equals one minute of allowance."""
+    return {'requests': LLM_REQUESTS_PER_MINUTE, 'input_tokens': LLM_INPUT_TOKENS_PER_MINUTE}
+
+
+def _refill(conn, now: float) -> Dict[str, float]:
+    """Refill both buckets for the elapsed time and return their current levels."""
+    levels = {}
+    for name, capacity in _bucket_capacities().items():
+        row = conn.execute("SELECT level, updated FROM buckets WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            level = capacity
+        else:
+            level = min(capacity, row["level"] + (now - row["updated"]) * capacity / 60.0)
+        conn.execute("INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)", (name, level, now))
+        levels[name] = level
+    return levels
+
+
+def _queue_order(conn):
+    """Waiters in service order: priority, then least recently served user, then arrival."""
+    return conn.execute(
+        """SELECT w.ticket, w.priority, w.user, w.input_tokens
+           FROM waiters w LEFT JOIN users u ON u.user = w.user
+           ORDER BY w.priority, COALESCE(u.last_served, 0), w.enqueued"""
+    ).fetchall()
+
+
+def _estimate_wait(conn, levels: Dict[str, float], priority: int, input_tokens: int) -> float:
+    """Estimate how long a new waiter at this priority would wait for its slot."""
+    ahead = conn.execute(
+        "SELECT COUNT(*) AS n, COALESCE(SUM(input_tokens), 0) AS t FROM waiters WHERE priority <= ?",
+        (priority,)
+    ).fetchone()
+    capacities = _bucket_capacities()
+    token_need = ahead["t"] + min(input_tokens, capacities['input_tokens']) - levels['input_tokens']
+    request_need = ahead["n"] + 1 - levels['requests']
+    return max(0.0,
+               token_need * 60.0 / capacities['input_tokens'],
+               request_need * 60.0 / capacities['requests'])
+
+
+def estimate_wait(input_tokens: int = 0, priority=None, state_dir: Optional[str] = None) -> float:
+    """
+    Estimate the queueing delay a new LLM call would see right now.
+
+    Args:
+        input_tokens (int): Estimated input tokens of the call
+        priority (str | int, optional): Call priority
+        state_dir (str, optional): Directory holding the scheduler database
+
+    Returns:
+        float: Estimated wait in seconds
+    """
+    priority = resolve_priority(priority)
+    conn = _connect(state_dir)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        now = time.time()
+        conn.execute("DELETE FROM waiters WHERE heartbeat < ?", (now - STALE_WAITER_SECONDS,))
+        levels = _refill(conn, now)
+        wait = _estimate_wait(conn, levels, priority, input_tokens)
+        conn.execute("COMMIT")
+        return wait
+    finally:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        conn.close()
+
+
+def _resolve_caller(priority, user: Optional[str], max_wait: Optional[float]) -> Tuple[int, str, float]:
+    """Fill in the defaults of acquire()'s priority, user and max_wait."""
+    priority = resolve_priority(priority)
+    if user is None:
+        user = os.getenv('LLM_USER', 'anonymous')
+    if max_wait is None:
+        max_wait = MAX_WAIT_SECONDS.get(priority, MAX_WAIT_SECONDS[PRIORITY_BATCH])
+    return priority, user, max_wait
+
+
+def _enqueue(conn, input_tokens: int, priority: int, user: str, max_wait: float) -> int:
+    """Join the wait queue and return the ticket, or reject up front if the queue ahead is too long."""
+    conn.execute("BEGIN IMMEDIATE")
+    now = time.time()
+    conn.execute("DELETE FROM waiters WHERE heartbeat < ?", (now - STALE_WAITER_SECONDS,))
+    levels = _refill(conn, now)
+    wait = _estimate_wait(conn, levels, priority, input_tokens)
+    if wait > max_wait:
+        conn.execute("COMMIT")
+        raise LLMRateLimited(wait)
+    cursor = conn.execute(
+        "INSERT INTO waiters (priority, user, input_tokens, enqueued, heartbeat) VALUES (?, ?, ?, ?, ?)",
+        (priority, user, input_tokens, now, now)
+    )
+    conn.execute("COMMIT")
+    return cursor.lastrowid
+
+
+def _try_admit(conn, ticket: int, input_tokens: int, priority: int, user: str,
+               started: float, max_wait: float) -> Optional[float]:
+    """
+    Take the slot if the ticket is at the head of the queue and the buckets cover it.
+    Returns None once admitted (the ticket is consumed), otherwise the seconds to sleep before
+    trying again; raises LLMRateLimited when max_wait has passed.
+    """
+    capacities = _bucket_capacities()
+    conn.execute("BEGIN IMMEDIATE")
+    now = time.time()
+    conn.execute("DELETE FROM waiters WHERE heartbeat < ? AND ticket != ?", (now - STALE_WAITER_SECONDS, ticket))
+    levels = _refill(conn, now)
+    order = _queue_order(conn)
+    # Requests larger than the bucket go through once the bucket is full
+    token_need = min(input_tokens, capacities['input_tokens'])
+    if (order and order[0]["ticket"] == ticket
+            and levels['requests'] >= 1 and levels['input_tokens'] >= token_need):
+        conn.execute("UPDATE buckets SET level = level - 1 WHERE name = 'requests'")
+        conn.execute("UPDATE buckets SET level = level - ? WHERE name = 'input_tokens'", (input_tokens,))
+        conn.execute("DELETE FROM waiters WHERE ticket = ?", (ticket,))
+        conn.execute("INSERT OR REPLACE INTO users VALUES (?, ?)", (user, now))
+        conn.execute("COMMIT")
+        return None
+
+    conn.execute("UPDATE waiters SET heartbeat = ? WHERE ticket = ?", (now, ticket))
+    conn.execute("COMMIT")
+
+    elapsed = now - started
+    if elapsed >= max_wait:
+        raise LLMRateLimited(_estimate_wait(conn, levels, priority, input_tokens))
+
+    # Sleep roughly until the bucket could cover us, polling at least once a second
+    deficit = max((token_need - levels['input_tokens']) * 60.0 / capacities['input_tokens'],
+                  (1 - levels['requests']) * 60.0 / capacities['requests'], 0.05)
+    return min(deficit, 1.0, max_wait - elapsed)
+
+
+def _leave(conn, ticket: int) -> None:
+    """Drop a ticket that was not admitted (rejected, failed or cancelled waiter)."""
+    if conn.in_transaction:
+        conn.execute("ROLLBACK")
+    try:
+        conn.execute("DELETE FROM waiters WHERE ticket = ?", (ticket,))
+    except Exception:
+        pass
+
+
+def acquire(input_tokens: int, priority=None, user: Optional[str] = None,
+            max_wait: Optional[float] = None, state_dir: Optional[str] = None) -> None:
+    """
+    Block until the caller may send one LLM request with the given input size.
+
+    Args:
+        input_tokens (int): Estimated input tokens of the request
+        priority (str | int, optional): 'interactive' (default) or 'batch'
+        user (str, optional): User the request is made for (LLM_USER env, default 'anonymous')
+        max_wait (float, optional): Maximum seconds to wait. Defaults to the priority's limit.
+        state_dir (str, optional): Directory holding the scheduler database
+
+    Raises:
+        LLMRateLimited: If the slot cannot be obtained within max_wait
+    """
+    priority, user, max_wait = _resolve_caller(priority, user, max_wait)
+    started = time.time()
+    conn = _connect(state_dir)
+    ticket = None
+    try:
+        ticket = _enqueue(conn, input_tokens, priority, user, max_wait)
+        while True:
+            delay = _try_admit(conn, ticket, input_tokens, priority, user, started, max_wait)
+            if delay is None:
+                ticket = None
+                return
+            time.sleep(delay)
+    finally:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        if ticket is not None:
+            _leave(conn, ticket)
+        conn.close()
+
+
+def _run_step(step: Callable, state_dir: Optional[str], *args):
+    """Run one acquire step on its own connection (connections must stay on the thread that opened them)."""
+    conn = _connect(state_dir)
+    try:
+        return step(conn, *args)
+    finally:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        conn.close()
+
+
+async def acquire_async(input_tokens: int, priority=None, user: Optional[str] = None,
+                        max_wait: Optional[float] = None, state_dir: Optional[str] = None) -> None:
+    """
+    acquire() for coroutines: waiting in the queue sleeps on the event loop instead of a thread,
+    and each database step runs on the default executor.
+
+    Args:
+        input_tokens (int): Estimated input tokens of the request
+        priority (str | int, optional): 'interactive' (default) or 'batch'
+        user (str, optional): User the request is made for (LLM_USER env, default 'anonymous')
+        max_wait (float, optional): Maximum seconds to wait. Defaults to the priority's limit.
+        state_dir (str, optional): Directory holding the scheduler database
+
+    Raises:
+        LLMRateLimited: If the slot cannot be obtained within max_wait
+    """
+    priority, user, max_wait = _resolve_caller(priority, user, max_wait)
+    started = time.time()
+    ticket = await asyncio.to_thread(_run_step, _enqueue, state_dir, input_tokens, priority, user, max_wait)
+    try:
+        while True:
+            delay = await asyncio.to_thread(_run_step, _try_admit, state_dir, ticket, input_tokens,
+                                            priority, user, started, max_wait)
+            if delay is None:
+                ticket = None
+                return
+            await asyncio.sleep(delay)
+    finally:
+        if ticket is not None:
+            # Also reached when the waiting task is cancelled; a missed cleanup goes stale anyway
+            await asyncio.to_thread(_run_step, _leave, state_dir, ticket)
+
+
+def record_usage(estimated_input_tokens: int, actual_input_tokens: int, state_dir: Optional[str] = None) -> None:
+    """
+    Correct the token bucket once the real input size of a request is known.
+
+    Args:
+        estimated_input_tokens (int): Tokens charged by acquire()
+        actual_input_tokens (int): Input tokens reported by the API
+        state_dir (str, optional): Directory holding the scheduler database
+    """
+    delta = actual_input_tokens - estimated_input_tokens
+    if delta == 0:
+        return
+    conn = _connect(state_dir)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("UPDATE buckets SET level = level - ? WHERE name = 'input_tokens'", (delta,))
+        conn.execute("COMMIT")
+    finally:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        conn.close()
+
+
+def get_scheduler_stats(state_dir: Optional[str] = None) -> Dict:
+    """
+    Get current bucket levels and queue depth per priority.
+
+    Args:
+        state_dir (str, optional): Directory holding the scheduler database
+
+    Returns:
+        Dict: Bucket levels, limits and waiting requests per priority
+    """
+    conn = _connect(state_dir)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        levels = _refill(conn, time.time())
+        rows = conn.execute("SELECT priority, COUNT(*) AS n FROM waiters GROUP BY priority").fetchall()
+        conn.execute("COMMIT")
+        return {
+            "requests_available": round(levels['requests'], 2),
+            "input_tokens_available": round(levels['input_tokens']),
+            "requests_per_minute": LLM_REQUESTS_PER_MINUTE,
+            "input_tokens_per_minute": LLM_INPUT_TOKENS_PER_MINUTE,
+            "waiting": {str(row["priority"]): row["n"] for row in rows}
+        }
+    finally:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        conn.close()
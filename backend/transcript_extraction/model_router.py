@@ -0,0 +1,195 @@
+"""
+Per-stage model routing for Claude calls.
+Small inputs go to a fast model and large ones to the large model. In 'auto' mode a fast
+answer that looks unusable (empty, low relevance, low confidence) is escalated to the large model.
+The routing policy is stored with each result so that cached answers can be checked against it.
+"""
+import os
+import time
+import asyncio
+from typing import Callable, Dict, Any, Optional, Tuple, List, Awaitable
+
+from stage_metrics import record_stage
+
+LLM_FAST_MODEL = os.getenv('LLM_FAST_MODEL', 'claude-3-5-haiku-20241022')
+LLM_LARGE_MODEL = os.getenv('LLM_LARGE_MODEL', 'claude-3-5-sonnet-20241022')
+
+# In auto mode, inputs up to this many estimated tokens start on the fast model
+LLM_ROUTE_FAST_MAX_INPUT_TOKENS = int(os.getenv('LLM_ROUTE_FAST_MAX_INPUT_TOKENS', '8000'))
+# Fast segment results whose best relevance_score is below this are escalated
+LLM_ROUTE_ESCALATE_MIN_SCORE = int(os.getenv('LLM_ROUTE_ESCALATE_MIN_SCORE', '3'))
+
+ROUTE_MODES = ('fast', 'large', 'auto')
+# Default mode per stage; override with LLM_ROUTE_<STAGE>, e.g. LLM_ROUTE_SEGMENTS=large
+DEFAULT_ROUTE_MODES = {
+    'segments': 'auto',
+    'playlist_segments': 'auto',
+    'relevance': 'auto',
+    'outline': 'auto',
+    'outline_select': 'fast',
+}
+
+
+def get_route_mode(stage: str) -> str:
+    """
+    Get the routing mode of a stage.
+
+    Args:
+        stage (str): Routing stage (segments, playlist_segments, relevance, outline, outline_select)
+
+    Returns:
+        str: 'fast', 'large' or 'auto'
+    """
+    mode = os.getenv(f'LLM_ROUTE_{stage.upper()}', DEFAULT_ROUTE_MODES.get(stage, 'large')).lower()
+    return mode if mode in ROUTE_MODES else 'large'
+
+
+def get_routing_policy(stage: str) -> str:
+    """
+    Get a string identifying everything that influences the model choice for a stage.
+
+    Args:
+        stage (str): Routing stage
+
+    Returns:
+        str: Policy signature stored with cached results
+    """
+    return (f"{get_route_mode(stage)}:{LLM_FAST_MODEL}:{LLM_LARGE_MODEL}:"
+            f"{LLM_ROUTE_FAST_MAX_INPUT_TOKENS}:{LLM_ROUTE_ESCALATE_MIN_SCORE}")
+
+
+def choose_tier(stage: str, input_tokens: int) -> str:
+    """
+    Choose the model tier for a call.
+
+    Args:
+        stage (str): Routing stage
+        input_tokens (int): Estimated input tokens
+
+    Returns:
+        str: 'fast' or 'large'
+    """
+    mode = get_route_mode(stage)
+    if mode != 'auto':
+        return mode
+    return 'fast' if input_tokens <= LLM_ROUTE_FAST_MAX_INPUT_TOKENS else 'large'
+
+
+def model_for_tier(tier: str) -> str:
+    """Model name of a tier."""
+    return LLM_FAST_MODEL if tier == 'fast' else LLM_LARGE_MODEL
+
+
+def routed_call(stage: str, input_tokens: int, call: Callable[[str, str], Any],
+                needs_escalation: Callable[[Any], bool]) -> Tuple[Any, Dict]:
+    """
+    Run a call on the routed model, escalating to the large model if needed.
+
+    Args:
+        stage (str): Routing stage
+        input_tokens (int): Estimated input tokens
+        call (Callable[[str, str], Any]): Takes (model, metrics stage name) and returns the parsed result
+        needs_escalation (Callable[[Any], bool]): True if a fast result should be redone on the large model
+
+    Returns:
+        Tuple[Any, Dict]: The result and its route (stage, policy, tier, model, escalated)
+    """
+    started = time.time()
+    tier = choose_tier(stage, input_tokens)
+    result = call(model_for_tier(tier), f"llm_{stage}_{tier}")
+    escalated = False
+    if tier == 'fast' and get_route_mode(stage) == 'auto' and needs_escalation(result):
+        print(f"[ROUTER] Escalating {stage} from {LLM_FAST_MODEL} to {LLM_LARGE_MODEL}")
+        tier = 'large'
+        escalated = True
+        result = call(LLM_LARGE_MODEL, f"llm_{stage}_large")
+
+    record_stage(f"route_{stage}", 'escalated' if escalated else tier, (time.time() - started) * 1000)
+    return result, _route(stage, tier, escalated)
+
+
+async def routed_call_async(stage: str, input_tokens: int, call: Callable[[str, str], Awaitable[Any]],
+                            needs_escalation: Callable[[Any], bool]) -> Tuple[Any, Dict]:
+    """
+    routed_call for coroutine calls (e.g. llm_client.create_message_async).
+
+    Args:
+        stage (str): Routing stage
+        input_tokens (int): Estimated input tokens
+        call (Callable[[str, str], Awaitable[Any]]): Takes (model, metrics stage name) and returns the parsed result
+        needs_escalation (Callable[[Any], bool]): True if a fast result should be redone on the large model
+
+    Returns:
+        Tuple[Any, Dict]: The result and its route (stage, policy, tier, model, escalated)
+    """
+    started = time.time()
+    tier = choose_tier(stage, input_tokens)
+    result = await call(model_for_tier(tier), f"llm_{stage}_{tier}")
+    escalated = False
+    if tier == 'fast' and get_route_mode(stage) == 'auto' and needs_escalation(result):
+        print(f"[ROUTER] Escalating {stage} from {LLM_FAST_MODEL} to {LLM_LARGE_MODEL}")
+        tier = 'large'
+        escalated = True
+        result = await call(LLM_LARGE_MODEL, f"llm_{stage}_large")
+
+    await asyncio.to_thread(record_stage, f"route_{stage}", 'escalated' if escalated else tier,
+                            (time.time() - started) * 1000)
+    return result, _route(stage, tier, escalated)
+
+
+def _route(stage: str, tier: str, escalated: bool) -> Dict:
+    """Route stored with a result."""
+    return {
+        'stage': stage,
+        'policy': get_routing_policy(stage),
+        'tier': tier,
+        'model': model_for_tier(tier),
+        'escalated': escalated
+    }
+
+
+def segments_need_escalation(segments: List[Dict]) -> bool:
+    """
+    Decide whether a fast model's segment list is too weak to keep.
+
+    Args:
+        segments (List[Dict]): Segments with relevance_score
+
+    Returns:
+        bool: True if there are no segments or none reaches LLM_ROUTE_ESCALATE_MIN_SCORE
+    """
+    if not segments:
+        return True
+    best = max((segment.get('relevance_score') or 0 for segment in segments if isinstance(segment, dict)), default=0)
+    return best < LLM_ROUTE_ESCALATE_MIN_SCORE
+
+
+def relevance_needs_escalation(analysis: Dict) -> bool:
+    """
+    Decide whether a fast model's metadata relevance verdict is too uncertain to keep.
+
+    Args:
+        analysis (Dict): Relevance analysis with relevance_score and confidence
+
+    Returns:
+        bool: True if the verdict is low confidence or could not be parsed
+    """
+    return analysis.get('confidence') == 'low' or not analysis.get('relevance_score')
+
+
+def route_satisfies(route: Optional[Dict], stage: str) -> bool:
+    """
+    Check whether a cached result may be served under the current routing policy.
+    Results from the large model (including results cached before routing existed) always
+    qualify; fast-model results only while the policy that produced them is still in effect.
+
+    Args:
+        route (Dict, optional): Route stored with the cached result
+        stage (str): Routing stage
+
+    Returns:
+        bool: True if the cached result can be reused
+    """
+    if not route or route.get('tier') == 'large':
+        return True
+    return route.get('policy') == get_routing_policy(stage)
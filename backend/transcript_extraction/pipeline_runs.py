@@ -0,0 +1,471 @@
+"""
+decide_clip.py runs started by the API servers, shared by every request waiting for the same
+(video, prompt). app.py waits for a run on its request thread; asgi.py spawns it as an asyncio
+subprocess and awaits it without holding a thread. Both go through this registry, so requests
+for one pair share one process whichever server path they arrive on. Once every waiting client
+has disconnected the run is cancelled: decide_clip.py gets SIGTERM and its process group is
+killed if it is still alive after PIPELINE_CANCEL_GRACE_SECONDS.
+With PIPELINE_MODE=queue the API does not run decide_clip.py itself; requests wait for a job
+that worker.py processes run (see QueuedJob).
+"""
+import os
+import sys
+import time
+import signal
+import asyncio
+import threading
+import subprocess
+from concurrent.futures import Future, wait
+from typing import Optional, Dict, List, Tuple, Callable, Awaitable
+
+import job_queue
+import profiling
+from decide_clip import EXIT_RATE_LIMITED
+from stage_metrics import record_stage
+from resilience import PIPELINE_DEADLINE_SECONDS, STAGE_POLICIES
+
+# 'inline' runs decide_clip.py in this process's children; 'queue' hands the work to worker.py processes
+PIPELINE_MODE = os.getenv('PIPELINE_MODE', 'inline').lower()
+
+# How often a waiting request checks whether its client is still connected
+PIPELINE_POLL_SECONDS = float(os.getenv('PIPELINE_POLL_SECONDS', '0.5'))
+# Time a cancelled run gets to finish its transcript fetch before its process group is killed
+PIPELINE_CANCEL_GRACE_SECONDS = float(os.getenv('PIPELINE_CANCEL_GRACE_SECONDS',
+                                                str(STAGE_POLICIES['youtube_fetch']['deadline'] + 30)))
+
+DECIDE_CLIP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'decide_clip.py')
+# decide_clip.py is started from the backend directory, like `python transcript_extraction/decide_clip.py`
+PIPELINE_CWD = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_runs = {}
+_runs_lock = threading.Lock()
+
+
+def parse_retry_after(stdout: str) -> int:
+    """
+    Extract the RETRY_AFTER=<seconds> hint printed by decide_clip.py.
+
+    Args:
+        stdout (str): Output of decide_clip.py
+
+    Returns:
+        int: Seconds to wait (defaults to 30 if no hint was printed)
+    """
+    for line in stdout.splitlines():
+        if line.startswith('RETRY_AFTER='):
+            return int(line.split('=', 1)[1])
+    return 30
+
+
+def decide_clip_command(video_id: str, prompt: str) -> List[str]:
+    """Command line of a decide_clip.py run for a video and prompt."""
+    return [sys.executable, DECIDE_CLIP_PATH, f"https://www.youtube.com/watch?v={video_id}", prompt]
+
+
+def spawn_decide_clip(video_id: str, prompt: str, env: Dict[str, str]) -> subprocess.Popen:
+    """
+    Start decide_clip.py for a video and prompt. The API servers, the workers and precompute.py
+    all run the pipeline through here.
+
+    Args:
+        video_id (str): YouTube video ID
+        prompt (str): Search prompt
+        env (Dict[str, str]): Environment of the run (LLM_PRIORITY, LLM_USER, the profiling ID)
+
+    Returns:
+        subprocess.Popen: The running process, with text stdout and stderr pipes
+    """
+    # Own process group, so a cancelled or timed-out run can be killed with its children
+    return subprocess.Popen(
+        decide_clip_command(video_id, prompt),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        cwd=PIPELINE_CWD,
+        env=env,
+        start_new_session=True
+    )
+
+
+def kill_process_group(process) -> None:
+    """Kill a decide_clip.py run (a Popen or an asyncio process) and its yt-dlp/transcript_fetch children."""
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def wait_decide_clip(process: subprocess.Popen, timeout: float) -> Tuple[str, str, bool]:
+    """
+    Wait for a run from spawn_decide_clip, killing its process group once the timeout is up.
+
+    Args:
+        process (subprocess.Popen): The running process
+        timeout (float): Seconds to wait
+
+    Returns:
+        Tuple[str, str, bool]: stdout, stderr, and whether the run was killed at the timeout
+    """
+    try:
+        stdout, stderr = process.communicate(timeout=timeout)
+        return stdout, stderr, False
+    except subprocess.TimeoutExpired:
+        kill_process_group(process)
+        stdout, stderr = process.communicate()
+        return stdout, stderr, True
+
+
+def run_outcome(returncode: int) -> str:
+    """Outcome of a finished decide_clip.py run for its stage metrics: success, rate_limited or error."""
+    if returncode == 0:
+        return 'success'
+    return 'rate_limited' if returncode == EXIT_RATE_LIMITED else 'error'
+
+
+class PipelineRun:
+    """
+    A decide_clip.py run shared by every request waiting for the same (video, prompt).
+    The run is registered before its process is spawned, so concurrent requests always join it;
+    future completes with the finished process once it has exited.
+    """
+
+    def __init__(self, key: str, video_id: str, prompt: str, env: Dict[str, str]):
+        self.key = key
+        self.video_id = video_id
+        self.prompt = prompt
+        self.command = decide_clip_command(video_id, prompt)
+        self.env = env
+        self.process = None
+        self.started = time.time()
+        self.waiters = 0
+        self.cancelled = False
+        self.timed_out = False
+        self.future = Future()
+        # Keeps the collecting task of an asyncio run alive
+        self.task = None
+
+
+def _run_key(video_id: str, prompt: str) -> str:
+    """Registry key of a (video, prompt) pair."""
+    return f"{video_id}\n{prompt}"
+
+
+def _new_run(video_id: str, prompt: str, user: str, profile_id: Optional[str]) -> PipelineRun:
+    """Build the environment of a pipeline run."""
+    env = {**os.environ, 'LLM_PRIORITY': 'interactive', 'LLM_USER': user}
+    if profile_id:
+        env[profiling.PROFILE_ENV] = profile_id
+    run = PipelineRun(_run_key(video_id, prompt), video_id, prompt, env)
+    print(f"[DEBUG] Running command: {' '.join(run.command)}")
+    return run
+
+
+def _join_run(video_id: str, prompt: str, user: str, profile_id: Optional[str],
+              start: Callable[[PipelineRun], None]) -> PipelineRun:
+    """Join the live run of a pair, or register a new one and start it; the caller becomes a waiter."""
+    with _runs_lock:
+        key = _run_key(video_id, prompt)
+        run = _runs.get(key)
+        if run is None or run.cancelled:
+            run = _new_run(video_id, prompt, user, profile_id)
+            _runs[key] = run
+            start(run)
+        else:
+            print(f"[DEBUG] Joining the run already in progress for this video and prompt")
+        run.waiters += 1
+        return run
+
+
+def _leave_run(run: PipelineRun, disconnected: bool) -> None:
+    """Stop waiting for a run, cancelling it if the last waiting client disconnected."""
+    with _runs_lock:
+        run.waiters -= 1
+        if disconnected and run.waiters == 0:
+            cancel_run(run)
+
+
+def _terminate(run: PipelineRun) -> None:
+    """SIGTERM a pipeline run, killing its process group if it outlives the grace period."""
+    try:
+        run.process.send_signal(signal.SIGTERM)
+    except ProcessLookupError:
+        return
+    timer = threading.Timer(PIPELINE_CANCEL_GRACE_SECONDS,
+                            lambda: None if run.future.done() else kill_process_group(run.process))
+    timer.daemon = True
+    timer.start()
+
+
+def cancel_run(run: PipelineRun) -> None:
+    """
+    Cancel a pipeline run nobody waits for any more. decide_clip.py gets SIGTERM: it abandons
+    its Claude request at once but lets a transcript fetch in progress finish so the transcript
+    is cached. The process group is killed if it is still alive after the grace period.
+
+    Args:
+        run (PipelineRun): Run to cancel
+    """
+    if run.future.done():
+        return
+    run.cancelled = True
+    print(f"[PIPELINE] Cancelling {run.key!r}: no client is waiting for it")
+    if run.process is not None:
+        # Otherwise still being spawned; the collector terminates it as soon as it exists
+        _terminate(run)
+
+
+def _finish(run: PipelineRun, returncode: int, stdout: str, stderr: str) -> None:
+    """Record the outcome of a run, drop it from the registry and wake its waiters."""
+    result = subprocess.CompletedProcess(run.command, returncode, stdout, stderr)
+    try:
+        if run.timed_out:
+            outcome = 'timeout'
+        elif run.cancelled:
+            outcome = 'cancelled'
+        else:
+            outcome = run_outcome(returncode)
+        record_stage('pipeline', outcome, (time.time() - run.started) * 1000)
+        print(f"[DEBUG] Subprocess return code: {returncode}")
+        print(f"[DEBUG] Subprocess stdout: {stdout}")
+        print(f"[DEBUG] Subprocess stderr: {stderr}")
+    finally:
+        with _runs_lock:
+            if _runs.get(run.key) is run:
+                del _runs[run.key]
+        run.future.set_result(result)
+
+
+def _remaining(run: PipelineRun) -> float:
+    """Seconds left of the run's PIPELINE_DEADLINE_SECONDS."""
+    return max(1.0, PIPELINE_DEADLINE_SECONDS - (time.time() - run.started))
+
+
+def _collect(run: PipelineRun) -> None:
+    """Spawn a run and wait for it on a collector thread."""
+    try:
+        run.process = spawn_decide_clip(run.video_id, run.prompt, run.env)
+        if run.cancelled:
+            _terminate(run)
+        stdout, stderr, run.timed_out = wait_decide_clip(run.process, _remaining(run))
+        _finish(run, run.process.returncode, stdout, stderr)
+    except Exception as e:
+        print(f"[PIPELINE] Run {run.key!r} failed: {str(e)}")
+        if not run.future.done():
+            _finish(run, 1, '', str(e))
+
+
+async def _collect_async(run: PipelineRun) -> None:
+    """Spawn a run as an asyncio subprocess and await it; no thread is held while it runs."""
+    try:
+        # Spawned like spawn_decide_clip, as an asyncio subprocess
+        run.process = await asyncio.create_subprocess_exec(
+            *run.command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=PIPELINE_CWD,
+            env=run.env,
+            start_new_session=True
+        )
+        if run.cancelled:
+            _terminate(run)
+        try:
+            stdout, stderr = await asyncio.wait_for(run.process.communicate(), _remaining(run))
+        except asyncio.TimeoutError:
+            run.timed_out = True
+            kill_process_group(run.process)
+            await run.process.wait()
+            stdout, stderr = b'', b''
+        # Recording the outcome writes to the metrics database
+        await asyncio.to_thread(_finish, run, run.process.returncode,
+                                stdout.decode('utf-8', 'replace'), stderr.decode('utf-8', 'replace'))
+    except Exception as e:
+        print(f"[PIPELINE] Run {run.key!r} failed: {str(e)}")
+        if not run.future.done():
+            _finish(run, 1, '', str(e))
+    finally:
+        # The event loop is shutting down: do not leave the child running or its waiters hanging
+        if not run.future.done():
+            if run.process is not None:
+                kill_process_group(run.process)
+            _finish(run, 1, '', "Pipeline run interrupted")
+
+
+def _run_result(run: PipelineRun) -> subprocess.CompletedProcess:
+    """The finished process of a run, raising TimeoutExpired if it was killed at the deadline."""
+    if run.timed_out:
+        raise subprocess.TimeoutExpired(run.command, PIPELINE_DEADLINE_SECONDS)
+    return run.future.result()
+
+
+def _start_thread(run: PipelineRun) -> None:
+    """Start the collector thread of a new run."""
+    threading.Thread(target=_collect, args=(run,), daemon=True, name='pipeline-collector').start()
+
+
+def run_pipeline(video_id: str, prompt: str, user: str = 'anonymous', profile_id: Optional[str] = None,
+                 disconnected: Callable[[], bool] = lambda: False) -> Optional[subprocess.CompletedProcess]:
+    """
+    Run decide_clip.py for a video and prompt, joining a run already in progress, and wait on
+    the calling thread. disconnected is polled every PIPELINE_POLL_SECONDS.
+
+    Args:
+        video_id (str): YouTube video ID
+        prompt (str): Search prompt
+        user (str): User the request is made for (used for fair LLM scheduling)
+        profile_id (str, optional): Profile the run under this ID (ignored when joining a run)
+        disconnected (Callable[[], bool]): True once the waiting client has gone away
+
+    Returns:
+        Optional[subprocess.CompletedProcess]: The finished process, or None if the client disconnected
+
+    Raises:
+        subprocess.TimeoutExpired: If the run exceeded PIPELINE_DEADLINE_SECONDS (the child is killed)
+    """
+    run = _join_run(video_id, prompt, user, profile_id, _start_thread)
+    gone = False
+    try:
+        while not wait([run.future], timeout=PIPELINE_POLL_SECONDS)[0]:
+            if disconnected():
+                gone = True
+                break
+    finally:
+        _leave_run(run, gone)
+    if gone:
+        print(f"[DEBUG] Client disconnected while waiting for the pipeline")
+        return None
+    return _run_result(run)
+
+
+async def run_pipeline_async(video_id: str, prompt: str, user: str = 'anonymous', profile_id: Optional[str] = None,
+                             disconnected: Callable[[], Awaitable[bool]] = None) -> Optional[subprocess.CompletedProcess]:
+    """
+    run_pipeline for coroutines: a new run is spawned as an asyncio subprocess, and waiting holds
+    no thread. disconnected is awaited every PIPELINE_POLL_SECONDS.
+
+    Args:
+        video_id (str): YouTube video ID
+        prompt (str): Search prompt
+        user (str): User the request is made for (used for fair LLM scheduling)
+        profile_id (str, optional): Profile the run under this ID (ignored when joining a run)
+        disconnected (Callable[[], Awaitable[bool]], optional): True once the waiting client has gone away
+
+    Returns:
+        Optional[subprocess.CompletedProcess]: The finished process, or None if the client disconnected
+
+    Raises:
+        subprocess.TimeoutExpired: If the run exceeded PIPELINE_DEADLINE_SECONDS (the child is killed)
+    """
+    def start(run: PipelineRun) -> None:
+        run.task = asyncio.get_running_loop().create_task(_collect_async(run))
+
+    run = _join_run(video_id, prompt, user, profile_id, start)
+    # A run started by a Flask request thread completes this future from its collector thread
+    finished = asyncio.wrap_future(run.future)
+    gone = False
+    try:
+        while not (await asyncio.wait({finished}, timeout=PIPELINE_POLL_SECONDS))[0]:
+            if disconnected is not None and await disconnected():
+                gone = True
+                break
+    finally:
+        _leave_run(run, gone)
+    if gone:
+        print(f"[DEBUG] Client disconnected while waiting for the pipeline")
+        return None
+    return _run_result(run)
+
+
+class QueuedJob:
+    """
+    A pipeline job on the job queue (PIPELINE_MODE=queue), polled until a worker finishes it.
+    Identical live jobs are joined. While the client stays connected the job is kept wanted;
+    a queued job nobody waits for any more is abandoned before a worker starts it.
+    """
+
+    def __init__(self, video_id: str, prompt: str, user: str = 'anonymous'):
+        job = job_queue.enqueue(video_id, prompt, user=user)
+        self.key = job['job_key']
+        self.job = job
+        self.started = self.last_touch = time.time()
+        print(f"[DEBUG] Enqueued pipeline job {self.key} ({job['status']})")
+
+    def poll(self) -> Optional[subprocess.CompletedProcess]:
+        """
+        Refresh the job, keeping it wanted.
+
+        Returns:
+            Optional[subprocess.CompletedProcess]: Outcome in the same shape as a decide_clip.py run
+            (return code 0 when done, 1 when failed), or None while the job is live
+
+        Raises:
+            subprocess.TimeoutExpired: If the job did not finish within PIPELINE_DEADLINE_SECONDS
+        """
+        if self.job['status'] in job_queue.TERMINAL_STATUSES:
+            if self.job['status'] == 'done':
+                return subprocess.CompletedProcess(['job', self.key], 0, '', '')
+            return subprocess.CompletedProcess(['job', self.key], 1, '',
+                                               self.job['error'] or f"Job {self.job['status']}")
+        if time.time() - self.started > PIPELINE_DEADLINE_SECONDS:
+            raise subprocess.TimeoutExpired(['job', self.key], PIPELINE_DEADLINE_SECONDS)
+        if time.time() - self.last_touch > job_queue.JOB_WANTED_SECONDS / 3:
+            job_queue.touch(self.key)
+            self.last_touch = time.time()
+        self.job = job_queue.get_job(self.key)
+        return None
+
+
+def run_queued_pipeline(video_id: str, prompt: str, user: str = 'anonymous',
+                        disconnected: Callable[[], bool] = lambda: False) -> Optional[subprocess.CompletedProcess]:
+    """
+    Enqueue the pipeline for a video and prompt and wait for a worker to finish it.
+
+    Args:
+        video_id (str): YouTube video ID
+        prompt (str): Search prompt
+        user (str): User the request is made for (used for fair LLM scheduling)
+        disconnected (Callable[[], bool]): True once the waiting client has gone away
+
+    Returns:
+        Optional[subprocess.CompletedProcess]: Outcome (see QueuedJob.poll), or None if the client disconnected
+
+    Raises:
+        subprocess.TimeoutExpired: If the job did not finish within PIPELINE_DEADLINE_SECONDS
+    """
+    job = QueuedJob(video_id, prompt, user)
+    result = job.poll()
+    while result is None:
+        time.sleep(PIPELINE_POLL_SECONDS)
+        if disconnected():
+            print(f"[DEBUG] Client disconnected while waiting for job {job.key}")
+            return None
+        result = job.poll()
+    return result
+
+
+async def run_queued_pipeline_async(video_id: str, prompt: str, user: str = 'anonymous',
+                                    disconnected: Callable[[], Awaitable[bool]] = None) -> Optional[subprocess.CompletedProcess]:
+    """
+    run_queued_pipeline for coroutines: the queue database is read on the default executor.
+
+    Args:
+        video_id (str): YouTube video ID
+        prompt (str): Search prompt
+        user (str): User the request is made for (used for fair LLM scheduling)
+        disconnected (Callable[[], Awaitable[bool]], optional): True once the waiting client has gone away
+
+    Returns:
+        Optional[subprocess.CompletedProcess]: Outcome (see QueuedJob.poll), or None if the client disconnected
+
+    Raises:
+        subprocess.TimeoutExpired: If the job did not finish within PIPELINE_DEADLINE_SECONDS
+    """
+    job = await asyncio.to_thread(QueuedJob, video_id, prompt, user)
+    result = await asyncio.to_thread(job.poll)
+    while result is None:
+        await asyncio.sleep(PIPELINE_POLL_SECONDS)
+        if disconnected is not None and await disconnected():
+            print(f"[DEBUG] Client disconnected while waiting for job {job.key}")
+            return None
+        result = await asyncio.to_thread(job.poll)
+    return result
+
@@ -0,0 +1,204 @@
+"""
+Off-peak precomputation of the most requested (video, prompt) pairs.
+The access log (access_log.py) counts /api/get requests; this job takes the top pairs of a recent
+window and makes sure each has a current segment result in the cache before the next peak. A pair
+whose result is missing, was routed under an old policy, or is older than the refresh age is run
+through decide_clip.py at batch priority, so the LLM scheduler serves interactive requests first.
+With PIPELINE_MODE=queue the pairs are enqueued as batch jobs for the workers instead.
+
+Usage: python precompute.py [--top-k N] [--window-days D] [--min-hits N] [--refresh-hours H] [--workers N] [--dry-run]
+"""
+import os
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict
+
+import job_queue
+from access_log import top_queries
+from decide_clip import get_segments_path
+from model_router import route_satisfies
+from pipeline_runs import spawn_decide_clip, wait_decide_clip, run_outcome
+from prompt_cache import find_match
+from stage_metrics import record_stage
+from storage import resolve_artifact_path, read_json_artifact
+from resilience import PIPELINE_DEADLINE_SECONDS
+
+# Number of most requested pairs kept precomputed
+PRECOMPUTE_TOP_K = int(os.getenv('PRECOMPUTE_TOP_K', '50'))
+# Popularity is counted over this many recent days
+PRECOMPUTE_WINDOW_DAYS = float(os.getenv('PRECOMPUTE_WINDOW_DAYS', '7'))
+# Pairs requested fewer times in the window are not precomputed
+PRECOMPUTE_MIN_HITS = int(os.getenv('PRECOMPUTE_MIN_HITS', '3'))
+# Cached results older than this are recomputed (0 keeps them until evicted or invalidated)
+PRECOMPUTE_REFRESH_HOURS = float(os.getenv('PRECOMPUTE_REFRESH_HOURS', '168'))
+# Pipeline runs in parallel (inline mode); each waits in the LLM scheduler at batch priority
+PRECOMPUTE_WORKERS = int(os.getenv('PRECOMPUTE_WORKERS', '2'))
+# User the LLM scheduler and job queue account precomputation to
+PRECOMPUTE_USER = 'precompute'
+
+
+def cached_result(video_id: str, prompt: str) -> Optional[Dict]:
+    """
+    Find the result /api/get would serve for a pair without running the pipeline.
+
+    Args:
+        video_id (str): YouTube video ID
+        prompt (str): Requested prompt
+
+    Returns:
+        Optional[Dict]: segments_path and age_seconds of the result, or None if there is none
+    """
+    candidates = [get_segments_path(video_id, prompt)]
+    match = find_match(video_id, prompt)
+    if match:
+        candidates.append(match["segments_path"])
+    for segments_path in candidates:
+        stored_path = resolve_artifact_path(segments_path)
+        if not stored_path:
+            continue
+        try:
+            data = read_json_artifact(segments_path)
+        except Exception as e:
+            print(f"[PRECOMPUTE] Unreadable result {segments_path}: {str(e)}")
+            continue
+        if not isinstance(data, dict):
+            # A bare segment list from older playlist runs, which /api/get does not serve either
+            print(f"[PRECOMPUTE] Ignoring result in an old format: {segments_path}")
+            continue
+        if route_satisfies(data.get('routing'), 'segments'):
+            return {"segments_path": segments_path, "age_seconds": time.time() - os.path.getmtime(stored_path)}
+    return None
+
+
+def plan_precompute(queries: List[Dict], refresh_hours: float = PRECOMPUTE_REFRESH_HOURS) -> List[Dict]:
+    """
+    Decide which popular pairs need a pipeline run.
+
+    Args:
+        queries (List[Dict]): Pairs from access_log.top_queries
+        refresh_hours (float): Recompute results older than this (0 disables)
+
+    Returns:
+        List[Dict]: The pairs with a status: fresh, stale (too old) or missing
+    """
+    planned = []
+    for query in queries:
+        result = cached_result(query["video_id"], query["prompt"])
+        if result is None:
+            status = 'missing'
+        elif refresh_hours > 0 and result["age_seconds"] > refresh_hours * 3600:
+            status = 'stale'
+        else:
+            status = 'fresh'
+        planned.append({**query, "status": status})
+    return planned
+
+
+def run_pipeline(video_id: str, prompt: str) -> str:
+    """
+    Run decide_clip.py for one pair at batch priority.
+
+    Args:
+        video_id (str): YouTube video ID
+        prompt (str): Prompt to answer
+
+    Returns:
+        str: Outcome (success, rate_limited, error or timeout)
+    """
+    env = {**os.environ, 'LLM_PRIORITY': 'batch', 'LLM_USER': PRECOMPUTE_USER}
+    started = time.time()
+    process = spawn_decide_clip(video_id, prompt, env)
+    stdout, stderr, timed_out = wait_decide_clip(process, PIPELINE_DEADLINE_SECONDS)
+    outcome = 'timeout' if timed_out else run_outcome(process.returncode)
+    record_stage('precompute', outcome, (time.time() - started) * 1000,
+                 detail=None if outcome == 'success' else (stderr or stdout)[-500:])
+    return outcome
+
+
+def precompute(top_k: int = PRECOMPUTE_TOP_K, window_days: float = PRECOMPUTE_WINDOW_DAYS,
+               min_hits: int = PRECOMPUTE_MIN_HITS, refresh_hours: float = PRECOMPUTE_REFRESH_HOURS,
+               workers: int = PRECOMPUTE_WORKERS, mode: Optional[str] = None, dry_run: bool = False,
+               state_dir: Optional[str] = None) -> Dict:
+    """
+    Precompute or refresh the segment results of the most requested pairs.
+
+    Args:
+        top_k (int): Number of most requested pairs to consider
+        window_days (float): Count requests from this many days back
+        min_hits (int): Skip pairs requested fewer times
+        refresh_hours (float): Recompute results older than this (0 disables)
+        workers (int): Parallel pipeline runs in inline mode
+        mode (str, optional): 'inline' or 'queue'. Defaults to PIPELINE_MODE.
+        dry_run (bool): Report the plan without running anything
+        state_dir (str, optional): Directory holding the access log database
+
+    Returns:
+        Dict: Counts per plan status and outcome, and the planned pairs
+    """
+    started = time.time()
+    mode = (mode or os.getenv('PIPELINE_MODE', 'inline')).lower()
+    planned = plan_precompute(top_queries(top_k, window_days, min_hits, state_dir), refresh_hours)
+    todo = [query for query in planned if query["status"] != 'fresh']
+    print(f"[PRECOMPUTE] {len(planned)} popular queries, {len(todo)} to compute ({mode} mode)")
+
+    rate_limited = threading.Event()
+
+    def _run(query: Dict) -> str:
+        # Once the scheduler turns batch work away, leave the rest for the next off-peak run
+        if rate_limited.is_set():
+            return 'skipped'
+        outcome = run_pipeline(query["video_id"], query["prompt"])
+        if outcome == 'rate_limited':
+            rate_limited.set()
+        print(f"[PRECOMPUTE] {query['video_id']} {query['prompt']!r} ({query['hits']} hits): {outcome}")
+        return outcome
+
+    if dry_run:
+        outcomes = ['planned'] * len(todo)
+    elif mode == 'queue':
+        outcomes = []
+        for query in todo:
+            job = job_queue.enqueue(query["video_id"], query["prompt"], priority='batch',
+                                    user=PRECOMPUTE_USER, wanted_seconds=None)
+            outcomes.append('enqueued' if job['status'] not in job_queue.TERMINAL_STATUSES else job['status'])
+    else:
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='precompute') as executor:
+            outcomes = list(executor.map(_run, todo))
+    for query, outcome in zip(todo, outcomes):
+        query["outcome"] = outcome
+
+    summary = {"queries": len(planned)}
+    for status in ('fresh', 'stale', 'missing'):
+        summary[status] = sum(1 for query in planned if query["status"] == status)
+    summary["outcomes"] = {outcome: outcomes.count(outcome) for outcome in sorted(set(outcomes))}
+    summary["planned"] = planned
+    summary["duration_ms"] = int((time.time() - started) * 1000)
+    print(f"[PRECOMPUTE] Done: {summary['fresh']} fresh, {summary['outcomes']}")
+    return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Precompute segment results of the most requested queries")
+    parser.add_argument('--top-k', type=int, default=PRECOMPUTE_TOP_K, help="Number of most requested pairs")
+    parser.add_argument('--window-days', type=float, default=PRECOMPUTE_WINDOW_DAYS,
+                        help="Count requests from this many days back")
+    parser.add_argument('--min-hits', type=int, default=PRECOMPUTE_MIN_HITS, help="Skip pairs requested fewer times")
+    parser.add_argument('--refresh-hours', type=float, default=PRECOMPUTE_REFRESH_HOURS,
+                        help="Recompute results older than this (0 disables)")
+    parser.add_argument('--workers', type=int, default=PRECOMPUTE_WORKERS, help="Parallel pipeline runs (inline mode)")
+    parser.add_argument('--mode', choices=('inline', 'queue'), default=None,
+                        help="Run the pipeline here or enqueue batch jobs (default: PIPELINE_MODE)")
+    parser.add_argument('--dry-run', action='store_true', help="Report the plan without running anything")
+    args = parser.parse_args()
+
+    summary = precompute(top_k=args.top_k, window_days=args.window_days, min_hits=args.min_hits,
+                         refresh_hours=args.refresh_hours, workers=args.workers, mode=args.mode,
+                         dry_run=args.dry_run)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+"""
+Background transcript prefetching (cache warming).
+Jobs fetch and clean transcripts for a list of videos through a bounded thread pool, so the
+first student searching a lecture does not pay for the YouTube fetch. A video already being
+fetched is shared between jobs instead of being fetched twice. Cancelling a job drops the
+videos it still has queued; fetches already running finish so their transcripts are cached.
+"""
+import os
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, Future, wait
+from typing import Optional, List, Dict, Callable, Iterable, Iterator
+
+from storage import resolve_artifact_path, read_text_artifact
+
+PREFETCH_WORKERS = int(os.getenv('PREFETCH_WORKERS', '4'))
+# Finished jobs beyond this many are forgotten, oldest first
+PREFETCH_MAX_JOBS = int(os.getenv('PREFETCH_MAX_JOBS', '100'))
+
+TEMP_DIR = os.path.join(os.path.dirname(__file__), 'temporary_files')
+
+# Re-entrant: a done-callback added to an already finished future runs while the lock is held
+_lock = threading.RLock()
+_executor = None
+_inflight = {}
+_jobs = {}
+# Requests currently blocked in wait_for_fetch, per video
+_waiters = {}
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Create the shared fetch pool on first use."""
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix='prefetch')
+        return _executor
+
+
+def transcript_path(video_id: str) -> str:
+    """Logical path of a video's cleaned transcript."""
+    return os.path.join(TEMP_DIR, f'transcript_{video_id}.txt')
+
+
+def _fetch(video_id: str) -> None:
+    """Fetch, clean, store and index one transcript (and build its outline when OUTLINE_MODE=fetch)."""
+    from transcript_fetch import fetch_transcript
+    import topic_outline
+    transcript_content = fetch_transcript(f"https://www.youtube.com/watch?v={video_id}")
+    if topic_outline.OUTLINE_MODE == 'fetch':
+        try:
+            topic_outline.ensure_outline(video_id, transcript_content, priority='batch')
+        except Exception as e:
+            print(f"[PREFETCH] Failed to build outline of {video_id}: {str(e)}")
+
+
+def submit_fetch(video_id: str) -> Future:
+    """
+    Start fetching a transcript in the background, or join a fetch already in progress.
+
+    Args:
+        video_id (str): YouTube video ID
+
+    Returns:
+        Future: Completes when the transcript is stored
+    """
+    executor = _get_executor()
+    with _lock:
+        future = _inflight.get(video_id)
+        if future is None:
+            future = executor.submit(_fetch, video_id)
+            _inflight[video_id] = future
+
+            def _done(_, video_id=video_id):
+                with _lock:
+                    _inflight.pop(video_id, None)
+            future.add_done_callback(_done)
+        return future
+
+
+def prefetch_video(video_id: str) -> bool:
+    """
+    Opportunistically fetch one transcript in the background if it is not cached.
+
+    Args:
+        video_id (str): YouTube video ID
+
+    Returns:
+        bool: True if a fetch is now running for the video
+    """
+    if resolve_artifact_path(transcript_path(video_id)):
+        return False
+    submit_fetch(video_id)
+    return True
+
+
+def is_fetching(video_id: str) -> bool:
+    """
+    Check whether a background fetch of a video is queued or running.
+
+    Args:
+        video_id (str): YouTube video ID
+
+    Returns:
+        bool: True if a fetch is in progress
+    """
+    with _lock:
+        return video_id in _inflight
+
+
+@contextmanager
+def waiting_for_fetch(video_id: str) -> Iterator[Optional[Future]]:
+    """
+    Hold a request's interest in the background fetch of a video while it waits, so cancelling
+    the prefetch job does not drop a fetch the request relies on.
+
+    Args:
+        video_id (str): YouTube video ID
+
+    Yields:
+        Optional[Future]: The fetch in progress (asyncio callers await it with asyncio.wrap_future),
+        or None if the video is not being fetched
+    """
+    with _lock:
+        future = _inflight.get(video_id)
+        if future is not None:
+            _waiters[video_id] = _waiters.get(video_id, 0) + 1
+    try:
+        yield future
+    finally:
+        if future is not None:
+            with _lock:
+                _waiters[video_id] -= 1
+                if not _waiters[video_id]:
+                    del _waiters[video_id]
+
+
+def wait_for_fetch(video_id: str, timeout: Optional[float] = None) -> bool:
+    """
+    Wait for a background fetch of a video, if one is running, so it is not fetched twice.
+
+    Args:
+        video_id (str): YouTube video ID
+        timeout (float, optional): Maximum seconds to wait
+
+    Returns:
+        bool: True if a fetch was running and has finished
+    """
+    with waiting_for_fetch(video_id) as future:
+        if future is None:
+            return False
+        done, _ = wait([future], timeout=timeout)
+        return bool(done)
+
+
+def _set_video(job: Dict, video_id: str, status: str, error: Optional[str] = None) -> None:
+    """Update one video of a job and its counters."""
+    with _lock:
+        previous = job['videos'].get(video_id, {}).get('status')
+        if previous:
+            job['counts'][previous] -= 1
+        job['videos'][video_id] = {'status': status, **({'error': error} if error else {})}
+        job['counts'][status] = job['counts'].get(status, 0) + 1
+
+
+def _settle_video(job: Dict, video_id: str, future: Future) -> None:
+    """Record the outcome of a finished (or cancelled) fetch on a job."""
+    if future.cancelled():
+        _set_video(job, video_id, 'cancelled')
+        return
+    error = future.exception()
+    _set_video(job, video_id, 'failed' if error else 'fetched', str(error) if error else None)
+
+
+def _run_job(job: Dict, video_ids: Optional[List[str]], resolve_video_ids: Optional[Callable[[], Iterable[str]]],
+             build_index: bool) -> None:
+    """Drive one prefetch job: resolve its videos, fetch what is missing and wait for completion."""
+    try:
+        if resolve_video_ids is not None:
+            # Videos are fetched as they are resolved; the total grows while a playlist is paged through
+            job['status'] = 'resolving'
+            video_ids = resolve_video_ids()
+        else:
+            job['status'] = 'running'
+
+        futures = []
+        seen = set()
+        for video_id in video_ids or []:
+            if job['cancelled']:
+                break
+            if video_id in seen:
+                continue
+            seen.add(video_id)
+            job['total'] = len(seen)
+            if resolve_artifact_path(transcript_path(video_id)):
+                if build_index:
+                    try:
+                        from search_index import index_transcript
+                        index_transcript(video_id, read_text_artifact(transcript_path(video_id)))
+                    except Exception as e:
+                        print(f"[PREFETCH] Failed to index {video_id}: {str(e)}")
+                _set_video(job, video_id, 'cached')
+                continue
+
+            with _lock:
+                if job['cancelled']:
+                    break
+                _set_video(job, video_id, 'pending')
+                future = submit_fetch(video_id)
+            future.add_done_callback(lambda future, video_id=video_id: _settle_video(job, video_id, future))
+            futures.append((video_id, future))
+
+        job['status'] = 'running'
+        wait([future for _, future in futures])
+        # Callbacks may still be running after wait() returns; settle the final states here
+        for video_id, future in futures:
+            _settle_video(job, video_id, future)
+        job['status'] = 'cancelled' if job['cancelled'] else 'done'
+    except Exception as e:
+        print(f"[PREFETCH] Job {job['job_id']} failed: {str(e)}")
+        job['status'] = 'failed'
+        job['error'] = str(e)
+    finally:
+        job['finished_at'] = time.time()
+
+
+def start_prefetch(video_ids: Optional[List[str]] = None,
+                   resolve_video_ids: Optional[Callable[[], Iterable[str]]] = None,
+                   build_index: bool = True) -> Dict:
+    """
+    Start a background prefetch job.
+
+    Args:
+        video_ids (List[str], optional): Videos to prefetch
+        resolve_video_ids (Callable[[], Iterable[str]], optional): Called in the background to list
+            the videos instead (e.g. to enumerate a playlist); may be a lazy generator
+        build_index (bool): Also make sure already-cached transcripts are in the search index
+
+    Returns:
+        Dict: The job (see get_job)
+    """
+    job = {
+        'job_id': uuid.uuid4().hex[:12],
+        'status': 'queued',
+        'created_at': time.time(),
+        'finished_at': None,
+        'total': len(video_ids or []),
+        'cancelled': False,
+        'counts': {'pending': 0, 'cached': 0, 'fetched': 0, 'failed': 0, 'cancelled': 0},
+        'videos': {}
+    }
+    with _lock:
+        _jobs[job['job_id']] = job
+        finished = [job_id for job_id, j in _jobs.items() if j['finished_at']]
+        for job_id in finished[:max(0, len(_jobs) - PREFETCH_MAX_JOBS)]:
+            del _jobs[job_id]
+
+    threading.Thread(target=_run_job, args=(job, video_ids, resolve_video_ids, build_index),
+                     daemon=True, name=f"prefetch-{job['job_id']}").start()
+    return get_job(job['job_id'])
+
+
+def get_job(job_id: str) -> Optional[Dict]:
+    """
+    Get the progress of a prefetch job.
+
+    Args:
+        job_id (str): Job ID returned by start_prefetch
+
+    Returns:
+        Optional[Dict]: Job status, counts per video status and per-video details, or None if unknown
+    """
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        done = sum(job['counts'][status] for status in ('cached', 'fetched', 'failed', 'cancelled'))
+        return {
+            **job,
+            'counts': dict(job['counts']),
+            'videos': dict(job['videos']),
+            'progress': round(done / job['total'], 3) if job['total'] else (1.0 if job['finished_at'] else 0.0)
+        }
+
+
+def _wanted_elsewhere(video_id: str, job: Dict) -> bool:
+    """Whether another unfinished job or a waiting request still needs a video's fetch."""
+    if _waiters.get(video_id):
+        return True
+    return any(other is not job and not other['cancelled']
+               and other['videos'].get(video_id, {}).get('status') == 'pending'
+               for other in _jobs.values())
+
+
+def cancel_job(job_id: str) -> Optional[Dict]:
+    """
+    Cancel a prefetch job. Its queued fetches are dropped unless another job or a waiting
+    request still needs them; fetches already running are left to finish and be cached.
+
+    Args:
+        job_id (str): Job ID returned by start_prefetch
+
+    Returns:
+        Optional[Dict]: The job (see get_job), or None if unknown
+    """
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        if not job['finished_at'] and not job['cancelled']:
+            job['cancelled'] = True
+            dropped = 0
+            for video_id, video in list(job['videos'].items()):
+                future = _inflight.get(video_id)
+                if (video['status'] == 'pending' and future is not None
+                        and not _wanted_elsewhere(video_id, job) and future.cancel()):
+                    dropped += 1
+            print(f"[PREFETCH] Job {job_id} cancelled, {dropped} queued fetches dropped")
+    return get_job(job_id)
+
+
+def list_jobs() -> List[Dict]:
+    """
+    List known prefetch jobs without per-video details, newest first.
+
+    Returns:
+        List[Dict]: Job summaries
+    """
+    with _lock:
+        job_ids = list(_jobs)
+    jobs = [get_job(job_id) for job_id in reversed(job_ids)]
+    return [{k: v for k, v in job.items() if k != 'videos'} for job in jobs if job]
@@ -0,0 +1,248 @@
+"""
+Opt-in profiling of pipeline runs.
+A run whose PROFILE_REQUEST_ID environment variable is set (by app.py for requests carrying the
+admin token and sampled traffic, or by worker.py) records cProfile statistics and the top tracemalloc
+allocation sites of each stage. Results are stored per request under temporary_files/profiles/.
+Without the variable every hook is a no-op, and cProfile/tracemalloc are not even imported.
+"""
+import os
+import json
+import time
+import uuid
+import random
+import shutil
+from contextlib import contextmanager
+from typing import Optional, List, Dict
+
+PROFILE_ENV = 'PROFILE_REQUEST_ID'
+
+# Fraction of pipeline runs profiled without being asked to
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_TOP_FUNCTIONS = int(os.getenv('PROFILE_TOP_FUNCTIONS', '30'))
+PROFILE_TOP_ALLOCATIONS = int(os.getenv('PROFILE_TOP_ALLOCATIONS', '15'))
+# Profiles of older requests beyond this many are deleted
+PROFILE_MAX_REQUESTS = int(os.getenv('PROFILE_MAX_REQUESTS', '200'))
+
+PROFILE_DIR = os.path.join(os.path.dirname(__file__), 'temporary_files', 'profiles')
+
+_stages = []
+_active_stage = None
+_combined_stats = None
+
+
+def choose_profile_id(requested: bool) -> Optional[str]:
+    """
+    Decide whether a pipeline run is profiled.
+
+    Args:
+        requested (bool): An admin-authorized request asked for profiling (header or query flag)
+
+    Returns:
+        Optional[str]: A new profile/request ID, or None if the run is not profiled
+    """
+    if requested:
+        return uuid.uuid4().hex[:16]
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return uuid.uuid4().hex[:16]
+    return None
+
+
+def current_request_id() -> Optional[str]:
+    """Profile ID of this process's run, or None if it is not profiled."""
+    return os.getenv(PROFILE_ENV) or None
+
+
+def _top_functions(stats, limit: int) -> List[Dict]:
+    """The functions with the highest cumulative time."""
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+    return [{
+        'function': f"{filename}:{line}({name})",
+        'calls': calls,
+        'own_ms': round(own * 1000, 2),
+        'cumulative_ms': round(cumulative * 1000, 2)
+    } for (filename, line, name), (_, calls, own, cumulative, _) in rows]
+
+
+def _top_allocations(before, after, limit: int) -> List[Dict]:
+    """The source lines that allocated the most memory still held at the end of a stage."""
+    import tracemalloc
+    ignore = (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__))
+    diff = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), 'lineno')
+    return [{
+        'site': str(stat.traceback[0]),
+        'size_kb': round(stat.size_diff / 1024, 1),
+        'count': stat.count_diff
+    } for stat in diff[:limit] if stat.size_diff > 0]
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Profile the enclosed block as one pipeline stage when this run is profiled.
+    Only one profiler can run at a time, so a nested stage (e.g. download inside fetch) records
+    its duration and parent stage; its functions and allocations count towards the outer stage.
+
+    Args:
+        name (str): Stage name (e.g. fetch, clean, analyze)
+    """
+    global _active_stage
+    if not current_request_id():
+        yield
+        return
+    if _active_stage is not None:
+        started = time.time()
+        try:
+            yield
+        finally:
+            _stages.append({
+                'stage': name,
+                'parent': _active_stage,
+                'duration_ms': round((time.time() - started) * 1000, 1)
+            })
+        return
+
+    import cProfile
+    import pstats
+    import tracemalloc
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(10)
+    tracemalloc.reset_peak()
+    stage_profile = cProfile.Profile()
+    before = tracemalloc.take_snapshot()
+    started = time.time()
+    _active_stage = name
+    stage_profile.enable()
+    try:
+        yield
+    finally:
+        stage_profile.disable()
+        _active_stage = None
+        duration_ms = (time.time() - started) * 1000
+        after = tracemalloc.take_snapshot()
+        stats = pstats.Stats(stage_profile)
+        _add_to_combined(stage_profile)
+        _stages.append({
+            'stage': name,
+            'duration_ms': round(duration_ms, 1),
+            'peak_memory_kb': round(tracemalloc.get_traced_memory()[1] / 1024, 1),
+            'top_functions': _top_functions(stats, PROFILE_TOP_FUNCTIONS),
+            'top_allocations': _top_allocations(before, after, PROFILE_TOP_ALLOCATIONS)
+        })
+
+
+def _add_to_combined(stage_profile) -> None:
+    """Merge a stage's statistics into the process-wide profile."""
+    global _combined_stats
+    import pstats
+    if _combined_stats is None:
+        _combined_stats = pstats.Stats(stage_profile)
+    else:
+        _combined_stats.add(stage_profile)
+
+
+def save(process: str, meta: Optional[Dict] = None) -> Optional[str]:
+    """
+    Write this process's stage summaries (JSON) and combined cProfile data (.prof, readable
+    with pstats or snakeviz) for the current request.
+
+    Args:
+        process (str): Name of the process within the run (e.g. decide_clip, transcript_fetch)
+        meta (Dict, optional): Extra details stored with the summary (video, prompt, ...)
+
+    Returns:
+        Optional[str]: Directory holding the request's profiles, or None if not profiled
+    """
+    request_id = current_request_id()
+    if not request_id or not _stages:
+        return None
+    try:
+        request_dir = os.path.join(PROFILE_DIR, request_id)
+        os.makedirs(request_dir, exist_ok=True)
+        summary = {
+            'request_id': request_id,
+            'process': process,
+            'created': time.time(),
+            **(meta or {}),
+            'stages': _stages
+        }
+        with open(os.path.join(request_dir, f'{process}.json'), 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+        _combined_stats.dump_stats(os.path.join(request_dir, f'{process}.prof'))
+        prune_profiles()
+        print(f"[PROFILE] Saved {process} profile for request {request_id}")
+        return request_dir
+    except Exception as e:
+        print(f"[PROFILE] Failed to save profile: {str(e)}")
+        return None
+
+
+def prune_profiles(max_requests: int = PROFILE_MAX_REQUESTS) -> int:
+    """
+    Delete the profiles of the oldest requests beyond max_requests.
+
+    Args:
+        max_requests (int): Number of requests to keep
+
+    Returns:
+        int: Number of requests deleted
+    """
+    requests = list_profiles()
+    for entry in requests[max_requests:]:
+        shutil.rmtree(os.path.join(PROFILE_DIR, entry['request_id']), ignore_errors=True)
+    return max(0, len(requests) - max_requests)
+
+
+def list_profiles() -> List[Dict]:
+    """
+    List profiled requests, newest first.
+
+    Returns:
+        List[Dict]: request_id, created time and the processes profiled
+    """
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    requests = []
+    with os.scandir(PROFILE_DIR) as entries:
+        for entry in entries:
+            if not entry.is_dir():
+                continue
+            processes = sorted(name[:-5] for name in os.listdir(entry.path) if name.endswith('.json'))
+            requests.append({'request_id': entry.name, 'created': entry.stat().st_mtime, 'processes': processes})
+    requests.sort(key=lambda r: r['created'], reverse=True)
+    return requests
+
+
+def load_profile(request_id: str) -> Optional[Dict]:
+    """
+    Load the stage summaries of a profiled request.
+
+    Args:
+        request_id (str): Profile/request ID
+
+    Returns:
+        Optional[Dict]: Summaries per process, or None if unknown
+    """
+    request_dir = os.path.join(PROFILE_DIR, os.path.basename(request_id))
+    if not os.path.isdir(request_dir):
+        return None
+    processes = {}
+    for name in sorted(os.listdir(request_dir)):
+        if name.endswith('.json'):
+            with open(os.path.join(request_dir, name), 'r', encoding='utf-8') as f:
+                processes[name[:-5]] = json.load(f)
+    return {'request_id': request_id, 'processes': processes}
+
+
+def profile_data_path(request_id: str, process: str) -> Optional[str]:
+    """
+    Path of the cProfile data of one process of a profiled request.
+
+    Args:
+        request_id (str): Profile/request ID
+        process (str): Process name
+
+    Returns:
+        Optional[str]: Path of the .prof file, or None if it does not exist
+    """
+    path = os.path.join(PROFILE_DIR, os.path.basename(request_id), f'{os.path.basename(process)}.prof')
+    return path if os.path.isfile(path) else None
@@ -0,0 +1,217 @@
+"""
+Query canonicalization in front of the segment cache.
+Prompts already answered for a video are recorded with their normalized terms; a new prompt whose
+terms closely match one of them (same stems, prefixes, small typos) reuses the cached segments
+instead of another Claude call.
+"""
+import os
+import sys
+import time
+from typing import Optional, List, Dict
+
+from state_store import get_connection
+from text_utils import tokenize
+from storage import resolve_artifact_path
+
+PROMPT_DB_NAME = 'prompt_cache.sqlite3'
+
+# Minimum similarity (0-1) for a prompt to reuse another prompt's segments
+PROMPT_MATCH_THRESHOLD = float(os.getenv('PROMPT_MATCH_THRESHOLD', '0.85'))
+# Similarity credited when one term is a prefix covering most of the other (e.g. "multip"/"multipli").
+# It stays below the default PROMPT_MATCH_THRESHOLD: a prefix match alone never reuses another prompt's segments.
+PREFIX_SIMILARITY = 0.8
+# Smallest share of the longer term a prefix must cover to get PREFIX_SIMILARITY
+PREFIX_MIN_COVERAGE = 0.6
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS prompts (
+    video_id TEXT NOT NULL,
+    canonical TEXT NOT NULL,
+    prompt TEXT NOT NULL,
+    segments_path TEXT NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (video_id, canonical)
+);
+"""
+
+_schema_ready = set()
+
+
+def _connect(state_dir: Optional[str] = None):
+    """Open the prompt cache database, creating the schema on first use."""
+    conn = get_connection(PROMPT_DB_NAME, state_dir)
+    key = state_dir or ''
+    if key not in _schema_ready:
+        conn.executescript(SCHEMA)
+        _schema_ready.add(key)
+    return conn
+
+
+def canonicalize(prompt: str) -> str:
+    """
+    Normalize a prompt to its sorted, de-duplicated stemmed terms (case, whitespace,
+    word order, stopwords and inflections are ignored).
+
+    Args:
+        prompt (str): User's prompt
+
+    Returns:
+        str: Canonical form, e.g. "how to multiply matrices" -> "matrix multip"
+    """
+    return " ".join(sorted(set(tokenize(prompt))))
+
+
+def _trigrams(term: str) -> set:
+    """Character trigrams of a term, padded so short terms still produce some."""
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def term_similarity(a: str, b: str) -> float:
+    """
+    Similarity of two stemmed terms: exact, prefix, or character-trigram overlap (typos).
+    A short prefix of a long term ("car"/"carbon", "gen"/"general") is only scored by its
+    trigrams, which credits it too little to match unless the prompts' other terms match.
+
+    Args:
+        a (str): First term
+        b (str): Second term
+
+    Returns:
+        float: Similarity between 0 and 1
+    """
+    if a == b:
+        return 1.0
+    shorter, longer = sorted((a, b), key=len)
+    if (len(shorter) >= 3 and longer.startswith(shorter)
+            and len(shorter) >= PREFIX_MIN_COVERAGE * len(longer)):
+        return PREFIX_SIMILARITY
+    ta, tb = _trigrams(a), _trigrams(b)
+    return 2 * len(ta & tb) / (len(ta) + len(tb))
+
+
+def prompt_similarity(canonical_a: str, canonical_b: str) -> float:
+    """
+    Soft overlap of two canonical prompts: every term is credited with its best match in the
+    other prompt, so an extra or missing term lowers the score.
+
+    Args:
+        canonical_a (str): Canonical prompt
+        canonical_b (str): Canonical prompt
+
+    Returns:
+        float: Similarity between 0 and 1
+    """
+    terms_a, terms_b = canonical_a.split(), canonical_b.split()
+    if not terms_a or not terms_b:
+        return 1.0 if canonical_a == canonical_b else 0.0
+    best_a = sum(max(term_similarity(a, b) for b in terms_b) for a in terms_a)
+    best_b = sum(max(term_similarity(b, a) for a in terms_a) for b in terms_b)
+    return (best_a + best_b) / (len(terms_a) + len(terms_b))
+
+
+def register_prompt(video_id: str, prompt: str, segments_path: str, state_dir: Optional[str] = None) -> None:
+    """
+    Record that segments for a prompt are cached at segments_path.
+
+    Args:
+        video_id (str): YouTube video ID
+        prompt (str): The answered prompt
+        segments_path (str): Logical path of the segments file
+        state_dir (str, optional): Directory holding the prompt cache database
+    """
+    conn = _connect(state_dir)
+    try:
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO prompts VALUES (?, ?, ?, ?, ?)",
+                         (video_id, canonicalize(prompt), prompt, segments_path, time.time()))
+    finally:
+        conn.close()
+
+
+def find_match(video_id: str, prompt: str, threshold: float = PROMPT_MATCH_THRESHOLD,
+               state_dir: Optional[str] = None) -> Optional[Dict]:
+    """
+    Find the closest already-answered prompt for a video. Entries whose segments file was
+    evicted are dropped along the way.
+
+    Args:
+        video_id (str): YouTube video ID
+        prompt (str): New prompt
+        threshold (float): Minimum similarity to accept
+        state_dir (str, optional): Directory holding the prompt cache database
+
+    Returns:
+        Optional[Dict]: matched prompt, canonical form, segments_path and score, or None
+    """
+    canonical = canonicalize(prompt)
+    conn = _connect(state_dir)
+    try:
+        rows = conn.execute("SELECT canonical, prompt, segments_path FROM prompts WHERE video_id = ?",
+                            (video_id,)).fetchall()
+        best = None
+        stale = []
+        for row in rows:
+            score = prompt_similarity(canonical, row["canonical"])
+            if score < threshold or (best and score <= best["score"]):
+                continue
+            if not resolve_artifact_path(row["segments_path"]):
+                stale.append(row["canonical"])
+                continue
+            best = {
+                "prompt": row["prompt"],
+                "canonical": row["canonical"],
+                "segments_path": row["segments_path"],
+                "score": round(score, 3)
+            }
+        if stale:
+            with conn:
+                conn.executemany("DELETE FROM prompts WHERE video_id = ? AND canonical = ?",
+                                 [(video_id, c) for c in stale])
+        return best
+    finally:
+        conn.close()
+
+
+def rebuild_prompt_index(cache_dir: Optional[str] = None, state_dir: Optional[str] = None) -> int:
+    """
+    Register every segments file already present in the cache directory.
+
+    Args:
+        cache_dir (str, optional): Directory with cached segments. Defaults to temporary_files.
+        state_dir (str, optional): Directory holding the prompt cache database
+
+    Returns:
+        int: Number of prompts registered
+    """
+    from cache_manager import list_artifacts
+    from storage import read_json_artifact
+
+    registered = 0
+    for artifact in list_artifacts(cache_dir):
+        if artifact["kind"] != "segments":
+            continue
+        logical_path = artifact["path"]
+        for suffix in ('.gz', '.zst'):
+            if logical_path.endswith(suffix):
+                logical_path = logical_path[:-len(suffix)]
+        try:
+            data = read_json_artifact(logical_path)
+            query = data.get("query") if isinstance(data, dict) else None
+            if query:
+                register_prompt(artifact["video_id"], query, logical_path, state_dir)
+                registered += 1
+        except Exception as e:
+            print(f"[PROMPT CACHE] Failed to register {artifact['name']}: {str(e)}")
+    return registered
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python prompt_cache.py --rebuild | <video_id> <prompt>")
+        sys.exit(1)
+
+    if sys.argv[1] == '--rebuild':
+        print(f"Registered {rebuild_prompt_index()} cached prompts")
+    else:
+        print(find_match(sys.argv[1], " ".join(sys.argv[2:])))
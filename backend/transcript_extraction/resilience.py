@@ -0,0 +1,485 @@
+"""
+Deadlines, retries, hedging and circuit breaking for the slow external calls
+(yt-dlp/YouTube fetches and Claude requests). Every outcome is reported to stage_metrics.
+Also holds the cooperative cancellation used when the client of a pipeline run goes away.
+"""
+import os
+import time
+import random
+import queue
+import signal
+import asyncio
+import threading
+import subprocess
+from contextlib import contextmanager
+from typing import Callable, Optional, Dict, Any, Awaitable
+
+from state_store import get_connection
+from stage_metrics import record_stage, get_latency_percentile
+
+# Per-stage policy: overall deadline (seconds), attempts and backoff bounds
+STAGE_POLICIES = {
+    'youtube_fetch': {
+        'deadline': float(os.getenv('YOUTUBE_FETCH_DEADLINE_SECONDS', '90')),
+        'max_attempts': int(os.getenv('YOUTUBE_FETCH_MAX_ATTEMPTS', '3')),
+        'base_delay': 1.0,
+        'max_delay': 10.0,
+    },
+    'llm': {
+        'deadline': float(os.getenv('LLM_DEADLINE_SECONDS', '120')),
+        'max_attempts': int(os.getenv('LLM_MAX_ATTEMPTS', '4')),
+        'base_delay': 2.0,
+        'max_delay': 20.0,
+    },
+}
+
+# Whole decide_clip.py run, as seen by app.py
+PIPELINE_DEADLINE_SECONDS = float(os.getenv('PIPELINE_DEADLINE_SECONDS', '300'))
+
+# Hedged LLM requests: send a second copy if the first has not answered after the stage's p95
+LLM_HEDGE_ENABLED = os.getenv('LLM_HEDGE_ENABLED', 'false').lower() in ('true', '1', 'yes', 'on')
+LLM_HEDGE_MIN_DELAY_SECONDS = float(os.getenv('LLM_HEDGE_MIN_DELAY_SECONDS', '5'))
+
+# Circuit breaker around YouTube fetches
+YOUTUBE_BREAKER_FAILURE_THRESHOLD = int(os.getenv('YOUTUBE_BREAKER_FAILURE_THRESHOLD', '5'))
+YOUTUBE_BREAKER_RESET_SECONDS = float(os.getenv('YOUTUBE_BREAKER_RESET_SECONDS', '60'))
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+RETRYABLE_FETCH_MARKERS = ('HTTP Error 429', 'HTTP Error 5', 'timed out', 'Connection reset',
+                           'Temporary failure', 'Remote end closed', 'IncompleteRead')
+
+BREAKER_DB_NAME = 'metrics.sqlite3'
+BREAKER_SCHEMA = """
+CREATE TABLE IF NOT EXISTS circuit_breakers (
+    name TEXT PRIMARY KEY,
+    failures INTEGER NOT NULL,
+    opened_at REAL
+);
+"""
+
+
+class StageTimeout(Exception):
+    """Raised when a stage runs out of its deadline."""
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is short-circuited because its dependency is failing."""
+
+
+class PipelineCancelled(BaseException):
+    """
+    Raised inside a pipeline process once it was asked to stop (SIGTERM). Like KeyboardInterrupt
+    it is not an Exception, so retry loops and generic error handlers let it through.
+    """
+
+
+def get_policy(stage: str) -> Dict:
+    """
+    Get the retry/deadline policy for a stage (llm_* stages share the llm policy).
+
+    Args:
+        stage (str): Stage name
+
+    Returns:
+        Dict: Policy with deadline, max_attempts, base_delay and max_delay
+    """
+    if stage in STAGE_POLICIES:
+        return STAGE_POLICIES[stage]
+    if stage.startswith('llm'):
+        return STAGE_POLICIES['llm']
+    return STAGE_POLICIES['youtube_fetch']
+
+
+def is_retryable_llm_error(error: Exception) -> bool:
+    """
+    Decide whether an Anthropic client error is transient (overloaded, rate limited, 5xx, network).
+
+    Args:
+        error (Exception): Error raised by the client
+
+    Returns:
+        bool: True if the request should be retried
+    """
+    if getattr(error, 'status_code', None) in RETRYABLE_STATUS_CODES:
+        return True
+    return type(error).__name__ in ('APIConnectionError', 'APITimeoutError', 'InternalServerError', 'OverloadedError')
+
+
+def is_retryable_fetch_error(error: Exception) -> bool:
+    """
+    Decide whether a yt-dlp failure is transient.
+
+    Args:
+        error (Exception): Error raised while fetching
+
+    Returns:
+        bool: True if the fetch should be retried
+    """
+    if isinstance(error, subprocess.TimeoutExpired):
+        return True
+    message = getattr(error, 'stderr', None) or str(error)
+    return any(marker in str(message) for marker in RETRYABLE_FETCH_MARKERS)
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """
+    Full-jitter exponential backoff.
+
+    Args:
+        attempt (int): Number of the attempt that just failed (1-based)
+        base_delay (float): Delay scale in seconds
+        max_delay (float): Upper bound in seconds
+
+    Returns:
+        float: Seconds to sleep before the next attempt
+    """
+    return random.uniform(0, min(max_delay, base_delay * (2 ** (attempt - 1))))
+
+
+def _retry_delay(stage: str, policy: Dict, error: Exception, attempt: int, started: float, deadline: float,
+                 is_retryable: Callable[[Exception], bool], breaker: Optional[str]) -> float:
+    """
+    Decide what follows a failed attempt: the delay before the next one, or (after recording
+    the failure) the error to raise.
+    """
+    elapsed_ms = (time.time() - started) * 1000
+    timed_out = isinstance(error, (StageTimeout, subprocess.TimeoutExpired)) or type(error).__name__ == 'APITimeoutError'
+    remaining = deadline - (time.time() - started)
+    delay = backoff_delay(attempt, policy['base_delay'], policy['max_delay'])
+    if (not isinstance(error, StageTimeout) and is_retryable(error)
+            and attempt < policy['max_attempts'] and remaining > delay):
+        print(f"[RESILIENCE] {stage} attempt {attempt} failed ({type(error).__name__}), retrying in {delay:.1f}s")
+        return delay
+    if breaker:
+        # Only transient failures count against the dependency; a permanent error
+        # (e.g. a video without captions) means it answered
+        breaker_record(breaker, success=not (timed_out or is_retryable(error)))
+    record_stage(stage, 'timeout' if timed_out else 'error', elapsed_ms, attempts=attempt, detail=str(error))
+    if timed_out and not isinstance(error, StageTimeout):
+        raise StageTimeout(f"{stage} timed out after {attempt} attempts: {str(error)}") from error
+    raise error
+
+
+def _record_success(stage: str, attempt: int, started: float, breaker: Optional[str]) -> None:
+    """Record a successful attempt (closing the breaker)."""
+    if breaker:
+        breaker_record(breaker, success=True)
+    record_stage(stage, 'success' if attempt == 1 else 'retried_success',
+                 (time.time() - started) * 1000, attempts=attempt)
+
+
+def _check_breaker(stage: str, breaker: Optional[str]) -> None:
+    """Short-circuit a call whose breaker is open."""
+    if breaker and not breaker_allows(breaker):
+        record_stage(stage, 'circuit_open', 0, attempts=0)
+        raise CircuitOpenError(f"{breaker} circuit is open, not calling {stage}")
+
+
+def call_with_retries(stage: str, fn: Callable[[float], Any], is_retryable: Callable[[Exception], bool],
+                      deadline: Optional[float] = None, breaker: Optional[str] = None) -> Any:
+    """
+    Run fn under a stage deadline with jittered exponential retries on retryable errors.
+    fn receives the remaining time budget in seconds and should use it as its own timeout.
+
+    Args:
+        stage (str): Stage name used for the policy and metrics
+        fn (Callable[[float], Any]): Operation to run
+        is_retryable (Callable[[Exception], bool]): Classifies errors as transient
+        deadline (float, optional): Overall deadline in seconds. Defaults to the stage policy.
+        breaker (str, optional): Name of a circuit breaker guarding the dependency
+
+    Returns:
+        Any: Result of fn
+
+    Raises:
+        CircuitOpenError: If the breaker is open
+        StageTimeout: If the deadline expired
+        Exception: The last error if it was not retryable or attempts ran out
+    """
+    policy = get_policy(stage)
+    if deadline is None:
+        deadline = policy['deadline']
+    started = time.time()
+    attempt = 0
+    _check_breaker(stage, breaker)
+
+    while True:
+        attempt += 1
+        remaining = deadline - (time.time() - started)
+        try:
+            if remaining <= 0:
+                raise StageTimeout(f"{stage} exceeded its {deadline:.0f}s deadline")
+            result = fn(remaining)
+        except Exception as e:
+            time.sleep(_retry_delay(stage, policy, e, attempt, started, deadline, is_retryable, breaker))
+            continue
+        _record_success(stage, attempt, started, breaker)
+        return result
+
+
+async def call_with_retries_async(stage: str, fn: Callable[[float], Awaitable[Any]],
+                                  is_retryable: Callable[[Exception], bool],
+                                  deadline: Optional[float] = None, breaker: Optional[str] = None) -> Any:
+    """
+    call_with_retries for coroutines: backoff sleeps on the event loop, and the breaker and
+    metrics databases are written on the default executor.
+
+    Args:
+        stage (str): Stage name used for the policy and metrics
+        fn (Callable[[float], Awaitable[Any]]): Coroutine function receiving the remaining budget
+        is_retryable (Callable[[Exception], bool]): Classifies errors as transient
+        deadline (float, optional): Overall deadline in seconds. Defaults to the stage policy.
+        breaker (str, optional): Name of a circuit breaker guarding the dependency
+
+    Returns:
+        Any: Result of fn
+
+    Raises:
+        CircuitOpenError: If the breaker is open
+        StageTimeout: If the deadline expired
+        Exception: The last error if it was not retryable or attempts ran out
+    """
+    policy = get_policy(stage)
+    if deadline is None:
+        deadline = policy['deadline']
+    started = time.time()
+    attempt = 0
+    await asyncio.to_thread(_check_breaker, stage, breaker)
+
+    while True:
+        attempt += 1
+        remaining = deadline - (time.time() - started)
+        try:
+            if remaining <= 0:
+                raise StageTimeout(f"{stage} exceeded its {deadline:.0f}s deadline")
+            result = await fn(remaining)
+        except Exception as e:
+            delay = await asyncio.to_thread(_retry_delay, stage, policy, e, attempt, started, deadline,
+                                            is_retryable, breaker)
+            await asyncio.sleep(delay)
+            continue
+        await asyncio.to_thread(_record_success, stage, attempt, started, breaker)
+        return result
+
+
+def get_hedge_delay(stage: str) -> Optional[float]:
+    """
+    Get the delay after which a hedged copy of a request is sent: the recent p95 of the stage's
+    API latency (recorded as `<stage>_api`, without time spent waiting for the LLM scheduler).
+
+    Args:
+        stage (str): Stage name
+
+    Returns:
+        Optional[float]: Delay in seconds, or None if hedging is disabled or there is too little data
+    """
+    if not LLM_HEDGE_ENABLED:
+        return None
+    p95_ms = get_latency_percentile(f"{stage}_api", 0.95)
+    if p95_ms is None:
+        return None
+    return max(LLM_HEDGE_MIN_DELAY_SECONDS, p95_ms / 1000.0)
+
+
+def call_hedged(stage: str, fn: Callable[[], Any], hedge_delay: float,
+                allow_hedge: Callable[[], bool] = lambda: True, hedge_fn: Optional[Callable[[], Any]] = None) -> Any:
+    """
+    Run fn and, if it has not finished after hedge_delay, start a second copy; return the first
+    successful result. The slower copy runs on a daemon thread and is abandoned: its result is
+    dropped and it never keeps the process alive.
+
+    Args:
+        stage (str): Stage name used for metrics
+        fn (Callable[[], Any]): Operation to run (must be safe to run twice)
+        hedge_delay (float): Seconds to wait before hedging
+        allow_hedge (Callable[[], bool]): Checked before sending the hedge (e.g. capacity check)
+        hedge_fn (Callable[[], Any], optional): Operation run as the hedged copy (defaults to fn)
+
+    Returns:
+        Any: Result of whichever copy succeeded first
+    """
+    outcomes = queue.Queue()
+
+    def _start(name: str, run_fn: Callable[[], Any]) -> None:
+        def _run():
+            try:
+                outcomes.put((name, True, run_fn()))
+            except Exception as e:
+                outcomes.put((name, False, e))
+        # Daemon threads: the losing copy is abandoned and never holds up interpreter exit
+        threading.Thread(target=_run, name=f"{stage}-{name}", daemon=True).start()
+
+    _start('primary', fn)
+    try:
+        name, ok, value = outcomes.get(timeout=hedge_delay)
+    except queue.Empty:
+        name = None
+    if name is None and not allow_hedge():
+        name, ok, value = outcomes.get()
+    if name is not None:
+        if ok:
+            return value
+        raise value
+
+    print(f"[RESILIENCE] {stage} slower than {hedge_delay:.1f}s, sending hedged request")
+    started = time.time()
+    _start('hedge', hedge_fn or fn)
+    last_error = None
+    for _ in range(2):
+        name, ok, value = outcomes.get()
+        if not ok:
+            last_error = value
+            continue
+        record_stage(f"{stage}_hedge", 'hedge_won' if name == 'hedge' else 'primary_won',
+                     (time.time() - started) * 1000)
+        return value
+    raise last_error
+
+
+async def call_hedged_async(stage: str, fn: Callable[[], Awaitable[Any]], hedge_delay: float,
+                            allow_hedge: Callable[[], Awaitable[bool]] = None,
+                            hedge_fn: Optional[Callable[[], Awaitable[Any]]] = None) -> Any:
+    """
+    call_hedged for coroutines. The slower copy is cancelled as soon as one succeeds, which
+    closes its connection instead of leaving it to finish.
+
+    Args:
+        stage (str): Stage name used for metrics
+        fn (Callable[[], Awaitable[Any]]): Coroutine function to run (must be safe to run twice)
+        hedge_delay (float): Seconds to wait before hedging
+        allow_hedge (Callable[[], Awaitable[bool]], optional): Checked before sending the hedge
+        hedge_fn (Callable[[], Awaitable[Any]], optional): Coroutine function run as the hedged copy (defaults to fn)
+
+    Returns:
+        Any: Result of whichever copy succeeded first
+    """
+    primary = asyncio.ensure_future(fn())
+    pending = {primary}
+    try:
+        done, _ = await asyncio.wait(pending, timeout=hedge_delay)
+        if done or (allow_hedge is not None and not await allow_hedge()):
+            return await primary
+
+        print(f"[RESILIENCE] {stage} slower than {hedge_delay:.1f}s, sending hedged request")
+        started = time.time()
+        hedge = asyncio.ensure_future((hedge_fn or fn)())
+        pending.add(hedge)
+        last_error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    last_error = task.exception()
+                    continue
+                await asyncio.to_thread(record_stage, f"{stage}_hedge",
+                                        'hedge_won' if task is hedge else 'primary_won',
+                                        (time.time() - started) * 1000)
+                return task.result()
+        raise last_error
+    finally:
+        for task in pending:
+            task.cancel()
+
+_cancel_requested = False
+_cancel_deferred = 0
+
+
+def _handle_cancel(signum, frame):
+    """SIGTERM handler: abort right away unless a deferred block is running."""
+    global _cancel_requested
+    _cancel_requested = True
+    if not _cancel_deferred:
+        raise PipelineCancelled(f"Cancelled by signal {signum}")
+
+
+def install_cancel_handler() -> None:
+    """
+    Turn SIGTERM into PipelineCancelled in the current (main) thread, so a blocking Claude
+    request is abandoned as soon as the parent cancels the run.
+    """
+    signal.signal(signal.SIGTERM, _handle_cancel)
+
+
+@contextmanager
+def defer_cancellation():
+    """
+    Let the enclosed block finish before a cancellation takes effect. Used around transcript
+    fetches: the transcript is worth caching even if nobody waits for this run any more.
+
+    Raises:
+        PipelineCancelled: On exit, if a cancellation arrived while the block was running
+    """
+    global _cancel_deferred
+    _cancel_deferred += 1
+    try:
+        yield
+    finally:
+        _cancel_deferred -= 1
+    if _cancel_requested and not _cancel_deferred:
+        raise PipelineCancelled("Cancelled while fetching the transcript")
+
+
+_schema_ready = set()
+
+
+def _breaker_connect():
+    """Open the circuit breaker table (stored with the metrics), creating it on first use."""
+    conn = get_connection(BREAKER_DB_NAME)
+    if '' not in _schema_ready:
+        conn.executescript(BREAKER_SCHEMA)
+        _schema_ready.add('')
+    return conn
+
+
+def breaker_allows(name: str, reset_seconds: float = YOUTUBE_BREAKER_RESET_SECONDS) -> bool:
+    """
+    Check whether a call may go through a circuit breaker. After reset_seconds an open
+    breaker lets calls through again (half-open); the next outcome closes or re-opens it.
+
+    Args:
+        name (str): Breaker name
+        reset_seconds (float): Seconds an open breaker stays open
+
+    Returns:
+        bool: True if the call may proceed
+    """
+    try:
+        conn = _breaker_connect()
+        try:
+            row = conn.execute("SELECT opened_at FROM circuit_breakers WHERE name = ?", (name,)).fetchone()
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"[RESILIENCE] Breaker state unavailable, allowing call: {str(e)}")
+        return True
+    if row is None or row["opened_at"] is None:
+        return True
+    return time.time() - row["opened_at"] >= reset_seconds
+
+
+def breaker_record(name: str, success: bool, threshold: int = YOUTUBE_BREAKER_FAILURE_THRESHOLD) -> None:
+    """
+    Record a call outcome on a circuit breaker, opening it after threshold consecutive failures.
+
+    Args:
+        name (str): Breaker name
+        success (bool): Whether the call succeeded
+        threshold (int): Consecutive failures that open the breaker
+    """
+    try:
+        conn = _breaker_connect()
+        try:
+            with conn:
+                if success:
+                    conn.execute("INSERT OR REPLACE INTO circuit_breakers VALUES (?, 0, NULL)", (name,))
+                    return
+                row = conn.execute("SELECT failures FROM circuit_breakers WHERE name = ?", (name,)).fetchone()
+                failures = (row["failures"] if row else 0) + 1
+                opened_at = time.time() if failures >= threshold else None
+                conn.execute("INSERT OR REPLACE INTO circuit_breakers VALUES (?, ?, ?)", (name, failures, opened_at))
+                if opened_at:
+                    print(f"[RESILIENCE] {name} circuit opened after {failures} consecutive failures")
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"[RESILIENCE] Failed to update breaker {name}: {str(e)}")
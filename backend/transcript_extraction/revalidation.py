@@ -0,0 +1,280 @@
+"""
+Cheap revalidation of cached transcripts against upstream caption changes.
+Every stored transcript has a fingerprint: the key of the caption track it was built from
+(see transcript_fetch.caption_track_key) and hashes of the raw captions and the cleaned text.
+A revalidation pass compares fingerprints against a metadata lookup per video, and only
+re-fetches and re-cleans videos whose track changed. Segment results of a video are removed
+when its cleaned transcript actually changed. Caption content is only downloaded for the
+periodic content check (REVALIDATE_CONTENT_DAYS), since YouTube can regenerate auto-captions
+without changing the track.
+
+Usage: python revalidation.py [--workers N] [--limit N] [--verify-content-days D] [--dry-run] [video_id ...]
+"""
+import os
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict
+
+from state_store import get_connection
+from storage import artifact_digest
+from resilience import call_with_retries, is_retryable_fetch_error
+from transcript_fetch import CAPTION_FORMAT, lookup_caption_track_key, download_native_captions
+
+FINGERPRINT_DB_NAME = 'fingerprints.sqlite3'
+
+# Metadata lookups run in parallel, within the shared 'youtube' circuit breaker
+REVALIDATE_WORKERS = int(os.getenv('REVALIDATE_WORKERS', '4'))
+# Caption content of an entry is downloaded and compared at most this often (0 disables the check)
+REVALIDATE_CONTENT_DAYS = float(os.getenv('REVALIDATE_CONTENT_DAYS', '30'))
+
+TEMP_DIR = os.path.join(os.path.dirname(__file__), 'temporary_files')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fingerprints (
+    video_id TEXT PRIMARY KEY,
+    track_key TEXT,
+    content_hash TEXT,
+    transcript_hash TEXT,
+    fetched_at REAL,
+    checked_at REAL NOT NULL,
+    verified_at REAL
+);
+"""
+
+_schema_ready = set()
+
+
+def _connect(state_dir: Optional[str] = None):
+    """Open the fingerprint database, creating the schema on first use."""
+    conn = get_connection(FINGERPRINT_DB_NAME, state_dir)
+    key = state_dir or ''
+    if key not in _schema_ready:
+        conn.executescript(SCHEMA)
+        _schema_ready.add(key)
+    return conn
+
+
+def content_hash(text: str) -> str:
+    """SHA-256 of a caption or transcript text."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def transcript_path(video_id: str) -> str:
+    """Logical path of a video's cleaned transcript."""
+    return os.path.join(TEMP_DIR, f'transcript_{video_id}.txt')
+
+
+def record_fingerprint(video_id: str, track_key: Optional[str], caption_hash: Optional[str],
+                       transcript_hash: Optional[str], state_dir: Optional[str] = None) -> None:
+    """
+    Store the fingerprint of a freshly fetched transcript.
+
+    Args:
+        video_id (str): YouTube video ID
+        track_key (str, optional): Caption track key (None when the fetch path does not expose it)
+        caption_hash (str, optional): Hash of the raw caption content
+        transcript_hash (str, optional): Hash of the cleaned transcript
+        state_dir (str, optional): Directory holding the fingerprint database
+    """
+    now = time.time()
+    conn = _connect(state_dir)
+    try:
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (video_id, track_key, caption_hash, transcript_hash, now, now,
+                          now if caption_hash else None))
+    finally:
+        conn.close()
+
+
+def get_fingerprints(video_ids: Optional[List[str]] = None, state_dir: Optional[str] = None) -> Dict[str, Dict]:
+    """
+    Load fingerprints in bulk.
+
+    Args:
+        video_ids (List[str], optional): Videos to load. Defaults to all.
+        state_dir (str, optional): Directory holding the fingerprint database
+
+    Returns:
+        Dict[str, Dict]: Fingerprint per video ID
+    """
+    conn = _connect(state_dir)
+    try:
+        rows = conn.execute("SELECT * FROM fingerprints").fetchall()
+    finally:
+        conn.close()
+    wanted = set(video_ids) if video_ids is not None else None
+    return {row["video_id"]: dict(row) for row in rows if wanted is None or row["video_id"] in wanted}
+
+
+def _save_checks(results: List[Dict], state_dir: Optional[str] = None) -> None:
+    """Store the outcome of every video that was not re-fetched in one transaction."""
+    rows = [(r["video_id"], r["track_key"], r.get("content_hash"), artifact_digest(transcript_path(r["video_id"])),
+             r["checked_at"], r.get("verified_at"))
+            for r in results if r["status"] in ('unchanged', 'baseline', 'unavailable')]
+    if not rows:
+        return
+    conn = _connect(state_dir)
+    try:
+        with conn:
+            conn.executemany(
+                "INSERT INTO fingerprints (video_id, track_key, content_hash, transcript_hash, checked_at, verified_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(video_id) DO UPDATE SET "
+                "track_key = COALESCE(excluded.track_key, track_key), "
+                "content_hash = COALESCE(excluded.content_hash, content_hash), "
+                "transcript_hash = COALESCE(transcript_hash, excluded.transcript_hash), "
+                "checked_at = excluded.checked_at, "
+                "verified_at = COALESCE(excluded.verified_at, verified_at)",
+                rows
+            )
+    finally:
+        conn.close()
+
+
+def refresh_transcript(video_id: str) -> Dict:
+    """
+    Re-fetch and re-clean one transcript, removing its segment results if the cleaned text changed.
+
+    Args:
+        video_id (str): YouTube video ID
+
+    Returns:
+        Dict: transcript_changed flag and number of segment results removed
+    """
+    from transcript_fetch import fetch_transcript
+    from cache_manager import remove_segments
+
+    before = artifact_digest(transcript_path(video_id))
+    fetch_transcript(f"https://www.youtube.com/watch?v={video_id}")
+    changed = artifact_digest(transcript_path(video_id)) != before
+    removed = remove_segments(video_id) if changed else 0
+    if removed:
+        print(f"[REVALIDATE] Transcript of {video_id} changed, removed {removed} segment results")
+    return {"transcript_changed": changed, "segments_removed": removed}
+
+
+def check_video(video_id: str, fingerprint: Optional[Dict], verify_content: bool, dry_run: bool = False) -> Dict:
+    """
+    Compare one video's fingerprint with YouTube and refresh it if the captions changed.
+
+    Args:
+        video_id (str): YouTube video ID
+        fingerprint (Dict, optional): Stored fingerprint (None for entries cached before fingerprinting)
+        verify_content (bool): Download the captions and compare their hash as well
+        dry_run (bool): Report changes without re-fetching
+
+    Returns:
+        Dict: video_id, status (unchanged, baseline, changed, refreshed, unavailable or error) and details
+    """
+    video_url = f"https://www.youtube.com/watch?v={video_id}"
+    result = {"video_id": video_id, "checked_at": time.time()}
+    try:
+        if verify_content:
+            content, _, track_key = call_with_retries(
+                'youtube_fetch', lambda timeout: download_native_captions(video_url, timeout),
+                is_retryable_fetch_error, breaker='youtube')
+            result["content_hash"] = content_hash(content)
+            result["verified_at"] = result["checked_at"]
+        else:
+            track_key = call_with_retries(
+                'youtube_fetch', lambda timeout: lookup_caption_track_key(video_url, timeout),
+                is_retryable_fetch_error, breaker='youtube')
+    except FileNotFoundError:
+        # Captions were withdrawn upstream; keep serving the cached transcript
+        return {**result, "status": "unavailable", "track_key": None}
+    except Exception as e:
+        return {**result, "status": "error", "error": str(e)}
+    result["track_key"] = track_key
+
+    if track_key is None:
+        return {**result, "status": "unavailable"}
+    if fingerprint is None or fingerprint["track_key"] is None:
+        # Nothing to compare against yet: the cached transcript becomes the baseline
+        return {**result, "status": "baseline"}
+    changed = track_key != fingerprint["track_key"] or (
+        verify_content and fingerprint["content_hash"] is not None
+        and result["content_hash"] != fingerprint["content_hash"])
+    if not changed:
+        return {**result, "status": "unchanged"}
+    if dry_run:
+        return {**result, "status": "changed"}
+    try:
+        return {**result, "status": "refreshed", **refresh_transcript(video_id)}
+    except Exception as e:
+        return {**result, "status": "error", "error": str(e)}
+
+
+def revalidate(video_ids: Optional[List[str]] = None, workers: int = REVALIDATE_WORKERS,
+               limit: Optional[int] = None, verify_content_days: float = REVALIDATE_CONTENT_DAYS,
+               dry_run: bool = False, cache_dir: Optional[str] = None, state_dir: Optional[str] = None) -> Dict:
+    """
+    Revalidate cached transcripts against YouTube, least recently checked first.
+
+    Args:
+        video_ids (List[str], optional): Videos to check. Defaults to every cached transcript.
+        workers (int): Parallel metadata lookups
+        limit (int, optional): Check at most this many videos
+        verify_content_days (float): Compare caption content of entries not verified for this many days (0 disables)
+        dry_run (bool): Report changes without re-fetching
+        cache_dir (str, optional): Cache directory. Defaults to temporary_files.
+        state_dir (str, optional): Directory holding the fingerprint database
+
+    Returns:
+        Dict: Counts per status, segment results removed and the changed videos
+    """
+    from cache_manager import list_artifacts
+
+    started = time.time()
+    if video_ids is None:
+        video_ids = sorted({a["video_id"] for a in list_artifacts(cache_dir) if a["kind"] == "transcript"})
+    fingerprints = get_fingerprints(video_ids, state_dir)
+    video_ids = sorted(video_ids, key=lambda v: fingerprints[v]["checked_at"] if v in fingerprints else 0)
+    if limit is not None:
+        video_ids = video_ids[:limit]
+
+    # Native captions are needed to compare content; the legacy SRT path only compares tracks
+    content_cutoff = started - verify_content_days * 86400 if verify_content_days > 0 and CAPTION_FORMAT != 'srt' else None
+
+    def _check(video_id: str) -> Dict:
+        fingerprint = fingerprints.get(video_id)
+        verify_content = (content_cutoff is not None and fingerprint is not None
+                          and (fingerprint["verified_at"] or 0) < content_cutoff)
+        return check_video(video_id, fingerprint, verify_content, dry_run)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='revalidate') as executor:
+        results = list(executor.map(_check, video_ids))
+    _save_checks(results, state_dir)
+
+    summary = {"checked": len(results)}
+    for status in ('unchanged', 'baseline', 'changed', 'refreshed', 'unavailable', 'error'):
+        summary[status] = sum(1 for r in results if r["status"] == status)
+    summary["verified_content"] = sum(1 for r in results if "verified_at" in r)
+    summary["segments_removed"] = sum(r.get("segments_removed", 0) for r in results)
+    summary["changed_videos"] = [r["video_id"] for r in results if r["status"] in ('changed', 'refreshed')]
+    summary["errors"] = {r["video_id"]: r["error"] for r in results if r["status"] == 'error'}
+    summary["duration_ms"] = int((time.time() - started) * 1000)
+    print(f"[REVALIDATE] Checked {summary['checked']} transcripts: {summary['unchanged']} unchanged, "
+          f"{len(summary['changed_videos'])} changed, {summary['error']} errors")
+    return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Revalidate cached transcripts against YouTube")
+    parser.add_argument('video_ids', nargs='*', help="Videos to check (default: every cached transcript)")
+    parser.add_argument('--workers', type=int, default=REVALIDATE_WORKERS, help="Parallel metadata lookups")
+    parser.add_argument('--limit', type=int, default=None, help="Check at most this many videos")
+    parser.add_argument('--verify-content-days', type=float, default=REVALIDATE_CONTENT_DAYS,
+                        help="Compare caption content not verified for this many days (0 disables)")
+    parser.add_argument('--dry-run', action='store_true', help="Report changes without re-fetching")
+    args = parser.parse_args()
+
+    summary = revalidate(args.video_ids or None, workers=args.workers, limit=args.limit,
+                         verify_content_days=args.verify_content_days, dry_run=args.dry_run)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
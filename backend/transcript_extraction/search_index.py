@@ -0,0 +1,304 @@
+"""
+Persistent inverted index over every cached, cleaned transcript.
+Postings are stored per cue together with the cue timestamps, so a query can be answered
+with (video, start, end) windows across the whole library without reading any transcript.
+"""
+import os
+import sys
+import math
+import time
+import hashlib
+from typing import Optional, List, Dict
+from collections import Counter
+
+from state_store import get_connection
+from text_utils import tokenize
+from transcript_fetch import parse_cleaned_transcript, millis_to_time
+
+INDEX_DB_NAME = 'search_index.sqlite3'
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Hits in the same video closer than this are merged into one window
+WINDOW_GAP_MS = int(os.getenv('SEARCH_WINDOW_GAP_MS', '20000'))
+MAX_WINDOW_MS = int(os.getenv('SEARCH_MAX_WINDOW_MS', '180000'))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    video_id TEXT PRIMARY KEY,
+    content_sha256 TEXT NOT NULL,
+    cue_count INTEGER NOT NULL,
+    token_count INTEGER NOT NULL,
+    indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cues (
+    video_id TEXT NOT NULL,
+    cue_no INTEGER NOT NULL,
+    start_ms INTEGER NOT NULL,
+    end_ms INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (video_id, cue_no)
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    video_id TEXT NOT NULL,
+    cue_no INTEGER NOT NULL,
+    start_ms INTEGER NOT NULL,
+    end_ms INTEGER NOT NULL,
+    tf INTEGER NOT NULL,
+    cue_len INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS postings_term ON postings (term);
+CREATE INDEX IF NOT EXISTS postings_video ON postings (video_id);
+"""
+
+_schema_ready = set()
+
+
+def _connect(state_dir: Optional[str] = None):
+    """Open the index database, creating the schema on first use."""
+    conn = get_connection(INDEX_DB_NAME, state_dir)
+    key = state_dir or ''
+    if key not in _schema_ready:
+        conn.executescript(SCHEMA)
+        _schema_ready.add(key)
+    return conn
+
+
+def index_transcript(video_id: str, transcript_content: str, state_dir: Optional[str] = None) -> bool:
+    """
+    Add or refresh one cleaned transcript in the index. Unchanged transcripts are skipped.
+
+    Args:
+        video_id (str): YouTube video ID
+        transcript_content (str): Cleaned transcript content
+        state_dir (str, optional): Directory holding the index database
+
+    Returns:
+        bool: True if the index was updated, False if it was already current
+    """
+    content_sha256 = hashlib.sha256(transcript_content.encode('utf-8')).hexdigest()
+    cues = parse_cleaned_transcript(transcript_content)
+
+    conn = _connect(state_dir)
+    try:
+        row = conn.execute("SELECT content_sha256 FROM videos WHERE video_id = ?", (video_id,)).fetchone()
+        if row and row["content_sha256"] == content_sha256:
+            return False
+
+        cue_rows = []
+        posting_rows = []
+        token_count = 0
+        for cue in cues:
+            tokens = tokenize(cue["text"])
+            token_count += len(tokens)
+            cue_rows.append((video_id, cue["index"], cue["start_ms"], cue["end_ms"], cue["text"]))
+            for term, tf in Counter(tokens).items():
+                posting_rows.append((term, video_id, cue["index"], cue["start_ms"], cue["end_ms"], tf, len(tokens)))
+
+        with conn:
+            conn.execute("DELETE FROM postings WHERE video_id = ?", (video_id,))
+            conn.execute("DELETE FROM cues WHERE video_id = ?", (video_id,))
+            conn.executemany("INSERT INTO cues VALUES (?, ?, ?, ?, ?)", cue_rows)
+            conn.executemany("INSERT INTO postings VALUES (?, ?, ?, ?, ?, ?, ?)", posting_rows)
+            conn.execute("INSERT OR REPLACE INTO videos VALUES (?, ?, ?, ?, ?)",
+                         (video_id, content_sha256, len(cue_rows), token_count, time.time()))
+        return True
+    finally:
+        conn.close()
+
+
+def remove_video(video_id: str, state_dir: Optional[str] = None) -> None:
+    """
+    Remove a video from the index.
+
+    Args:
+        video_id (str): YouTube video ID
+        state_dir (str, optional): Directory holding the index database
+    """
+    conn = _connect(state_dir)
+    try:
+        with conn:
+            conn.execute("DELETE FROM postings WHERE video_id = ?", (video_id,))
+            conn.execute("DELETE FROM cues WHERE video_id = ?", (video_id,))
+            conn.execute("DELETE FROM videos WHERE video_id = ?", (video_id,))
+    finally:
+        conn.close()
+
+
+def _build_windows(hits: List[Dict], gap_ms: int, max_window_ms: int) -> List[Dict]:
+    """Merge scored cue hits of one video (sorted by start time) into contiguous windows."""
+    windows = []
+    current = None
+    for hit in hits:
+        if (current is not None
+                and hit["start_ms"] - current["end_ms"] <= gap_ms
+                and hit["end_ms"] - current["start_ms"] <= max_window_ms):
+            current["end_ms"] = max(current["end_ms"], hit["end_ms"])
+            current["score"] += hit["score"]
+            current["terms"] |= hit["terms"]
+            current["cues"].append(hit["cue_no"])
+        else:
+            current = {
+                "start_ms": hit["start_ms"],
+                "end_ms": hit["end_ms"],
+                "score": hit["score"],
+                "terms": set(hit["terms"]),
+                "cues": [hit["cue_no"]]
+            }
+            windows.append(current)
+    return windows
+
+
+def search(query: str, limit: int = 10, state_dir: Optional[str] = None,
+           gap_ms: int = WINDOW_GAP_MS, max_window_ms: int = MAX_WINDOW_MS) -> List[Dict]:
+    """
+    Find the best-matching (video, start, end) windows across every indexed transcript.
+    Cues are scored with BM25; nearby matching cues of the same video are merged into windows,
+    and windows covering more distinct query terms rank higher.
+
+    Args:
+        query (str): Free-text search query
+        limit (int): Maximum number of windows to return
+        state_dir (str, optional): Directory holding the index database
+        gap_ms (int): Maximum gap between hits merged into the same window
+        max_window_ms (int): Maximum window length
+
+    Returns:
+        List[Dict]: Windows with video_id, start, end, start_ms, end_ms, score, matched_terms and text
+    """
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return []
+
+    conn = _connect(state_dir)
+    try:
+        stats = conn.execute("SELECT COALESCE(SUM(cue_count), 0) AS n, COALESCE(SUM(token_count), 0) AS t FROM videos").fetchone()
+        total_cues = stats["n"]
+        if total_cues == 0:
+            return []
+        avg_len = stats["t"] / total_cues
+
+        # Score every cue containing at least one query term
+        cue_hits = {}
+        for term in terms:
+            rows = conn.execute(
+                "SELECT video_id, cue_no, start_ms, end_ms, tf, cue_len FROM postings WHERE term = ?",
+                (term,)
+            ).fetchall()
+            if not rows:
+                continue
+            idf = math.log(1 + (total_cues - len(rows) + 0.5) / (len(rows) + 0.5))
+            for row in rows:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * row["cue_len"] / avg_len)
+                score = idf * row["tf"] * (BM25_K1 + 1) / (row["tf"] + norm)
+                key = (row["video_id"], row["cue_no"])
+                hit = cue_hits.get(key)
+                if hit is None:
+                    cue_hits[key] = {
+                        "video_id": row["video_id"],
+                        "cue_no": row["cue_no"],
+                        "start_ms": row["start_ms"],
+                        "end_ms": row["end_ms"],
+                        "score": score,
+                        "terms": {term}
+                    }
+                else:
+                    hit["score"] += score
+                    hit["terms"].add(term)
+
+        by_video = {}
+        for hit in cue_hits.values():
+            by_video.setdefault(hit["video_id"], []).append(hit)
+
+        windows = []
+        for video_id, hits in by_video.items():
+            hits.sort(key=lambda h: h["start_ms"])
+            for window in _build_windows(hits, gap_ms, max_window_ms):
+                coverage = len(window["terms"]) / len(terms)
+                window["video_id"] = video_id
+                window["score"] = window["score"] * (1 + coverage)
+                windows.append(window)
+
+        windows.sort(key=lambda w: w["score"], reverse=True)
+        results = []
+        for window in windows[:limit]:
+            rows = conn.execute(
+                "SELECT text FROM cues WHERE video_id = ? AND cue_no BETWEEN ? AND ? ORDER BY cue_no",
+                (window["video_id"], window["cues"][0], window["cues"][-1])
+            ).fetchall()
+            results.append({
+                "video_id": window["video_id"],
+                "start": millis_to_time(window["start_ms"]),
+                "end": millis_to_time(window["end_ms"]),
+                "start_ms": window["start_ms"],
+                "end_ms": window["end_ms"],
+                "score": round(window["score"], 4),
+                "matched_terms": sorted(window["terms"]),
+                "text": " ".join(row["text"] for row in rows)
+            })
+        return results
+    finally:
+        conn.close()
+
+
+def get_index_stats(state_dir: Optional[str] = None) -> Dict:
+    """
+    Get size statistics for the search index.
+
+    Args:
+        state_dir (str, optional): Directory holding the index database
+
+    Returns:
+        Dict: Number of indexed videos, cues and postings
+    """
+    conn = _connect(state_dir)
+    try:
+        videos = conn.execute("SELECT COUNT(*), COALESCE(SUM(cue_count), 0) FROM videos").fetchone()
+        postings = conn.execute("SELECT COUNT(*) FROM postings").fetchone()
+        return {"videos": videos[0], "cues": videos[1], "postings": postings[0]}
+    finally:
+        conn.close()
+
+
+def rebuild_index(cache_dir: Optional[str] = None, state_dir: Optional[str] = None) -> int:
+    """
+    Index every transcript already present in the cache directory (e.g. after upgrading).
+
+    Args:
+        cache_dir (str, optional): Directory with cached transcripts. Defaults to temporary_files.
+        state_dir (str, optional): Directory holding the index database
+
+    Returns:
+        int: Number of transcripts that were (re)indexed
+    """
+    from cache_manager import list_artifacts
+    from storage import read_text_artifact
+
+    updated = 0
+    for artifact in list_artifacts(cache_dir):
+        if artifact["kind"] != "transcript":
+            continue
+        logical_path = os.path.join(os.path.dirname(artifact["path"]), f"transcript_{artifact['video_id']}.txt")
+        try:
+            if index_transcript(artifact["video_id"], read_text_artifact(logical_path), state_dir):
+                updated += 1
+        except Exception as e:
+            print(f"[SEARCH] Failed to index {artifact['video_id']}: {str(e)}")
+    return updated
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python search_index.py --rebuild | <query>")
+        sys.exit(1)
+
+    if sys.argv[1] == '--rebuild':
+        print(f"Indexed {rebuild_index()} transcripts")
+        print(get_index_stats())
+    else:
+        for result in search(" ".join(sys.argv[1:])):
+            print(f"{result['video_id']} ({result['start']} - {result['end']}) [score {result['score']}]")
+            print(f"   {result['text'][:200]}")
@@ -0,0 +1,236 @@
+"""
+Local validation of the segments returned by the model.
+The model's answer is parsed leniently (complete objects are salvaged from a truncated array),
+then each segment's timestamps are snapped to the nearest cue boundaries of the transcript it
+read, clamped to the transcript's length, and overlapping or adjacent segments are merged.
+A bad answer is repaired locally instead of costing the user another full LLM call.
+"""
+import os
+import re
+import json
+from bisect import bisect_left, bisect_right
+from typing import List, Dict, Optional, Tuple
+
+from transcript_fetch import parse_cleaned_transcript, millis_to_time
+
+# Segments closer than this (after snapping) are merged into one
+SEGMENT_MERGE_GAP_MS = int(os.getenv('SEGMENT_MERGE_GAP_MS', '1000'))
+
+TIMESTAMP_PATTERN = re.compile(r'^(?:(\d+):)?(\d{1,2}):(\d{1,2})(?:[,.](\d{1,3}))?$')
+
+
+class CueIndex:
+    """Sorted cue start and end times of a transcript, searchable with bisect."""
+
+    def __init__(self, cues: List[Dict]):
+        self.starts = sorted(cue['start_ms'] for cue in cues)
+        self.ends = sorted(cue['end_ms'] for cue in cues)
+        self.duration_ms = self.ends[-1] if self.ends else 0
+
+    @classmethod
+    def from_transcript(cls, transcript_content: str) -> 'CueIndex':
+        """Build the index of a cleaned transcript."""
+        return cls(parse_cleaned_transcript(transcript_content))
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    @staticmethod
+    def _nearest(values: List[int], millis: int) -> int:
+        """The value closest to millis (values must not be empty)."""
+        i = bisect_left(values, millis)
+        if i == 0:
+            return values[0]
+        if i == len(values):
+            return values[-1]
+        return values[i] if values[i] - millis < millis - values[i - 1] else values[i - 1]
+
+    def snap_start(self, millis: int) -> int:
+        """Nearest cue start to a timestamp."""
+        return self._nearest(self.starts, millis)
+
+    def snap_end(self, millis: int) -> int:
+        """Nearest cue end to a timestamp."""
+        return self._nearest(self.ends, millis)
+
+    def end_after(self, millis: int) -> Optional[int]:
+        """First cue end strictly after a timestamp, or None past the last cue."""
+        i = bisect_right(self.ends, millis)
+        return self.ends[i] if i < len(self.ends) else None
+
+    def end_before(self, millis: int) -> Optional[int]:
+        """Last cue end at or before a timestamp, or None before the first cue end."""
+        i = bisect_right(self.ends, millis)
+        return self.ends[i - 1] if i else None
+
+
+def parse_timestamp(value) -> Optional[int]:
+    """
+    Convert a model timestamp to milliseconds. Accepts HH:MM:SS,mmm as requested in the prompt,
+    and the variants models drift to (MM:SS, a '.' separator, plain seconds).
+
+    Args:
+        value: Timestamp string or number of seconds
+
+    Returns:
+        Optional[int]: Milliseconds, or None if the value is not a timestamp
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value * 1000) if value >= 0 else None
+    if not isinstance(value, str):
+        return None
+    match = TIMESTAMP_PATTERN.match(value.strip())
+    if not match:
+        return None
+    hours, minutes, seconds, fraction = match.groups()
+    millis = int((fraction or '0').ljust(3, '0'))
+    return ((int(hours or 0) * 60 + int(minutes)) * 60 + int(seconds)) * 1000 + millis
+
+
+def parse_segments_response(text: str) -> Tuple[List, bool]:
+    """
+    Parse the model's JSON array, keeping every complete object if the array is cut short
+    (e.g. by the output token limit) or followed by stray text.
+
+    Args:
+        text (str): Raw response text
+
+    Returns:
+        Tuple[List, bool]: Parsed items and whether the array was incomplete
+    """
+    content = text.replace('```json', '').replace('```', '').strip()
+    start = content.find('[')
+    if start == -1:
+        # A lone object instead of an array
+        start = content.find('{')
+        if start == -1:
+            return [], bool(content)
+        content = '[' + content[start:] + ']'
+        start = 0
+    try:
+        items = json.loads(content[start:])
+        if isinstance(items, list):
+            return items, False
+    except json.JSONDecodeError:
+        pass
+
+    decoder = json.JSONDecoder()
+    items = []
+    position = start + 1
+    while True:
+        while position < len(content) and content[position] in ' \t\r\n,':
+            position += 1
+        if position >= len(content) or content[position] == ']':
+            return items, position >= len(content)
+        try:
+            item, position = decoder.raw_decode(content, position)
+        except json.JSONDecodeError:
+            return items, True
+        items.append(item)
+
+
+def _merge(segments: List[Dict], gap_ms: int) -> Tuple[List[Dict], int]:
+    """Merge segments that overlap or are at most gap_ms apart; the best-scored one keeps its text."""
+    merged = []
+    for segment in sorted(segments, key=lambda s: (s['start_ms'], s['end_ms'])):
+        previous = merged[-1] if merged else None
+        if previous is None or segment['start_ms'] > previous['end_ms'] + gap_ms:
+            merged.append(segment)
+            continue
+        best = previous if previous['relevance_score'] >= segment['relevance_score'] else segment
+        merged[-1] = {**best, 'start_ms': previous['start_ms'], 'end_ms': max(previous['end_ms'], segment['end_ms'])}
+    return merged, len(segments) - len(merged)
+
+
+def postprocess_segments(items: List, cue_index: CueIndex,
+                         merge_gap_ms: int = SEGMENT_MERGE_GAP_MS) -> Tuple[List[Dict], Dict]:
+    """
+    Validate, snap, clamp and merge the segments returned by the model.
+
+    Args:
+        items (List): Parsed model output (see parse_segments_response)
+        cue_index (CueIndex): Cues of the transcript the model read
+        merge_gap_ms (int): Merge segments at most this far apart
+
+    Returns:
+        Tuple[List[Dict], Dict]: Segments sorted by relevance (start, end, title, summary,
+        relevance_score) and counts of what was repaired
+    """
+    stats = {'received': len(items), 'dropped': 0, 'snapped': 0, 'clamped': 0, 'merged': 0}
+    valid = []
+    for item in items:
+        start_ms = parse_timestamp(item.get('start')) if isinstance(item, dict) else None
+        end_ms = parse_timestamp(item.get('end')) if isinstance(item, dict) else None
+        if start_ms is None or end_ms is None:
+            stats['dropped'] += 1
+            continue
+        if end_ms < start_ms:
+            start_ms, end_ms = end_ms, start_ms
+
+        if len(cue_index):
+            if start_ms >= cue_index.duration_ms:
+                # Entirely past the end of the transcript
+                stats['dropped'] += 1
+                continue
+            if end_ms > cue_index.duration_ms:
+                end_ms = cue_index.duration_ms
+                stats['clamped'] += 1
+            snapped_start, snapped_end = cue_index.snap_start(start_ms), cue_index.snap_end(end_ms)
+            if snapped_end <= snapped_start:
+                # Both ends fell inside one cue; keep at least that cue
+                snapped_end = cue_index.end_after(snapped_start)
+                if snapped_end is None:
+                    stats['dropped'] += 1
+                    continue
+            if (snapped_start, snapped_end) != (start_ms, end_ms):
+                stats['snapped'] += 1
+            start_ms, end_ms = snapped_start, snapped_end
+        elif end_ms == start_ms:
+            stats['dropped'] += 1
+            continue
+
+        try:
+            score = min(5, max(1, int(item.get('relevance_score') or 1)))
+        except (TypeError, ValueError):
+            score = 1
+        valid.append({
+            'start_ms': start_ms,
+            'end_ms': end_ms,
+            'title': str(item.get('title') or '').strip(),
+            'summary': str(item.get('summary') or '').strip(),
+            'relevance_score': score
+        })
+
+    merged, stats['merged'] = _merge(valid, merge_gap_ms)
+    merged.sort(key=lambda s: (-s['relevance_score'], s['start_ms']))
+    segments = [{
+        'start': millis_to_time(s['start_ms']),
+        'end': millis_to_time(s['end_ms']),
+        'title': s['title'],
+        'summary': s['summary'],
+        'relevance_score': s['relevance_score']
+    } for s in merged]
+    stats['kept'] = len(segments)
+    return segments, stats
+
+
+def clean_model_segments(text: str, cue_index: CueIndex) -> List[Dict]:
+    """
+    Parse and repair one model answer, logging what had to be fixed.
+
+    Args:
+        text (str): Raw response text
+        cue_index (CueIndex): Cues of the transcript the model read
+
+    Returns:
+        List[Dict]: Valid segments sorted by relevance
+    """
+    items, truncated = parse_segments_response(text)
+    segments, stats = postprocess_segments(items, cue_index)
+    if truncated:
+        print(f"[SEGMENTS] Response was incomplete, salvaged {len(items)} complete segments")
+    if stats['dropped'] or stats['snapped'] or stats['clamped'] or stats['merged']:
+        print(f"[SEGMENTS] Post-processing: {stats}")
+    return segments
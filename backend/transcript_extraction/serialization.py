@@ -0,0 +1,116 @@
+"""
+JSON serialization shared by the storage and HTTP paths.
+Artifacts are written compact unless pretty printing is requested, orjson is used when it is
+installed (JSON_BACKEND), and large responses are produced as a stream of chunks so a long
+transcript is never held as one response string.
+"""
+import os
+import json
+from collections.abc import Iterator as IteratorType
+from typing import Any, Iterable, Iterator, Tuple, Union
+
+# 'auto' uses orjson when installed, 'stdlib' always uses the json module
+JSON_BACKEND = os.getenv('JSON_BACKEND', 'auto').lower()
+# Pretty-print stored artifacts (indent=2) for debugging; compact by default
+JSON_PRETTY = os.getenv('JSON_PRETTY', 'false').lower() in ('true', '1', 'yes', 'on')
+# Characters of a large string value encoded per streamed chunk
+JSON_STREAM_CHUNK_CHARS = int(os.getenv('JSON_STREAM_CHUNK_CHARS', str(64 * 1024)))
+
+_orjson = None
+
+
+def load_orjson():
+    """
+    Import orjson on first use, unless the stdlib backend is configured.
+
+    Returns:
+        module: The orjson module, or None if it is disabled or not installed
+    """
+    global _orjson
+    if _orjson is None:
+        _orjson = False
+        if JSON_BACKEND != 'stdlib':
+            try:
+                import orjson
+                _orjson = orjson
+            except ImportError:
+                if JSON_BACKEND == 'orjson':
+                    print("[JSON] orjson is not installed, falling back to the json module")
+    return _orjson or None
+
+
+def dumps(data: Any, pretty: bool = False) -> bytes:
+    """
+    Serialize data to UTF-8 JSON.
+
+    Args:
+        data (Any): JSON-serializable data
+        pretty (bool): Indent with two spaces instead of the compact encoding
+
+    Returns:
+        bytes: Encoded JSON
+    """
+    orjson = load_orjson()
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, option=(orjson.OPT_INDENT_2 if pretty else 0) | orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # Values orjson refuses (e.g. integers beyond 64 bits) still go through the json module
+            pass
+    if pretty:
+        return json.dumps(data, indent=2).encode('utf-8')
+    return json.dumps(data, separators=(',', ':')).encode('utf-8')
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """
+    Parse JSON.
+
+    Args:
+        data (Union[bytes, str]): Encoded JSON
+
+    Returns:
+        Any: Parsed data
+    """
+    orjson = load_orjson()
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _escape(text: str) -> bytes:
+    """Encode a piece of a string value without its surrounding quotes."""
+    return dumps(text)[1:-1]
+
+
+def iter_json_object(fields: Iterable[Tuple[str, Any]],
+                     chunk_chars: int = JSON_STREAM_CHUNK_CHARS) -> Iterator[bytes]:
+    """
+    Encode a JSON object as a stream of chunks. A value that is an iterator of strings
+    (e.g. storage.open_text_stream) is encoded as one JSON string without being joined, and
+    long string values are encoded piece by piece.
+
+    Args:
+        fields (Iterable[Tuple[str, Any]]): Keys and values in output order (keys must be unique)
+        chunk_chars (int): Characters of a long string encoded per chunk
+
+    Yields:
+        bytes: Consecutive pieces of the encoded object
+    """
+    yield b'{'
+    for i, (key, value) in enumerate(fields):
+        prefix = (b',' if i else b'') + dumps(key) + b':'
+        if isinstance(value, IteratorType):
+            yield prefix + b'"'
+            for piece in value:
+                if piece:
+                    yield _escape(piece)
+            yield b'"'
+        elif isinstance(value, str) and len(value) > chunk_chars:
+            yield prefix + b'"'
+            for start in range(0, len(value), chunk_chars):
+                yield _escape(value[start:start + chunk_chars])
+            yield b'"'
+        else:
+            yield prefix + dumps(value)
+    yield b'}'
@@ -0,0 +1,143 @@
+"""
+Per-stage outcome and latency metrics shared by all backend processes.
+Events are stored in SQLite next to the cache so that app.py, decide_clip.py subprocesses
+and playlist scans report into the same place.
+"""
+import os
+import math
+import time
+import random
+from typing import Optional, Dict, List
+
+from state_store import get_connection
+
+METRICS_DB_NAME = 'metrics.sqlite3'
+METRICS_RETENTION_SECONDS = int(os.getenv('METRICS_RETENTION_SECONDS', str(24 * 3600)))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stage_events (
+    ts REAL NOT NULL,
+    stage TEXT NOT NULL,
+    outcome TEXT NOT NULL,
+    duration_ms INTEGER NOT NULL,
+    attempts INTEGER NOT NULL,
+    detail TEXT
+);
+CREATE INDEX IF NOT EXISTS stage_events_stage_ts ON stage_events (stage, ts);
+"""
+
+_schema_ready = set()
+
+
+def _connect(state_dir: Optional[str] = None):
+    """Open the metrics database, creating the schema on first use."""
+    conn = get_connection(METRICS_DB_NAME, state_dir)
+    key = state_dir or ''
+    if key not in _schema_ready:
+        conn.executescript(SCHEMA)
+        _schema_ready.add(key)
+    return conn
+
+
+def record_stage(stage: str, outcome: str, duration_ms: float, attempts: int = 1,
+                 detail: Optional[str] = None, state_dir: Optional[str] = None) -> None:
+    """
+    Record the outcome of one pipeline stage. Metrics failures never affect the caller.
+
+    Args:
+        stage (str): Stage name (e.g. youtube_fetch, llm_segments, pipeline)
+        outcome (str): Outcome (e.g. success, retried_success, error, timeout, circuit_open)
+        duration_ms (float): Wall-clock duration of the stage including retries
+        attempts (int): Number of attempts made
+        detail (str, optional): Short description (e.g. the error message)
+        state_dir (str, optional): Directory holding the metrics database
+    """
+    try:
+        conn = _connect(state_dir)
+        try:
+            with conn:
+                now = time.time()
+                conn.execute("INSERT INTO stage_events VALUES (?, ?, ?, ?, ?, ?)",
+                             (now, stage, outcome, int(duration_ms), attempts, (detail or '')[:500]))
+                # Prune old events now and then instead of on every write
+                if random.random() < 0.01:
+                    conn.execute("DELETE FROM stage_events WHERE ts < ?", (now - METRICS_RETENTION_SECONDS,))
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"[METRICS] Failed to record {stage}/{outcome}: {str(e)}")
+
+
+def _percentile(sorted_values: List[int], pct: float) -> Optional[int]:
+    """Nearest-rank percentile of an already sorted list (the value at rank ceil(pct * n))."""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def get_latency_percentile(stage: str, pct: float, window_seconds: int = 3600,
+                           min_samples: int = 20, state_dir: Optional[str] = None) -> Optional[float]:
+    """
+    Get a latency percentile of successful runs of a stage.
+
+    Args:
+        stage (str): Stage name
+        pct (float): Percentile between 0 and 1 (e.g. 0.95)
+        window_seconds (int): Only consider events from this many seconds back
+        min_samples (int): Return None if fewer successful samples exist
+        state_dir (str, optional): Directory holding the metrics database
+
+    Returns:
+        Optional[float]: Percentile in milliseconds, or None if there is not enough data
+    """
+    conn = _connect(state_dir)
+    try:
+        rows = conn.execute(
+            """SELECT duration_ms FROM stage_events
+               WHERE stage = ? AND ts >= ? AND outcome IN ('success', 'retried_success')
+               ORDER BY duration_ms""",
+            (stage, time.time() - window_seconds)
+        ).fetchall()
+    finally:
+        conn.close()
+    if len(rows) < min_samples:
+        return None
+    return _percentile([row[0] for row in rows], pct)
+
+
+def get_stage_summary(window_seconds: int = 3600, state_dir: Optional[str] = None) -> Dict:
+    """
+    Summarize outcomes and latencies per stage.
+
+    Args:
+        window_seconds (int): Only consider events from this many seconds back
+        state_dir (str, optional): Directory holding the metrics database
+
+    Returns:
+        Dict: Per stage, the count of each outcome and p50/p95/p99 latency in milliseconds
+    """
+    conn = _connect(state_dir)
+    try:
+        rows = conn.execute(
+            "SELECT stage, outcome, duration_ms, attempts FROM stage_events WHERE ts >= ?",
+            (time.time() - window_seconds,)
+        ).fetchall()
+    finally:
+        conn.close()
+
+    summary = {}
+    durations = {}
+    for row in rows:
+        stage_summary = summary.setdefault(row["stage"], {"outcomes": {}, "count": 0, "retries": 0})
+        stage_summary["count"] += 1
+        stage_summary["retries"] += max(0, row["attempts"] - 1)
+        stage_summary["outcomes"][row["outcome"]] = stage_summary["outcomes"].get(row["outcome"], 0) + 1
+        durations.setdefault(row["stage"], []).append(row["duration_ms"])
+
+    for stage, values in durations.items():
+        values.sort()
+        summary[stage]["p50_ms"] = _percentile(values, 0.50)
+        summary[stage]["p95_ms"] = _percentile(values, 0.95)
+        summary[stage]["p99_ms"] = _percentile(values, 0.99)
+    return {"window_seconds": window_seconds, "stages": summary}
@@ -0,0 +1,45 @@
+"""
+SQLite connections for shared backend state (search index, schedulers, metrics).
+Databases live next to the cached artifacts so every process using the same
+temporary_files volume sees the same state.
+"""
+import os
+import sqlite3
+from typing import Optional
+
+DEFAULT_STATE_DIR = os.getenv('STATE_DIR', os.path.join(os.path.dirname(__file__), 'temporary_files'))
+
+
+def get_db_path(db_name: str, state_dir: Optional[str] = None) -> str:
+    """
+    Get the path of a state database.
+
+    Args:
+        db_name (str): Database file name (e.g. search_index.sqlite3)
+        state_dir (str, optional): Directory holding the databases. Defaults to STATE_DIR.
+
+    Returns:
+        str: Path to the database file
+    """
+    return os.path.join(state_dir or DEFAULT_STATE_DIR, db_name)
+
+
+def get_connection(db_name: str, state_dir: Optional[str] = None) -> sqlite3.Connection:
+    """
+    Open a connection to a state database. Connections are cheap and must not be shared
+    between threads, so callers open one per unit of work and close it afterwards.
+
+    Args:
+        db_name (str): Database file name
+        state_dir (str, optional): Directory holding the databases. Defaults to STATE_DIR.
+
+    Returns:
+        sqlite3.Connection: Connection with WAL journaling and row access by column name
+    """
+    path = get_db_path(db_name, state_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
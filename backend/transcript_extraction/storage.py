@@ -0,0 +1,441 @@
+"""
+Storage helpers for transcripts and segment results in temporary_files.
+Artifacts are written compressed (gzip or zstd) and read back transparently; plain files
+from older versions are still readable. Callers always pass the logical (uncompressed) path.
+"""
+import io
+import os
+import gzip
+import hashlib
+import tempfile
+from typing import Optional, Tuple, Any, Iterator, Dict
+
+import serialization
+
+
+STORAGE_COMPRESSION = os.getenv('STORAGE_COMPRESSION', 'gzip').lower()
+STORAGE_COMPRESSION_LEVEL = os.getenv('STORAGE_COMPRESSION_LEVEL')
+
+# File suffix and HTTP Content-Encoding token for each codec
+CODEC_SUFFIXES = {'zstd': '.zst', 'gzip': '.gz'}
+CODEC_ENCODINGS = {'zstd': 'zstd', 'gzip': 'gzip'}
+DEFAULT_LEVELS = {'zstd': 3, 'gzip': 6}
+
+_zstandard = None
+
+# Content digests keyed by (stored path, mtime, size); cleared when it grows past this many entries
+DIGEST_CACHE_MAX_ENTRIES = 4096
+_digest_cache = {}
+
+
+def load_zstandard():
+    """
+    Import zstandard on first use, so processes that never touch .zst artifacts do not pay for it.
+
+    Returns:
+        module: The zstandard module, or None if it is not installed
+    """
+    global _zstandard
+    if _zstandard is None:
+        try:
+            import zstandard
+            _zstandard = zstandard
+        except ImportError:
+            _zstandard = False
+    return _zstandard or None
+
+
+def get_write_codec() -> Optional[str]:
+    """
+    Get the codec used for new artifacts.
+
+    Returns:
+        Optional[str]: 'zstd', 'gzip', or None for uncompressed storage
+    """
+    if STORAGE_COMPRESSION in ('', 'none', 'off', 'plain'):
+        return None
+    if STORAGE_COMPRESSION == 'zstd' and load_zstandard() is None:
+        print("[STORAGE] zstandard is not installed, falling back to gzip")
+        return 'gzip'
+    if STORAGE_COMPRESSION not in CODEC_SUFFIXES:
+        raise ValueError(f"Unsupported STORAGE_COMPRESSION: {STORAGE_COMPRESSION}")
+    return STORAGE_COMPRESSION
+
+
+def get_compression_level(codec: str) -> int:
+    """
+    Get the configured compression level for a codec.
+
+    Args:
+        codec (str): 'zstd' or 'gzip'
+
+    Returns:
+        int: Compression level
+    """
+    if STORAGE_COMPRESSION_LEVEL:
+        return int(STORAGE_COMPRESSION_LEVEL)
+    return DEFAULT_LEVELS[codec]
+
+
+def codec_for_path(path: str) -> Optional[str]:
+    """
+    Determine the codec of a stored file from its suffix.
+
+    Args:
+        path (str): Path to the stored file
+
+    Returns:
+        Optional[str]: 'zstd', 'gzip', or None for a plain file
+    """
+    for codec, suffix in CODEC_SUFFIXES.items():
+        if path.endswith(suffix):
+            return codec
+    return None
+
+
+def compress_bytes(data: bytes, codec: Optional[str]) -> bytes:
+    """
+    Compress bytes with the given codec.
+
+    Args:
+        data (bytes): Uncompressed data
+        codec (str, optional): 'zstd', 'gzip', or None
+
+    Returns:
+        bytes: Compressed data (unchanged if codec is None)
+    """
+    if codec == 'zstd':
+        return load_zstandard().ZstdCompressor(level=get_compression_level(codec)).compress(data)
+    if codec == 'gzip':
+        return gzip.compress(data, compresslevel=get_compression_level(codec), mtime=0)
+    return data
+
+
+def decompress_bytes(data: bytes, codec: Optional[str]) -> bytes:
+    """
+    Decompress bytes stored with the given codec.
+
+    Args:
+        data (bytes): Stored data
+        codec (str, optional): 'zstd', 'gzip', or None
+
+    Returns:
+        bytes: Uncompressed data
+    """
+    if codec == 'zstd':
+        zstandard = load_zstandard()
+        if zstandard is None:
+            raise Exception("zstandard is required to read .zst artifacts")
+        return zstandard.ZstdDecompressor().decompress(data, max_output_size=2**31)
+    if codec == 'gzip':
+        return gzip.decompress(data)
+    return data
+
+
+def resolve_artifact_path(path: str) -> Optional[str]:
+    """
+    Find the stored file for a logical artifact path, whichever encoding it was written with.
+
+    Args:
+        path (str): Logical (uncompressed) artifact path
+
+    Returns:
+        Optional[str]: Path of the stored file, or None if the artifact does not exist
+    """
+    for suffix in CODEC_SUFFIXES.values():
+        if os.path.exists(path + suffix):
+            return path + suffix
+    if os.path.exists(path):
+        return path
+    return None
+
+
+def artifact_exists(path: str) -> bool:
+    """
+    Check whether an artifact exists in any encoding.
+
+    Args:
+        path (str): Logical (uncompressed) artifact path
+
+    Returns:
+        bool: True if the artifact exists
+    """
+    return resolve_artifact_path(path) is not None
+
+
+def remove_artifact(path: str) -> None:
+    """
+    Remove every stored encoding of an artifact.
+
+    Args:
+        path (str): Logical (uncompressed) artifact path
+    """
+    for candidate in [path] + [path + suffix for suffix in CODEC_SUFFIXES.values()]:
+        try:
+            os.remove(candidate)
+        except FileNotFoundError:
+            pass
+
+
+def replace_file(path: str, data: bytes) -> None:
+    """
+    Atomically replace a file's content. Each write goes through its own temporary file in the
+    same directory (named `<file>.<random>.tmp`), so concurrent writers, in this process or
+    another, never share one. The temporary file is removed if the write fails.
+
+    Args:
+        path (str): Path of the file
+        data (bytes): New content
+    """
+    directory, name = os.path.split(path)
+    fd, tmp_path = tempfile.mkstemp(prefix=name + '.', suffix='.tmp', dir=directory or '.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def write_bytes_artifact(path: str, data: bytes) -> str:
+    """
+    Atomically write an artifact using the configured codec, replacing any other encoding of it.
+
+    Args:
+        path (str): Logical (uncompressed) artifact path
+        data (bytes): Uncompressed content
+
+    Returns:
+        str: Path of the stored file
+    """
+    codec = get_write_codec()
+    stored_path = path + CODEC_SUFFIXES[codec] if codec else path
+    replace_file(stored_path, compress_bytes(data, codec))
+
+    # Drop stale copies in other encodings so reads never see an outdated version
+    for candidate in [path] + [path + suffix for suffix in CODEC_SUFFIXES.values()]:
+        if candidate != stored_path:
+            try:
+                os.remove(candidate)
+            except FileNotFoundError:
+                pass
+    return stored_path
+
+
+def read_bytes_artifact(path: str) -> bytes:
+    """
+    Read and decompress an artifact.
+
+    Args:
+        path (str): Logical (uncompressed) artifact path
+
+    Returns:
+        bytes: Uncompressed content
+    """
+    stored_path = resolve_artifact_path(path)
+    if stored_path is None:
+        raise FileNotFoundError(f"Artifact not found: {path}")
+    with open(stored_path, 'rb') as f:
+        return decompress_bytes(f.read(), codec_for_path(stored_path))
+
+
+def write_text_artifact(path: str, text: str) -> str:
+    """
+    Write a text artifact (UTF-8).
+
+    Args:
+        path (str): Logical (uncompressed) artifact path
+        text (str): Content to store
+
+    Returns:
+        str: Path of the stored file
+    """
+    return write_bytes_artifact(path, text.encode('utf-8'))
+
+
+def read_text_artifact(path: str) -> str:
+    """
+    Read a text artifact (UTF-8).
+
+    Args:
+        path (str): Logical (uncompressed) artifact path
+
+    Returns:
+        str: Stored text
+    """
+    return read_bytes_artifact(path).decode('utf-8')
+
+
+def open_text_stream(path: str, chunk_chars: int = serialization.JSON_STREAM_CHUNK_CHARS) -> Iterator[str]:
+    """
+    Read a text artifact (UTF-8) incrementally, decompressing as it goes. The file is opened
+    immediately, so the stream stays readable if the artifact is evicted while it is consumed.
+
+    Args:
+        path (str): Logical (uncompressed) artifact path
+        chunk_chars (int): Characters per chunk
+
+    Returns:
+        Iterator[str]: Consecutive pieces of the stored text
+    """
+    stored_path = resolve_artifact_path(path)
+    if stored_path is None:
+        raise FileNotFoundError(f"Artifact not found: {path}")
+    codec = codec_for_path(stored_path)
+    if codec == 'zstd':
+        zstandard = load_zstandard()
+        if zstandard is None:
+            raise Exception("zstandard is required to read .zst artifacts")
+        stream = io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(stored_path, 'rb')))
+    elif codec == 'gzip':
+        stream = gzip.open(stored_path, 'rb')
+    else:
+        stream = open(stored_path, 'rb')
+    text = io.TextIOWrapper(stream, encoding='utf-8')
+
+    def _chunks() -> Iterator[str]:
+        with text:
+            while True:
+                chunk = text.read(chunk_chars)
+                if not chunk:
+                    return
+                yield chunk
+    return _chunks()
+
+
+def write_json_artifact(path: str, data: Any, pretty: Optional[bool] = None) -> str:
+    """
+    Write a JSON artifact, compact unless pretty printing is requested.
+
+    Args:
+        path (str): Logical (uncompressed) artifact path
+        data (Any): JSON-serializable data
+        pretty (bool, optional): Indent the output. Defaults to JSON_PRETTY.
+
+    Returns:
+        str: Path of the stored file
+    """
+    if pretty is None:
+        pretty = serialization.JSON_PRETTY
+    return write_bytes_artifact(path, serialization.dumps(data, pretty=pretty))
+
+
+def read_json_artifact(path: str) -> Any:
+    """
+    Read a JSON artifact.
+
+    Args:
+        path (str): Logical (uncompressed) artifact path
+
+    Returns:
+        Any: Parsed JSON data
+    """
+    return serialization.loads(read_bytes_artifact(path))
+
+
+def read_encoded_artifact(path: str, accept_encoding: str = '') -> Tuple[bytes, Optional[str]]:
+    """
+    Read an artifact for an HTTP response. If the client accepts the stored encoding, the
+    compressed bytes are returned as-is so they can be sent without recompressing.
+
+    Args:
+        path (str): Logical (uncompressed) artifact path
+        accept_encoding (str): Value of the client's Accept-Encoding header
+
+    Returns:
+        Tuple[bytes, Optional[str]]: Body bytes and the Content-Encoding to send (None if uncompressed)
+    """
+    stored_path = resolve_artifact_path(path)
+    if stored_path is None:
+        raise FileNotFoundError(f"Artifact not found: {path}")
+    codec = codec_for_path(stored_path)
+    with open(stored_path, 'rb') as f:
+        data = f.read()
+    if codec is None:
+        return data, None
+
+    content_encoding = negotiate_encoding(stored_path, accept_encoding)
+    if content_encoding:
+        return data, content_encoding
+    return decompress_bytes(data, codec), None
+
+
+def negotiate_encoding(stored_path: str, accept_encoding: str = '') -> Optional[str]:
+    """
+    Get the Content-Encoding a stored artifact is served with for a client.
+
+    Args:
+        stored_path (str): Path of the stored (possibly compressed) file
+        accept_encoding (str): Value of the client's Accept-Encoding header
+
+    Returns:
+        Optional[str]: Content-Encoding of the stored bytes if the client accepts it, otherwise None
+    """
+    codec = codec_for_path(stored_path)
+    if codec is None:
+        return None
+    encoding = CODEC_ENCODINGS[codec]
+    weights = parse_accept_encoding(accept_encoding)
+    # An encoding not listed by name takes the weight of '*', if any
+    weight = weights.get(encoding, weights.get('*', 0.0))
+    return encoding if weight > 0 else None
+
+
+def parse_accept_encoding(accept_encoding: str) -> Dict[str, float]:
+    """
+    Parse an Accept-Encoding header into the weight (q-value) of each listed coding.
+
+    Args:
+        accept_encoding (str): Value of the client's Accept-Encoding header
+
+    Returns:
+        Dict[str, float]: Lowercased coding (or '*') to its weight; q=0 means not acceptable
+    """
+    weights = {}
+    for token in accept_encoding.split(','):
+        coding, *params = [part.strip() for part in token.split(';')]
+        if not coding:
+            continue
+        weight = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    weight = float(value.strip())
+                except ValueError:
+                    # A malformed weight is not an acceptance
+                    weight = 0.0
+        weights[coding.lower()] = weight
+    return weights
+
+
+def artifact_digest(path: str) -> Optional[str]:
+    """
+    Get the SHA-256 of an artifact's uncompressed content. Digests are memoized by file
+    identity (stored path, modification time and size), so repeated calls only stat the file.
+
+    Args:
+        path (str): Logical (uncompressed) artifact path
+
+    Returns:
+        Optional[str]: Hex digest, or None if the artifact does not exist
+    """
+    stored_path = resolve_artifact_path(path)
+    if stored_path is None:
+        return None
+    try:
+        st = os.stat(stored_path)
+    except FileNotFoundError:
+        return None
+    key = (stored_path, st.st_mtime_ns, st.st_size)
+    digest = _digest_cache.get(key)
+    if digest is None:
+        digest = hashlib.sha256(read_bytes_artifact(path)).hexdigest()
+        if len(_digest_cache) >= DIGEST_CACHE_MAX_ENTRIES:
+            _digest_cache.clear()
+        _digest_cache[key] = digest
+    return digest
@@ -0,0 +1,64 @@
+"""
+Text normalization helpers shared by the search index and local ranking code.
+"""
+import re
+from typing import List
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had has have
+having he her here hers him his how i if in into is it its itself just me more most my no nor not now
+of off on once only or other our ours out over own same she should so some such than that the their
+theirs them then there these they this those through to too under until up very was we were what when
+where which while who whom why will with would you your yours um uh like okay yeah gonna wanna
+""".split())
+
+
+def stem(word: str) -> str:
+    """
+    Reduce a word to a crude stem so that simple inflections match (e.g. "matrices"/"matrix",
+    "multiplication"/"multiply").
+
+    Args:
+        word (str): Lowercase word
+
+    Returns:
+        str: Stemmed word
+    """
+    if len(word) <= 3:
+        return word
+    if word.endswith("'s"):
+        word = word[:-2]
+    for suffix, replacement in (('ications', 'i'), ('ication', 'i'), ('ational', ''), ('ations', ''),
+                                ('ation', ''), ('ices', 'ix'), ('ies', 'i'), ('ied', 'i'),
+                                ('ings', ''), ('ing', ''), ('ness', ''), ('ments', ''), ('ment', ''),
+                                ('edly', ''), ('ly', ''), ('ed', ''), ('ers', ''), ('er', ''),
+                                ('es', ''), ('s', '')):
+        if word.endswith(suffix) and len(word) - len(suffix) + len(replacement) >= 3:
+            word = word[:-len(suffix)] + replacement
+            break
+    if word.endswith('y') and len(word) > 3:
+        word = word[:-1] + 'i'
+    return word
+
+
+def tokenize(text: str, remove_stopwords: bool = True, stemmed: bool = True) -> List[str]:
+    """
+    Split text into normalized word tokens.
+
+    Args:
+        text (str): Input text
+        remove_stopwords (bool): Whether to drop common function words
+        stemmed (bool): Whether to stem tokens
+
+    Returns:
+        List[str]: Tokens in order of appearance
+    """
+    tokens = WORD_PATTERN.findall(text.lower())
+    if remove_stopwords:
+        tokens = [t for t in tokens if t not in STOPWORDS]
+    if stemmed:
+        tokens = [stem(t) for t in tokens]
+    return tokens
@@ -0,0 +1,443 @@
+"""
+Per-video topic outline: a one-time indexing pass that splits the cleaned transcript into
+consecutive topical sections with titles, summaries, keywords and exact cue boundaries.
+Outlines are cached next to the transcript as outline_{video_id}.json. A prompt is answered
+by ranking the sections locally, or with a small Claude call over the outline only, and falls
+back to the full-transcript analysis when neither is confident. The LLM cost of a lecture is
+paid once per video instead of once per prompt.
+
+Usage: python topic_outline.py [--force] video_id [video_id ...]
+"""
+import os
+import re
+import sys
+import json
+import math
+import time
+import argparse
+from typing import Optional, List, Dict, Tuple
+
+from llm_scheduler import LLMRateLimited
+from storage import resolve_artifact_path, read_text_artifact, read_json_artifact, write_json_artifact, artifact_digest
+from text_utils import tokenize
+from transcript_fetch import millis_to_time
+from segment_postprocess import CueIndex, parse_segments_response, parse_timestamp
+
+# 'off' disables outlines, 'on' answers from outlines built on demand, 'fetch' also builds them
+# when a transcript is fetched (prefetch jobs and the first analysis of a video)
+OUTLINE_MODE = os.getenv('OUTLINE_MODE', 'on').lower()
+# Share of the prompt's (idf-weighted) terms the best section must cover to answer locally
+OUTLINE_MIN_COVERAGE = float(os.getenv('OUTLINE_MIN_COVERAGE', '0.8'))
+# At most this many sections are returned, each scoring at least OUTLINE_RELATIVE_SCORE of the best
+OUTLINE_TOP_K = int(os.getenv('OUTLINE_TOP_K', '3'))
+OUTLINE_RELATIVE_SCORE = float(os.getenv('OUTLINE_RELATIVE_SCORE', '0.5'))
+# Ask Claude to pick sections from the outline when local ranking is not confident
+OUTLINE_LLM_SELECT = os.getenv('OUTLINE_LLM_SELECT', 'true').lower() in ('true', '1', 'yes', 'on')
+OUTLINE_MAX_TOKENS = int(os.getenv('OUTLINE_MAX_TOKENS', '4096'))
+
+# Weight of a term occurrence in each field of a section
+FIELD_WEIGHTS = (('title', 3.0), ('keywords', 2.0), ('summary', 1.0))
+MAX_KEYWORDS = 12
+
+TEMP_DIR = os.path.join(os.path.dirname(__file__), 'temporary_files')
+
+
+def outline_path(video_id: str) -> str:
+    """Logical path of a video's cached outline."""
+    return os.path.join(TEMP_DIR, f'outline_{video_id}.json')
+
+
+def transcript_path(video_id: str) -> str:
+    """Logical path of a video's cleaned transcript."""
+    return os.path.join(TEMP_DIR, f'transcript_{video_id}.txt')
+
+
+def load_outline(video_id: str) -> Optional[Dict]:
+    """
+    Load a video's outline if it was built from the transcript currently cached.
+
+    Args:
+        video_id (str): YouTube video ID
+
+    Returns:
+        Optional[Dict]: The outline, or None if there is none or the transcript changed since
+    """
+    if OUTLINE_MODE == 'off' or not resolve_artifact_path(outline_path(video_id)):
+        return None
+    try:
+        outline = read_json_artifact(outline_path(video_id))
+    except (OSError, ValueError) as e:
+        print(f"[OUTLINE] Failed to read outline of {video_id}: {str(e)}")
+        return None
+    if outline.get('transcript_hash') != artifact_digest(transcript_path(video_id)):
+        return None
+    return outline
+
+
+def make_sections(items: List, cue_index: CueIndex) -> List[Dict]:
+    """
+    Turn the model's section starts into consecutive sections on exact cue boundaries.
+    Each start is snapped to the nearest cue start; a section ends at the last cue before the
+    next section, so the sections cover the whole transcript without overlapping.
+
+    Args:
+        items (List): Parsed model output with start, title, summary and keywords
+        cue_index (CueIndex): Cues of the transcript
+
+    Returns:
+        List[Dict]: Sections with start, end, start_ms, end_ms, title, summary and keywords
+    """
+    starts = {}
+    for item in items:
+        start_ms = parse_timestamp(item.get('start')) if isinstance(item, dict) else None
+        if start_ms is None or start_ms >= cue_index.duration_ms:
+            continue
+        starts.setdefault(cue_index.snap_start(start_ms), item)
+    if not starts:
+        return []
+
+    ordered = sorted(starts.items(), key=lambda pair: pair[0])
+    # The first section always starts at the first cue
+    ordered[0] = (cue_index.starts[0], ordered[0][1])
+    sections = []
+    for i, (start_ms, item) in enumerate(ordered):
+        end_ms = cue_index.end_before(ordered[i + 1][0]) if i + 1 < len(ordered) else cue_index.duration_ms
+        if end_ms is None or end_ms <= start_ms:
+            end_ms = cue_index.end_after(start_ms) or cue_index.duration_ms
+        keywords = item.get('keywords') if isinstance(item.get('keywords'), list) else []
+        sections.append({
+            'start': millis_to_time(start_ms),
+            'end': millis_to_time(end_ms),
+            'start_ms': start_ms,
+            'end_ms': end_ms,
+            'title': str(item.get('title') or '').strip(),
+            'summary': str(item.get('summary') or '').strip(),
+            'keywords': [str(keyword).strip().lower() for keyword in keywords if str(keyword).strip()][:MAX_KEYWORDS]
+        })
+    return sections
+
+
+def build_outline(video_id: str, transcript_content: Optional[str] = None, priority=None) -> Dict:
+    """
+    Build and cache a video's outline with one Claude call over the full transcript.
+
+    Args:
+        video_id (str): YouTube video ID
+        transcript_content (str, optional): Cleaned transcript. Defaults to the cached one.
+        priority (str | int, optional): LLM scheduler priority ('batch' for background builds)
+
+    Returns:
+        Dict: The outline (video_id, transcript_hash, routing, created_at, sections)
+    """
+    from llm_client import create_message, estimate_input_tokens
+    from model_router import routed_call
+    from decide_clip import load_credentials
+
+    transcript_hash = artifact_digest(transcript_path(video_id))
+    if transcript_content is None:
+        transcript_content = read_text_artifact(transcript_path(video_id))
+    cue_index = CueIndex.from_transcript(transcript_content)
+    if not len(cue_index):
+        raise ValueError(f"Transcript of {video_id} has no cues")
+
+    prompt = """You are an assistant that indexes lecture transcripts so that students can find topics quickly.
+
+Input transcript format:
+Each cue has a start and end timestamp in "HH:MM:SS,mmm --> HH:MM:SS,mmm" format, followed by the spoken text.
+
+Your task:
+- Split the whole transcript into consecutive topical sections, in order, usually 2 to 10 minutes long.
+- Return a JSON array of objects, one per section, each with:
+  - "start": the start timestamp of the first cue of the section (string, format HH:MM:SS,mmm)
+  - "title": what the section is about (string, maximum 6 words)
+  - "summary": what is explained in the section (string, 1 to 3 sentences)
+  - "keywords": 3 to 8 lowercase terms a student might search for, including synonyms and notation (array of strings)
+
+IMPORTANT:
+- Your response must be a valid JSON array starting with [ and ending with ].
+- Do not include any other text."""
+    messages = [
+        {"role": "user", "content": f"Transcript text: {transcript_content}\n\nPrompt: {prompt}"}
+    ]
+    credentials = load_credentials()
+
+    def call(model: str, stage: str) -> List[Dict]:
+        response = create_message(
+            api_key=credentials.get('ANTHROPIC_API_KEY'),
+            model=model,
+            max_tokens=OUTLINE_MAX_TOKENS,
+            messages=messages,
+            priority=priority,
+            stage=stage
+        )
+        items, truncated = parse_segments_response(response.content[0].text)
+        if truncated:
+            print(f"[OUTLINE] Response for {video_id} was incomplete, kept {len(items)} sections")
+        return make_sections(items, cue_index)
+
+    sections, route = routed_call('outline', estimate_input_tokens(messages), call, lambda sections: not sections)
+    if not sections:
+        raise ValueError(f"No sections found for {video_id}")
+    outline = {
+        'video_id': video_id,
+        'transcript_hash': transcript_hash,
+        'routing': route,
+        'created_at': time.time(),
+        'sections': sections
+    }
+    write_json_artifact(outline_path(video_id), outline)
+    print(f"[OUTLINE] Built outline of {video_id}: {len(sections)} sections using {route['model']}")
+    return outline
+
+
+def ensure_outline(video_id: str, transcript_content: Optional[str] = None, priority=None) -> Optional[Dict]:
+    """
+    Get a video's outline, building it first when OUTLINE_MODE is 'fetch'.
+    A failed build is logged and does not fail the caller (only LLMRateLimited is raised).
+
+    Args:
+        video_id (str): YouTube video ID
+        transcript_content (str, optional): Cleaned transcript. Defaults to the cached one.
+        priority (str | int, optional): LLM scheduler priority of a build
+
+    Returns:
+        Optional[Dict]: The outline, or None if there is none
+    """
+    outline = load_outline(video_id)
+    if outline is None and OUTLINE_MODE == 'fetch':
+        try:
+            outline = build_outline(video_id, transcript_content, priority)
+        except LLMRateLimited:
+            raise
+        except Exception as e:
+            print(f"[OUTLINE] Failed to build outline of {video_id}: {str(e)}")
+    return outline
+
+
+def _section_terms(section: Dict) -> Dict[str, float]:
+    """Weighted term frequencies of a section's title, keywords and summary."""
+    weights = {}
+    for field, weight in FIELD_WEIGHTS:
+        text = ' '.join(section[field]) if field == 'keywords' else section[field]
+        for term in tokenize(text):
+            weights[term] = weights.get(term, 0.0) + weight
+    return weights
+
+
+def rank_sections(outline: Dict, user_prompt: str) -> List[Tuple[float, float, Dict]]:
+    """
+    Score an outline's sections against the prompt. Terms found in fewer sections weigh more,
+    and terms found in no section weigh the most, so a prompt about something the outline does
+    not mention gets a low coverage.
+
+    Args:
+        outline (Dict): Outline with sections
+        user_prompt (str): User's prompt
+
+    Returns:
+        List[Tuple[float, float, Dict]]: (score, coverage, section) for sections matching any
+        prompt term, best first; coverage is the idf-weighted share of prompt terms matched
+    """
+    terms = set(tokenize(user_prompt))
+    sections = outline.get('sections') or []
+    if not terms or not sections:
+        return []
+    section_terms = [_section_terms(section) for section in sections]
+    idf = {}
+    for term in terms:
+        df = sum(1 for weights in section_terms if term in weights)
+        idf[term] = math.log(1 + len(sections) / (df or 0.5))
+    total = sum(idf.values())
+
+    ranked = []
+    for section, weights in zip(sections, section_terms):
+        matched = [term for term in terms if term in weights]
+        if not matched:
+            continue
+        score = sum(idf[term] * weights[term] / (weights[term] + 2.0) for term in matched)
+        ranked.append((score, sum(idf[term] for term in matched) / total, section))
+    ranked.sort(key=lambda entry: (-entry[0], entry[2]['start_ms']))
+    return ranked
+
+
+def _to_segment(section: Dict, relevance_score: int) -> Dict:
+    """A section in the shape of a segment result."""
+    return {
+        'start': section['start'],
+        'end': section['end'],
+        'title': section['title'],
+        'summary': section['summary'],
+        'relevance_score': max(1, min(5, relevance_score))
+    }
+
+
+def answer_locally(outline: Dict, user_prompt: str) -> Optional[Tuple[List[Dict], Dict]]:
+    """
+    Answer a prompt by ranking the outline's sections, without any LLM call.
+
+    Args:
+        outline (Dict): Outline with sections
+        user_prompt (str): User's prompt
+
+    Returns:
+        Optional[Tuple[List[Dict], Dict]]: Segments and a description of the answer, or None if
+        the best section covers less than OUTLINE_MIN_COVERAGE of the prompt
+    """
+    ranked = rank_sections(outline, user_prompt)
+    if not ranked or ranked[0][1] < OUTLINE_MIN_COVERAGE:
+        return None
+    best_score = ranked[0][0]
+    chosen = [entry for entry in ranked if entry[0] >= OUTLINE_RELATIVE_SCORE * best_score][:OUTLINE_TOP_K]
+    segments = [_to_segment(section, 1 + round(4 * coverage)) for _, coverage, section in chosen]
+    return segments, {'method': 'local', 'coverage': round(ranked[0][1], 3)}
+
+
+def parse_selection(text: str) -> Optional[Dict]:
+    """Parse the JSON object of an outline selection answer (None if it is not one)."""
+    content = text.replace('```json', '').replace('```', '').strip()
+    match = re.search(r'\{.*\}', content, re.DOTALL)
+    if not match:
+        return None
+    try:
+        selection = json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return None
+    return selection if isinstance(selection, dict) else None
+
+
+def answer_with_llm(outline: Dict, user_prompt: str, priority=None) -> Optional[Tuple[List[Dict], Dict]]:
+    """
+    Answer a prompt with a small Claude call that reads the outline instead of the transcript.
+
+    Args:
+        outline (Dict): Outline with sections
+        user_prompt (str): User's prompt
+        priority (str | int, optional): LLM scheduler priority
+
+    Returns:
+        Optional[Tuple[List[Dict], Dict]]: Segments and a description of the answer (including the
+        model route), or None if the model is not confident the outline answers the prompt
+    """
+    from llm_client import create_message, estimate_input_tokens
+    from model_router import routed_call, segments_need_escalation
+    from decide_clip import load_credentials
+
+    sections = outline['sections']
+    listing = '\n'.join(
+        f"{i}. [{section['start']} - {section['end']}] {section['title']}: {section['summary']} "
+        f"(keywords: {', '.join(section['keywords'])})"
+        for i, section in enumerate(sections))
+    prompt = f"""You are an assistant that finds the sections of a lecture relevant to a student's query, using only the lecture's outline.
+
+Outline (index, time range, title, summary, keywords):
+{listing}
+
+User's query: {user_prompt}
+
+Return a JSON object with:
+  - "sections": the relevant sections, most relevant first, as objects with "index" (integer) and "relevance_score" (integer 1-5)
+  - "confidence": "high", "medium" or "low", how sure you are that the outline alone answers the query
+
+Your response must be a valid JSON object. Do not include any other text."""
+    messages = [{"role": "user", "content": prompt}]
+    credentials = load_credentials()
+
+    def call(model: str, stage: str) -> Optional[Dict]:
+        response = create_message(
+            api_key=credentials.get('ANTHROPIC_API_KEY'),
+            model=model,
+            max_tokens=512,
+            messages=messages,
+            priority=priority,
+            stage=stage
+        )
+        return parse_selection(response.content[0].text)
+
+    selection, route = routed_call('outline_select', estimate_input_tokens(messages), call,
+                                   lambda selection: selection is None or selection.get('confidence') == 'low')
+    if selection is None or selection.get('confidence') not in ('high', 'medium'):
+        return None
+
+    segments = []
+    seen = set()
+    for choice in selection.get('sections') or []:
+        try:
+            index, score = int(choice['index']), int(choice.get('relevance_score') or 1)
+        except (TypeError, ValueError, KeyError):
+            continue
+        if 0 <= index < len(sections) and index not in seen:
+            seen.add(index)
+            segments.append(_to_segment(sections[index], score))
+    if segments_need_escalation(segments):
+        return None
+    segments.sort(key=lambda segment: -segment['relevance_score'])
+    return segments, {'method': 'llm', 'confidence': selection['confidence'], 'model': route['model']}
+
+
+def answer_prompt(video_id: str, user_prompt: str, use_llm: bool = True, outline: Optional[Dict] = None,
+                  priority=None) -> Optional[Tuple[List[Dict], Dict]]:
+    """
+    Answer a prompt from a video's outline, locally first and then (optionally) with Claude.
+
+    Args:
+        video_id (str): YouTube video ID
+        user_prompt (str): User's prompt
+        use_llm (bool): Allow the outline-only Claude call when local ranking is not confident
+        outline (Dict, optional): The outline, if already loaded
+        priority (str | int, optional): LLM scheduler priority
+
+    Returns:
+        Optional[Tuple[List[Dict], Dict]]: Segments and the route to store with them (see
+        model_router.route_satisfies), or None if the full-transcript analysis is needed
+    """
+    if outline is None:
+        outline = load_outline(video_id)
+    if not outline:
+        return None
+    answer = answer_locally(outline, user_prompt)
+    if answer is None and use_llm and OUTLINE_LLM_SELECT:
+        try:
+            answer = answer_with_llm(outline, user_prompt, priority)
+        except LLMRateLimited:
+            raise
+        except Exception as e:
+            print(f"[OUTLINE] Outline selection failed for {video_id}, using the full transcript: {str(e)}")
+    if answer is None:
+        return None
+
+    from model_router import get_routing_policy
+    segments, details = answer
+    # Served like segment results while the segments routing policy holds
+    route = {
+        'stage': 'segments',
+        'policy': get_routing_policy('segments'),
+        'tier': 'outline',
+        'model': details.pop('model', 'local'),
+        'escalated': False,
+        'outline': details
+    }
+    print(f"[OUTLINE] Answered '{user_prompt}' for {video_id} from the outline ({details})")
+    return segments, route
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build topic outlines of cached transcripts")
+    parser.add_argument('video_ids', nargs='+', help="Videos to index")
+    parser.add_argument('--force', action='store_true', help="Rebuild outlines that are still current")
+    args = parser.parse_args()
+
+    failed = 0
+    for video_id in args.video_ids:
+        if not args.force and load_outline(video_id):
+            print(f"[OUTLINE] Outline of {video_id} is current")
+            continue
+        try:
+            build_outline(video_id, priority='batch')
+        except Exception as e:
+            print(f"[OUTLINE] Failed to build outline of {video_id}: {str(e)}")
+            failed += 1
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
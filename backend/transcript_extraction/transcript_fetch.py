@@ -6,7 +6,24 @@ import subprocess
 import os
 import sys
 import re
-from typing import Optional, List, Dict
+import json
+from typing import Optional, List, Dict, Tuple
+from storage import write_text_artifact, artifact_exists
+from resilience import call_with_retries, is_retryable_fetch_error
+import profiling
+
+# 'native' pulls YouTube's json3/srv3 captions into memory through the yt_dlp API and builds cues
+# from word timings; 'srt' uses the legacy yt-dlp CLI with ffmpeg conversion and rolling-caption cleanup
+CAPTION_FORMAT = os.getenv('CAPTION_FORMAT', 'native').lower()
+NATIVE_CAPTION_FORMATS = ('json3', 'srv3')
+
+# Cue building from word timings: a pause this long, or a cue this long, starts a new cue
+CUE_PAUSE_MS = int(os.getenv('CUE_PAUSE_MS', '1200'))
+CUE_MAX_MS = int(os.getenv('CUE_MAX_MS', '8000'))
+SENTENCE_END = ('.', '?', '!')
+
+# Caption URL parameters that identify the track; the rest are signatures, expiry and session data
+CAPTION_URL_STABLE_PARAMS = ('v', 'lang', 'kind', 'name', 'tlang', 'fmt')
 
 def extract_video_id(url: str) -> str:
     """
@@ -173,6 +190,137 @@ def format_srt(subs: List[Dict]) -> str:
         srt_blocks.append(block)
     return "\n".join(srt_blocks)
 
+def parse_cleaned_transcript(transcript_content: str) -> List[Dict]:
+    """
+    Parse a cleaned transcript (as written by format_srt, without index numbers) into cues.
+    
+    Args:
+        transcript_content (str): The cleaned transcript content
+        
+    Returns:
+        List[Dict]: List of cue dictionaries with index, start, end, start_ms, end_ms and text
+    """
+    pattern = re.compile(r"^(\d{2}:\d{2}:\d{2},\d{3}) --> (\d{2}:\d{2}:\d{2},\d{3})\n(.*)$", re.MULTILINE)
+    cues = []
+    for i, match in enumerate(pattern.finditer(transcript_content), 1):
+        start, end, text = match.groups()
+        cues.append({
+            "index": i,
+            "start": start,
+            "end": end,
+            "start_ms": time_to_millis(start),
+            "end_ms": time_to_millis(end),
+            "text": text.strip()
+        })
+    return cues
+
+def parse_json3_words(json_text: str) -> List[Dict]:
+    """
+    Parse YouTube json3 captions into timed words.
+    
+    Args:
+        json_text (str): The json3 caption content
+        
+    Returns:
+        List[Dict]: Words with start_ms, end_ms and text, in time order
+    """
+    words = []
+    for event in json.loads(json_text).get('events', []):
+        segs = event.get('segs')
+        if not segs or 'tStartMs' not in event:
+            continue
+        event_start = event['tStartMs']
+        event_end = event_start + event.get('dDurationMs', 0)
+        for seg in segs:
+            text = seg.get('utf8', '').strip()
+            if text:
+                words.append({'start_ms': event_start + seg.get('tOffsetMs', 0), 'end_ms': event_end, 'text': text})
+    return _close_word_gaps(words)
+
+def parse_srv3_words(xml_text: str) -> List[Dict]:
+    """
+    Parse YouTube srv3 (timedtext XML) captions into timed words.
+    
+    Args:
+        xml_text (str): The srv3 caption content
+        
+    Returns:
+        List[Dict]: Words with start_ms, end_ms and text, in time order
+    """
+    import xml.etree.ElementTree as ET
+    words = []
+    for p in ET.fromstring(xml_text).iter('p'):
+        p_start = int(p.get('t', 0))
+        p_end = p_start + int(p.get('d', 0))
+        spans = list(p.iter('s'))
+        if not spans:
+            # Manual captions carry one line per paragraph without word timing
+            spans = [p]
+        for span in spans:
+            text = ''.join(span.itertext()).strip()
+            if text:
+                words.append({'start_ms': p_start + int(span.get('t', 0)) if span is not p else p_start,
+                              'end_ms': p_end, 'text': text})
+    return _close_word_gaps(words)
+
+def _close_word_gaps(words: List[Dict]) -> List[Dict]:
+    """Order words by start time and end each word no later than the next one starts."""
+    words.sort(key=lambda w: w['start_ms'])
+    for word, next_word in zip(words, words[1:]):
+        word['end_ms'] = max(word['start_ms'], min(word['end_ms'], next_word['start_ms']))
+    return words
+
+def build_cues_from_words(words: List[Dict], pause_ms: int = CUE_PAUSE_MS, max_cue_ms: int = CUE_MAX_MS) -> List[Dict]:
+    """
+    Group timed words into non-overlapping cues, ending a cue at sentence punctuation,
+    at a pause in speech or when it grows too long.
+    
+    Args:
+        words (List[Dict]): Words with start_ms, end_ms and text, in time order
+        pause_ms (int): Silence that ends a cue
+        max_cue_ms (int): Maximum cue duration
+        
+    Returns:
+        List[Dict]: Cues with index, start, end and text (same structure as remove_and_merge)
+    """
+    cues = []
+    current = []
+    for word in words:
+        if current and (word['start_ms'] - current[-1]['end_ms'] >= pause_ms
+                        or word['end_ms'] - current[0]['start_ms'] > max_cue_ms):
+            cues.append(current)
+            current = []
+        current.append(word)
+        if word['text'].endswith(SENTENCE_END):
+            cues.append(current)
+            current = []
+    if current:
+        cues.append(current)
+
+    subs = []
+    for i, cue_words in enumerate(cues, 1):
+        subs.append({
+            "index": i,
+            "start": millis_to_time(cue_words[0]['start_ms']),
+            "end": millis_to_time(max(cue_words[-1]['end_ms'], cue_words[0]['start_ms'])),
+            "text": " ".join(w['text'] for w in cue_words)
+        })
+    return subs
+
+def clean_native_captions(caption_content: str, extension: str) -> str:
+    """
+    Build a cleaned transcript directly from native json3/srv3 captions.
+    
+    Args:
+        caption_content (str): The caption file content
+        extension (str): '.json3' or '.srv3'
+        
+    Returns:
+        str: The cleaned transcript content (same format as clean_transcript)
+    """
+    words = parse_json3_words(caption_content) if extension == '.json3' else parse_srv3_words(caption_content)
+    return format_srt(build_cues_from_words(words))
+
 def clean_transcript(transcript_content: str) -> str:
     """
     Clean the transcript by removing duplicate text and merging identical consecutive subtitles.
@@ -187,9 +335,165 @@ def clean_transcript(transcript_content: str) -> str:
     cleaned_subs = remove_and_merge(subs)
     return format_srt(cleaned_subs)
 
+def select_caption_track(info: Dict, formats: Tuple[str, ...] = NATIVE_CAPTION_FORMATS) -> Optional[Dict]:
+    """
+    Pick the English caption track to download from yt-dlp video info.
+    Auto-generated captions are preferred, then uploaded English subtitles.
+    
+    Args:
+        info (Dict): Video info returned by YoutubeDL.extract_info
+        formats (Tuple[str, ...]): Acceptable caption formats in order of preference
+        
+    Returns:
+        Optional[Dict]: The track (with url and ext), or None if no English track exists
+    """
+    found = _find_caption_track(info, formats)
+    return found[2] if found else None
+
+def _find_caption_track(info: Dict, formats: Tuple[str, ...]) -> Optional[Tuple[str, str, Dict]]:
+    """Find the preferred English caption track as (source, language, track)."""
+    for source in ('automatic_captions', 'subtitles'):
+        tracks = info.get(source) or {}
+        languages = [lang for lang in ('en', 'en-orig') if lang in tracks]
+        languages += sorted(lang for lang in tracks if lang.startswith('en-') and lang not in languages)
+        for lang in languages:
+            for caption_format in formats:
+                for track in tracks[lang]:
+                    if track.get('ext') == caption_format and track.get('url'):
+                        return source, lang, track
+    return None
+
+def caption_track_key(info: Dict, formats: Tuple[str, ...] = NATIVE_CAPTION_FORMATS) -> Optional[str]:
+    """
+    Identify the caption track a fetch would use, from yt-dlp video info alone.
+    Signed, expiring and per-session URL parameters are dropped, so the key only changes
+    when YouTube serves a different track (new upload, language, kind or name).
+    
+    Args:
+        info (Dict): Video info returned by YoutubeDL.extract_info
+        formats (Tuple[str, ...]): Acceptable caption formats in order of preference
+        
+    Returns:
+        Optional[str]: Stable track key, or None if no English track exists
+    """
+    found = _find_caption_track(info, formats)
+    if found is None:
+        return None
+    source, lang, track = found
+    from urllib.parse import urlsplit, parse_qsl
+    query = dict(parse_qsl(urlsplit(track['url']).query))
+    stable = '&'.join(f"{name}={query[name]}" for name in CAPTION_URL_STABLE_PARAMS if name in query)
+    return f"{source}:{lang}:{track['ext']}:{track.get('name', '')}:{stable}"
+
+def lookup_caption_track_key(video_url: str, timeout: float) -> Optional[str]:
+    """
+    Look up the current caption track key of a video with a metadata request only.
+    
+    Args:
+        video_url (str): The URL of the YouTube video
+        timeout (float): Socket timeout in seconds
+        
+    Returns:
+        Optional[str]: Stable track key, or None if no English track exists
+    """
+    import yt_dlp
+
+    ydl_opts = {
+        'quiet': True,
+        'no_warnings': True,
+        'skip_download': True,
+        'socket_timeout': timeout
+    }
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        return caption_track_key(ydl.extract_info(video_url, download=False))
+
+def download_native_captions(video_url: str, timeout: float) -> Tuple[str, str, str]:
+    """
+    Resolve the caption track with the yt_dlp API and read it straight into memory.
+    
+    Args:
+        video_url (str): The URL of the YouTube video
+        timeout (float): Socket timeout in seconds
+        
+    Returns:
+        Tuple[str, str, str]: Caption content, its extension ('.json3' or '.srv3') and the track key
+    """
+    import yt_dlp
+
+    ydl_opts = {
+        'quiet': True,
+        'no_warnings': True,
+        'skip_download': True,
+        'socket_timeout': timeout
+    }
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(video_url, download=False)
+        track = select_caption_track(info)
+        if track is None:
+            raise FileNotFoundError(f"No English {'/'.join(NATIVE_CAPTION_FORMATS)} captions available for {video_url}")
+        response = ydl.urlopen(track['url'])
+        try:
+            content = response.read().decode('utf-8')
+        finally:
+            response.close()
+
+    # The same info carries the chapters; cache them for chapter-scoped analysis
+    try:
+        from chapter_slicing import save_chapters, normalize_chapters
+        save_chapters(extract_video_id(video_url), normalize_chapters(info.get('chapters')))
+    except Exception as e:
+        print(f"Warning: failed to cache chapters: {str(e)}")
+    return content, f".{track['ext']}", caption_track_key(info)
+
+def download_srt_with_cli(video_url: str, video_id: str, output_dir: str) -> str:
+    """
+    Legacy path: download captions with the yt-dlp CLI and convert them to SRT with ffmpeg.
+    
+    Args:
+        video_url (str): The URL of the YouTube video
+        video_id (str): The video ID
+        output_dir (str): Directory the CLI writes the .srt file to
+        
+    Returns:
+        str: Raw SRT content
+    """
+    # Remove leftover .srt downloads for this video only; other cached transcripts are kept
+    srt_prefix = f"transcript_{video_id}."
+    for f in os.listdir(output_dir):
+        if f.startswith(srt_prefix) and f.endswith('.srt'):
+            os.remove(os.path.join(output_dir, f))
+    
+    command = [
+        'yt-dlp',
+        '--write-auto-subs',
+        '--sub-lang', 'en',
+        '--skip-download',
+        '--convert-subs', 'srt',
+        '--no-warnings',
+        '-o', os.path.join(output_dir, f"transcript_{video_id}"),
+        video_url
+    ]
+    call_with_retries(
+        'youtube_fetch',
+        lambda timeout: subprocess.run(command, check=True, capture_output=True, text=True, timeout=timeout),
+        is_retryable_fetch_error,
+        breaker='youtube'
+    )
+    
+    # Find the .srt file for this video (e.g. transcript_{video_id}.en.srt)
+    srt_files = [f for f in os.listdir(output_dir) if f.startswith(srt_prefix) and f.endswith('.srt')]
+    if not srt_files:
+        raise FileNotFoundError(f"No .srt transcript file found in {output_dir}")
+    with open(os.path.join(output_dir, srt_files[0]), 'r', encoding='utf-8') as f:
+        transcript_content = f.read()
+    for f in srt_files:
+        os.remove(os.path.join(output_dir, f))
+    return transcript_content
+
 def fetch_transcript(video_url: str, output_dir: Optional[str] = None, save_raw_transcript: bool = False) -> str:
     """
     Download English auto-generated captions from a YouTube video using yt-dlp.
+    By default the native json3/srv3 captions are read into memory and parsed directly (see CAPTION_FORMAT).
     
     Args:
         video_url (str): The URL of the YouTube video
@@ -209,53 +513,56 @@ def fetch_transcript(video_url: str, output_dir: Optional[str] = None, save_raw_
     video_id = extract_video_id(video_url)
     output_file = os.path.join(output_dir, f"transcript_{video_id}.txt")
     
-    # Remove any existing .srt or .txt files for this video
-    for f in os.listdir(output_dir):
-        if f.startswith('transcript') and (f.endswith('.srt') or f.endswith('.txt')):
-            os.remove(os.path.join(output_dir, f))
+    native = CAPTION_FORMAT != 'srt'
+    # The legacy CLI path does not expose the track; revalidation adopts the current key as baseline
+    track_key = None
     
     try:
-        # Construct the yt-dlp command
-        command = [
-            'yt-dlp',
-            '--write-auto-subs',
-            '--sub-lang', 'en',
-            '--skip-download',
-            '--convert-subs', 'srt',
-            '--no-warnings',
-            '-o', os.path.join(output_dir, 'transcript'),
-            video_url
-        ]
-        
-        # Run the command
-        subprocess.run(command, check=True, capture_output=True, text=True)
-        
-        # Find any .srt file (including transcript.en.srt)
-        srt_files = [f for f in os.listdir(output_dir) if f.startswith('transcript') and f.endswith('.srt')]
-        if not srt_files:
-            raise FileNotFoundError(f"No .srt transcript file found in {output_dir}")
-        # Use the first .srt file found
-        srt_path = os.path.join(output_dir, srt_files[0])
-        with open(srt_path, 'r', encoding='utf-8') as f:
-            transcript_content = f.read()
+        with profiling.stage('download'):
+            if native:
+                # Resolve and read the caption track in-process: no temporary files, no extra process.
+                # Transient YouTube errors are retried under the fetch deadline, and the shared
+                # 'youtube' breaker stops hammering YouTube while it keeps failing.
+                transcript_content, extension, track_key = call_with_retries(
+                    'youtube_fetch',
+                    lambda timeout: download_native_captions(video_url, timeout),
+                    is_retryable_fetch_error,
+                    breaker='youtube'
+                )
+            else:
+                transcript_content = download_srt_with_cli(video_url, video_id, output_dir)
         
         # Save raw transcript if requested
         if save_raw_transcript:
             raw_transcript_file = os.path.join(output_dir, f"raw_transcript_{video_id}.txt")
-            with open(raw_transcript_file, 'w', encoding='utf-8') as f:
-                f.write(transcript_content)
-            print(f"Raw transcript saved to: {raw_transcript_file}")
+            stored_raw_file = write_text_artifact(raw_transcript_file, transcript_content)
+            print(f"Raw transcript saved to: {stored_raw_file}")
         
         # Clean the transcript
-        cleaned_content = clean_transcript(transcript_content)
-        
-        # Save to transcript_{video_id}.txt
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(cleaned_content)
+        with profiling.stage('clean'):
+            if native:
+                cleaned_content = clean_native_captions(transcript_content, extension)
+            else:
+                cleaned_content = clean_transcript(transcript_content)
         
-        # Remove all .srt files after processing
-        for f in srt_files:
-            os.remove(os.path.join(output_dir, f))
+        with profiling.stage('store'):
+            # Save to transcript_{video_id}.txt (compressed according to STORAGE_COMPRESSION)
+            write_text_artifact(output_file, cleaned_content)
+            
+            # Keep the cross-video search index in sync; a failure here must not fail the fetch
+            try:
+                from search_index import index_transcript
+                index_transcript(video_id, cleaned_content)
+            except Exception as e:
+                print(f"Warning: failed to index transcript {video_id}: {str(e)}")
+            
+            # Fingerprint the entry so revalidation can detect upstream caption changes cheaply
+            try:
+                from revalidation import record_fingerprint, content_hash
+                record_fingerprint(video_id, track_key, content_hash(transcript_content) if native else None,
+                                   content_hash(cleaned_content))
+            except Exception as e:
+                print(f"Warning: failed to fingerprint transcript {video_id}: {str(e)}")
         
         return cleaned_content
     except subprocess.CalledProcessError as e:
@@ -280,7 +587,7 @@ if __name__ == "__main__":
         output_file = os.path.join(os.path.dirname(__file__), 'temporary_files', f"transcript_{video_id}.txt")
         
         # Check if file exists and inform user
-        if os.path.exists(output_file):
+        if artifact_exists(output_file):
             print(f"Overwriting existing transcript file: transcript_{video_id}.txt")
         
         fetch_transcript(video_url, save_raw_transcript=save_raw)
@@ -291,4 +598,6 @@ if __name__ == "__main__":
             
     except Exception as e:
         print(f"Error: {str(e)}")
-        sys.exit(1) 
\ No newline at end of file
+        sys.exit(1)
+    finally:
+        profiling.save('transcript_fetch', {'video_url': video_url})
@@ -0,0 +1,142 @@
+"""
+Pipeline worker: claims jobs from the durable job queue and runs decide_clip.py for each one.
+Any number of workers can run on any node that mounts the shared temporary_files volume; the API
+tier only enqueues jobs and reads results (PIPELINE_MODE=queue in app.py).
+
+Usage: python worker.py [--concurrency N] [--once]
+"""
+import os
+import time
+import signal
+import socket
+import argparse
+import threading
+import subprocess
+from typing import Dict
+
+import job_queue
+import profiling
+from stage_metrics import record_stage
+from llm_scheduler import PRIORITY_INTERACTIVE
+from pipeline_runs import spawn_decide_clip, kill_process_group, run_outcome, parse_retry_after
+from resilience import PIPELINE_DEADLINE_SECONDS
+
+WORKER_CONCURRENCY = int(os.getenv('WORKER_CONCURRENCY', '2'))
+# Seconds an idle worker waits before polling the queue again
+WORKER_POLL_SECONDS = float(os.getenv('WORKER_POLL_SECONDS', '1'))
+# Seconds between clean-ups of finished jobs
+WORKER_PRUNE_INTERVAL = 600
+
+_stopping = threading.Event()
+
+
+def run_job(job: Dict, worker_id: str) -> str:
+    """
+    Run the fetch/clean/analyze/save pipeline for one leased job, extending the lease while
+    it runs, and report the outcome to the queue.
+
+    Args:
+        job (Dict): Job returned by job_queue.claim
+        worker_id (str): Worker holding the lease
+
+    Returns:
+        str: Outcome (success, rate_limited, error, timeout or lease_lost)
+    """
+    priority = 'interactive' if job['priority'] <= PRIORITY_INTERACTIVE else 'batch'
+    print(f"[WORKER] {worker_id} running {job['job_key']} (attempt {job['attempts']}): {job['prompt']!r}")
+    env = {**os.environ, 'LLM_PRIORITY': priority, 'LLM_USER': job['user']}
+    profile_id = profiling.choose_profile_id(False)
+    if profile_id:
+        env[profiling.PROFILE_ENV] = profile_id
+        print(f"[WORKER] Profiling {job['job_key']} as {profile_id}")
+    started = time.time()
+    process = spawn_decide_clip(job['video_id'], job['prompt'], env)
+
+    heartbeat = job_queue.JOB_VISIBILITY_TIMEOUT_SECONDS / 3
+    outcome = None
+    while True:
+        try:
+            stdout, stderr = process.communicate(timeout=heartbeat)
+            break
+        except subprocess.TimeoutExpired:
+            if time.time() - started > PIPELINE_DEADLINE_SECONDS:
+                outcome = 'timeout'
+                kill_process_group(process)
+            elif not job_queue.extend_lease(job['job_key'], worker_id):
+                # The job was redelivered to another worker; stop competing (the transcript fetch still completes)
+                outcome = 'lease_lost'
+                process.send_signal(signal.SIGTERM)
+
+    if outcome is None:
+        outcome = run_outcome(process.returncode)
+    record_stage('pipeline', outcome, (time.time() - started) * 1000, attempts=job['attempts'],
+                 detail=None if outcome == 'success' else (stderr or stdout)[-500:])
+
+    if outcome == 'success':
+        job_queue.complete(job['job_key'])
+    elif outcome == 'rate_limited':
+        job_queue.fail(job['job_key'], worker_id, "LLM capacity exhausted", retry_after=parse_retry_after(stdout))
+    elif outcome == 'timeout':
+        job_queue.fail(job['job_key'], worker_id, f"Pipeline exceeded {int(PIPELINE_DEADLINE_SECONDS)}s")
+    elif outcome == 'error':
+        job_queue.fail(job['job_key'], worker_id, (stderr or stdout).strip()[-2000:] or f"exit code {process.returncode}")
+    print(f"[WORKER] {worker_id} finished {job['job_key']}: {outcome} in {time.time() - started:.1f}s")
+    return outcome
+
+
+def worker_loop(slot: int, once: bool = False) -> None:
+    """
+    Claim and run jobs until the worker is stopped.
+
+    Args:
+        slot (int): Index of this loop within the worker process
+        once (bool): Return as soon as the queue is empty
+    """
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{slot}"
+    last_prune = 0.0
+    while not _stopping.is_set():
+        try:
+            job = job_queue.claim(worker_id)
+        except Exception as e:
+            print(f"[WORKER] {worker_id} failed to claim a job: {str(e)}")
+            job = None
+        if job is None:
+            if once:
+                return
+            if slot == 0 and time.time() - last_prune > WORKER_PRUNE_INTERVAL:
+                last_prune = time.time()
+                job_queue.prune_jobs()
+            _stopping.wait(WORKER_POLL_SECONDS)
+            continue
+        try:
+            run_job(job, worker_id)
+        except Exception as e:
+            print(f"[WORKER] {worker_id} crashed on {job['job_key']}: {str(e)}")
+            job_queue.fail(job['job_key'], worker_id, str(e))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run pipeline jobs from the shared job queue")
+    parser.add_argument('--concurrency', type=int, default=WORKER_CONCURRENCY, help="Jobs run in parallel")
+    parser.add_argument('--once', action='store_true', help="Exit when the queue is empty")
+    args = parser.parse_args()
+
+    # Finish the running jobs on SIGTERM/SIGINT; unfinished leases are redelivered if we are killed
+    def stop(signum, frame):
+        print(f"[WORKER] Signal {signum} received, finishing running jobs")
+        _stopping.set()
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    print(f"[WORKER] Starting {args.concurrency} worker loops on {socket.gethostname()}")
+    threads = [threading.Thread(target=worker_loop, args=(slot, args.once), name=f"worker-{slot}")
+               for slot in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    while any(thread.is_alive() for thread in threads):
+        for thread in threads:
+            thread.join(timeout=1)
+
+
+if __name__ == "__main__":
+    main()
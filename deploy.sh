@@ -8,7 +8,7 @@ echo "🚀 Starting SmartLLMs deployment..."
 # Function to cleanup processes on exit
 cleanup() {
     echo "🛑 Stopping servers..."
-    pkill -f "python.*app.py" 2>/dev/null
+    pkill -f "uvicorn asgi:application" 2>/dev/null
     pkill -f "pnpm.*dev" 2>/dev/null
     exit 0
 }
@@ -22,9 +22,9 @@ lsof -ti:3000 | xargs kill -9 2>/dev/null
 lsof -ti:3001 | xargs kill -9 2>/dev/null
 
 # Start backend server
-echo "🔧 Starting backend server (Flask) on port 3001..."
+echo "🔧 Starting backend server (uvicorn) on port 3001..."
 cd backend
-python app.py &
+python -m uvicorn asgi:application --host 127.0.0.1 --port 3001 &
 BACKEND_PID=$!
 cd ..
 